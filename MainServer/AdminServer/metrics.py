@@ -0,0 +1,237 @@
+"""
+Request and stage latency histograms, exposed as Prometheus text on
+``GET /metrics``.
+
+Code times its stages with :func:`stage` (OCR upload / decode / detect /
+recognize ..., receipt seller / items ...).  Each stage is recorded in
+the ``app_stage_duration_seconds`` histogram and, inside a request, added
+to that request's ``Server-Timing`` header by
+``AdminServer.middleware.MetricsMiddleware``, which also records the
+request's latency and database query count / time.
+
+Histograms live in this process's memory.  With ``METRICS_DIR`` set,
+every process writes its own ``<pid>.json`` there at most every
+``METRICS_FLUSH_SECONDS`` (and on exit), and ``/metrics`` adds all the
+files up, so any gunicorn worker can answer for the whole server.  The
+files of exited workers are folded into one (``mark_process_dead``, from
+gunicorn's ``child_exit``) so counts never go backwards.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_COUNTS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name → (help, bucket upper bounds)
+HISTOGRAMS = {
+    "app_stage_duration_seconds": (
+        "Time spent in each stage of OCR and receipt processing.", _SECONDS,
+    ),
+    "http_request_duration_seconds": (
+        "Request latency until the response is returned, by view.", _SECONDS,
+    ),
+    "http_request_db_queries": ("Database queries per request, by view.", _COUNTS),
+    "http_request_db_duration_seconds": ("Database time per request, by view.", _SECONDS),
+}
+
+# exited workers' totals, next to the <pid>.json files
+_DEAD_FILE = "dead.json"
+
+# (name, ((label, value), ...)) → [count per bucket ..., +Inf count, sum]
+_series = {}
+_lock = threading.Lock()
+_flushed = {"at": 0.0, "atexit": False}
+
+# stage → seconds for the request being handled (see MetricsMiddleware)
+_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def enabled():
+    return getattr(settings, "METRICS_ENABLED", True)
+
+
+def _dir():
+    return getattr(settings, "METRICS_DIR", None)
+
+
+# ── recording ───────────────────────────────────────────────────────
+def observe(name, value, **labels):
+    """Add *value* to histogram *name* (a key of :data:`HISTOGRAMS`)."""
+    if not enabled():
+        return
+    buckets = HISTOGRAMS[name][1]
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        row = _series.get(key)
+        if row is None:
+            row = _series[key] = [0] * (len(buckets) + 1) + [0.0]
+        row[bisect_left(buckets, value)] += 1
+        row[-1] += value
+    if _dir() and time.monotonic() - _flushed["at"] >= getattr(settings, "METRICS_FLUSH_SECONDS", 1.0):
+        flush()
+
+
+def observe_stage(name, seconds):
+    observe("app_stage_duration_seconds", seconds, stage=name)
+    timings = _request.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time the block as stage *name*."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - t0)
+
+
+def begin_request():
+    """Start collecting stage timings for this request; returns the token
+    for :func:`end_request`."""
+    return _request.set({})
+
+
+def end_request(token) -> dict:
+    """``{stage: seconds}`` recorded since :func:`begin_request`."""
+    timings = _request.get()
+    _request.reset(token)
+    return timings or {}
+
+
+# ── sharing between processes ───────────────────────────────────────
+def _snapshot():
+    with _lock:
+        return [[name, dict(labels), list(row)] for (name, labels), row in _series.items()]
+
+
+def _write(path, rows):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".metrics-")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(rows, fh)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def flush():
+    """Write this process's histograms to ``METRICS_DIR/<pid>.json``."""
+    directory = _dir()
+    _flushed["at"] = time.monotonic()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f"{os.getpid()}.json"), _snapshot())
+    if not _flushed["atexit"]:
+        _flushed["atexit"] = True
+        atexit.register(flush)
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        # exited and folded away meanwhile, or being replaced
+        return []
+
+
+def _merge(totals, rows):
+    for name, labels, row in rows:
+        if name not in HISTOGRAMS:
+            continue
+        key = (name, tuple(sorted(labels.items())))
+        current = totals.get(key)
+        if current is None or len(current) != len(row):
+            totals[key] = list(row)
+        else:
+            totals[key] = [a + b for a, b in zip(current, row)]
+    return totals
+
+
+def collect() -> dict:
+    """Histograms of every process sharing ``METRICS_DIR`` (or just this
+    one), as ``{(name, labels): row}``."""
+    directory = _dir()
+    if not directory:
+        return _merge({}, _snapshot())
+    flush()
+    totals = {}
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith(".json"):
+            _merge(totals, _read(os.path.join(directory, entry)))
+    return totals
+
+
+def mark_process_dead(pid):
+    """Fold an exited process's file into the dead-process totals (run by
+    one process at a time: the gunicorn master)."""
+    directory = _dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f"{pid}.json")
+    rows = _read(path)
+    if not rows:
+        return
+    dead = os.path.join(directory, _DEAD_FILE)
+    totals = _merge(_merge({}, _read(dead)), rows)
+    _write(dead, [[name, dict(labels), row] for (name, labels), row in totals.items()])
+    os.unlink(path)
+
+
+def reset():
+    """Forget every histogram, here and in ``METRICS_DIR`` (at server
+    start: worker pids are reused across restarts)."""
+    with _lock:
+        _series.clear()
+    directory = _dir()
+    if directory and os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            if entry.endswith(".json"):
+                os.unlink(os.path.join(directory, entry))
+
+
+# ── Prometheus text format ──────────────────────────────────────────
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals=None) -> str:
+    """Prometheus text exposition (format 0.0.4) of :func:`collect`."""
+    totals = collect() if totals is None else totals
+    out = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        out += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (series, labels), row in sorted(totals.items()):
+            if series != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], row[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                out.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            out.append(f"{name}_sum{_labels(labels)} {_number(round(row[-1], 6))}")
+            out.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(out) + "\n"
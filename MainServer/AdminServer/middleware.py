@@ -0,0 +1,70 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics
+
+
+class _QueryTimer:
+    """``execute_wrapper`` counting queries and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - t0
+
+
+def server_timing(stages, db, total) -> str:
+    """``Server-Timing`` value: each stage, the database, and the total,
+    in milliseconds."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    parts.append(f'db;dur={db.seconds * 1000:.1f};desc="{db.count} queries"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Record each request's latency and database queries per view (see
+    ``AdminServer.metrics``) and send the breakdown, with the stages the
+    view timed, in a ``Server-Timing`` header for the browser devtools.
+    Goes first in ``MIDDLEWARE`` so the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.enabled():
+            return self.get_response(request)
+
+        db = _QueryTimer()
+        token = metrics.begin_request()
+        t0 = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(db))
+                response = self.get_response(request)
+        finally:
+            stages = metrics.end_request(token)
+        total = time.perf_counter() - t0
+
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        metrics.observe(
+            "http_request_duration_seconds", total,
+            view=view, method=request.method, status=str(response.status_code),
+        )
+        metrics.observe("http_request_db_queries", db.count, view=view)
+        metrics.observe("http_request_db_duration_seconds", db.seconds, view=view)
+        response["Server-Timing"] = server_timing(stages, db, total)
+        return response
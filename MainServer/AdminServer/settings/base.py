@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'AdminServer.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -172,6 +173,149 @@ JWT_AUTH_HTTPONLY = True                   # Prevent JavaScript access (XSS prot
 JWT_AUTH_SAMESITE = 'Lax'                 # CSRF protection ('Strict' or 'Lax')
 JWT_AUTH_COOKIE_PATH = '/'                 # Cookie path
 
+# ============================================================================
+# METRICS (AdminServer/metrics.py)
+# ============================================================================
+
+# Per-view / per-stage latency histograms on GET /metrics (Prometheus text)
+# and a Server-Timing header on every response
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Each process writes its histograms here and /metrics adds them up, so any
+# worker answers for all of them (gunicorn_config.py sets a default).
+# Unset: /metrics reports the answering process only.
+METRICS_DIR = os.getenv('METRICS_DIR', '') or None
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '1.0'))  # max staleness of other workers' numbers
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '') or None                     # bearer token /metrics requires, if set
+
+# ============================================================================
+# SELLER MATCHING (businesses/resolver.py)
+# ============================================================================
+
+# RapidFuzz score (0-100, on normalised names) a receipt without a TIN needs
+# to reuse an existing seller instead of creating one
+SELLER_MATCH_MIN_SCORE = int(os.getenv('SELLER_MATCH_MIN_SCORE', '90'))
+# lower bar for the suggested_seller offered in OCR results
+SELLER_SUGGEST_MIN_SCORE = int(os.getenv('SELLER_SUGGEST_MIN_SCORE', '75'))
+# seconds between checks for sellers saved by other processes
+SELLER_INDEX_CHECK_SECONDS = int(os.getenv('SELLER_INDEX_CHECK_SECONDS', '5'))
+
+# ============================================================================
+# BILLING SETTINGS
+# ============================================================================
+
+# POST /api/billing/receipts/bulk/.  The JSON body is also capped by Django's
+# DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB by default, roughly 1000 receipts).
+BILLING_BULK_MAX_RECEIPTS = int(os.getenv('BILLING_BULK_MAX_RECEIPTS', '1000'))
+
+# GET /api/billing/receipts/export/ reads receipts (and prefetches their items)
+# this many at a time; memory use scales with it, not with the export size.
+BILLING_EXPORT_CHUNK_SIZE = int(os.getenv('BILLING_EXPORT_CHUNK_SIZE', '2000'))
+
+# Duplicate-receipt detection (billing.duplicates), reported on ingest and in
+# OCR responses.  Image hashes within this many of 64 bits count as the same
+# picture.  Up to 3 each lookup is 4 exact index probes; 4-7 reads ~17x more
+# rows (sub-millisecond at a million receipts only holds up to 3).
+BILLING_DUPLICATE_MAX_DISTANCE = int(os.getenv('BILLING_DUPLICATE_MAX_DISTANCE', '3'))
+# same date and total: RapidFuzz token-set ratio (0-100) the seller names need
+BILLING_DUPLICATE_NAME_SCORE = int(os.getenv('BILLING_DUPLICATE_NAME_SCORE', '85'))
+BILLING_DUPLICATE_LIMIT = 5                                             # candidates reported per receipt
+
+# ============================================================================
+# OCR SETTINGS
+# ============================================================================
+
+# Background OCR job queue (POST /api/ocr/jobs/, drained by `manage.py ocr_worker`)
+OCR_JOB_CONCURRENCY = int(os.getenv('OCR_JOB_CONCURRENCY', '2'))       # worker threads per ocr_worker process
+OCR_JOB_QUEUE_MAX = int(os.getenv('OCR_JOB_QUEUE_MAX', '50'))          # queued + running jobs before 429
+OCR_JOB_POLL_INTERVAL = float(os.getenv('OCR_JOB_POLL_INTERVAL', '1.0'))  # seconds between empty-queue polls
+OCR_JOB_STALE_SECONDS = int(os.getenv('OCR_JOB_STALE_SECONDS', '300'))  # re-queue RUNNING jobs older than this
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv('OCR_JOB_MAX_ATTEMPTS', '3'))
+OCR_JOB_RETRY_DELAY = int(os.getenv('OCR_JOB_RETRY_DELAY', '10'))     # seconds before re-running a job the OCR server failed
+OCR_JOB_RETRY_AFTER = 5                                                 # Retry-After header on 429
+
+# Batch endpoint (POST /api/ocr/extract/batch/)
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '4'))                  # images per detector forward pass
+OCR_BATCH_MAX_IMAGES = int(os.getenv('OCR_BATCH_MAX_IMAGES', '20'))     # images accepted per request
+
+# OCR result cache, keyed by image SHA-256 (Django cache tier + on-disk tier)
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'True') == 'True'
+OCR_CACHE_ALIAS = 'default'
+OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', str(7 * 24 * 3600)))    # seconds, both tiers
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', str(BASE_DIR / 'cache' / 'ocr'))
+OCR_CACHE_DISK_MAX_BYTES = int(os.getenv('OCR_CACHE_DISK_MAX_BYTES', str(256 * 1024 * 1024)))
+# Django's default upload handlers, hashing the file as it is streamed in
+# (upload.sha256 is the cache key above, see ocr/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    'ocr.uploads.HashingMemoryFileUploadHandler',
+    'ocr.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# Compiled category keyword index (ocr/categorizer.py): rebuilt when an
+# ExpenseCategory is saved / deleted; other processes re-check this often
+OCR_CATEGORY_INDEX_CHECK_SECONDS = int(os.getenv('OCR_CATEGORY_INDEX_CHECK_SECONDS', '5'))
+
+# Trained category classifier (ocr/classifier.py), built from confirmed
+# receipts by `manage.py train_category_model`; None disables it
+OCR_CLASSIFIER_DIR = os.getenv('OCR_CLASSIFIER_DIR', str(BASE_DIR / 'cache' / 'category_model'))
+OCR_CLASSIFIER_FEATURES = 2 ** 16                                       # hashed n-gram buckets (fixed once trained)
+OCR_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv('OCR_CLASSIFIER_MIN_CONFIDENCE', '0.6'))  # below this the keyword match wins
+
+# Load and warm the EasyOCR reader at boot instead of on the first request
+# (gunicorn hooks in gunicorn_config.py, runserver via OcrConfig.ready).
+# GET /api/ocr/ready/ then returns 503 until the reader is warm (else 200).
+OCR_WARM_START = os.getenv('OCR_WARM_START', 'False') == 'True'
+
+# Inference backend: 'torch' (EasyOCR as shipped) or 'onnx' – the same reader
+# with its networks on ONNX Runtime, exported by `manage.py export_onnx_models`
+# (ocr/onnx_backend.py).  Compare: `manage.py ocr_benchmark backends`
+OCR_BACKEND = os.getenv('OCR_BACKEND', 'torch')
+OCR_ONNX_DIR = os.getenv('OCR_ONNX_DIR', str(BASE_DIR / 'cache' / 'onnx'))
+OCR_ONNX_QUANTIZED = os.getenv('OCR_ONNX_QUANTIZED', 'True') == 'True'  # int8 weights; False runs the fp32 export
+
+# CPU budget for OCR inference (torch, or ONNX Runtime sessions).  Keep OCR_TORCH_THREADS x concurrent
+# inferences x processes <= cores; 0 leaves torch's default (one per core).
+OCR_TORCH_THREADS = int(os.getenv('OCR_TORCH_THREADS', '2'))          # intra-op threads per process
+OCR_INTEROP_THREADS = int(os.getenv('OCR_INTEROP_THREADS', '1'))      # inter-op threads per process
+OCR_MAX_CONCURRENT = int(os.getenv('OCR_MAX_CONCURRENT', '1'))        # inferences at once per process
+OCR_CPU_AFFINITY = os.getenv('OCR_CPU_AFFINITY', 'False') == 'True'   # pin gunicorn workers to OCR_TORCH_THREADS cores each
+
+# Shared OCR model server (`manage.py ocr_server`).  When the socket is set,
+# web and job workers send images to it instead of loading EasyOCR themselves.
+OCR_SERVER_SOCKET = os.getenv('OCR_SERVER_SOCKET', '') or None
+OCR_SERVER_CONCURRENCY = int(os.getenv('OCR_SERVER_CONCURRENCY', '2'))  # inferences at once in the server
+OCR_SERVER_TIMEOUT = int(os.getenv('OCR_SERVER_TIMEOUT', '120'))          # seconds per request
+
+# Image pre-processing before detection (see ocr/preprocess.py); boxes are
+# mapped back to original coordinates.  Benchmark: `manage.py ocr_benchmark preprocess`
+OCR_PREPROCESS = {
+    'enabled': os.getenv('OCR_PREPROCESS_ENABLED', 'False') == 'True',
+    'grayscale': True,
+    'crop': True,                                                         # crop to the receipt contour
+    'deskew': True,
+    'max_skew_degrees': 10.0,
+    'max_long_edge': int(os.getenv('OCR_PREPROCESS_MAX_LONG_EDGE', '1600')),
+    'target_text_height': None,                                           # px; downscale until text is this tall
+}
+
+# Progressive OCR (see ocr/progressive.py): a low-resolution pass first, then only
+# weak boxes re-read at full resolution.  Benchmark: `manage.py ocr_benchmark progressive`
+OCR_PROGRESSIVE = {
+    'enabled': os.getenv('OCR_PROGRESSIVE_ENABLED', 'False') == 'True',
+    'long_edge': int(os.getenv('OCR_PROGRESSIVE_LONG_EDGE', '1200')),     # first pass
+    'min_confidence': float(os.getenv('OCR_PROGRESSIVE_MIN_CONFIDENCE', '0.5')),  # re-read boxes below this
+    'fields': True,                                                       # also re-read rows of key fields the parser missed
+    'max_weak_share': 0.5,                                                # more weak boxes than this → full pass instead
+}
+
+# Per-seller layout templates (see ocr/templates.py): fields of known sellers read from
+# where their confirmed receipts print them.  Rebuild: `manage.py learn_layout_templates`
+# Learned from saved receipts by `manage.py ocr_worker` (LEARN_LAYOUT jobs).
+OCR_TEMPLATES_ENABLED = os.getenv('OCR_TEMPLATES_ENABLED', 'True') == 'True'
+OCR_TEMPLATE_MIN_RECEIPTS = int(os.getenv('OCR_TEMPLATE_MIN_RECEIPTS', '3'))       # confirmed receipts before a template is used
+OCR_TEMPLATE_HEADER_LINES = int(os.getenv('OCR_TEMPLATE_HEADER_LINES', '6'))       # lines searched for the seller's TIN / name
+OCR_TEMPLATE_CACHE_SIZE = int(os.getenv('OCR_TEMPLATE_CACHE_SIZE', '256'))         # templates kept in memory per process
+OCR_TEMPLATE_CACHE_SECONDS = int(os.getenv('OCR_TEMPLATE_CACHE_SECONDS', '300'))   # then read from the database again
+
 # Logging configuration
 LOGGING = {
     'version': 1,
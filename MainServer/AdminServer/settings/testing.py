@@ -33,6 +33,10 @@ CACHES = {
     }
 }
 
+# OCR result cache - memory tier only, nothing written to disk
+OCR_CACHE_DIR = None
+OCR_CLASSIFIER_DIR = None
+
 # Email backend - console for tests
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
@@ -0,0 +1,75 @@
+import re
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from billing.management.commands.benchmark_bulk_receipts import synthetic_payloads
+
+from . import metrics
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.payload = synthetic_payloads(1)[0]
+
+    def test_server_timing_and_metrics_endpoint(self):
+        response = APIClient().post("/api/billing/receipts/", self.payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        timing = response["Server-Timing"]
+        for name in ("validate", "receipt_seller", "receipt_save", "receipt_items", "duplicates", "total"):
+            self.assertIn(f"{name};dur=", timing)
+        queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing).group(1))
+        self.assertGreater(queries, 0)
+
+        text = self.client.get("/metrics").content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{method="POST",status="201",view="receipt-list"} 1', text
+        )
+        self.assertIn(f'http_request_db_queries_sum{{view="receipt-list"}} {float(queries)}', text)
+        self.assertIn('app_stage_duration_seconds_bucket{stage="receipt_save",le="+Inf"} 1', text)
+
+    def test_error_responses(self):
+        payload = dict(self.payload)
+        del payload["serial_number"]
+        response = APIClient().post("/api/billing/receipts/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("validate;dur=", response["Server-Timing"])
+
+        client = APIClient(raise_request_exception=False)
+        with mock.patch("billing.views.find_duplicates", side_effect=RuntimeError):
+            response = client.post("/api/billing/receipts/", self.payload, format="json")
+        self.assertEqual(response.status_code, 500)
+        # the stage that raised is timed too
+        self.assertIn("duplicates;dur=", response["Server-Timing"])
+
+        text = self.client.get("/metrics").content.decode()
+        for status in ("400", "500"):
+            self.assertIn(
+                f'http_request_duration_seconds_count{{method="POST",status="{status}",view="receipt-list"}} 1',
+                text,
+            )
+        self.assertIn('app_stage_duration_seconds_count{stage="duplicates"} 1', text)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+    def test_processes_share_a_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.observe_stage("detect", 0.2)
+            # another worker's file, as it would flush it
+            other = [0] * 16 + [0.0]
+            other[7], other[-1] = 3, 0.3
+            metrics._write(f"{directory}/999999.json", [["app_stage_duration_seconds", {"stage": "detect"}, other]])
+
+            row = metrics.collect()[("app_stage_duration_seconds", (("stage", "detect"),))]
+            self.assertEqual((sum(row[:-1]), round(row[-1], 6)), (4, 0.5))
+            # an exited worker's counts are kept
+            metrics.mark_process_dead(999999)
+            self.assertEqual(metrics.collect()[("app_stage_duration_seconds", (("stage", "detect"),))], row)
+            self.assertIn('app_stage_duration_seconds_count{stage="detect"} 4', metrics.render())
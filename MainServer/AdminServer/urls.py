@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/billing/', include('billing.urls')),
@@ -26,6 +28,7 @@ urlpatterns = [
     path('api/businesses/', include('businesses.urls')),
     path('api/printing/', include('printing.urls')),
     path('api/ocr/', include('ocr.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
@@ -0,0 +1,22 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from . import metrics
+
+
+def metrics_view(request):
+    """
+    GET the request / stage histograms of every worker in Prometheus text
+    format.  With ``METRICS_TOKEN`` set, scrapes must send it as a bearer
+    token.
+    """
+    if not metrics.enabled():
+        raise Http404
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        sent = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(sent.encode(), f"Bearer {token}".encode()):
+            return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        # duplicates are merged first
+        ('billing', '0003_merge_duplicate_parties'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='buyer',
+            constraint=models.UniqueConstraint(fields=('buyer_tin',), name='buyer_tin_uniq'),
+        ),
+    ]
@@ -10,5 +10,11 @@ class Buyer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # NULL (no TIN) is not a duplicate
+            models.UniqueConstraint(fields=["buyer_tin"], name="buyer_tin_uniq"),
+        ]
+
     def __str__(self):
         return self.buyer_name
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Bulk receipt ingestion (``POST /api/billing/receipts/bulk/``).
+
+Same payload per receipt as ``ReceiptCreateSerializer`` and the same
+linking rules (seller by TIN or else by name, buyer by TIN, ATP by
+number, reusing existing rows), but done per batch instead of per receipt:
+
+1. validate every row; invalid rows are reported and skipped,
+2. one query per entity type to find existing sellers / buyers / ATPs /
+   categories, one ``bulk_create`` per type for the missing ones (read
+   back in one more query),
+3. ``bulk_create`` receipts, then items (``line_total`` computed here,
+   since ``bulk_create`` bypasses ``ReceiptItem.save``), in chunks,
+
+all inside one transaction.  ``bulk_create`` sends no ``post_save``
+signals, so the batch's daily rollups and receipt fingerprints are
+written here in one go; each created row reports the receipts it may
+duplicate (earlier ones, or others in the same batch).
+"""
+
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError as DRFValidationError
+
+from accounts.models import Buyer
+from businesses.models import PLACEHOLDER_TIN, Seller
+from businesses.resolver import SellerIndex, add_sellers, match_seller
+from printing.models import PrinterAccreditation
+
+from .duplicates import find_duplicates_many, fingerprint_lookup_key, index_receipts
+from .models import ExpenseCategory, Receipt, ReceiptItem
+from .rollups import add_receipt, apply_deltas
+from .serializers import (
+    ReceiptCreateSerializer,
+    atp_defaults,
+    item_fields,
+    receipt_fields,
+    tin_sellers,
+)
+
+CHUNK_SIZE = 500
+CENTS = Decimal("0.01")
+
+# relations resolved separately; clean_fields would query for them
+_RECEIPT_RELATIONS = ["seller", "buyer", "category", "atp", "receipt_image"]
+
+
+def _validate(serializer, index, payload):
+    """
+    ``(row, errors)`` – *row* holds validated data plus unsaved models.
+    One serializer validates every row (as ``many=True`` does), so its
+    fields are built once instead of per receipt.
+    """
+    try:
+        d = dict(serializer.run_validation(payload))
+    except DRFValidationError as exc:
+        return None, exc.detail
+
+    d.pop("receipt_image", None)  # JSON only
+    items_data = d.pop("items", [])
+    receipt = Receipt(**receipt_fields(d))
+    items = []
+    for item in items_data:
+        obj = ReceiptItem(**item_fields(item))
+        # what ReceiptItem.save() stores; the DB would round to 2 places
+        obj.line_total = (obj.quantity * obj.unit_cost).quantize(
+            CENTS, rounding=ROUND_HALF_EVEN
+        )
+        items.append(obj)
+
+    errors = {}
+    try:
+        receipt.clean_fields(exclude=_RECEIPT_RELATIONS)
+    except ValidationError as exc:
+        errors.update(exc.message_dict)
+    for n, obj in enumerate(items):
+        try:
+            obj.clean_fields(exclude=["receipt"])
+        except ValidationError as exc:
+            errors[f"items[{n}]"] = exc.message_dict
+    if errors:
+        return None, errors
+
+    return {"index": index, "data": d, "receipt": receipt, "items": items}, None
+
+
+def _resolve(queryset, key_field, keys, make):
+    """
+    ``{key: instance}`` for *keys*: existing rows of *queryset* (one
+    query; the oldest wins if a key repeats), the rest created with
+    ``make(key)``.  The keys are unique in the table, so a row that a
+    concurrent request inserted first is skipped (``ignore_conflicts``)
+    and read back with the new ones.
+    """
+    found = {}
+
+    def fetch(wanted):
+        for obj in queryset.filter(**{f"{key_field}__in": wanted}).order_by("-pk"):
+            found[getattr(obj, key_field)] = obj
+
+    if keys:
+        fetch(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        queryset.model.objects.bulk_create(
+            [make(key) for key in missing], batch_size=CHUNK_SIZE, ignore_conflicts=True
+        )
+        fetch(missing)
+    return found
+
+
+def _seller_tin(d):
+    tin = d["seller_tin"].strip()
+    return "" if tin == PLACEHOLDER_TIN else tin
+
+
+def _buyer_tin(d):
+    return d.get("buyer_tin", "").strip()
+
+
+def _atp_number(d):
+    return d.get("atp_number", "").strip()
+
+
+def _first_by_key(rows, key):
+    """``{key value: first row's data}`` – first payload supplies defaults,
+    as with sequential ``get_or_create``."""
+    first = {}
+    for row in rows:
+        value = key(row["data"])
+        if value and value not in first:
+            first[value] = row["data"]
+    return first
+
+
+def _link_sellers_by_name(rows):
+    """
+    Rows without a TIN reuse the seller without one that
+    ``match_seller`` finds for their name, or one created for the first
+    row of the batch with a similar name.
+    """
+    names = {row["data"]["seller_name"] for row in rows}
+    matches = {name: match_seller(name) for name in names}
+    existing = Seller.objects.in_bulk({m["id"] for m in matches.values() if m})
+    created, batch = [], SellerIndex()
+    for row in rows:
+        d = row["data"]
+        match = matches[d["seller_name"]]
+        seller = existing.get(match["id"]) if match else None
+        if seller is None or seller.registered_business_name != match["name"]:
+            match = match_seller(d["seller_name"], index=batch)
+            if match:
+                seller = created[match["id"]]
+            else:
+                seller = Seller(
+                    registered_business_name=d["seller_name"],
+                    business_address=d["seller_address"],
+                    tin=PLACEHOLDER_TIN,
+                    vat_status=d["seller_vat_status"],
+                )
+                batch.upsert(len(created), seller.registered_business_name, "")
+                created.append(seller)
+        row["receipt"].seller = seller
+    Seller.objects.bulk_create(created, batch_size=CHUNK_SIZE)
+    transaction.on_commit(lambda: add_sellers(created))
+
+
+def _link_related(rows):
+    # ── sellers (by TIN, else by name) ──
+    by_tin = _first_by_key(rows, _seller_tin)
+    sellers = _resolve(
+        tin_sellers(), "tin", list(by_tin),
+        lambda tin: Seller(
+            tin=tin,
+            registered_business_name=by_tin[tin]["seller_name"],
+            business_address=by_tin[tin]["seller_address"],
+            vat_status=by_tin[tin]["seller_vat_status"],
+        ),
+    )
+    _link_sellers_by_name([row for row in rows if not _seller_tin(row["data"])])
+    for row in rows:
+        if _seller_tin(row["data"]):
+            row["receipt"].seller = sellers[_seller_tin(row["data"])]
+    transaction.on_commit(lambda: add_sellers(sellers.values()))
+
+    # ── buyers (only when named; by TIN when given) ──
+    named = [row for row in rows if row["data"].get("buyer_name")]
+    by_tin = _first_by_key(named, _buyer_tin)
+    buyers = _resolve(
+        Buyer.objects.all(), "buyer_tin", list(by_tin),
+        lambda tin: Buyer(
+            buyer_tin=tin,
+            buyer_name=by_tin[tin]["buyer_name"],
+            buyer_address=by_tin[tin].get("buyer_address", ""),
+        ),
+    )
+    anonymous = [
+        (row, Buyer(
+            buyer_name=row["data"]["buyer_name"],
+            buyer_address=row["data"].get("buyer_address", ""),
+        ))
+        for row in named if not _buyer_tin(row["data"])
+    ]
+    Buyer.objects.bulk_create([b for _, b in anonymous], batch_size=CHUNK_SIZE)
+    for row, buyer in anonymous:
+        row["receipt"].buyer = buyer
+    for row in named:
+        if _buyer_tin(row["data"]):
+            row["receipt"].buyer = buyers[_buyer_tin(row["data"])]
+
+    # ── printer accreditations (by ATP number) ──
+    by_number = _first_by_key(rows, _atp_number)
+    atps = _resolve(
+        PrinterAccreditation.objects.all(), "authority_to_print_number", list(by_number),
+        lambda number: PrinterAccreditation(
+            authority_to_print_number=number, **atp_defaults(by_number[number])
+        ),
+    )
+    for row in rows:
+        if _atp_number(row["data"]):
+            row["receipt"].atp = atps[_atp_number(row["data"])]
+
+    # ── categories (unknown ids are ignored, as in the single create) ──
+    cat_ids = {row["data"].get("category_id") for row in rows} - {None, 0}
+    categories = ExpenseCategory.objects.in_bulk(cat_ids) if cat_ids else {}
+    for row in rows:
+        row["receipt"].category = categories.get(row["data"].get("category_id"))
+
+
+def bulk_create_receipts(payloads, chunk_size=CHUNK_SIZE) -> list:
+    """
+    Create receipts from *payloads*.  Returns one entry per payload, in
+    order::
+
+        {"index": 0, "status": "created", "id": 12, "errors": None, "duplicates": [7]}
+        {"index": 1, "status": "error", "id": None, "errors": {...}, "duplicates": []}
+
+    ``duplicates`` holds the ids of receipts this one may duplicate
+    (``billing.duplicates``).
+    """
+    serializer = ReceiptCreateSerializer()
+    results, rows = [], []
+    for index, payload in enumerate(payloads):
+        row, errors = _validate(serializer, index, payload)
+        if row is None:
+            results.append({"index": index, "status": "error", "id": None,
+                            "errors": errors, "duplicates": []})
+        else:
+            rows.append(row)
+            results.append({"index": index, "status": "created", "id": None,
+                            "errors": None, "duplicates": []})
+
+    if not rows:
+        return results
+
+    with transaction.atomic():
+        _link_related(rows)
+        receipts = [row["receipt"] for row in rows]
+        Receipt.objects.bulk_create(receipts, batch_size=chunk_size)
+        fingerprints = index_receipts(receipts)
+
+        items = []
+        for row in rows:
+            for item in row["items"]:
+                item.receipt = row["receipt"]
+                items.append(item)
+        ReceiptItem.objects.bulk_create(items, batch_size=chunk_size)
+
+        deltas = {}
+        for receipt in receipts:
+            add_receipt(deltas, receipt)
+        apply_deltas(deltas)
+
+        found = find_duplicates_many(fingerprint_lookup_key(f) for f in fingerprints)
+
+    for row, candidates in zip(rows, found):
+        results[row["index"]]["id"] = row["receipt"].pk
+        results[row["index"]]["duplicates"] = [c["receipt_id"] for c in candidates]
+    return results
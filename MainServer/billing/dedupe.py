@@ -0,0 +1,111 @@
+"""
+Merge duplicate sellers, buyers and printer accreditations.
+
+Before the unique constraints on ``Seller(tin, branch_code)``,
+``Buyer.buyer_tin`` and ``PrinterAccreditation.authority_to_print_number``
+existed, ingestion could store the same party twice.  Each group of
+duplicates is merged into its oldest row: receipts (and a seller's
+compliance record, if the survivor has none) are repointed to it and
+the rest are deleted.
+
+Functions take an app registry so the migration that adds the
+constraints can run them on historical models; ``manage.py
+dedupe_parties`` passes the live one.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+from businesses.models import PLACEHOLDER_TIN
+
+
+def _duplicate_groups(queryset, keys):
+    """Lists of ids sharing the values of *keys*, oldest first."""
+    groups = (
+        queryset.values(*keys).annotate(n=Count("id")).filter(n__gt=1).order_by()
+    )
+    for group in groups:
+        lookup = {key: group[key] for key in keys}
+        yield list(queryset.filter(**lookup).order_by("id").values_list("id", flat=True))
+
+
+def _merge(model, ids, references):
+    """Point every ``(model, fk field)`` in *references* at ``ids[0]`` and
+    delete the other rows."""
+    keep, losers = ids[0], ids[1:]
+    for ref_model, field in references:
+        ref_model.objects.filter(**{f"{field}__in": losers}).update(**{field: keep})
+    model.objects.filter(id__in=losers).delete()
+
+
+def _dedupe(model, queryset, keys, references, dry_run, before_merge=None):
+    merged = 0
+    for ids in _duplicate_groups(queryset, keys):
+        merged += len(ids) - 1
+        if not dry_run:
+            if before_merge:
+                before_merge(ids)
+            _merge(model, ids, references)
+    return merged
+
+
+def dedupe_sellers(apps, dry_run=False) -> int:
+    """Merge sellers with the same TIN and branch; returns rows removed.
+    The placeholder TIN is shared by unrelated sellers and is left alone."""
+    Seller = apps.get_model("businesses", "Seller")
+    BusinessCompliance = apps.get_model("businesses", "BusinessCompliance")
+    Receipt = apps.get_model("billing", "Receipt")
+
+    def keep_compliance(ids):
+        # one-to-one: the survivor keeps its own record, else the oldest
+        # duplicate's; the others go with their sellers
+        if not BusinessCompliance.objects.filter(seller_id=ids[0]).exists():
+            first = (
+                BusinessCompliance.objects.filter(seller_id__in=ids[1:])
+                .order_by("id").first()
+            )
+            if first is not None:
+                BusinessCompliance.objects.filter(id=first.id).update(seller_id=ids[0])
+
+    queryset = Seller.objects.exclude(tin=PLACEHOLDER_TIN).annotate(
+        branch=Coalesce("branch_code", Value(""))
+    )
+    return _dedupe(
+        Seller, queryset, ["tin", "branch"], [(Receipt, "seller_id")],
+        dry_run, before_merge=keep_compliance,
+    )
+
+
+def dedupe_buyers(apps, dry_run=False) -> int:
+    """Merge buyers with the same TIN; returns rows removed.  A blank TIN
+    is stored as NULL (no TIN), which the constraint allows repeatedly."""
+    Buyer = apps.get_model("accounts", "Buyer")
+    Receipt = apps.get_model("billing", "Receipt")
+    if not dry_run:
+        Buyer.objects.filter(buyer_tin="").update(buyer_tin=None)
+    return _dedupe(
+        Buyer, Buyer.objects.filter(buyer_tin__gt=""), ["buyer_tin"],
+        [(Receipt, "buyer_id")], dry_run,
+    )
+
+
+def dedupe_accreditations(apps, dry_run=False) -> int:
+    """Merge ATPs with the same number; returns rows removed."""
+    PrinterAccreditation = apps.get_model("printing", "PrinterAccreditation")
+    Receipt = apps.get_model("billing", "Receipt")
+    return _dedupe(
+        PrinterAccreditation,
+        PrinterAccreditation.objects.all(),
+        ["authority_to_print_number"], [(Receipt, "atp_id")], dry_run,
+    )
+
+
+def dedupe_parties(apps, dry_run=False) -> dict:
+    """Run all three in one transaction; ``{"sellers": n, ...}``."""
+    with transaction.atomic():
+        return {
+            "sellers": dedupe_sellers(apps, dry_run),
+            "buyers": dedupe_buyers(apps, dry_run),
+            "accreditations": dedupe_accreditations(apps, dry_run),
+        }
@@ -0,0 +1,567 @@
+"""
+Duplicate-receipt detection.
+
+Every receipt has a ``ReceiptFingerprint``: a normalised key (seller TIN
+digits, serial number, local date, total) and, when it has an image, a
+64-bit perceptual hash of it.  A lookup is one raw SQL statement, a
+UNION of three indexed probes:
+
+* same seller TIN and serial number,
+* same date and total – the seller names are then compared with
+  RapidFuzz, since OCR and hand entry spell them differently,
+* multi-index hashing on the image hash: the hash is stored as four
+  16-bit bands, and two hashes within Hamming distance *r* differ in at
+  most ``r // 4`` bits of at least one band.  With the default *r* of 3
+  some band is equal, so each band is one index lookup; *r* of 4–7 looks
+  up the 17 values within one bit of each band, reading ~17× the rows.
+
+Candidates come back as cursor tuples, skipping the ORM, and are
+checked exactly in Python; only receipts that match are read in full.
+Fingerprints are kept in step by ``billing.signals`` and
+``bulk_create_receipts``; ``manage.py index_receipt_fingerprints``
+rebuilds them.
+
+``manage.py benchmark_duplicate_lookup --receipts 1000000`` on SQLite:
+p50 0.79 ms, p95 1.39 ms (SQL p50 0.30 ms), every copy found.
+PostgreSQL has not been measured.
+"""
+
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+from itertools import combinations
+
+import cv2
+import numpy as np
+from dateutil import parser as dateutil_parser
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection
+from rapidfuzz import fuzz
+from rapidfuzz.utils import default_process
+
+from businesses.models import PLACEHOLDER_TIN
+from ocr import preprocess
+
+from .rollups import local_day
+
+logger = logging.getLogger(__name__)
+
+BANDS = 4
+BAND_BITS = 16
+_BAND_MASK = (1 << BAND_BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+_CENTS = Decimal("0.01")
+_BATCH = 1000
+# date-and-total rows read per looked-up key, so a very common date /
+# total cannot turn a lookup into a scan
+_CANDIDATES_PER_KEY = 1000
+
+_SERIAL_LABEL_RE = re.compile(r"^\s*(?:SERIAL\s*)?(?:NO\b|NUMBER\b|#)\.?")
+
+# reasons a candidate is reported, strongest first
+SERIAL, AMOUNT_DATE, IMAGE = "serial", "amount_date", "image"
+# which probe of a lookup query found a row
+_SERIAL_PROBE, _IMAGE_PROBE, _AMOUNT_PROBE = 0, 1, 2
+
+# crop + deskew only: hashes must not change with OCR_PREPROCESS
+_PAGE_CFG = {
+    **preprocess.DEFAULTS,
+    "crop": True, "deskew": True, "max_long_edge": None, "target_text_height": None,
+}
+
+_FIELDS = ["seller_tin", "serial", "day", "total", "image_hash", "image_name",
+           *(f"band{n}" for n in range(BANDS))]
+# what a lookup reads per candidate
+_ROW_FIELDS = ["receipt_id", "seller_tin", "serial", "day", "total", "image_hash",
+               *(f"band{n}" for n in range(BANDS))]
+
+
+def _fingerprint_model(apps=global_apps):
+    return apps.get_model("billing", "ReceiptFingerprint")
+
+
+# ── normalisation ───────────────────────────────────────────────────
+def normalize_tin(tin) -> str:
+    """The 9 TIN digits (no branch code); "" for none or the placeholder."""
+    tin = (tin or "").strip()
+    if not tin or tin == PLACEHOLDER_TIN:
+        return ""
+    return re.sub(r"\D", "", tin)[:9]
+
+
+def normalize_serial(serial) -> str:
+    """Letters and digits only, upper case, without a "No." label or
+    leading zeros ("No. 0001234" and "1234" are the same serial)."""
+    serial = _SERIAL_LABEL_RE.sub("", (serial or "").upper())
+    return re.sub(r"[^0-9A-Z]", "", serial).lstrip("0")
+
+
+def normalize_total(total):
+    try:
+        return Decimal(str(total).replace(",", "")).quantize(_CENTS)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+# ── perceptual hash ─────────────────────────────────────────────────
+def image_hash(data):
+    """
+    64-bit perceptual hash of encoded image bytes, as a signed int for
+    ``BigIntegerField``; None if *data* is not an image.
+
+    The photo is decoded at a quarter of its size, cropped to the
+    receipt and levelled (``ocr.preprocess``), trimmed of its edges and
+    reduced to 32×128 grey – receipts are tall.  Bit *i* says whether the
+    *i*-th of the lowest 16×4 DCT frequencies is above their median: the
+    layout of the text lines, which survives re-photographing,
+    re-compression and lighting changes.
+    """
+    encoded = np.frombuffer(data, np.uint8)
+    grey = cv2.imdecode(encoded, cv2.IMREAD_REDUCED_GRAYSCALE_4) if encoded.size else None
+    del encoded
+    if grey is None:
+        return None
+    _, grey, _ = preprocess.preprocess(None, grey, _PAGE_CFG)
+    h, w = grey.shape
+    grey = grey[h // 20:h - h // 20, w // 20:w - w // 20]
+    small = cv2.resize(grey, (32, 128), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:16, :4].flatten()
+    bits = low > np.median(low[1:])  # the DC term is just the brightness
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hash_bands(value) -> list:
+    """The four 16-bit bands of a hash, most significant first."""
+    value &= _HASH_MASK
+    return [(value >> (BAND_BITS * (BANDS - 1 - n))) & _BAND_MASK for n in range(BANDS)]
+
+
+def hamming(a, b) -> int:
+    return ((a ^ b) & _HASH_MASK).bit_count()
+
+
+def _band_neighbours(band, radius) -> list:
+    """Every 16-bit value within *radius* bits of *band*."""
+    values = [band]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            flipped = band
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def set_image_hash(fingerprint, value):
+    """Set a fingerprint's hash and its bands."""
+    fingerprint.image_hash = value
+    bands = hash_bands(value) if value is not None else [None] * BANDS
+    for n, band in enumerate(bands):
+        setattr(fingerprint, f"band{n}", band)
+
+
+def _hash_field_file(field_file):
+    try:
+        with field_file.open("rb") as fh:
+            return image_hash(fh.read())
+    except (OSError, ValueError):
+        logger.warning("Could not hash receipt image %s", field_file.name, exc_info=True)
+        return None
+
+
+# ── keeping fingerprints in step ────────────────────────────────────
+def _fill(fingerprint, receipt, hash_image=True):
+    """Set *fingerprint*'s key from *receipt*; re-hash the image if it
+    changed (and *hash_image*)."""
+    fingerprint.seller_tin = normalize_tin(receipt.seller.tin)
+    fingerprint.serial = normalize_serial(receipt.serial_number)[:100]
+    fingerprint.day = local_day(receipt.transaction_date)
+    fingerprint.total = normalize_total(receipt.total_amount_due) or Decimal("0.00")
+    name = receipt.receipt_image.name if receipt.receipt_image else ""
+    if hash_image and fingerprint.image_name != name:
+        fingerprint.image_name = name
+        set_image_hash(fingerprint, _hash_field_file(receipt.receipt_image) if name else None)
+
+
+def index_receipt(receipt, created=False):
+    """Create or refresh *receipt*'s fingerprint."""
+    Fingerprint = _fingerprint_model()
+    fingerprint = None if created else Fingerprint.objects.filter(pk=receipt.pk).first()
+    if fingerprint is None:
+        fingerprint = Fingerprint(receipt=receipt)
+        created = True
+    _fill(fingerprint, receipt)
+    fingerprint.save(force_insert=created)
+    return fingerprint
+
+
+def index_receipts(receipts):
+    """Fingerprints for newly created *receipts* in one ``bulk_create``
+    (images are not hashed: the bulk endpoint takes JSON only)."""
+    Fingerprint = _fingerprint_model()
+    fingerprints = []
+    for receipt in receipts:
+        fingerprint = Fingerprint(receipt=receipt)
+        _fill(fingerprint, receipt, hash_image=False)
+        fingerprints.append(fingerprint)
+    Fingerprint.objects.bulk_create(fingerprints, batch_size=_BATCH)
+    return fingerprints
+
+
+def rebuild_fingerprints(images=False, apps=global_apps) -> int:
+    """
+    Create or refresh every receipt's fingerprint; with *images*, also
+    hash images that changed or were never hashed (slow: reads every
+    one from storage).  Returns the number of receipts processed.
+    """
+    Receipt = apps.get_model("billing", "Receipt")
+    Fingerprint = _fingerprint_model(apps)
+    receipts = (
+        Receipt.objects.select_related("seller")
+        .only("serial_number", "transaction_date", "total_amount_due",
+              "receipt_image", "seller__tin")
+        .order_by("pk")
+    )
+    done, chunk = 0, []
+
+    def flush():
+        existing = Fingerprint.objects.in_bulk([r.pk for r in chunk])
+        new, changed = [], []
+        for receipt in chunk:
+            fingerprint = existing.get(receipt.pk)
+            if fingerprint is None:
+                fingerprint = Fingerprint(receipt_id=receipt.pk)
+                new.append(fingerprint)
+            else:
+                changed.append(fingerprint)
+            _fill(fingerprint, receipt, hash_image=images)
+        Fingerprint.objects.bulk_create(new, batch_size=_BATCH)
+        Fingerprint.objects.bulk_update(changed, _FIELDS, batch_size=_BATCH)
+        return len(chunk)
+
+    for receipt in receipts.iterator(chunk_size=_BATCH):
+        chunk.append(receipt)
+        if len(chunk) >= _BATCH:
+            done += flush()
+            chunk = []
+    if chunk:
+        done += flush()
+    return done
+
+
+# ── lookups ─────────────────────────────────────────────────────────
+def fingerprint_lookup_key(fingerprint) -> dict:
+    """What :func:`find_duplicates` needs to look for copies of a
+    fingerprinted receipt."""
+    return {
+        "receipt_id": fingerprint.receipt_id,
+        "seller_tin": fingerprint.seller_tin,
+        "seller_name": fingerprint.receipt.seller.registered_business_name,
+        "serial": fingerprint.serial,
+        "day": fingerprint.day,
+        "total": fingerprint.total,
+        "image_hash": fingerprint.image_hash,
+    }
+
+
+def receipt_lookup_key(receipt) -> dict:
+    fingerprint = _fingerprint_model().objects.get(pk=receipt.pk)
+    fingerprint.receipt = receipt  # with its seller already loaded
+    return fingerprint_lookup_key(fingerprint)
+
+
+def parsed_lookup_key(parsed, image_hash=None) -> dict:
+    """The lookup key for an OCR payload (``ocr.parser`` output); blank
+    or unreadable fields are left out of the match."""
+    receipt = parsed.get("receipt", {})
+    seller = parsed.get("seller", {})
+    day = None
+    if receipt.get("transaction_date"):
+        try:
+            day = local_day(dateutil_parser.parse(receipt["transaction_date"]))
+        except (ValueError, OverflowError):
+            pass
+    return {
+        "receipt_id": None,
+        "seller_tin": normalize_tin(seller.get("tin")),
+        "seller_name": seller.get("registered_business_name", ""),
+        "serial": normalize_serial(receipt.get("serial_number")),
+        "day": day,
+        "total": normalize_total(receipt["total_amount_due"]) if receipt.get("total_amount_due") else None,
+        "image_hash": image_hash,
+    }
+
+
+def _converter(field):
+    """Turns a raw database value of *field* into what the ORM returns."""
+    col = field.get_col(field.model._meta.db_table)
+    converters = connection.ops.get_db_converters(col) + col.get_db_converters(connection)
+
+    def convert(value):
+        for converter in converters:
+            value = converter(value, col, connection)
+        return value
+
+    return convert
+
+
+_SQL = {}  # connection alias → quoted names and converters of the raw queries
+
+
+def _sql():
+    """Quoted table / column names and value converters of the raw
+    lookup queries, worked out once per database."""
+    try:
+        return _SQL[connection.alias]
+    except KeyError:
+        pass
+    qn = connection.ops.quote_name
+    Fingerprint = _fingerprint_model()
+    columns = [qn(Fingerprint._meta.get_field(name).column) for name in _ROW_FIELDS]
+    Receipt = global_apps.get_model("billing", "Receipt")
+    seller_fk = Receipt._meta.get_field("seller")
+    Seller = seller_fk.related_model
+    receipt, seller = qn(Receipt._meta.db_table), qn(Seller._meta.db_table)
+    receipt_pk = f"{receipt}.{qn(Receipt._meta.pk.column)}"
+    fields = [
+        *(Receipt._meta.get_field(name) for name in ("serial_number", "transaction_date", "total_amount_due")),
+        Seller._meta.get_field("registered_business_name"),
+    ]
+    _SQL[connection.alias] = sql = {
+        "table": qn(Fingerprint._meta.db_table),
+        "columns": ", ".join(columns),
+        "image_columns": ", ".join([columns[0], *(["NULL"] * 4), *columns[5:]]),
+        "column": {name: qn(Fingerprint._meta.get_field(name).column)
+                   for name in ("seller_tin", "serial", "day", "total", "receipt_id",
+                                *(f"band{n}" for n in range(BANDS)))},
+        "day": _converter(Fingerprint._meta.get_field("day")),
+        "total": _converter(Fingerprint._meta.get_field("total")),
+        "details": (
+            f"SELECT {receipt_pk}, "
+            + ", ".join(f"{qn(f.model._meta.db_table)}.{qn(f.column)}" for f in fields)
+            + f" FROM {receipt} INNER JOIN {seller}"
+            f" ON {receipt}.{qn(seller_fk.column)} = {seller}.{qn(Seller._meta.pk.column)}"
+            f" WHERE {receipt_pk} IN "
+        ),
+        "details_converters": [_converter(field) for field in fields],
+    }
+    return sql
+
+
+def _wanted_bands(keys, radius) -> list:
+    """Per band, every value within *radius* bits of a key's hash band."""
+    hashes = [hash_bands(k["image_hash"]) for k in keys if k.get("image_hash") is not None]
+    return [
+        list({v for h in hashes for v in _band_neighbours(h[n], radius)}) for n in range(BANDS)
+    ]
+
+
+def _placeholders(values) -> str:
+    return f"({', '.join(['%s'] * len(values))})"
+
+
+def _candidate_query(keys, bands, cap):
+    """
+    ``(sql, params)`` of one statement reading every key's candidates:
+    a UNION of indexed probes, each row ``_ROW_FIELDS`` plus the probe
+    that found it (for several keys a superset, narrowed in Python).
+
+    * ``_SERIAL``: same seller TIN and serial number;
+    * ``_IMAGE``: any hash band in *bands* (:func:`_wanted_bands`) –
+      only the id, hash and bands are read, as most of these rows are
+      near misses;
+    * ``_AMOUNT``: same date and total.  This can match a busy day's
+      worth, so it reads at most *cap* rows (newest first) and cannot
+      crowd the others out.
+
+    None when no key has anything to look for.
+    """
+    ops = connection.ops
+    sql = _sql()
+    table, columns, column = sql["table"], sql["columns"], sql["column"]
+    parts, params = [], []
+
+    serials = {(k["seller_tin"], k["serial"]) for k in keys if k["seller_tin"] and k["serial"]}
+    if serials:
+        tins, numbers = list({t for t, _ in serials}), list({s for _, s in serials})
+        parts.append(
+            f"SELECT {columns}, {_SERIAL_PROBE} FROM {table}"
+            f" WHERE {column['seller_tin']} IN {_placeholders(tins)}"
+            f" AND {column['serial']} IN {_placeholders(numbers)}"
+        )
+        params += [*tins, *numbers]
+
+    if bands[0]:
+        parts.append(
+            f"SELECT {sql['image_columns']}, {_IMAGE_PROBE} FROM {table} WHERE "
+            + " OR ".join(f"{column[f'band{n}']} IN {_placeholders(values)}"
+                          for n, values in enumerate(bands))
+        )
+        params += [v for values in bands for v in values]
+
+    amounts = {(k["day"], k["total"]) for k in keys if k["day"] and k["total"] is not None}
+    if amounts:
+        days = list({ops.adapt_datefield_value(d) for d, _ in amounts})
+        totals = list({ops.adapt_decimalfield_value(t) for _, t in amounts})
+        parts.append(
+            f"SELECT * FROM (SELECT {columns}, {_AMOUNT_PROBE} FROM {table}"
+            f" WHERE {column['day']} IN {_placeholders(days)}"
+            f" AND {column['total']} IN {_placeholders(totals)}"
+            f" ORDER BY {column['receipt_id']} DESC LIMIT %s) AS same_amount"
+        )
+        params += [*days, *totals, cap]
+
+    if not parts:
+        return None
+    return " UNION ".join(parts), params
+
+
+def _index(rows, bands):
+    """Candidate rows (see :func:`_candidate_query`) by serial key, by
+    date and total, and by each hash band in *bands* (the values looked
+    up, per band)."""
+    by_serial, by_amount = {}, {}
+    by_band = [{value: [] for value in values} for values in bands]
+    sql = _sql()
+    day_of, total_of = sql["day"], sql["total"]
+    for row in rows:
+        receipt_id, tin, serial, day, total, hashed, *bands, probe = row
+        if probe == _IMAGE_PROBE:
+            for n, band in enumerate(bands):
+                if band in by_band[n]:
+                    by_band[n][band].append((receipt_id, hashed))
+        elif probe == _SERIAL_PROBE:
+            by_serial.setdefault((tin, serial), []).append(receipt_id)
+        else:
+            by_amount.setdefault((day_of(day), total_of(total)), []).append((receipt_id, tin))
+    return by_serial, by_amount, by_band
+
+
+def _hits(key, index, radius, max_distance):
+    """
+    ``({receipt id: hit}, pending)`` for *key*.  *pending* holds receipts
+    with the same date and total but not the same TIN: they count once
+    the seller names are compared (:func:`_candidates`).
+    """
+    by_serial, by_amount, by_band = index
+    hits, pending = {}, set()
+
+    def hit(receipt_id, reason):
+        entry = hits.setdefault(
+            receipt_id, {"reasons": [], "image_distance": None, "name_score": None}
+        )
+        entry["reasons"].append(reason)
+        return entry
+
+    if key["seller_tin"] and key["serial"]:
+        for receipt_id in by_serial.get((key["seller_tin"], key["serial"]), ()):
+            hit(receipt_id, SERIAL)
+
+    if key["day"] and key["total"] is not None:
+        for receipt_id, tin in by_amount.get((key["day"], key["total"]), ()):
+            if key["seller_tin"] and key["seller_tin"] == tin:
+                hit(receipt_id, AMOUNT_DATE)
+            elif key["seller_name"]:
+                pending.add(receipt_id)
+
+    if key.get("image_hash") is not None:
+        seen = set()
+        for n, band in enumerate(hash_bands(key["image_hash"])):
+            for value in _band_neighbours(band, radius):
+                for receipt_id, hashed in by_band[n].get(value, ()):
+                    if receipt_id in seen:
+                        continue
+                    seen.add(receipt_id)
+                    distance = hamming(key["image_hash"], hashed)
+                    if distance <= max_distance:
+                        hit(receipt_id, IMAGE)["image_distance"] = distance
+
+    hits.pop(key["receipt_id"], None)
+    pending.discard(key["receipt_id"])
+    return hits, pending - hits.keys()
+
+
+def _candidates(key, hits, pending, details, min_score):
+    for receipt_id in pending:
+        score = fuzz.token_set_ratio(
+            key["seller_name"], details[receipt_id]["seller_name"], processor=default_process
+        )
+        if score >= min_score:
+            hits[receipt_id] = {
+                "reasons": [AMOUNT_DATE], "image_distance": None, "name_score": round(score, 1),
+            }
+
+    order = [SERIAL, AMOUNT_DATE, IMAGE]
+    out = []
+    for receipt_id, hit in hits.items():
+        hit["reasons"].sort(key=order.index)
+        out.append({**details[receipt_id], "receipt_id": receipt_id, **hit})
+    out.sort(key=lambda c: (
+        -len(c["reasons"]), order.index(c["reasons"][0]),
+        c["image_distance"] if c["image_distance"] is not None else 65,
+    ))
+    return out
+
+
+def _details(receipt_ids) -> dict:
+    """``{receipt id: {"serial_number", "transaction_date",
+    "total_amount_due", "seller_name"}}`` of the receipts that matched."""
+    sql = _sql()
+    converters = sql["details_converters"]
+    ids = list(receipt_ids)
+
+    details = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql["details"] + _placeholders(ids), ids)
+        for receipt_id, *values in cursor.fetchall():
+            serial, date, total, name = (convert(v) for convert, v in zip(converters, values))
+            details[receipt_id] = {
+                "serial_number": serial, "transaction_date": date,
+                "total_amount_due": total, "seller_name": name,
+            }
+    return details
+
+
+def find_duplicates_many(keys, limit=None) -> list:
+    """
+    Receipts that look like each key (from :func:`receipt_lookup_key`,
+    :func:`fingerprint_lookup_key` or :func:`parsed_lookup_key`): one
+    list per key, best first, of::
+
+        {"receipt_id": 12, "serial_number": "1234", "seller_name": "...",
+         "transaction_date": ..., "total_amount_due": ...,
+         "reasons": ["serial", "image"], "image_distance": 3,
+         "name_score": None}
+
+    One query over the fingerprints for all keys, plus one for the
+    details of the receipts that matched (none, usually).
+    """
+    keys = list(keys)
+    limit = limit or getattr(settings, "BILLING_DUPLICATE_LIMIT", 5)
+    max_distance = getattr(settings, "BILLING_DUPLICATE_MAX_DISTANCE", 3)
+    min_score = getattr(settings, "BILLING_DUPLICATE_NAME_SCORE", 85)
+    radius = max_distance // BANDS
+
+    bands = _wanted_bands(keys, radius)
+    query = _candidate_query(keys, bands, _CANDIDATES_PER_KEY * len(keys))
+    if query is None:
+        return [[] for _ in keys]
+    with connection.cursor() as cursor:
+        cursor.execute(*query)
+        index = _index(cursor.fetchall(), bands)
+    found = [_hits(key, index, radius, max_distance) for key in keys]
+
+    wanted = {receipt_id for hits, pending in found for receipt_id in (*hits, *pending)}
+    details = _details(wanted) if wanted else {}
+
+    return [
+        _candidates(key, hits, pending, details, min_score)[:limit]
+        for key, (hits, pending) in zip(keys, found)
+    ]
+
+
+def find_duplicates(key, limit=None) -> list:
+    """:func:`find_duplicates_many` for one key."""
+    return find_duplicates_many([key], limit)[0]
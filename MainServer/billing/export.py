@@ -0,0 +1,148 @@
+"""
+Streaming receipt export (``GET /api/billing/receipts/export/``).
+
+Rows come from a server-side cursor (``QuerySet.iterator``): related
+sellers, buyers, categories and ATPs are joined in, and line items are
+prefetched one chunk of receipts at a time, so memory depends on the
+chunk size, not on how many receipts are exported.  The CSV / XLSX
+writers buffer about 64 KB before handing bytes to the response.
+
+Columns follow the BIR summary list of purchases: one row per receipt,
+or one row per line item with ``rows="items"``.
+"""
+
+import csv
+import io
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Receipt, ReceiptItem
+from .rollups import receipts_between
+from .xlsx import stream_xlsx
+
+DEFAULT_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+def _local_date(receipt):
+    return timezone.localdate(receipt.transaction_date)
+
+
+def _buyer(attr):
+    return lambda r: getattr(r.buyer, attr) if r.buyer_id else ""
+
+
+# (header, value getter) – receipt columns, shared by both row kinds
+RECEIPT_COLUMNS = [
+    ("Transaction Date", _local_date),
+    ("Receipt Type", lambda r: r.get_receipt_type_display()),
+    ("Serial Number", lambda r: r.serial_number),
+    ("Seller TIN", lambda r: r.seller.tin),
+    ("Branch Code", lambda r: r.seller.branch_code or ""),
+    ("Seller Name", lambda r: r.seller.registered_business_name),
+    ("Seller Address", lambda r: r.seller.business_address),
+    ("Buyer Name", _buyer("buyer_name")),
+    ("Buyer TIN", _buyer("buyer_tin")),
+    ("Category", lambda r: r.category.name if r.category_id else ""),
+    ("ATP Number", lambda r: r.atp.authority_to_print_number if r.atp_id else ""),
+]
+AMOUNT_COLUMNS = [
+    ("Gross Sales", lambda r: r.gross_sales),
+    ("Vatable Sales", lambda r: r.vatable_sales),
+    ("VAT Exempt Sales", lambda r: r.vat_exempt_sales),
+    ("Zero Rated Sales", lambda r: r.zero_rated_sales),
+    ("VAT Amount", lambda r: r.vat_amount),
+    ("Total Amount Due", lambda r: r.total_amount_due),
+]
+ITEM_COLUMNS = [
+    ("Description", lambda i: i.description),
+    ("Quantity", lambda i: i.quantity),
+    ("Unit Cost", lambda i: i.unit_cost),
+    ("Line Total", lambda i: i.line_total),
+]
+
+ROW_KINDS = ("receipts", "items")
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# a spreadsheet would run OCR'd text starting with these as a formula
+_FORMULA_START = ("=", "+", "-", "@")
+
+
+def export_queryset(date_from=None, date_to=None, rows="receipts"):
+    """Receipts in the (local, inclusive) date range, oldest first, with
+    only the columns the export reads."""
+    queryset = (
+        Receipt.objects.select_related("seller", "buyer", "category", "atp")
+        .only(
+            "receipt_type", "serial_number", "transaction_date",
+            "gross_sales", "vatable_sales", "vat_exempt_sales",
+            "zero_rated_sales", "vat_amount", "total_amount_due",
+            "seller__tin", "seller__branch_code", "seller__registered_business_name",
+            "seller__business_address", "buyer__buyer_name", "buyer__buyer_tin",
+            "category__name", "atp__authority_to_print_number",
+        )
+        .order_by("transaction_date", "id")
+    )
+    queryset = receipts_between(queryset, date_from, date_to)
+    if rows == "items":
+        items = ReceiptItem.objects.only(
+            "receipt_id", "description", "quantity", "unit_cost", "line_total"
+        ).order_by("id")
+        queryset = queryset.prefetch_related(Prefetch("items", queryset=items))
+    return queryset
+
+
+def header(rows="receipts"):
+    columns = RECEIPT_COLUMNS + (ITEM_COLUMNS if rows == "items" else AMOUNT_COLUMNS)
+    return [name for name, _ in columns]
+
+
+def export_rows(queryset, rows="receipts", chunk_size=None):
+    """Yield one list of values per receipt (or per line item)."""
+    chunk_size = chunk_size or getattr(settings, "BILLING_EXPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    for receipt in queryset.iterator(chunk_size=chunk_size):
+        values = [get(receipt) for _, get in RECEIPT_COLUMNS]
+        if rows == "items":
+            for item in receipt.items.all():
+                yield values + [get(item) for _, get in ITEM_COLUMNS]
+            # prefetched items point back at the receipt; break the cycle
+            # so the chunk is freed now, not at the next full gc
+            receipt._prefetched_objects_cache.clear()
+        else:
+            yield values + [get(receipt) for _, get in AMOUNT_COLUMNS]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(_FORMULA_START):
+        return "'" + value
+    return value
+
+
+def stream_csv(header, rows, flush_bytes=FLUSH_BYTES):
+    """Yield UTF-8 CSV (with a BOM, so Excel detects the encoding)."""
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        if buffer.tell() >= flush_bytes:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def stream_export(output="csv", rows="receipts", date_from=None, date_to=None, chunk_size=None):
+    """The file's bytes, a chunk at a time."""
+    queryset = export_queryset(date_from, date_to, rows)
+    values = export_rows(queryset, rows, chunk_size)
+    if output == "xlsx":
+        return stream_xlsx(header(rows), values, sheet_name=f"Purchases ({rows})")
+    return stream_csv(header(rows), values)
@@ -0,0 +1,120 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from billing.views import ReceiptViewSet
+
+
+_SELLERS = 40
+_BUYERS = 15
+_ATPS = 10
+
+
+def synthetic_tin(n):
+    return f"{n // 1000000 % 1000:03d}-{n // 1000 % 1000:03d}-{n % 1000:03d}-000"
+
+
+def synthetic_payloads(count, seed=0):
+    """Review-form payloads drawn from a small pool of sellers, buyers and
+    ATPs, so most rows link to an existing entity – as in a real backlog."""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        s, b, a = rng.randrange(_SELLERS), rng.randrange(_BUYERS), rng.randrange(_ATPS)
+        items = [
+            {
+                "description": f"Item {rng.randint(1, 500)}",
+                "quantity": str(rng.randint(1, 6)),
+                "unit_cost": f"{rng.uniform(5, 900):.2f}",
+            }
+            for _ in range(rng.randint(1, 5))
+        ]
+        total = sum(float(it["quantity"]) * float(it["unit_cost"]) for it in items)
+        payloads.append({
+            "seller_name": f"BENCH SELLER {s}",
+            "seller_address": "1 Rizal Ave., Makati City",
+            "seller_tin": synthetic_tin(900000000 + s),
+            "seller_vat_status": "VAT",
+            "buyer_name": f"BENCH BUYER {b}",
+            "buyer_tin": synthetic_tin(800000000 + b),
+            "receipt_type": "OFFICIAL_RECEIPT",
+            "serial_number": f"{i:07d}",
+            "transaction_date": (date(2024, 1, 1) + timedelta(days=rng.randint(0, 365))).isoformat(),
+            "gross_sales": f"{total:.2f}",
+            "vatable_sales": f"{total / 1.12:.2f}",
+            "vat_amount": f"{total - total / 1.12:.2f}",
+            "total_amount_due": f"{total:.2f}",
+            "atp_number": f"BENCH-ATP-{a}",
+            "printer_name": "BENCH PRINTER",
+            "atp_issue_date": "2023-01-15",
+            "items": items,
+            "raw_ocr_text": "BENCH SELLER OFFICIAL RECEIPT TOTAL AMOUNT DUE",
+        })
+    return payloads
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare N single POST /api/billing/receipts/ calls with one bulk "
+        "POST /api/billing/receipts/bulk/.  Runs in a transaction that is "
+        "rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--receipts", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def _measure(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            t0 = time.perf_counter()
+            response = fn()
+            elapsed = time.perf_counter() - t0
+        return response, {"seconds": round(elapsed, 3), "queries": len(queries)}
+
+    def handle(self, *args, **options):
+        count = options["receipts"]
+        payloads = synthetic_payloads(count, seed=options["seed"])
+        factory = APIRequestFactory()
+        create = ReceiptViewSet.as_view({"post": "create"})
+        bulk = ReceiptViewSet.as_view({"post": "bulk"})
+
+        def single_posts():
+            for payload in payloads:
+                response = create(factory.post("/api/billing/receipts/", payload, format="json"))
+                if response.status_code != 201:
+                    raise RuntimeError(f"single POST failed: {response.data}")
+
+        def bulk_post():
+            response = bulk(factory.post("/api/billing/receipts/bulk/", payloads, format="json"))
+            if response.data["failed"]:
+                raise RuntimeError(f"bulk POST failed: {response.data['results'][:3]}")
+
+        # each run in its own rolled-back transaction: both start from the same rows
+        report = {"receipts": count}
+        for name, fn in (("single", single_posts), ("bulk", bulk_post)):
+            with transaction.atomic():
+                _, report[name] = self._measure(fn)
+                transaction.set_rollback(True)
+            report[name]["receipts_per_second"] = round(count / max(report[name]["seconds"], 1e-9), 1)
+        report["speedup"] = round(report["single"]["seconds"] / max(report["bulk"]["seconds"], 1e-9), 1)
+
+        for name in ("single", "bulk"):
+            r = report[name]
+            self.stdout.write(
+                f"{name:<7} {r['seconds']:>8.3f} s  {r['queries']:>7} queries  "
+                f"{r['receipts_per_second']:>9} receipts/s"
+            )
+        self.stdout.write(f"speedup {report['speedup']}x")
+
+        text = json.dumps(report, indent=2)
+        self.stdout.write(text)
+        if options.get("output"):
+            with open(options["output"], "w") as fh:
+                fh.write(text + "\n")
@@ -0,0 +1,189 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from billing.duplicates import (
+    find_duplicates,
+    fingerprint_lookup_key,
+    normalize_serial,
+    normalize_tin,
+    set_image_hash,
+)
+from billing.models import Receipt, ReceiptFingerprint
+from businesses.models import Seller
+
+from .benchmark_bulk_receipts import synthetic_tin
+
+_BATCH = 5000
+
+
+def _flip(value, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class _SQLTimer:
+    """``execute_wrapper`` recording each query's time in ms (the debug
+    query log rounds to whole milliseconds)."""
+
+    def __init__(self):
+        self.samples = []
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.samples.append((time.perf_counter() - t0) * 1000)
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time duplicate-receipt lookups (billing.duplicates) against N "
+        "fingerprinted receipts with random image hashes.  Seeds data in a "
+        "transaction that is rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--receipts", type=int, default=1000000)
+        parser.add_argument("--sellers", type=int, default=2000)
+        parser.add_argument("--lookups", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def _seed(self, count, sellers, rng):
+        Seller.objects.bulk_create(
+            [
+                Seller(
+                    registered_business_name=f"BENCH SELLER {n}",
+                    business_address="1 Rizal Ave., Makati City",
+                    tin=synthetic_tin(900000000 + n),
+                    vat_status=Seller.VAT,
+                )
+                for n in range(sellers)
+            ],
+            batch_size=_BATCH,
+        )
+        pool = list(Seller.objects.filter(registered_business_name__startswith="BENCH SELLER "))
+        start = timezone.make_aware(datetime(2022, 1, 1))
+        for offset in range(0, count, _BATCH):
+            receipts = []
+            for n in range(offset, min(offset + _BATCH, count)):
+                total = Decimal(rng.randrange(100, 5000000)) / 100
+                receipts.append(Receipt(
+                    seller=rng.choice(pool),
+                    receipt_type=Receipt.OFFICIAL_RECEIPT,
+                    serial_number=f"{n:09d}",
+                    transaction_date=start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+                    gross_sales=total,
+                    total_amount_due=total,
+                ))
+            Receipt.objects.bulk_create(receipts)
+            fingerprints = []
+            for receipt in receipts:
+                fingerprint = ReceiptFingerprint(
+                    receipt=receipt,
+                    seller_tin=normalize_tin(receipt.seller.tin),
+                    serial=normalize_serial(receipt.serial_number),
+                    day=timezone.localdate(receipt.transaction_date),
+                    total=receipt.total_amount_due,
+                )
+                set_image_hash(fingerprint, rng.getrandbits(64) - (1 << 63))
+                fingerprints.append(fingerprint)
+            ReceiptFingerprint.objects.bulk_create(fingerprints)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(ReceiptFingerprint._meta.db_table)}")
+
+    def _keys(self, lookups, rng):
+        """Half copies of stored receipts (image hash a few bits off),
+        half receipts never seen."""
+        sample = list(
+            ReceiptFingerprint.objects.select_related("receipt__seller")
+            .order_by("?")[: lookups // 2]
+        )
+        keys = []
+        for fingerprint in sample:
+            key = fingerprint_lookup_key(fingerprint)
+            key["receipt_id"] = None
+            key["image_hash"] = _flip(fingerprint.image_hash, rng.randrange(0, 5), rng)
+            keys.append(("copy", key))
+        for _ in range(lookups - len(keys)):
+            keys.append(("new", {
+                "receipt_id": None,
+                "seller_tin": normalize_tin(synthetic_tin(700000000 + rng.randrange(10 ** 6))),
+                "seller_name": "NEVER SEEN TRADING",
+                "serial": str(rng.randrange(10 ** 9, 10 ** 10)),
+                "day": date(2023, 1, 1) + timedelta(days=rng.randrange(365)),
+                "total": Decimal(rng.randrange(100, 5000000)) / 100,
+                "image_hash": rng.getrandbits(64) - (1 << 63),
+            }))
+        rng.shuffle(keys)
+        return keys
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        report = {"vendor": connection.vendor, "receipts": options["receipts"]}
+
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            self._seed(options["receipts"], options["sellers"], rng)
+            report["seed_seconds"] = round(time.perf_counter() - t0, 1)
+            keys = self._keys(options["lookups"], rng)
+
+            for _, key in keys[:50]:  # warm caches and prepared plans
+                find_duplicates(key)
+
+            samples = {"copy": [], "new": []}
+            found = {"copy": 0, "new": 0}
+            for kind, key in keys:
+                t0 = time.perf_counter()
+                candidates = find_duplicates(key)
+                samples[kind].append((time.perf_counter() - t0) * 1000)
+                found[kind] += bool(candidates)
+            # again with the SQL timed, which would skew the timings above
+            timer = _SQLTimer()
+            with connection.execute_wrapper(timer):
+                for _, key in keys:
+                    find_duplicates(key)
+            sql_ms = timer.samples
+            transaction.set_rollback(True)
+
+        all_ms = samples["copy"] + samples["new"]
+        report["lookup_ms"] = {
+            "p50": _percentile(all_ms, 0.50),
+            "p95": _percentile(all_ms, 0.95),
+            "p99": _percentile(all_ms, 0.99),
+            "mean": round(statistics.fmean(all_ms), 3),
+        }
+        report["sql_ms_p50"] = _percentile(sql_ms, 0.50) if sql_ms else None
+        report["recall_on_copies"] = round(found["copy"] / max(len(samples["copy"]), 1), 4)
+        report["false_hits_on_new"] = found["new"]
+
+        ms = report["lookup_ms"]
+        self.stdout.write(
+            f"{report['receipts']} receipts ({report['vendor']}): lookup p50 {ms['p50']} ms, "
+            f"p95 {ms['p95']} ms, p99 {ms['p99']} ms; SQL p50 {report['sql_ms_p50']} ms"
+        )
+        self.stdout.write(
+            f"copies found {report['recall_on_copies']:.1%}, "
+            f"new receipts flagged {report['false_hits_on_new']}"
+        )
+        text = json.dumps(report, indent=2)
+        if options.get("output"):
+            with open(options["output"], "w") as fh:
+                fh.write(text + "\n")
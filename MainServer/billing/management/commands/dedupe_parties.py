@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from billing.dedupe import dedupe_parties
+from billing.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge duplicate sellers (same TIN and branch), buyers (same TIN) and "
+        "printer accreditations (same ATP number) into their oldest row, "
+        "repointing receipts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows would be merged away",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        merged = dedupe_parties(apps, dry_run=dry_run)
+        verb = "would be merged" if dry_run else "merged"
+        for name, count in merged.items():
+            self.stdout.write(f"{name:<15} {count} duplicate(s) {verb}")
+        if not dry_run and merged["sellers"]:
+            # receipts were repointed with QuerySet.update(), which the
+            # rollup signals do not see
+            rebuild_rollups()
+        if not dry_run and any(merged.values()):
+            self.stdout.write(self.style.SUCCESS("Duplicates merged"))
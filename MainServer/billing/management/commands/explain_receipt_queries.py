@@ -0,0 +1,225 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import Buyer
+from billing.models import Receipt
+from billing.pagination import ReceiptKeysetPagination
+from billing.views import ReceiptViewSet
+from businesses.models import Seller
+from printing.models import PrinterAccreditation
+
+from .benchmark_bulk_receipts import synthetic_payloads, synthetic_tin
+
+# models whose Meta indexes / unique constraints serve the ingest and
+# list paths; "before" drops all of them
+MODELS = [Seller, Buyer, PrinterAccreditation, Receipt]
+
+
+def _seed(sellers, receipts, seed):
+    """Parties named like ``synthetic_payloads`` (so its payloads link to
+    existing rows, the common case) plus *receipts* spread over them."""
+    rng = random.Random(seed)
+    Seller.objects.bulk_create(
+        [
+            Seller(
+                registered_business_name=f"BENCH SELLER {n}",
+                business_address="1 Rizal Ave., Makati City",
+                tin=synthetic_tin(900000000 + n),
+                vat_status=Seller.VAT,
+            )
+            for n in range(sellers)
+        ],
+        batch_size=1000,
+    )
+    Buyer.objects.bulk_create(
+        [
+            Buyer(buyer_name=f"BENCH BUYER {n}", buyer_address="", buyer_tin=synthetic_tin(800000000 + n))
+            for n in range(sellers)
+        ],
+        batch_size=1000,
+    )
+    PrinterAccreditation.objects.bulk_create(
+        [
+            PrinterAccreditation(
+                authority_to_print_number=f"BENCH-ATP-{n}",
+                atp_issue_date="2023-01-15",
+                bir_permit_number="",
+                printer_name="BENCH PRINTER",
+                printer_address="",
+                printer_tin="000-000-000-000",
+                serial_start="0000001",
+                serial_end="9999999",
+            )
+            for n in range(sellers)
+        ],
+        batch_size=1000,
+    )
+    seller_ids = list(Seller.objects.values_list("id", flat=True))
+    start = timezone.make_aware(datetime(2022, 1, 1))
+    Receipt.objects.bulk_create(
+        [
+            Receipt(
+                seller_id=rng.choice(seller_ids),
+                receipt_type=Receipt.OFFICIAL_RECEIPT,
+                serial_number=f"S{n:09d}",
+                transaction_date=start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+                gross_sales=100,
+                total_amount_due=100,
+            )
+            for n in range(receipts)
+        ],
+        batch_size=1000,
+    )
+
+    if connection.vendor == "postgresql":
+        tables = [m._meta.db_table for m in MODELS]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE " + ", ".join(connection.ops.quote_name(t) for t in tables))
+
+
+def _drop_indexes():
+    """Drop what can be dropped in place; returns the names that could
+    not (SQLite keeps plain UNIQUE constraints inside the table)."""
+    qn = connection.ops.quote_name
+    kept = []
+    for model in MODELS:
+        table = qn(model._meta.db_table)
+        for obj in [*model._meta.indexes, *model._meta.constraints]:
+            # partial / expression unique constraints are unique indexes
+            if isinstance(obj, models.UniqueConstraint) and obj.fields and not obj.condition:
+                sql = f"ALTER TABLE {table} DROP CONSTRAINT {qn(obj.name)}"
+            else:
+                sql = f"DROP INDEX {qn(obj.name)}"
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(sql)
+            except DatabaseError:
+                kept.append(obj.name)
+    return kept
+
+
+def _explain(sql, phase):
+    """Plan lines for *sql* on this database.  *phase* keeps the text
+    distinct per run: sqlite3's statement cache would otherwise return
+    the plan prepared before the indexes were dropped."""
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix}{sql} /* {phase} */")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def _run_sql(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN and time the queries behind the receipt ingest "
+        "(POST /api/billing/receipts/) and list paths, with the seller / "
+        "buyer / ATP / receipt indexes and with them dropped.  Seeds data "
+        "in a transaction that is rolled back, so nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sellers", type=int, default=20000,
+                            help="Sellers, buyers and ATPs to seed (each)")
+        parser.add_argument("--receipts", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def _workloads(self):
+        factory = APIRequestFactory()
+        create = ReceiptViewSet.as_view({"post": "create"})
+        list_view = ReceiptViewSet.as_view({"get": "list"})
+        payload = synthetic_payloads(1, seed=self.seed)[0]
+
+        middle = Receipt.objects.order_by("-transaction_date", "-id")[Receipt.objects.count() // 2]
+        cursor = ReceiptKeysetPagination()._encode(middle, reverse=False)
+        serial = middle.serial_number
+
+        def get(url):
+            return lambda: list_view(factory.get(url)).render()
+
+        return {
+            "ingest": lambda: create(factory.post("/api/billing/receipts/", payload, format="json")),
+            "list": get("/api/billing/receipts/"),
+            "list_deep": get(f"/api/billing/receipts/?cursor={cursor}"),
+            "list_serial": get(f"/api/billing/receipts/?serial_number={serial}"),
+        }
+
+    def _measure(self, phase, workloads, captured, repeat):
+        out = {}
+        for name, fn in workloads.items():
+            out[name] = {
+                "request_ms": _median_ms(fn, repeat),
+                "queries": [
+                    {"plan": _explain(sql, phase), "ms": _median_ms(lambda: _run_sql(sql), repeat)}
+                    for sql in captured[name]
+                ],
+            }
+        return out
+
+    def handle(self, *args, **options):
+        self.seed = options["seed"]
+        repeat = options["repeat"]
+        report = {"vendor": connection.vendor, "sellers": options["sellers"],
+                  "receipts": options["receipts"], "paths": {}}
+
+        with transaction.atomic():
+            _seed(options["sellers"], options["receipts"], self.seed)
+            workloads = self._workloads()
+
+            captured = {}
+            for name, fn in workloads.items():
+                with CaptureQueriesContext(connection) as queries:
+                    fn()
+                captured[name] = [
+                    q["sql"] for q in queries.captured_queries
+                    if q["sql"].lstrip().upper().startswith("SELECT")
+                ]
+                report["paths"][name] = {"queries": len(queries), "selects": captured[name]}
+
+            after = self._measure("after", workloads, captured, repeat)
+            report["not_dropped"] = _drop_indexes()
+            before = self._measure("before", workloads, captured, repeat)
+            transaction.set_rollback(True)
+
+        for name, path in report["paths"].items():
+            path["before"], path["after"] = before[name], after[name]
+            self.stdout.write(
+                f"\n{name}: {path['queries']} queries, request "
+                f"{before[name]['request_ms']:.2f} ms → {after[name]['request_ms']:.2f} ms"
+            )
+            for sql, b, a in zip(path["selects"], before[name]["queries"], after[name]["queries"]):
+                self.stdout.write(f"  {sql[:100]}")
+                self.stdout.write(f"    before {b['ms']:>8.3f} ms  {' | '.join(b['plan'])[:110]}")
+                self.stdout.write(f"    after  {a['ms']:>8.3f} ms  {' | '.join(a['plan'])[:110]}")
+
+        if report["not_dropped"]:
+            self.stdout.write(f"\nnot dropped for 'before': {', '.join(report['not_dropped'])}")
+
+        text = json.dumps(report, indent=2)
+        if options.get("output"):
+            with open(options["output"], "w") as fh:
+                fh.write(text + "\n")
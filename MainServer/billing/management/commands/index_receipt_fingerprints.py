@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from billing.duplicates import rebuild_fingerprints
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or refresh the fingerprints used to detect duplicate "
+        "receipts.  Run after changes that bypass model signals, e.g. "
+        "QuerySet.update() on receipts; --images also hashes receipt "
+        "images not hashed yet (the migration only indexes the keys)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--images",
+            action="store_true",
+            help="Read and hash receipt images whose hash is missing or stale",
+        )
+
+    def handle(self, *args, **options):
+        done = rebuild_fingerprints(images=options["images"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {done} receipt(s)"))
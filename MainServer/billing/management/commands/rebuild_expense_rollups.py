@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.rollups import GROUPS, rebuild_rollups, receipt_summary, rollup_summary
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not a date (YYYY-MM-DD): {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily expense rollups from receipts (all days, or "
+        "--from / --to).  Run after bulk changes that bypass model signals, "
+        "e.g. QuerySet.update() on receipts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=_date)
+        parser.add_argument("--to", dest="date_to", type=_date)
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Rebuild nothing; compare the rollups with a GROUP BY over receipts",
+        )
+
+    def handle(self, *args, **options):
+        window = {"date_from": options["date_from"], "date_to": options["date_to"]}
+        if options["verify"]:
+            everything = list(GROUPS.keys() - {"month"})
+            expected = receipt_summary(everything, **window)
+            actual = rollup_summary(everything, **window)
+            if expected != actual:
+                raise CommandError(
+                    f"Rollups differ from receipts ({len(actual)} vs {len(expected)} "
+                    "groups); run without --verify to rebuild"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Rollups match receipts ({len(actual)} groups)"))
+            return
+
+        written = rebuild_rollups(**window)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup row(s)"))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('billing', '0001_initial'),
+        ('businesses', '0001_initial'),
+        ('printing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('keywords', models.TextField(blank=True, help_text='Comma-separated keywords used by the auto-categoriser.')),
+            ],
+            options={
+                'verbose_name_plural': 'Expense Categories',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='raw_ocr_text',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='receipt_image',
+            field=models.ImageField(blank=True, null=True, upload_to='receipts/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='receipt',
+            name='atp',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='receipts', to='printing.printeraccreditation'),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipts', to='billing.expensecategory'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['transaction_date', 'id'], name='receipt_txn_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from billing.dedupe import dedupe_parties
+
+
+def merge_duplicates(apps, schema_editor):
+    dedupe_parties(apps)
+
+
+class Migration(migrations.Migration):
+    """
+    Merge duplicate sellers / buyers / ATPs before the unique constraints
+    are added (businesses 0002, accounts 0002, printing 0002).  Kept apart
+    from those so the repointed rows are committed before the indexes
+    are built.
+    """
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('businesses', '0001_initial'),
+        ('printing', '0001_initial'),
+        ('billing', '0002_expensecategory_receipt_fields_and_list_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_merge_duplicate_parties'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['serial_number'], name='receipt_serial_number_idx'),
+        ),
+    ]
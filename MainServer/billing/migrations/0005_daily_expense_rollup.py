@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 12:27
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+from billing.rollups import rebuild_rollups
+
+
+def backfill(apps, schema_editor):
+    rebuild_rollups(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_receipt_serial_number_idx'),
+        ('businesses', '0002_seller_tin_branch_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('receipt_type', models.CharField(choices=[('OFFICIAL_RECEIPT', 'Official Receipt'), ('SALES_INVOICE', 'Sales Invoice')], max_length=20)),
+                ('receipt_count', models.PositiveIntegerField(default=0)),
+                ('total_amount_due', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('vat_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('vatable_sales', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('vat_exempt_sales', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='billing.expensecategory')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='businesses.seller')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(models.F('day'), django.db.models.functions.comparison.Coalesce('category', models.Value(0)), models.F('seller'), models.F('receipt_type'), name='rollup_day_category_seller_type_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
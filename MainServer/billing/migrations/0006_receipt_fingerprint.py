@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from billing.duplicates import rebuild_fingerprints
+
+
+def backfill(apps, schema_editor):
+    # keys only; `manage.py index_receipt_fingerprints --images` hashes images
+    rebuild_fingerprints(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_daily_expense_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptFingerprint',
+            fields=[
+                ('receipt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='billing.receipt')),
+                ('seller_tin', models.CharField(blank=True, max_length=9)),
+                ('serial', models.CharField(blank=True, max_length=100)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('image_hash', models.BigIntegerField(blank=True, null=True)),
+                ('image_name', models.CharField(blank=True, max_length=255)),
+                ('band0', models.PositiveIntegerField(blank=True, null=True)),
+                ('band1', models.PositiveIntegerField(blank=True, null=True)),
+                ('band2', models.PositiveIntegerField(blank=True, null=True)),
+                ('band3', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller_tin', 'serial'], name='fingerprint_tin_serial_idx'), models.Index(fields=['day', 'total'], name='fingerprint_day_total_idx'), models.Index(fields=['band0'], name='fingerprint_band0_idx'), models.Index(fields=['band1'], name='fingerprint_band1_idx'), models.Index(fields=['band2'], name='fingerprint_band2_idx'), models.Index(fields=['band3'], name='fingerprint_band3_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
 from businesses.models import Seller
@@ -91,6 +93,13 @@ class Receipt(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the receipt list (billing.pagination)
+            models.Index(fields=["transaction_date", "id"], name="receipt_txn_date_id_idx"),
+            models.Index(fields=["serial_number"], name="receipt_serial_number_idx"),
+        ]
+
     def is_vat_registered(self):
         return self.seller.vat_status == Seller.VAT
 
@@ -117,4 +126,84 @@ class ReceiptItem(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.description} ({self.receipt.serial_number})"
\ No newline at end of file
+        return f"{self.description} ({self.receipt.serial_number})"
+
+
+class DailyExpenseRollup(models.Model):
+    """
+    Receipt totals per day, category, seller and receipt type, kept in
+    step with ``Receipt`` by ``billing.rollups`` so reports read these
+    rows instead of scanning receipts.  ``day`` is the transaction date
+    in ``TIME_ZONE``; NULL amounts count as zero.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(
+        ExpenseCategory,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    seller = models.ForeignKey(
+        Seller,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    receipt_type = models.CharField(max_length=20, choices=Receipt.RECEIPT_TYPE_CHOICES)
+
+    receipt_count = models.PositiveIntegerField(default=0)
+    total_amount_due = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    vat_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    vatable_sales = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    vat_exempt_sales = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # uncategorised (NULL) rows must collide too
+            models.UniqueConstraint(
+                "day", Coalesce("category", Value(0)), "seller", "receipt_type",
+                name="rollup_day_category_seller_type_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.receipt_type} ({self.receipt_count})"
+
+
+class ReceiptFingerprint(models.Model):
+    """
+    What ``billing.duplicates`` compares to spot a receipt submitted
+    twice: a normalised key (seller TIN digits, serial number, local
+    date, total) and a 64-bit perceptual hash of the image, also stored
+    as four 16-bit bands for multi-index Hamming-distance lookups.
+    """
+    receipt = models.OneToOneField(
+        Receipt,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="fingerprint",
+    )
+    seller_tin = models.CharField(max_length=9, blank=True)
+    serial = models.CharField(max_length=100, blank=True)
+    day = models.DateField()
+    total = models.DecimalField(max_digits=15, decimal_places=2)
+
+    image_hash = models.BigIntegerField(null=True, blank=True)
+    image_name = models.CharField(max_length=255, blank=True)
+    band0 = models.PositiveIntegerField(null=True, blank=True)
+    band1 = models.PositiveIntegerField(null=True, blank=True)
+    band2 = models.PositiveIntegerField(null=True, blank=True)
+    band3 = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seller_tin", "serial"], name="fingerprint_tin_serial_idx"),
+            models.Index(fields=["day", "total"], name="fingerprint_day_total_idx"),
+            *(
+                models.Index(fields=[f"band{n}"], name=f"fingerprint_band{n}_idx")
+                for n in range(4)
+            ),
+        ]
+
+    def __str__(self):
+        return f"Fingerprint of receipt {self.receipt_id}"
@@ -0,0 +1,118 @@
+"""
+Keyset (cursor) pagination for the receipt list.
+
+Pages are ordered newest first on ``(transaction_date, id)`` and the
+cursor is the last row's key, so fetching a page is an index range scan
+on ``receipt_txn_date_id_idx`` no matter how deep it is – unlike
+``OFFSET``, which reads and discards every earlier row.  ``id`` breaks
+ties between receipts with the same timestamp.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ReceiptKeysetPagination(BasePagination):
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def _page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # ── cursor encoding: {"d": iso datetime, "i": id, "r": reverse} ──
+    def _encode(self, obj, reverse):
+        raw = json.dumps(
+            {"d": obj.transaction_date.isoformat(), "i": obj.pk, "r": reverse},
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _decode(self, value):
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(data["d"]), int(data["i"]), bool(data["r"])
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self._page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        reverse = False
+        queryset = queryset.order_by("-transaction_date", "-id")
+        if cursor:
+            date, pk, reverse = self._decode(cursor)
+            if reverse:
+                # rows newer than the cursor, read oldest first
+                queryset = queryset.filter(
+                    Q(transaction_date__gte=date)
+                    & (Q(transaction_date__gt=date) | Q(id__gt=pk))
+                ).order_by("transaction_date", "id")
+            else:
+                # the leading range condition keeps this an index range scan
+                queryset = queryset.filter(
+                    Q(transaction_date__lte=date)
+                    & (Q(transaction_date__lt=date) | Q(id__lt=pk))
+                )
+
+        rows = list(queryset[: size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        # reading forward, a previous page exists iff we came from a cursor;
+        # reading backward, a next page always exists (the cursor row)
+        self.has_next = more if not reverse else True
+        self.has_previous = bool(cursor) if not reverse else more
+        self.page = rows
+        return rows
+
+    def _link(self, obj, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._encode(obj, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
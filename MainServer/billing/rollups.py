@@ -0,0 +1,282 @@
+"""
+Daily expense rollups behind ``/api/billing/reports/summary/``.
+
+``DailyExpenseRollup`` holds one row per (day, category, seller, receipt
+type) with the receipt count and summed amounts.  It is maintained
+incrementally:
+
+* ``Receipt`` save / delete (``billing.signals``) apply the receipt's
+  contribution as a delta – the old one is subtracted on update,
+* ``bulk_create_receipts`` applies the deltas of a whole batch at once
+  (``bulk_create`` sends no signals),
+* deleting a category moves its rows to "uncategorised", as
+  ``on_delete=SET_NULL`` does to the receipts.
+
+Anything else that writes receipts with ``QuerySet.update()`` must call
+``rebuild_rollups`` (``manage.py rebuild_expense_rollups``), which
+recomputes rows from ``Receipt``.
+"""
+
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+MEASURES = ["total_amount_due", "vat_amount", "vatable_sales", "vat_exempt_sales"]
+KEY_FIELDS = ["day", "category_id", "seller_id", "receipt_type"]
+
+# report dimension → columns in each result row
+GROUPS = {
+    "category": ["category_id", "category_name"],
+    "seller": ["seller_id", "seller_name"],
+    "receipt_type": ["receipt_type"],
+    "day": ["day"],
+    "month": ["month"],
+}
+
+_ZERO = Decimal("0.00")
+_BATCH = 1000
+
+
+def _rollup_model(apps=global_apps):
+    return apps.get_model("billing", "DailyExpenseRollup")
+
+
+# ── incremental maintenance ─────────────────────────────────────────
+def local_day(when):
+    """The date of a ``transaction_date`` in ``TIME_ZONE``."""
+    if timezone.is_naive(when):
+        # as the DateTimeField stores it
+        when = timezone.make_aware(when, timezone.get_default_timezone())
+    return timezone.localdate(when)
+
+
+def receipt_key(receipt):
+    """The rollup row a receipt (or a dict of its values) counts towards."""
+    get = receipt.get if isinstance(receipt, dict) else lambda f: getattr(receipt, f)
+    return (
+        local_day(get("transaction_date")),
+        get("category_id"),
+        get("seller_id"),
+        get("receipt_type"),
+    )
+
+
+def add_receipt(deltas, receipt, sign=1):
+    """Add ``sign`` × *receipt* to *deltas* (``{key: [count, *amounts]}``)."""
+    get = receipt.get if isinstance(receipt, dict) else lambda f: getattr(receipt, f)
+    delta = deltas.setdefault(receipt_key(receipt), [0] + [_ZERO] * len(MEASURES))
+    delta[0] += sign
+    for n, measure in enumerate(MEASURES, 1):
+        delta[n] += sign * Decimal(str(get(measure) or 0))
+    return deltas
+
+
+def _apply_one(Rollup, key, delta):
+    """Increment one row in SQL; create it if missing."""
+    lookup = dict(zip(KEY_FIELDS, key))
+    changes = {"receipt_count": F("receipt_count") + delta[0]}
+    changes.update({m: F(m) + d for m, d in zip(MEASURES, delta[1:])})
+    if not Rollup.objects.filter(**lookup).update(**changes):
+        try:
+            with transaction.atomic():
+                Rollup.objects.create(
+                    **lookup, receipt_count=delta[0], **dict(zip(MEASURES, delta[1:]))
+                )
+        except IntegrityError:
+            # created concurrently since our update
+            Rollup.objects.filter(**lookup).update(**changes)
+
+
+def apply_deltas(deltas):
+    """
+    Apply *deltas* (from ``add_receipt``) to the rollup table: one query
+    to lock the existing rows, one ``bulk_update``, one ``bulk_create``
+    for new keys.  Rows whose count drops to zero are removed.
+    """
+    deltas = {k: d for k, d in deltas.items() if d[0] or any(d[1:])}
+    if not deltas:
+        return
+    Rollup = _rollup_model()
+    # no savepoint of its own: inside a receipt save this joins that transaction
+    with transaction.atomic(savepoint=False):
+        existing = {}
+        candidates = Rollup.objects.select_for_update().filter(
+            day__in={k[0] for k in deltas}, seller_id__in={k[2] for k in deltas}
+        )
+        for row in candidates:
+            key = (row.day, row.category_id, row.seller_id, row.receipt_type)
+            if key in deltas:
+                existing[key] = row
+
+        changed, created, emptied = [], [], []
+        for key, delta in deltas.items():
+            row = existing.get(key)
+            if row is None and delta[0] <= 0:
+                # nothing to subtract from: out of step, fixed by a rebuild
+                continue
+            if row is None:
+                row = Rollup(**dict(zip(KEY_FIELDS, key)))
+                created.append(row)
+            else:
+                changed.append(row)
+            row.receipt_count += delta[0]
+            for measure, d in zip(MEASURES, delta[1:]):
+                setattr(row, measure, (getattr(row, measure) or _ZERO) + d)
+            if row.receipt_count <= 0 and row.pk:
+                emptied.append(row.pk)
+
+        Rollup.objects.bulk_update(
+            changed, ["receipt_count", *MEASURES], batch_size=_BATCH
+        )
+        if emptied:
+            Rollup.objects.filter(pk__in=emptied).delete()
+        try:
+            with transaction.atomic():
+                Rollup.objects.bulk_create(created, batch_size=_BATCH)
+        except IntegrityError:
+            # a concurrent writer created some of these keys first
+            for row in created:
+                key = (row.day, row.category_id, row.seller_id, row.receipt_type)
+                _apply_one(Rollup, key, deltas[key])
+
+
+def move_category_to_uncategorised(category_id):
+    """Fold a category's rows into the uncategorised ones, before the
+    category is deleted and its receipts set to NULL."""
+    Rollup = _rollup_model()
+    deltas = {}
+    rows = Rollup.objects.filter(category_id=category_id).values(
+        *KEY_FIELDS, "receipt_count", *MEASURES
+    )
+    for row in rows:
+        key = (row["day"], None, row["seller_id"], row["receipt_type"])
+        delta = deltas.setdefault(key, [0] + [_ZERO] * len(MEASURES))
+        delta[0] += row["receipt_count"]
+        for n, measure in enumerate(MEASURES, 1):
+            delta[n] += row[measure]
+    Rollup.objects.filter(category_id=category_id).delete()
+    apply_deltas(deltas)
+
+
+# ── full recomputation ──────────────────────────────────────────────
+def _date_range(queryset, field, date_from, date_to):
+    if date_from:
+        queryset = queryset.filter(**{f"{field}__gte": date_from})
+    if date_to:
+        queryset = queryset.filter(**{f"{field}__lte": date_to})
+    return queryset
+
+
+def receipts_between(queryset, date_from, date_to):
+    """Receipts whose local transaction date falls in the range."""
+    tz = timezone.get_current_timezone()
+    if date_from:
+        queryset = queryset.filter(
+            transaction_date__gte=timezone.make_aware(datetime.combine(date_from, time.min), tz)
+        )
+    if date_to:
+        queryset = queryset.filter(
+            transaction_date__lte=timezone.make_aware(datetime.combine(date_to, time.max), tz)
+        )
+    return queryset
+
+
+def _money(expression):
+    return Coalesce(
+        Sum(expression), Value(_ZERO),
+        output_field=DecimalField(max_digits=18, decimal_places=2),
+    )
+
+
+def rebuild_rollups(date_from=None, date_to=None, apps=global_apps) -> int:
+    """Recompute the rows for the date range (all days by default) from
+    ``Receipt``; returns the number of rows written."""
+    Receipt = apps.get_model("billing", "Receipt")
+    Rollup = _rollup_model(apps)
+    grouped = (
+        receipts_between(Receipt.objects.all(), date_from, date_to)
+        .annotate(day=TruncDate("transaction_date"))
+        .values("day", "category_id", "seller_id", "receipt_type")
+        .annotate(n=Count("id"), **{f"sum_{m}": _money(m) for m in MEASURES})
+        .order_by()
+    )
+    written = 0
+    with transaction.atomic():
+        _date_range(Rollup.objects.all(), "day", date_from, date_to).delete()
+        batch = []
+        for row in grouped.iterator(chunk_size=_BATCH):
+            batch.append(Rollup(
+                **{f: row[f] for f in KEY_FIELDS},
+                receipt_count=row["n"],
+                **{m: row[f"sum_{m}"] for m in MEASURES},
+            ))
+            if len(batch) >= _BATCH:
+                written += len(Rollup.objects.bulk_create(batch))
+                batch = []
+        written += len(Rollup.objects.bulk_create(batch))
+    return written
+
+
+# ── reports ─────────────────────────────────────────────────────────
+def _summarize(queryset, group_by, columns, count):
+    """
+    Group *queryset* by the *group_by* dimensions.  *columns* maps each
+    result column and measure to an expression over the queryset's
+    model; they are aliased (``g_`` / ``sum_``) because several share a
+    name with a model field.
+    """
+    names = [name for group in group_by for name in GROUPS[group]]
+    rows = (
+        queryset.annotate(**{f"g_{name}": columns[name] for name in names})
+        .values(*(f"g_{name}" for name in names))
+        .annotate(n=count, **{f"sum_{m}": _money(columns[m]) for m in MEASURES})
+        .order_by(*(f"g_{name}" for name in names))
+    )
+    return [
+        {
+            **{name: row[f"g_{name}"] for name in names},
+            "receipt_count": row["n"],
+            # SQLite sums decimals as floats
+            **{m: row[f"sum_{m}"].quantize(_ZERO) for m in MEASURES},
+        }
+        for row in rows
+    ]
+
+
+def rollup_summary(group_by, date_from=None, date_to=None) -> list:
+    """Totals per *group_by* combination, read from the rollup table."""
+    queryset = _date_range(_rollup_model().objects.all(), "day", date_from, date_to)
+    columns = {
+        "category_id": F("category_id"),
+        "category_name": F("category__name"),
+        "seller_id": F("seller_id"),
+        "seller_name": F("seller__registered_business_name"),
+        "receipt_type": F("receipt_type"),
+        "day": F("day"),
+        "month": TruncMonth("day", output_field=DateField()),
+        **{m: F(m) for m in MEASURES},
+    }
+    return _summarize(queryset, group_by, columns, Sum("receipt_count"))
+
+
+def receipt_summary(group_by, date_from=None, date_to=None) -> list:
+    """The same totals computed with ``GROUP BY`` over ``Receipt`` – the
+    reference the rollups must match."""
+    Receipt = global_apps.get_model("billing", "Receipt")
+    queryset = receipts_between(Receipt.objects.all(), date_from, date_to)
+    columns = {
+        "category_id": F("category_id"),
+        "category_name": F("category__name"),
+        "seller_id": F("seller_id"),
+        "seller_name": F("seller__registered_business_name"),
+        "receipt_type": F("receipt_type"),
+        "day": TruncDate("transaction_date"),
+        "month": TruncMonth("transaction_date", output_field=DateField()),
+        **{m: F(m) for m in MEASURES},
+    }
+    return _summarize(queryset, group_by, columns, Count("id"))
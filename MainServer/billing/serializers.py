@@ -1,12 +1,90 @@
 from rest_framework import serializers
 from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from datetime import date
 from decimal import Decimal, InvalidOperation
 from dateutil import parser as dateutil_parser
 
 from .models import Receipt, ReceiptItem, ExpenseCategory
-from businesses.models import Seller
+from businesses.models import PLACEHOLDER_TIN, Seller
+from businesses.resolver import match_seller
 from accounts.models import Buyer
 from printing.models import PrinterAccreditation
+from AdminServer import metrics
+
+
+# ── payload → model fields (shared with billing.bulk) ──────────────
+def parse_amount(val):
+    try:
+        return Decimal(val.replace(",", ""))
+    except (InvalidOperation, AttributeError):
+        return Decimal("0.00")
+
+
+def parse_transaction_date(val):
+    try:
+        return dateutil_parser.parse(val)
+    except Exception:
+        from django.utils import timezone
+        return timezone.now()
+
+
+def tin_sellers():
+    """Sellers a receipt's TIN links to.  Receipts carry no branch code,
+    so this is the branch-less row of each TIN – the key of
+    seller_tin_branch_uniq, whose condition and expression it repeats so
+    the lookup can use that index."""
+    return (
+        Seller.objects.exclude(tin=PLACEHOLDER_TIN)
+        .alias(branch=Coalesce("branch_code", Value("")))
+        .filter(branch="")
+    )
+
+
+def receipt_fields(d):
+    """Receipt column values (no foreign keys) from validated data."""
+    return {
+        "receipt_type": d["receipt_type"],
+        "serial_number": d["serial_number"],
+        "transaction_date": parse_transaction_date(d["transaction_date"]),
+        "gross_sales": parse_amount(d["gross_sales"]),
+        "vatable_sales": parse_amount(d.get("vatable_sales", "")),
+        "vat_amount": parse_amount(d.get("vat_amount", "")),
+        "vat_exempt_sales": parse_amount(d.get("vat_exempt_sales", "")),
+        "zero_rated_sales": parse_amount(d.get("zero_rated_sales", "")),
+        "total_amount_due": parse_amount(d["total_amount_due"]),
+        "raw_ocr_text": d.get("raw_ocr_text", ""),
+    }
+
+
+def item_fields(item):
+    return {
+        "description": item.get("description", ""),
+        "quantity": Decimal(str(item.get("quantity", "1"))),
+        "unit_cost": Decimal(str(item.get("unit_cost", "0")).replace(",", "")),
+    }
+
+
+def atp_defaults(d):
+    """PrinterAccreditation values for a new ATP number."""
+    defaults = {
+        "printer_name": d.get("printer_name", ""),
+        "printer_address": d.get("printer_address", ""),
+        "printer_tin": d.get("printer_tin", "000-000-000-000"),
+        "bir_permit_number": d.get("bir_permit_number", ""),
+        "serial_start": d.get("serial_start", ""),
+        "serial_end": d.get("serial_end", ""),
+    }
+    atp_issue = d.get("atp_issue_date", "").strip()
+    if atp_issue:
+        try:
+            defaults["atp_issue_date"] = dateutil_parser.parse(atp_issue).date()
+        except Exception:
+            defaults["atp_issue_date"] = date.today()
+    else:
+        defaults["atp_issue_date"] = date.today()
+    return defaults
 
 
 class ExpenseCategorySerializer(serializers.ModelSerializer):
@@ -39,6 +117,90 @@ class ReceiptReadSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ReceiptListSerializer(serializers.ModelSerializer):
+    """
+    Slim list rows: no OCR text, image or disclaimer.  ``fields`` (an
+    iterable of names) keeps only those fields; ``expand`` containing
+    ``"items"`` adds the line items.
+    """
+
+    seller_name = serializers.CharField(
+        source="seller.registered_business_name", read_only=True
+    )
+    buyer_name = serializers.CharField(
+        source="buyer.buyer_name", read_only=True, default=""
+    )
+    category_name = serializers.CharField(
+        source="category.name", read_only=True, default=""
+    )
+
+    class Meta:
+        model = Receipt
+        fields = [
+            "id", "receipt_type", "serial_number", "transaction_date",
+            "gross_sales", "vatable_sales", "vat_amount", "vat_exempt_sales",
+            "zero_rated_sales", "total_amount_due",
+            "seller", "seller_name", "buyer", "buyer_name",
+            "category", "category_name", "atp",
+            "created_at", "updated_at",
+        ]
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if "items" in expand:
+            self.fields["items"] = ReceiptItemSerializer(many=True, read_only=True)
+        if fields:
+            wanted = set(fields)
+            for name in list(self.fields):
+                if name not in wanted:
+                    self.fields.pop(name)
+
+
+class DuplicateCandidateSerializer(serializers.Serializer):
+    """A receipt that may be a copy of the one submitted (``billing.duplicates``)."""
+
+    receipt_id = serializers.IntegerField()
+    serial_number = serializers.CharField()
+    seller_name = serializers.CharField()
+    transaction_date = serializers.DateTimeField()
+    total_amount_due = serializers.DecimalField(max_digits=15, decimal_places=2)
+    reasons = serializers.ListField(child=serializers.CharField())
+    image_distance = serializers.IntegerField(allow_null=True)
+    name_score = serializers.FloatField(allow_null=True)
+
+
+def _money_field():
+    return serializers.DecimalField(max_digits=18, decimal_places=2, read_only=True)
+
+
+class ExpenseSummaryRowSerializer(serializers.Serializer):
+    """
+    One row of the expense summary.  ``group_by`` (the dimensions asked
+    for) keeps only their columns plus the totals.
+    """
+
+    category_id = serializers.IntegerField(read_only=True, allow_null=True)
+    category_name = serializers.CharField(read_only=True, allow_null=True)
+    seller_id = serializers.IntegerField(read_only=True)
+    seller_name = serializers.CharField(read_only=True)
+    receipt_type = serializers.CharField(read_only=True)
+    day = serializers.DateField(read_only=True)
+    month = serializers.DateField(read_only=True)
+
+    receipt_count = serializers.IntegerField(read_only=True)
+    total_amount_due = _money_field()
+    vat_amount = _money_field()
+    vatable_sales = _money_field()
+    vat_exempt_sales = _money_field()
+
+    def __init__(self, *args, columns=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in ("category_id", "category_name", "seller_id", "seller_name",
+                     "receipt_type", "day", "month"):
+            if name not in columns:
+                self.fields.pop(name)
+
+
 class ReceiptCreateSerializer(serializers.Serializer):
     """
     Accepts the full parsed payload from the frontend review form
@@ -94,129 +256,91 @@ class ReceiptCreateSerializer(serializers.Serializer):
     # ── image ──
     receipt_image = serializers.ImageField(required=False)
 
-    # helpers
-    def _dec(self, val):
-        try:
-            return Decimal(val.replace(",", ""))
-        except (InvalidOperation, AttributeError):
-            return Decimal("0.00")
-
-    def _parse_date(self, val):
-        try:
-            return dateutil_parser.parse(val)
-        except Exception:
-            from django.utils import timezone
-            return timezone.now()
-
     @transaction.atomic
     def create(self, validated_data):
         d = validated_data
         items_data = d.pop("items", [])
 
-        # ── seller (get or create by TIN) ──
-        seller_tin = d["seller_tin"].strip()
-        if seller_tin:
-            seller, _ = Seller.objects.get_or_create(
-                tin=seller_tin,
-                defaults={
-                    "registered_business_name": d["seller_name"],
-                    "business_address": d["seller_address"],
-                    "vat_status": d["seller_vat_status"],
-                },
-            )
-        else:
-            seller = Seller.objects.create(
-                registered_business_name=d["seller_name"],
-                business_address=d["seller_address"],
-                tin="000-000-000-000",
-                vat_status=d["seller_vat_status"],
-            )
-
-        # ── buyer ──
-        buyer = None
-        if d.get("buyer_name"):
-            buyer_tin = d.get("buyer_tin", "").strip()
-            if buyer_tin:
-                buyer, _ = Buyer.objects.get_or_create(
-                    buyer_tin=buyer_tin,
+        # ── seller (get or create by TIN, else by name) ──
+        with metrics.stage("receipt_seller"):
+            seller_tin = d["seller_tin"].strip()
+            if seller_tin and seller_tin != PLACEHOLDER_TIN:
+                seller, _ = tin_sellers().get_or_create(
+                    tin=seller_tin,
                     defaults={
-                        "buyer_name": d["buyer_name"],
-                        "buyer_address": d.get("buyer_address", ""),
+                        "registered_business_name": d["seller_name"],
+                        "business_address": d["seller_address"],
+                        "vat_status": d["seller_vat_status"],
                     },
                 )
             else:
-                buyer = Buyer.objects.create(
-                    buyer_name=d["buyer_name"],
-                    buyer_address=d.get("buyer_address", ""),
-                )
+                # no TIN: reuse a seller without one and (nearly) the same name
+                seller, match = None, match_seller(d["seller_name"])
+                if match:
+                    # the index can be a moment behind the table
+                    seller = Seller.objects.filter(
+                        pk=match["id"], registered_business_name=match["name"]
+                    ).first()
+                if seller is None:
+                    seller = Seller.objects.create(
+                        registered_business_name=d["seller_name"],
+                        business_address=d["seller_address"],
+                        tin=PLACEHOLDER_TIN,
+                        vat_status=d["seller_vat_status"],
+                    )
+
+        # buyer, category and printer rows
+        with metrics.stage("receipt_related"):
+            # ── buyer ──
+            buyer = None
+            if d.get("buyer_name"):
+                buyer_tin = d.get("buyer_tin", "").strip()
+                if buyer_tin:
+                    buyer, _ = Buyer.objects.get_or_create(
+                        buyer_tin=buyer_tin,
+                        defaults={
+                            "buyer_name": d["buyer_name"],
+                            "buyer_address": d.get("buyer_address", ""),
+                        },
+                    )
+                else:
+                    buyer = Buyer.objects.create(
+                        buyer_name=d["buyer_name"],
+                        buyer_address=d.get("buyer_address", ""),
+                    )
 
-        # ── category ──
-        category = None
-        cat_id = d.get("category_id")
-        if cat_id:
-            try:
-                category = ExpenseCategory.objects.get(pk=cat_id)
-            except ExpenseCategory.DoesNotExist:
-                pass
-
-        # ── printer accreditation (optional) ──
-        atp = None
-        atp_number = d.get("atp_number", "").strip()
-        if atp_number:
-            atp_defaults = {
-                "printer_name": d.get("printer_name", ""),
-                "printer_address": d.get("printer_address", ""),
-                "printer_tin": d.get("printer_tin", "000-000-000-000"),
-                "bir_permit_number": d.get("bir_permit_number", ""),
-                "serial_start": d.get("serial_start", ""),
-                "serial_end": d.get("serial_end", ""),
-            }
-            atp_issue = d.get("atp_issue_date", "").strip()
-            if atp_issue:
+            # ── category ──
+            category = None
+            cat_id = d.get("category_id")
+            if cat_id:
                 try:
-                    atp_defaults["atp_issue_date"] = dateutil_parser.parse(
-                        atp_issue
-                    ).date()
-                except Exception:
-                    from datetime import date
-                    atp_defaults["atp_issue_date"] = date.today()
-            else:
-                from datetime import date
-                atp_defaults["atp_issue_date"] = date.today()
+                    category = ExpenseCategory.objects.get(pk=cat_id)
+                except ExpenseCategory.DoesNotExist:
+                    pass
 
-            atp, _ = PrinterAccreditation.objects.get_or_create(
-                authority_to_print_number=atp_number,
-                defaults=atp_defaults,
-            )
+            # ── printer accreditation (optional) ──
+            atp = None
+            atp_number = d.get("atp_number", "").strip()
+            if atp_number:
+                atp, _ = PrinterAccreditation.objects.get_or_create(
+                    authority_to_print_number=atp_number,
+                    defaults=atp_defaults(d),
+                )
 
         # ── receipt ──
-        receipt = Receipt.objects.create(
-            seller=seller,
-            buyer=buyer,
-            category=category,
-            receipt_type=d["receipt_type"],
-            serial_number=d["serial_number"],
-            transaction_date=self._parse_date(d["transaction_date"]),
-            gross_sales=self._dec(d["gross_sales"]),
-            vatable_sales=self._dec(d.get("vatable_sales", "")),
-            vat_amount=self._dec(d.get("vat_amount", "")),
-            vat_exempt_sales=self._dec(d.get("vat_exempt_sales", "")),
-            zero_rated_sales=self._dec(d.get("zero_rated_sales", "")),
-            total_amount_due=self._dec(d["total_amount_due"]),
-            atp=atp,
-            raw_ocr_text=d.get("raw_ocr_text", ""),
-            receipt_image=d.get("receipt_image"),
-        )
+        with metrics.stage("receipt_save"):
+            receipt = Receipt.objects.create(
+                seller=seller,
+                buyer=buyer,
+                category=category,
+                atp=atp,
+                receipt_image=d.get("receipt_image"),
+                **receipt_fields(d),
+            )
 
         # ── items ──
-        for item in items_data:
-            ReceiptItem.objects.create(
-                receipt=receipt,
-                description=item.get("description", ""),
-                quantity=Decimal(str(item.get("quantity", "1"))),
-                unit_cost=Decimal(
-                    str(item.get("unit_cost", "0")).replace(",", "")
-                ),
-            )
+        with metrics.stage("receipt_items"):
+            for item in items_data:
+                ReceiptItem.objects.create(receipt=receipt, **item_fields(item))
 
         return receipt
\ No newline at end of file
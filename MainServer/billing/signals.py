@@ -0,0 +1,82 @@
+"""
+Signal receivers connected in ``BillingConfig.ready``: keep
+``DailyExpenseRollup`` (see ``billing.rollups``) and receipt fingerprints
+(see ``billing.duplicates``) in step with receipts.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .duplicates import index_receipt
+from .rollups import MEASURES, add_receipt, apply_deltas, move_category_to_uncategorised
+
+# what a receipt contributes to the rollups
+ROLLUP_FIELDS = {
+    "transaction_date", "category", "category_id", "seller", "seller_id",
+    "receipt_type", *MEASURES,
+}
+
+# what a receipt's fingerprint is built from
+FINGERPRINT_FIELDS = {
+    "seller", "seller_id", "serial_number", "transaction_date",
+    "total_amount_due", "receipt_image",
+}
+
+
+def _touches_rollup(update_fields):
+    return update_fields is None or not ROLLUP_FIELDS.isdisjoint(update_fields)
+
+
+def _remember_old(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rollup_old = None
+    if raw or instance._state.adding or not _touches_rollup(update_fields):
+        return
+    instance._rollup_old = (
+        sender.objects.filter(pk=instance.pk)
+        .values("transaction_date", "category_id", "seller_id", "receipt_type", *MEASURES)
+        .first()
+    )
+
+
+def _receipt_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_rollup(update_fields):
+        return
+    deltas = {}
+    old = getattr(instance, "_rollup_old", None)
+    if old:
+        add_receipt(deltas, old, sign=-1)
+    add_receipt(deltas, instance)
+    apply_deltas(deltas)
+
+
+def _receipt_fingerprint(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and FINGERPRINT_FIELDS.isdisjoint(update_fields)):
+        return
+    index_receipt(instance, created=created)
+
+
+def _receipt_deleted(sender, instance, **kwargs):
+    apply_deltas(add_receipt({}, instance, sign=-1))
+
+
+def _category_deleting(sender, instance, **kwargs):
+    move_category_to_uncategorised(instance.pk)
+
+
+def connect():
+    pre_save.connect(
+        _remember_old, sender="billing.Receipt", dispatch_uid="billing.rollup.pre_save"
+    )
+    post_save.connect(
+        _receipt_saved, sender="billing.Receipt", dispatch_uid="billing.rollup.save"
+    )
+    post_save.connect(
+        _receipt_fingerprint, sender="billing.Receipt",
+        dispatch_uid="billing.fingerprint.save",
+    )
+    post_delete.connect(
+        _receipt_deleted, sender="billing.Receipt", dispatch_uid="billing.rollup.delete"
+    )
+    pre_delete.connect(
+        _category_deleting, sender="billing.ExpenseCategory",
+        dispatch_uid="billing.rollup.category_delete",
+    )
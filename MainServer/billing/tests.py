@@ -1,3 +1,653 @@
-from django.test import TestCase
+import csv
+import io
+import random
+import re
+import tempfile
+import tracemalloc
+import zipfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from itertools import combinations
+from unittest import mock
 
-# Create your tests here.
+import cv2
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import Buyer
+from businesses.models import PLACEHOLDER_TIN, BusinessCompliance, Seller
+from ocr.benchmarks.corpus import _photograph, _receipt_lines, _render_flat
+
+from .bulk import bulk_create_receipts
+from .dedupe import dedupe_buyers, dedupe_parties, dedupe_sellers
+from .duplicates import (
+    AMOUNT_DATE, IMAGE, SERIAL, find_duplicates, find_duplicates_many, fingerprint_lookup_key,
+    hamming, image_hash, normalize_serial, parsed_lookup_key, rebuild_fingerprints,
+    receipt_lookup_key, set_image_hash,
+)
+from .management.commands.benchmark_bulk_receipts import synthetic_payloads
+from .models import (
+    DailyExpenseRollup, ExpenseCategory, Receipt, ReceiptFingerprint, ReceiptItem,
+)
+from .pagination import ReceiptKeysetPagination
+from .rollups import GROUPS, rebuild_rollups, receipt_summary, rollup_summary
+from .serializers import ReceiptCreateSerializer
+
+ALL_GROUPINGS = [
+    list(combo)
+    for size in range(1, len(GROUPS) + 1)
+    for combo in combinations(GROUPS, size)
+]
+
+
+@override_settings(TIME_ZONE="Asia/Manila")
+class DailyRollupTests(TestCase):
+    """The rollups, kept up to date incrementally, must give the same
+    totals as a ``GROUP BY`` over ``Receipt``."""
+
+    def setUp(self):
+        self.food = ExpenseCategory.objects.create(name="Food")
+        self.fuel = ExpenseCategory.objects.create(name="Fuel")
+        payloads = synthetic_payloads(60, seed=7)
+        for n, payload in enumerate(payloads):
+            payload["category_id"] = [None, self.food.pk, self.fuel.pk][n % 3]
+            payload["receipt_type"] = ["OFFICIAL_RECEIPT", "SALES_INVOICE"][n % 2]
+            if n % 4 == 0:
+                payload["vat_amount"] = ""  # NULL amounts count as zero
+
+        # both ingest paths: per-receipt signals and the bulk batch
+        for payload in payloads[:20]:
+            serializer = ReceiptCreateSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        results = bulk_create_receipts(payloads[20:])
+        self.assertTrue(all(r["status"] == "created" for r in results))
+
+    def assertRollupsMatch(self, **window):
+        for group_by in ALL_GROUPINGS:
+            with self.subTest(group_by=group_by, **window):
+                self.assertEqual(
+                    rollup_summary(group_by, **window),
+                    receipt_summary(group_by, **window),
+                )
+
+    def test_after_create(self):
+        self.assertRollupsMatch()
+        self.assertRollupsMatch(date_from=date(2024, 3, 1), date_to=date(2024, 8, 31))
+
+    def test_after_update_and_delete(self):
+        receipts = list(Receipt.objects.order_by("id"))
+        moved = receipts[3]
+        moved.category = self.fuel if moved.category_id != self.fuel.pk else None
+        moved.total_amount_due += Decimal("10.05")
+        moved.transaction_date = datetime(2024, 2, 29, 20, 30, tzinfo=dt_timezone.utc)
+        moved.save()
+
+        receipts[5].vat_amount = Decimal("1.11")
+        receipts[5].save(update_fields=["vat_amount"])
+        receipts[7].raw_ocr_text = "edited"
+        receipts[7].save(update_fields=["raw_ocr_text"])
+        for receipt in receipts[10:15]:
+            receipt.delete()
+        self.assertRollupsMatch()
+
+    def test_category_delete_moves_rows_to_uncategorised(self):
+        food_id = self.food.pk
+        self.food.delete()
+        self.assertFalse(DailyExpenseRollup.objects.filter(category_id=food_id).exists())
+        self.assertRollupsMatch()
+
+    def test_local_day_boundary(self):
+        # 20:00 UTC on 1 March is 2 March in Manila
+        receipt = Receipt.objects.order_by("id").first()
+        receipt.transaction_date = datetime(2025, 3, 1, 20, 0, tzinfo=dt_timezone.utc)
+        receipt.save()
+        days = [r["day"] for r in rollup_summary(["day"], date_from=date(2025, 3, 1))]
+        self.assertEqual(days, [date(2025, 3, 2)])
+        self.assertRollupsMatch(date_from=date(2025, 3, 2), date_to=date(2025, 3, 2))
+
+    def test_rebuild(self):
+        expected = rollup_summary(["day", "category", "seller", "receipt_type"])
+        DailyExpenseRollup.objects.all().delete()
+        rebuild_rollups()
+        self.assertEqual(rollup_summary(["day", "category", "seller", "receipt_type"]), expected)
+
+        # a partial rebuild leaves other days alone
+        rebuild_rollups(date_from=date(2024, 6, 1), date_to=date(2024, 6, 30))
+        self.assertRollupsMatch()
+
+
+class ExpenseSummaryEndpointTests(TestCase):
+    url = "/api/billing/reports/summary/"
+
+    def setUp(self):
+        bulk_create_receipts(synthetic_payloads(25, seed=3))
+        self.client = APIClient()
+
+    def test_grouped_totals(self):
+        response = self.client.get(
+            self.url, {"group_by": "seller,month", "date_from": "2024-02-01"}
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = receipt_summary(["seller", "month"], date_from=date(2024, 2, 1))
+        self.assertEqual(len(response.data["results"]), len(expected))
+        first = response.data["results"][0]
+        self.assertEqual(
+            set(first),
+            {"seller_id", "seller_name", "month", "receipt_count",
+             "total_amount_due", "vat_amount", "vatable_sales", "vat_exempt_sales"},
+        )
+        self.assertEqual(first["total_amount_due"], str(expected[0]["total_amount_due"]))
+        self.assertEqual(
+            response.data["totals"]["receipt_count"],
+            sum(row["receipt_count"] for row in expected),
+        )
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"group_by": "buyer"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"date_to": "31/12/2024"}).status_code, 400)
+
+
+@override_settings(BILLING_EXPORT_CHUNK_SIZE=100)
+class ReceiptExportTests(TestCase):
+    url = "/api/billing/receipts/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        payloads = synthetic_payloads(1200, seed=11)
+        payloads[0]["seller_name"] = "=HYPERLINK(\"http://x\")"
+        bulk_create_receipts(payloads)
+
+    def _download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def _peak_bytes(self, **params):
+        """Peak traced allocation while streaming the whole response."""
+        tracemalloc.start()
+        try:
+            response = self.client.get(self.url, params)
+            for _ in response.streaming_content:
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_csv_receipts(self):
+        rows = list(csv.reader(io.StringIO(self._download().decode("utf-8-sig"))))
+        self.assertEqual(rows[0][:3], ["Transaction Date", "Receipt Type", "Serial Number"])
+        self.assertEqual(len(rows) - 1, Receipt.objects.count())
+        # formulas from OCR text are neutralised
+        self.assertTrue(any(row[5].startswith("'=HYPERLINK") for row in rows[1:]))
+
+    def test_csv_items_and_date_range(self):
+        rows = list(csv.reader(io.StringIO(self._download(rows="items").decode("utf-8-sig"))))
+        self.assertEqual(len(rows) - 1, ReceiptItem.objects.count())
+
+        body = self._download(date_from="2024-03-01", date_to="2024-03-31")
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))[1:]
+        self.assertTrue(rows)
+        self.assertTrue(all(row[0].startswith("2024-03-") for row in rows))
+
+    def test_xlsx(self):
+        with zipfile.ZipFile(io.BytesIO(self._download(output="xlsx"))) as zf:
+            self.assertIsNone(zf.testzip())
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(len(re.findall(r"<row ", sheet)) - 1, Receipt.objects.count())
+
+    def test_memory_does_not_grow_with_rows(self):
+        for output, rows in (("csv", "receipts"), ("xlsx", "items")):
+            with self.subTest(output=output, rows=rows):
+                self._peak_bytes(output=output, rows=rows)  # warm up caches
+                half = self._peak_bytes(output=output, rows=rows, date_to="2024-06-30")
+                year = self._peak_bytes(output=output, rows=rows)
+                # twice the rows, about the same peak
+                self.assertLess(year, half * 1.25)
+                self.assertLess(year, 2 * 1024 * 1024)
+
+    def test_bad_parameters(self):
+        for params in ({"output": "pdf"}, {"rows": "sellers"}, {"date_from": "March"}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+def _photo(lines, seed, angle, noise):
+    """A JPEG photo of a receipt with the given text lines."""
+    photo = _photograph(_render_flat(lines, 28), random.Random(seed), angle, noise)
+    return cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        self.payloads = synthetic_payloads(40, seed=5)
+        bulk_create_receipts(self.payloads)
+        self.receipts = list(Receipt.objects.select_related("seller").order_by("id"))
+
+    def _parsed(self, receipt, **changes):
+        parsed = {
+            "seller": {
+                "tin": receipt.seller.tin,
+                "registered_business_name": receipt.seller.registered_business_name,
+            },
+            "receipt": {
+                "serial_number": receipt.serial_number,
+                "transaction_date": receipt.transaction_date.date().isoformat(),
+                "total_amount_due": str(receipt.total_amount_due),
+            },
+        }
+        for path, value in changes.items():
+            section, field = path.split("__")
+            parsed[section][field] = value
+        return parsed
+
+    def test_serial_match_ignores_formatting(self):
+        self.assertEqual(normalize_serial("No. 0001234"), "1234")
+        self.assertEqual(normalize_serial("SERIAL NO: 000-1234"), "1234")
+        receipt = self.receipts[3]
+        found = find_duplicates(parsed_lookup_key(self._parsed(
+            receipt, receipt__serial_number=f"No. 00{receipt.serial_number}",
+            receipt__total_amount_due="1.00",
+        )))
+        self.assertEqual([c["receipt_id"] for c in found], [receipt.pk])
+        self.assertEqual(found[0]["reasons"], [SERIAL])
+
+    def test_amount_and_date_match_by_tin_or_name(self):
+        receipt = self.receipts[4]
+        name = receipt.seller.registered_business_name
+        same_tin = find_duplicates(parsed_lookup_key(self._parsed(
+            receipt, receipt__serial_number="X1",
+        )))
+        self.assertEqual([c["receipt_id"] for c in same_tin], [receipt.pk])
+        self.assertEqual(same_tin[0]["reasons"], [AMOUNT_DATE])
+
+        # TIN misread, name close enough
+        similar_name = find_duplicates(parsed_lookup_key(self._parsed(
+            receipt, receipt__serial_number="X1", seller__tin="",
+            seller__registered_business_name=name.lower() + " inc.",
+        )))
+        self.assertEqual([c["receipt_id"] for c in similar_name], [receipt.pk])
+        self.assertGreaterEqual(similar_name[0]["name_score"], 85)
+
+        other_name = find_duplicates(parsed_lookup_key(self._parsed(
+            receipt, receipt__serial_number="X1", seller__tin="",
+            seller__registered_business_name="NEVER SEEN TRADING",
+        )))
+        self.assertEqual(other_name, [])
+
+    def test_new_receipt_matches_nothing(self):
+        found = find_duplicates(parsed_lookup_key(self._parsed(
+            self.receipts[0], receipt__serial_number="99999",
+            receipt__total_amount_due="0.01",
+        )))
+        self.assertEqual(found, [])
+        # a stored receipt is not its own duplicate
+        self.assertEqual(find_duplicates(receipt_lookup_key(self.receipts[5])), [])
+
+    def test_rephotographed_receipt(self):
+        lines, _ = _receipt_lines(random.Random(1))
+        other, _ = _receipt_lines(random.Random(2))
+        first, again, different = (
+            _photo(lines, 1, -2.5, 4), _photo(lines, 2, 3.0, 9), _photo(other, 1, -2.5, 4),
+        )
+        self.assertLessEqual(hamming(image_hash(first), image_hash(again)), 3)
+        self.assertGreater(hamming(image_hash(first), image_hash(different)), 3)
+        self.assertIsNone(image_hash(b"not an image"))
+
+        receipt = self.receipts[6]
+        receipt.receipt_image.save("first.jpg", ContentFile(first))  # signal hashes it
+        self.assertIsNotNone(ReceiptFingerprint.objects.get(pk=receipt.pk).image_hash)
+
+        key = parsed_lookup_key(
+            {"seller": {}, "receipt": {"serial_number": "77"}}, image_hash=image_hash(again)
+        )
+        found = find_duplicates(key)
+        self.assertEqual([c["receipt_id"] for c in found], [receipt.pk])
+        self.assertEqual(found[0]["reasons"], [IMAGE])
+        key["image_hash"] = image_hash(different)
+        self.assertEqual(find_duplicates(key), [])
+
+    def test_image_lookup_equals_brute_force(self):
+        rng = random.Random(9)
+        fingerprints = list(ReceiptFingerprint.objects.all())
+        for fingerprint in fingerprints:
+            set_image_hash(fingerprint, rng.getrandbits(64) - (1 << 63))
+        ReceiptFingerprint.objects.bulk_update(
+            fingerprints, ["image_hash", "band0", "band1", "band2", "band3"]
+        )
+        stored = {f.pk: f.image_hash for f in fingerprints}
+
+        # 1 and 3 bits off stored hashes (spread over bands or in one), and unrelated
+        probes = [f.image_hash ^ (1 << rng.randrange(63)) for f in fingerprints[:8]]
+        probes += [f.image_hash ^ 0b1011 for f in fingerprints[8:12]]
+        probes += [f.image_hash ^ (1 | 1 << 20 | 1 << 40) for f in fingerprints[12:16]]
+        probes += [rng.getrandbits(63) for _ in range(8)]
+        keys = [
+            {"receipt_id": None, "seller_tin": "", "seller_name": "", "serial": "",
+             "day": None, "total": None, "image_hash": h}
+            for h in probes
+        ]
+        for key, found in zip(keys, find_duplicates_many(keys, limit=100)):
+            expected = {pk for pk, h in stored.items() if hamming(h, key["image_hash"]) <= 3}
+            self.assertEqual({c["receipt_id"] for c in found}, expected)
+
+    def test_bulk_reports_duplicates_and_create_returns_them(self):
+        payloads = synthetic_payloads(3, seed=5)
+        payloads[2]["serial_number"] = "NEW-1"
+        payloads[2]["total_amount_due"] = payloads[2]["gross_sales"] = "0.50"
+        results = bulk_create_receipts(payloads)
+        self.assertEqual(results[0]["duplicates"], [self.receipts[0].pk])
+        self.assertEqual(results[2]["duplicates"], [])
+
+        response = APIClient().post("/api/billing/receipts/", self.payloads[1], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(self.receipts[1].pk, [c["receipt_id"] for c in response.data["duplicates"]])
+
+    def test_busy_amount_bucket_does_not_hide_other_probes(self):
+        # (the first receipt's serial normalises to nothing)
+        *busy, target = self.receipts[1:9]
+        fingerprint = ReceiptFingerprint.objects.get(receipt=target)
+        # older receipts on the same day with the same total
+        ReceiptFingerprint.objects.filter(receipt__in=busy).update(
+            day=fingerprint.day, total=fingerprint.total
+        )
+        key = fingerprint_lookup_key(fingerprint)
+        key["receipt_id"] = None
+        with mock.patch("billing.duplicates._CANDIDATES_PER_KEY", 3):
+            found = find_duplicates(key, limit=20)
+        self.assertEqual(found[0]["receipt_id"], target.pk)
+        self.assertIn(SERIAL, found[0]["reasons"])
+
+    def test_rebuild(self):
+        ReceiptFingerprint.objects.all().delete()
+        rebuild_fingerprints()
+        self.assertEqual(ReceiptFingerprint.objects.count(), len(self.receipts))
+        self.assertEqual(
+            [c["receipt_id"] for c in find_duplicates(parsed_lookup_key(self._parsed(self.receipts[2])))],
+            [self.receipts[2].pk],
+        )
+
+
+class PartyLinkingTests(TestCase):
+    def setUp(self):
+        self.payload = synthetic_payloads(1, seed=3)[0]
+        self.tin = self.payload["seller_tin"]
+
+    def _create(self, **changes):
+        serializer = ReceiptCreateSerializer(data={**self.payload, **changes})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_branches_of_one_tin(self):
+        main = Seller.objects.create(
+            registered_business_name="MAIN", business_address="", tin=self.tin, vat_status="VAT",
+        )
+        Seller.objects.create(
+            registered_business_name="BRANCH 1", business_address="", tin=self.tin,
+            branch_code="001", vat_status="VAT",
+        )
+        self.assertEqual(self._create().seller, main)
+        (result,) = bulk_create_receipts([{**self.payload, "serial_number": "B-1"}])
+        self.assertEqual(Receipt.objects.get(pk=result["id"]).seller, main)
+        self.assertEqual(Seller.objects.filter(tin=self.tin).count(), 2)
+
+    def test_only_a_branch_gets_a_main_seller(self):
+        branch = Seller.objects.create(
+            registered_business_name="BRANCH 1", business_address="", tin=self.tin,
+            branch_code="001", vat_status="VAT",
+        )
+        seller = self._create().seller
+        self.assertNotEqual(seller, branch)
+        self.assertIsNone(seller.branch_code)
+        (result,) = bulk_create_receipts([{**self.payload, "serial_number": "B-1"}])
+        self.assertEqual(Receipt.objects.get(pk=result["id"]).seller, seller)
+
+    def test_blank_buyer_tin_is_null(self):
+        first = self._create(buyer_tin="  ").buyer
+        results = bulk_create_receipts([
+            {**self.payload, "serial_number": f"B-{n}", "buyer_tin": ""} for n in range(2)
+        ])
+        buyers = [first] + [Receipt.objects.get(pk=r["id"]).buyer for r in results]
+        self.assertEqual([b.buyer_tin for b in buyers], [None, None, None])
+        # no TIN is not a duplicate: one buyer per receipt
+        self.assertEqual(len({b.pk for b in buyers}), 3)
+
+
+class BulkCreateReceiptsTests(TestCase):
+    def setUp(self):
+        self.payloads = synthetic_payloads(3, seed=5)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        valid, missing, too_big, bad_item = synthetic_payloads(4, seed=5)
+        del missing["serial_number"]
+        # passes the serializer (amounts are strings), fails the model
+        too_big["gross_sales"] = "1" * 20
+        bad_item["items"][0]["quantity"] = "1" * 12
+        results = bulk_create_receipts([valid, missing, too_big, bad_item])
+
+        self.assertEqual([r["status"] for r in results], ["created", "error", "error", "error"])
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3])
+        self.assertIn("serial_number", results[1]["errors"])
+        self.assertIn("gross_sales", results[2]["errors"])
+        self.assertIn("quantity", results[3]["errors"]["items"][0])
+        self.assertEqual(list(Receipt.objects.values_list("pk", flat=True)), [results[0]["id"]])
+        self.assertIsNone(results[1]["id"])
+
+        # a batch with only invalid rows writes nothing
+        self.assertEqual([r["status"] for r in bulk_create_receipts([missing])], ["error"])
+        self.assertEqual(Receipt.objects.count(), 1)
+
+    def test_links_existing_parties(self):
+        first = self.payloads[0]
+        seller = Seller.objects.create(
+            registered_business_name="OLD NAME", business_address="", tin=first["seller_tin"],
+            vat_status="VAT",
+        )
+        by_name = Seller.objects.create(
+            registered_business_name="HARBOUR VIEW BAKESHOP", business_address="",
+            tin=PLACEHOLDER_TIN, vat_status="NON_VAT",
+        )
+        buyer = Buyer.objects.create(
+            buyer_name="OLD BUYER", buyer_address="", buyer_tin=first["buyer_tin"]
+        )
+        category = ExpenseCategory.objects.create(name="Meals")
+        payloads = [
+            {**first, "category_id": category.pk},
+            {**first, "serial_number": "X-2", "category_id": 10_000},
+            {**first, "serial_number": "X-3", "seller_tin": "", "seller_name": "Harbour View Bakeshop Inc."},
+        ]
+        counts = (Seller.objects.count(), Buyer.objects.count())
+        results = bulk_create_receipts(payloads)
+        receipts = [Receipt.objects.get(pk=r["id"]) for r in results]
+
+        self.assertEqual([r.seller for r in receipts], [seller, seller, by_name])
+        self.assertEqual({r.buyer for r in receipts}, {buyer})
+        self.assertEqual((Seller.objects.count(), Buyer.objects.count()), counts)
+        # one accreditation per ATP number, created once for the batch
+        self.assertEqual(len({r.atp_id for r in receipts}), 1)
+        self.assertEqual(receipts[0].atp.authority_to_print_number, first["atp_number"])
+        # unknown category ids are ignored
+        self.assertEqual([r.category for r in receipts], [category, None, None])
+
+    def test_line_totals(self):
+        payload = {**self.payloads[0], "items": [
+            {"description": "A", "quantity": "3", "unit_cost": "19.99"},
+            {"description": "B", "quantity": "1.25", "unit_cost": "0.10"},
+            {"description": "C", "quantity": "0.50", "unit_cost": "1000.05"},
+        ]}
+        (result,) = bulk_create_receipts([payload])
+        totals = ReceiptItem.objects.filter(receipt=result["id"]).order_by("description")
+        self.assertEqual(
+            [t.line_total for t in totals], [Decimal("59.97"), Decimal("0.12"), Decimal("500.02")]
+        )
+
+    def test_one_transaction(self):
+        with mock.patch.object(ReceiptItem.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                bulk_create_receipts(self.payloads)
+        for model in (Receipt, ReceiptFingerprint, Seller, Buyer, DailyExpenseRollup):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.exists())
+
+
+class PartyDedupeTests(TransactionTestCase):
+    """``billing.dedupe`` runs before the unique constraints exist, so
+    they are dropped for the duration of each test."""
+
+    def setUp(self):
+        self.constraints = [
+            (model, constraint)
+            for model in (Seller, Buyer, apps.get_model("printing", "PrinterAccreditation"))
+            for constraint in model._meta.constraints
+        ]
+        with connection.schema_editor() as editor:
+            for model, constraint in self.constraints:
+                # SQLite rebuilds the table from the model's (new) constraints
+                with mock.patch.object(model._meta, "constraints", []):
+                    editor.remove_constraint(model, constraint)
+        bulk_create_receipts(synthetic_payloads(4, seed=9))
+        self.receipts = list(Receipt.objects.order_by("id"))
+
+    def tearDown(self):
+        Receipt.objects.all().delete()
+        for model, _ in self.constraints:
+            model.objects.all().delete()
+        with connection.schema_editor() as editor:
+            for model, constraint in self.constraints:
+                editor.add_constraint(model, constraint)
+
+    def _seller(self, tin, **fields):
+        return Seller.objects.create(
+            registered_business_name="ACME", business_address="", tin=tin, vat_status="VAT",
+            **fields,
+        )
+
+    def _link(self, receipt, **fields):
+        Receipt.objects.filter(pk=receipt.pk).update(**fields)
+
+    def test_sellers(self):
+        tin = "321-654-987-000"
+        keep, duplicate = self._seller(tin), self._seller(tin, branch_code="")
+        branch = self._seller(tin, branch_code="001")
+        placeholders = [self._seller(PLACEHOLDER_TIN) for _ in range(2)]
+        BusinessCompliance.objects.create(seller=duplicate, has_registered_books=True)
+        for receipt, seller in zip(self.receipts, [keep, duplicate, branch, placeholders[1]]):
+            self._link(receipt, seller=seller)
+
+        self.assertEqual(dedupe_sellers(apps, dry_run=True), 1)
+        self.assertTrue(Seller.objects.filter(pk=duplicate.pk).exists())
+
+        self.assertEqual(dedupe_sellers(apps), 1)
+        self.assertFalse(Seller.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(
+            [r.seller_id for r in Receipt.objects.order_by("id")],
+            [keep.pk, keep.pk, branch.pk, placeholders[1].pk],
+        )
+        # the survivor had none: it takes the duplicate's compliance record
+        self.assertTrue(BusinessCompliance.objects.get(seller=keep).has_registered_books)
+        self.assertEqual(Seller.objects.filter(tin=PLACEHOLDER_TIN).count(), 2)
+
+    def test_survivor_keeps_its_compliance(self):
+        tin = "321-654-987-000"
+        keep, duplicate = self._seller(tin), self._seller(tin)
+        BusinessCompliance.objects.create(seller=keep, has_cas_permit=True)
+        BusinessCompliance.objects.create(seller=duplicate, has_registered_books=True)
+        dedupe_sellers(apps)
+        (compliance,) = BusinessCompliance.objects.filter(seller__tin=tin)
+        self.assertEqual((compliance.seller_id, compliance.has_cas_permit), (keep.pk, True))
+
+    def test_buyers(self):
+        keep = Buyer.objects.create(buyer_name="A", buyer_address="", buyer_tin="111-222-333-000")
+        duplicate = Buyer.objects.create(buyer_name="B", buyer_address="", buyer_tin="111-222-333-000")
+        blanks = [Buyer.objects.create(buyer_name="C", buyer_address="", buyer_tin="") for _ in range(2)]
+        self._link(self.receipts[0], buyer=duplicate)
+
+        self.assertEqual(dedupe_buyers(apps), 1)
+        self.assertEqual(Receipt.objects.get(pk=self.receipts[0].pk).buyer_id, keep.pk)
+        # blank TINs become NULL and are not merged
+        self.assertEqual(
+            [b.buyer_tin for b in Buyer.objects.filter(pk__in=[b.pk for b in blanks])], [None, None]
+        )
+
+    def test_dedupe_parties(self):
+        atp = Receipt.objects.select_related("atp").get(pk=self.receipts[0].pk).atp
+        atp.pk = None
+        atp.save()
+        self._link(self.receipts[0], atp=atp)
+        self.assertEqual(dedupe_parties(apps), {"sellers": 0, "buyers": 0, "accreditations": 1})
+        self.assertEqual(
+            Receipt.objects.filter(atp__authority_to_print_number=atp.authority_to_print_number)
+            .values("atp_id").distinct().count(),
+            1,
+        )
+
+
+class ReceiptListPaginationTests(TestCase):
+    url = "/api/billing/receipts/"
+
+    def setUp(self):
+        bulk_create_receipts(synthetic_payloads(13, seed=11))
+        # ties on the timestamp are broken by id
+        same = datetime(2024, 6, 1, 9, 30, tzinfo=dt_timezone.utc)
+        Receipt.objects.filter(pk__in=Receipt.objects.order_by("id").values("id")[2:9]).update(
+            transaction_date=same
+        )
+        self.expected = list(
+            Receipt.objects.order_by("-transaction_date", "-id").values_list("id", flat=True)
+        )
+        self.client = APIClient()
+
+    def _ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_pages_round_trip(self):
+        response = self.client.get(self.url, {"page_size": 4})
+        self.assertEqual(set(response.data), {"next", "previous", "results"})
+        self.assertIsNone(response.data["previous"])
+        pages = [self._ids(response)]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            pages.append(self._ids(response))
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # and back again from the last page
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.data["previous"])
+            self.assertEqual(self._ids(response), page)
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        for cursor in ("not-a-cursor", "eyJkIjoxfQ", "%%%"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.url, {"cursor": cursor}).status_code, 404)
+
+    def test_page_size(self):
+        with mock.patch.object(ReceiptKeysetPagination, "max_page_size", 5):
+            for size, rows in (("0", 1), ("-3", 1), ("3", 3), ("500", 5)):
+                with self.subTest(page_size=size):
+                    response = self.client.get(self.url, {"page_size": size})
+                    self.assertEqual(len(self._ids(response)), rows)
+        default = self.client.get(self.url, {"page_size": "many"})
+        self.assertEqual(self._ids(default), self.expected)
+
+    def test_fields_and_expand(self):
+        rows = self.client.get(self.url, {"fields": "id,serial_number"}).data["results"]
+        self.assertEqual({tuple(row) for row in rows}, {("id", "serial_number")})
+
+        rows = self.client.get(self.url).data["results"]
+        self.assertNotIn("items", rows[0])
+        self.assertNotIn("raw_ocr_text", rows[0])
+
+        rows = self.client.get(self.url, {"expand": "items", "fields": "id,items"}).data["results"]
+        counts = dict(
+            Receipt.objects.annotate(n=Count("items")).values_list("id", "n")
+        )
+        self.assertEqual({row["id"]: len(row["items"]) for row in rows}, counts)
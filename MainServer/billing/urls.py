@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReceiptViewSet, ExpenseCategoryViewSet
+from .views import ReceiptViewSet, ExpenseCategoryViewSet, ExpenseSummaryView
 
 router = DefaultRouter()
 router.register(r"receipts", ReceiptViewSet, basename="receipt")
 router.register(r"categories", ExpenseCategoryViewSet, basename="category")
 
 urlpatterns = [
+    path("reports/summary/", ExpenseSummaryView.as_view(), name="expense-summary"),
     path("", include(router.urls)),
 ]
\ No newline at end of file
@@ -1,8 +1,24 @@
+from datetime import date
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from AdminServer import metrics
 
+from .bulk import bulk_create_receipts
+from .duplicates import find_duplicates, receipt_lookup_key
+from .export import CONTENT_TYPES, ROW_KINDS, stream_export
 from .models import Receipt, ExpenseCategory
+from .pagination import ReceiptKeysetPagination
+from .rollups import GROUPS, MEASURES, rollup_summary
 from .serializers import (
+    DuplicateCandidateSerializer,
+    ExpenseSummaryRowSerializer,
+    ReceiptListSerializer,
     ReceiptReadSerializer,
     ReceiptCreateSerializer,
     ExpenseCategorySerializer,
@@ -14,19 +30,168 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseCategorySerializer
 
 
+def _csv_param(request, name):
+    raw = request.query_params.get(name, "")
+    return [part.strip() for part in raw.split(",") if part.strip()]
+
+
+def _date_params(request):
+    """``({"date_from": date | None, "date_to": ...}, error message | None)``."""
+    dates = {}
+    for name in ("date_from", "date_to"):
+        raw = request.query_params.get(name, "").strip()
+        try:
+            dates[name] = date.fromisoformat(raw) if raw else None
+        except ValueError:
+            return None, f"{name} must be a date (YYYY-MM-DD)."
+    return dates, None
+
+
 class ReceiptViewSet(viewsets.ModelViewSet):
+    """
+    ``GET /api/billing/receipts/`` is keyset-paginated, newest first
+    (``?cursor=``, ``?page_size=``), with slim rows; the response is
+    ``{"next", "previous", "results"}``, not a bare list.  ``?fields=a,b``
+    keeps only those fields; ``?expand=items`` adds line items;
+    ``?serial_number=`` finds receipts by serial.  ``POST`` returns the
+    created receipt plus ``duplicates``, earlier receipts it may copy.
+    """
+
     queryset = Receipt.objects.select_related(
         "seller", "buyer", "category"
-    ).prefetch_related("items").order_by("-transaction_date")
+    ).prefetch_related("items").order_by("-transaction_date", "-id")
+    pagination_class = ReceiptKeysetPagination
+
+    def get_queryset(self):
+        if self.action != "list":
+            return super().get_queryset()
+        qs = Receipt.objects.select_related("seller", "buyer", "category").defer(
+            "raw_ocr_text", "non_vat_disclaimer", "receipt_image"
+        )
+        if "items" in _csv_param(self.request, "expand"):
+            qs = qs.prefetch_related("items")
+        serial = self.request.query_params.get("serial_number", "").strip()
+        if serial:
+            qs = qs.filter(serial_number=serial)
+        return qs.order_by("-transaction_date", "-id")
 
     def get_serializer_class(self):
         if self.action == "create":
             return ReceiptCreateSerializer
+        if self.action == "list":
+            return ReceiptListSerializer
         return ReceiptReadSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list":
+            kwargs.setdefault("fields", _csv_param(self.request, "fields"))
+            kwargs.setdefault("expand", _csv_param(self.request, "expand"))
+        return super().get_serializer(*args, **kwargs)
+
     def create(self, request, *args, **kwargs):
-        ser = ReceiptCreateSerializer(data=request.data)
-        ser.is_valid(raise_exception=True)
+        with metrics.stage("validate"):
+            ser = ReceiptCreateSerializer(data=request.data)
+            ser.is_valid(raise_exception=True)
         receipt = ser.save()
         out = ReceiptReadSerializer(receipt)
-        return Response(out.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        # earlier receipts this one may duplicate; it is saved either way
+        with metrics.stage("duplicates"):
+            duplicates = find_duplicates(receipt_lookup_key(receipt))
+        return Response(
+            {**out.data, "duplicates": DuplicateCandidateSerializer(duplicates, many=True).data},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        POST a JSON array of receipt payloads (or ``{"receipts": [...]}``).
+        Valid rows are created together; the response reports each row,
+        with the ids of receipts it may duplicate.
+        """
+        payloads = request.data
+        if isinstance(payloads, dict):
+            payloads = payloads.get("receipts")
+        if not isinstance(payloads, list):
+            return Response(
+                {"error": "Expected a JSON array of receipts."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = getattr(settings, "BILLING_BULK_MAX_RECEIPTS", 1000)
+        if len(payloads) > limit:
+            return Response(
+                {"error": f"At most {limit} receipts per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = bulk_create_receipts(payloads)
+        created = sum(1 for r in results if r["status"] == "created")
+        return Response(
+            {"created": created, "failed": len(results) - created, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        Stream receipts as a file: ``?output=csv`` (default) or ``xlsx``,
+        ``?rows=receipts`` (default) or ``items`` (one row per line item),
+        ``?date_from=`` / ``?date_to=`` (YYYY-MM-DD, inclusive).
+        """
+        output = request.query_params.get("output", "csv")
+        rows = request.query_params.get("rows", "receipts")
+        dates, error = _date_params(request)
+        if output not in CONTENT_TYPES:
+            error = f"output must be one of {', '.join(CONTENT_TYPES)}."
+        elif rows not in ROW_KINDS:
+            error = f"rows must be one of {', '.join(ROW_KINDS)}."
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        span = "_".join(str(d) for d in dates.values() if d) or "all"
+        response = StreamingHttpResponse(
+            stream_export(output, rows, **dates), content_type=CONTENT_TYPES[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{rows}_{span}.{output}"'
+        # let nginx pass chunks straight through instead of spooling them
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class ExpenseSummaryView(APIView):
+    """
+    ``GET /api/billing/reports/summary/`` – totals of ``total_amount_due``,
+    ``vat_amount``, ``vatable_sales`` and ``vat_exempt_sales``, read from
+    the daily rollups.
+
+    ``?group_by=`` any of ``category,seller,receipt_type,day,month``
+    (default ``month``); ``?date_from=`` / ``?date_to=`` (YYYY-MM-DD,
+    inclusive, in the server time zone).
+    """
+
+    def get(self, request):
+        group_by = _csv_param(request, "group_by") or ["month"]
+        unknown = [g for g in group_by if g not in GROUPS]
+        if unknown:
+            return Response(
+                {"error": f"Unknown group_by {', '.join(unknown)}; use {', '.join(GROUPS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        group_by = list(dict.fromkeys(group_by))
+
+        dates, error = _date_params(request)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = rollup_summary(group_by, **dates)
+        totals = {
+            "receipt_count": sum(r["receipt_count"] for r in rows),
+            **{m: sum(r[m] for r in rows) for m in MEASURES},
+        }
+        columns = [name for group in group_by for name in GROUPS[group]]
+        return Response({
+            "group_by": group_by,
+            **dates,
+            "totals": ExpenseSummaryRowSerializer(totals).data,
+            "results": ExpenseSummaryRowSerializer(rows, many=True, columns=columns).data,
+        })
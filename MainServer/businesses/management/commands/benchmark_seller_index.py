@@ -0,0 +1,143 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses.resolver import SellerIndex
+
+_FIRST = [
+    "GOLDEN", "SILVER", "ROYAL", "GRAND", "NEW", "BRIGHT", "EVERGREEN", "PACIFIC",
+    "MABUHAY", "BAGONG", "SAN", "STA", "PHIL", "METRO", "SUNRISE", "BLUE", "GREEN",
+    "RED", "TRIPLE", "ACE", "PRIME", "UNITED", "FIRST", "STAR", "LUCKY", "JOY",
+    "DIAMOND", "EAGLE", "ISLAND", "MANILA", "CEBU", "DAVAO", "ILOILO", "BICOL",
+    "NORTHERN", "SOUTHERN", "EASTERN", "WESTERN", "MOUNTAIN", "RIVERSIDE",
+]
+_SECOND = [
+    "DRAGON", "LOTUS", "HARVEST", "BAY", "HILLS", "PALM", "SAMPAGUITA", "NARRA",
+    "MANGO", "COCONUT", "PEARL", "OCEAN", "VALLEY", "FORTUNE", "HORIZON", "LIGHT",
+    "BRIDGE", "GATE", "CROWN", "TOWER", "GARDEN", "FIELD", "SPRING", "STONE",
+    "KALAYAAN", "MAKISIG", "MALAYA", "BAYANIHAN", "MAHARLIKA", "PAG ASA",
+    "ANGEL", "CROSS", "TRINITY", "VICTORY", "HOPE", "FAITH", "GRACE", "UNITY",
+    "SUMMIT", "LEGACY",
+]
+_KIND = [
+    "TRADING", "HARDWARE", "PHARMACY", "BAKESHOP", "RESTAURANT", "CAFE",
+    "SUPERMARKET", "GROCERY", "AUTO SUPPLY", "ENTERPRISES", "MARKETING",
+    "GENERAL MERCHANDISE", "PRINTING PRESS", "GASOLINE STATION", "LUMBER",
+    "ELECTRICAL SUPPLY", "BOOKSTORE", "SCHOOL SUPPLIES", "MOTOR PARTS",
+    "FOOD CORP.", "FOODS INC.", "DRUGSTORE", "CONVENIENCE STORE", "CATERING SERVICES",
+    "TRAVEL AND TOURS", "LAUNDRY SHOP", "WATER REFILLING", "RICE DEALER",
+    "FURNITURE", "GLASS AND ALUMINUM", "COMPUTER CENTER", "APPLIANCE CENTER",
+    "TIRE SUPPLY", "MEAT SHOP", "SARI SARI STORE", "BAKERY", "CARINDERIA",
+    "SALON", "MINI MART", "CONSTRUCTION SUPPLY",
+]
+_OCR_SWAPS = {"O": "0", "0": "O", "I": "1", "1": "I", "S": "5", "B": "8", "E": "F", "G": "C"}
+
+
+def synthetic_names(count, rng):
+    """*count* distinct merchant names."""
+    names = {}  # insertion-ordered, so a seed gives the same names
+    while len(names) < count:
+        name = f"{rng.choice(_FIRST)} {rng.choice(_SECOND)} {rng.choice(_KIND)}"
+        if rng.random() < 0.5:
+            name = f"{name} {rng.choice(['BRANCH', 'OUTLET', 'ANNEX'])} {rng.randint(1, 99)}"
+        names[name] = None
+    return list(names)
+
+
+def misread(name, rng):
+    """*name* as OCR might return it: a few characters swapped or lost,
+    the legal form dropped, different case."""
+    chars = list(name)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        if chars[i] in _OCR_SWAPS:
+            chars[i] = _OCR_SWAPS[chars[i]]
+        elif chars[i] != " ":
+            del chars[i]
+    text = "".join(chars)
+    for suffix in (" INC.", " CORP."):
+        text = text.replace(suffix, "")
+    return text.title() if rng.random() < 0.3 else text
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time seller-name lookups (businesses.resolver.SellerIndex) against N "
+        "synthetic sellers: misread copies of indexed names, and names never "
+        "indexed.  In memory only; the database is not used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sellers", type=int, default=100000)
+        parser.add_argument("--lookups", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        names = synthetic_names(options["sellers"] + options["lookups"], rng)
+        indexed, unseen = names[: options["sellers"]], names[options["sellers"]:]
+        min_score = getattr(settings, "SELLER_MATCH_MIN_SCORE", 90)
+        suggest_score = getattr(settings, "SELLER_SUGGEST_MIN_SCORE", 75)
+
+        t0 = time.perf_counter()
+        index = SellerIndex((n, name, "000-000-000-000") for n, name in enumerate(indexed))
+        report = {"sellers": len(index), "build_ms": round((time.perf_counter() - t0) * 1000)}
+
+        half = options["lookups"] // 2
+        queries = [(n, misread(indexed[n], rng)) for n in rng.sample(range(len(indexed)), half)]
+        queries += [(None, name) for name in unseen[: options["lookups"] - half]]
+        rng.shuffle(queries)
+        for _, name in queries[:50]:  # warm up
+            index.best(name, min_score=suggest_score)
+
+        # the OCR suggestion's lookup; reuse takes the stricter min_score
+        samples, suggested, reused, wrongly_reused = [], 0, 0, 0
+        for expected, name in queries:
+            t0 = time.perf_counter()
+            best = index.best(name, min_score=suggest_score)
+            samples.append((time.perf_counter() - t0) * 1000)
+            confident = best is not None and best["score"] >= min_score
+            if expected is None:
+                wrongly_reused += confident
+            else:
+                suggested += best is not None and best["id"] == expected
+                reused += confident and best["id"] == expected
+                wrongly_reused += confident and best["id"] != expected
+
+        copies = max(half, 1)
+        report["lookup_ms"] = {
+            "p50": _percentile(samples, 0.50),
+            "p95": _percentile(samples, 0.95),
+            "p99": _percentile(samples, 0.99),
+            "mean": round(statistics.fmean(samples), 3),
+        }
+        report["suggested_on_misread"] = round(suggested / copies, 4)
+        report["reused_on_misread"] = round(reused / copies, 4)
+        report["wrongly_reused"] = wrongly_reused
+        report["min_score"] = min_score
+        report["suggest_min_score"] = suggest_score
+
+        ms = report["lookup_ms"]
+        self.stdout.write(
+            f"{report['sellers']} sellers (built in {report['build_ms']} ms): lookup "
+            f"p50 {ms['p50']} ms, p95 {ms['p95']} ms, p99 {ms['p99']} ms"
+        )
+        self.stdout.write(
+            f"misread names: suggested {report['suggested_on_misread']:.1%}, reused at "
+            f"score >= {min_score} {report['reused_on_misread']:.1%}; "
+            f"wrong reuses {wrongly_reused} of {len(queries)}"
+        )
+        text = json.dumps(report, indent=2)
+        if options.get("output"):
+            with open(options["output"], "w") as fh:
+                fh.write(text + "\n")
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 12:24
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0001_initial'),
+        # duplicates are merged first
+        ('billing', '0003_merge_duplicate_parties'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='seller',
+            constraint=models.UniqueConstraint(models.F('tin'), django.db.models.functions.comparison.Coalesce('branch_code', models.Value('')), condition=models.Q(('tin', '000-000-000-000'), _negated=True), name='seller_tin_branch_uniq'),
+        ),
+    ]
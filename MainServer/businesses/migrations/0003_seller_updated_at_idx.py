@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0002_seller_tin_branch_uniq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seller',
+            index=models.Index(fields=['updated_at'], name='seller_updated_at_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import RegexValidator
 
+# stored when the receipt shows no TIN; shared by many sellers
+PLACEHOLDER_TIN = "000-000-000-000"
+
 
 class Seller(models.Model):
     VAT = "VAT"
@@ -31,6 +36,21 @@ class Seller(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # one seller per TIN and branch; also the index for TIN lookups
+            models.UniqueConstraint(
+                "tin",
+                Coalesce("branch_code", Value("")),
+                condition=~Q(tin=PLACEHOLDER_TIN),
+                name="seller_tin_branch_uniq",
+            ),
+        ]
+        indexes = [
+            # businesses.resolver re-reads recently saved sellers
+            models.Index(fields=["updated_at"], name="seller_updated_at_idx"),
+        ]
+
     def vat_reg_tin_phrase(self):
         if self.vat_status == self.VAT:
             return f"VAT REG. TIN: {self.tin}"
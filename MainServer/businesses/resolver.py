@@ -0,0 +1,387 @@
+"""
+Resolves an OCR'd seller name / TIN to an existing ``Seller``.
+
+Receipts without a TIN used to get a new seller each, so one merchant
+ended up as many rows.  :class:`SellerIndex` keeps every seller in
+memory: names are normalised (case, punctuation, accents and legal forms
+such as "Inc." or "Corp." dropped), candidates are the sellers sharing
+the most character trigrams with the query, and those few are scored
+with RapidFuzz (:func:`name_score`, 0–100).  A TIN, when readable, wins
+over the name.
+
+The index is built from the database on first use.  Seller saves in this
+process update it in place (``businesses.signals``); other processes
+pick up new and edited sellers every ``SELLER_INDEX_CHECK_SECONDS`` from
+``updated_at``.  Deleting a seller makes every process rebuild, through
+a version counter in the Django cache.  ``QuerySet.update()`` sends no
+signals and does not set ``updated_at``: call :func:`invalidate_index`
+after using it.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+
+from .models import PLACEHOLDER_TIN, Seller
+
+logger = logging.getLogger(__name__)
+
+# legal forms and filler words that do not tell sellers apart
+_NOISE_WORDS = {
+    "THE", "INC", "INCORPORATED", "CORP", "CORPORATION", "CO", "COMPANY",
+    "LTD", "LIMITED", "OPC", "LLC",
+}
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]+")
+_DIGITS_RE = re.compile(r"\D")
+
+# candidates scored with RapidFuzz per lookup
+_CANDIDATES = 32
+# postings read per lookup, rarest trigrams first
+_MAX_POSTINGS = 20000
+# a candidate shares at least this fraction of the trigrams the best one shares
+_MIN_SHARED = 0.5
+# a word of one name this unlike every word of the other caps the score
+# ("UNITY" / "TRINITY" is a different seller, "SAR" / "STAR" a misread)
+_WORD_FLOOR = 75
+# updated_at window re-read on each refresh, for transactions that
+# committed after a later one
+_REFRESH_OVERLAP = timedelta(seconds=60)
+_BATCH = 5000
+
+_VERSION_KEY = "businesses:seller-index-version"
+
+
+def normalize_name(name) -> str:
+    """Upper-case ASCII words of *name* without legal forms:
+    "Jollibee Foods Corp." → "JOLLIBEE FOODS"."""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    text = text.upper().replace("&", " AND ")
+    words = [w for w in _NON_ALNUM_RE.split(text) if w and w not in _NOISE_WORDS]
+    return " ".join(words)
+
+
+def normalize_tin(tin) -> str:
+    """The TIN's digits (9, or 12 with the branch code); "" when unusable."""
+    digits = _DIGITS_RE.sub("", tin or "")
+    if len(digits) < 9 or tin == PLACEHOLDER_TIN or not digits.strip("0"):
+        return ""
+    return digits[:12]
+
+
+def _weakest_word(a, b):
+    """How well the worst-matched word of the shorter name matches a word
+    of the other (RapidFuzz ratio); numbers (branch numbers) must be
+    equal."""
+    words_a, words_b = a.split(), b.split()
+    if {w for w in words_a if w.isdigit()} != {w for w in words_b if w.isdigit()}:
+        return 0.0
+    shorter, longer = sorted((words_a, words_b), key=len)
+    longer = [w for w in longer if not w.isdigit()]
+    words = [w for w in shorter if not w.isdigit()]
+    if not longer:
+        # only numbers on the other side: nothing for a word to match
+        return 0.0 if words else 100.0
+    return min(
+        (process.extractOne(w, longer, scorer=fuzz.ratio)[1] for w in words),
+        default=100.0,
+    )
+
+
+def _ratio(a, b):
+    # plain ratio keeps a misread first letter from reordering the words
+    return max(fuzz.ratio(a, b), fuzz.token_sort_ratio(a, b))
+
+
+def name_score(a, b) -> float:
+    """Similarity (0–100) of two normalised names: RapidFuzz ratio (or
+    token-sort ratio, for reordered words), capped by
+    :func:`_weakest_word` when a word has no counterpart."""
+    score = _ratio(a, b)
+    if score and a != b:
+        weakest = _weakest_word(a, b)
+        if weakest < _WORD_FLOOR:
+            score = min(score, weakest)
+    return score
+
+
+def _trigrams(name):
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SellerIndex:
+    """
+    In-memory seller lookup by name or TIN.  Each seller gets a slot;
+    every trigram of its normalised name keeps an ``array`` of slots, so
+    a lookup counts shared trigrams with ``numpy.bincount`` and scores
+    only the best :data:`_CANDIDATES` names.
+
+    Editing or removing a seller leaves its old slot dead (skipped by
+    lookups) until the next rebuild.
+    """
+
+    def __init__(self, sellers=()):
+        """*sellers*: ``[(id, name, tin), ...]``."""
+        self._lock = threading.Lock()
+        self._sellers = []     # slot → (id, name, tin) or None
+        self._names = []       # slot → normalised name
+        self._slots = {}       # id → slot
+        self._grams = {}       # trigram → array of slots
+        self._by_name = {}     # normalised name → [slot, ...]
+        self._by_tin = {}      # 9-digit TIN → [slot, ...]
+        self._with_tin = array("b")  # slot → 1 if the seller has a usable TIN
+        for seller in sellers:
+            self._add(*seller)
+
+    def __len__(self):
+        return len(self._slots)
+
+    # ── maintenance ──
+    def _add(self, seller_id, name, tin):
+        slot = len(self._sellers)
+        normalized = normalize_name(name)
+        self._sellers.append((seller_id, name, tin))
+        self._names.append(normalized)
+        self._slots[seller_id] = slot
+        if normalized:
+            self._by_name.setdefault(normalized, []).append(slot)
+            for gram in _trigrams(normalized):
+                postings = self._grams.get(gram)
+                if postings is None:
+                    postings = self._grams[gram] = array("i")
+                postings.append(slot)
+        tin = normalize_tin(tin)
+        self._with_tin.append(bool(tin))
+        if tin:
+            self._by_tin.setdefault(tin[:9], []).append(slot)
+
+    def _remove(self, seller_id):
+        slot = self._slots.pop(seller_id, None)
+        if slot is not None:
+            self._sellers[slot] = None
+
+    def upsert(self, seller_id, name, tin):
+        """Add a seller, or re-index it if its name or TIN changed."""
+        with self._lock:
+            slot = self._slots.get(seller_id)
+            if slot is not None and self._sellers[slot] == (seller_id, name, tin):
+                return
+            self._remove(seller_id)
+            self._add(seller_id, name, tin)
+
+    def remove(self, seller_id):
+        with self._lock:
+            self._remove(seller_id)
+
+    # ── lookup ──
+    def _match(self, slot, score, how):
+        seller_id, name, tin = self._sellers[slot]
+        return {"id": seller_id, "name": name, "tin": tin, "score": score, "match": how}
+
+    def _name_candidates(self, query, without_tin=False):
+        """Live slots sharing the most trigrams with *query* (only sellers
+        without a TIN if *without_tin*)."""
+        grams = sorted(
+            (len(self._grams[g]), g) for g in _trigrams(query) if g in self._grams
+        )
+        postings = [self._grams[g] for _, g in grams]
+        read, total = [], 0
+        for p in postings:
+            if read and total + len(p) > _MAX_POSTINGS:
+                break
+            read.append(p)
+            total += len(p)
+        if not read:
+            return []
+        counts = np.bincount(np.concatenate([np.frombuffer(p, np.int32) for p in read]))
+        if without_tin:
+            counts[np.frombuffer(self._with_tin, np.int8)[:len(counts)].astype(bool)] = 0
+            if not counts.any():
+                return []
+        slots = np.flatnonzero(counts >= max(1, int(counts.max() * _MIN_SHARED)))
+        if len(slots) > _CANDIDATES:
+            slots = slots[np.argpartition(-counts[slots], _CANDIDATES)[:_CANDIDATES]]
+        return [s for s in slots.tolist() if self._sellers[s] is not None]
+
+    def _rescore(self, query, scored, limit, min_score):
+        """The best *limit* ``(name_score, slot)`` of *scored*
+        (``(name, ratio, slot)``, best ratio first).  ``name_score`` never
+        exceeds that ratio, so the rest are skipped once they cannot
+        make the cut."""
+        best = []  # (-score, seller id, slot), best first
+        for name, ratio, slot in scored:
+            if len(best) >= limit and ratio < -best[limit - 1][0]:
+                break
+            score = name_score(query, name)
+            if score >= min_score:
+                bisect.insort(best, (-score, self._sellers[slot][0], slot))
+        return [(-score, slot) for score, _, slot in best[:limit]]
+
+    def lookup(self, name="", tin="", limit=3, min_score=0, without_tin=False) -> list:
+        """
+        Up to *limit* sellers as ``{"id", "name", "tin", "score",
+        "match"}``, best first.  Sellers with the same 9-digit TIN come
+        first (``match="tin"``, score 100; the same branch, then the
+        closest name, leads); the rest are scored on the name
+        (``match="name"``), only among sellers without a TIN if
+        *without_tin*.  Ties go to the oldest seller.
+        """
+        query = normalize_name(name)
+        tin = normalize_tin(tin)
+        with self._lock:
+            by_tin = [s for s in self._by_tin.get(tin[:9], ()) if self._sellers[s] is not None]
+            by_tin.sort(key=lambda s: (
+                normalize_tin(self._sellers[s][2]) != tin,
+                -name_score(query, self._names[s]),
+                self._sellers[s][0],
+            ))
+            found = [self._match(s, 100.0, "tin") for s in by_tin[:limit]]
+            if query and len(found) < limit:
+                exact = [
+                    s for s in self._by_name.get(query, ())
+                    if self._sellers[s] is not None and not (without_tin and self._with_tin[s])
+                ]
+                choices = {
+                    s: self._names[s]
+                    for s in exact or self._name_candidates(query, without_tin) if s not in by_tin
+                }
+                scored = sorted(
+                    ((name, ratio, slot) for slot, name in choices.items()
+                     if (ratio := _ratio(query, name)) >= min_score),
+                    key=lambda m: -m[1],
+                )
+                found += [
+                    self._match(slot, round(score, 1), "name")
+                    for score, slot in self._rescore(query, scored, limit - len(found), min_score)
+                ]
+        return found
+
+    def best(self, name="", tin="", min_score=0, without_tin=False):
+        """The best match scoring at least *min_score*, or None."""
+        found = self.lookup(name, tin, limit=1, min_score=min_score, without_tin=without_tin)
+        return found[0] if found else None
+
+
+def build_index() -> SellerIndex:
+    return SellerIndex(
+        Seller.objects.values_list("id", "registered_business_name", "tin")
+        .order_by("id").iterator(chunk_size=_BATCH)
+    )
+
+
+# ── process-wide index ──────────────────────────────────────────────
+_lock = threading.Lock()
+_state = {"index": None, "version": None, "checked_at": 0.0, "synced_at": None}
+
+
+def _shared_version():
+    try:
+        return cache.get(_VERSION_KEY, 0)
+    except Exception:
+        logger.warning("Seller index version unavailable", exc_info=True)
+        return None
+
+
+def _refresh(index, since):
+    """Re-index the sellers saved by other processes since *since*."""
+    changed = Seller.objects.filter(updated_at__gte=since - _REFRESH_OVERLAP)
+    for seller in changed.values_list("id", "registered_business_name", "tin"):
+        index.upsert(*seller)
+
+
+def get_index() -> SellerIndex:
+    """The index, refreshed at most every ``SELLER_INDEX_CHECK_SECONDS``."""
+    interval = getattr(settings, "SELLER_INDEX_CHECK_SECONDS", 5)
+    now = time.monotonic()
+    index = _state["index"]
+    if index is not None and now - _state["checked_at"] < interval:
+        return index
+
+    version = _shared_version()
+    with _lock:
+        if _state["index"] is not None and time.monotonic() - _state["checked_at"] < interval:
+            return _state["index"]  # refreshed by another thread meanwhile
+        synced_at = timezone.now()
+        if _state["index"] is None or (version is not None and version != _state["version"]):
+            t0 = time.perf_counter()
+            _state["index"] = build_index()
+            _state["version"] = version
+            logger.info(
+                "Seller index built: %s sellers in %.0f ms",
+                len(_state["index"]), (time.perf_counter() - t0) * 1000,
+            )
+        else:
+            _refresh(_state["index"], _state["synced_at"])
+        _state.update(checked_at=now, synced_at=synced_at)
+        return _state["index"]
+
+
+def add_sellers(sellers):
+    """Index sellers saved in this process – ``post_save``, or after a
+    ``bulk_create``.  A no-op until the index is first built."""
+    index = _state["index"]
+    if index is not None:
+        for seller in sellers:
+            index.upsert(seller.pk, seller.registered_business_name, seller.tin)
+
+
+def invalidate_index(**kwargs):
+    """Drop the index here and, via the cache, in every process.
+    Connected to Seller ``post_delete``."""
+    with _lock:
+        _state["index"] = None
+    try:
+        if not cache.add(_VERSION_KEY, 1, timeout=None):
+            cache.incr(_VERSION_KEY)
+    except Exception:
+        logger.warning("Seller index version unavailable", exc_info=True)
+
+
+def start_warm_up():
+    """Build the index on a daemon thread; returns the thread."""
+
+    def _run():
+        try:
+            get_index()
+        except Exception:
+            logger.exception("Seller index warm-up failed")
+
+    thread = threading.Thread(target=_run, name="seller-index-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+# ── public API ──────────────────────────────────────────────────────
+def seller_candidates(name="", tin="", limit=3) -> list:
+    """Best-matching sellers for an OCR'd name / TIN (see
+    :meth:`SellerIndex.lookup`)."""
+    return get_index().lookup(name, tin, limit=limit)
+
+
+def suggest_seller(name="", tin=""):
+    """The match to offer the reviewer, if it reaches
+    ``SELLER_SUGGEST_MIN_SCORE``; else None."""
+    return get_index().best(name, tin, getattr(settings, "SELLER_SUGGEST_MIN_SCORE", 75))
+
+
+def match_seller(name, index=None, allow_tin=False):
+    """The seller to reuse for a receipt without a TIN: the best name
+    match reaching ``SELLER_MATCH_MIN_SCORE`` in *index* (the
+    process-wide one by default), or None.  A name alone does not link
+    a receipt to a registered taxpayer: sellers with a TIN are only
+    considered if *allow_tin*."""
+    index = index if index is not None else get_index()
+    return index.best(
+        name, min_score=getattr(settings, "SELLER_MATCH_MIN_SCORE", 90), without_tin=not allow_tin
+    )
@@ -0,0 +1,28 @@
+"""
+Signal receivers connected in ``BusinessesConfig.ready``: keep the
+seller index (``businesses.resolver``) in step with ``Seller``.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .resolver import add_sellers, invalidate_index
+
+
+def _seller_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # after commit, so a rolled-back seller is never suggested
+        transaction.on_commit(lambda: add_sellers([instance]))
+
+
+def _seller_deleted(sender, **kwargs):
+    transaction.on_commit(invalidate_index)
+
+
+def connect():
+    post_save.connect(
+        _seller_saved, sender="businesses.Seller", dispatch_uid="businesses.seller_index.save",
+    )
+    post_delete.connect(
+        _seller_deleted, sender="businesses.Seller", dispatch_uid="businesses.seller_index.delete",
+    )
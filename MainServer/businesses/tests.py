@@ -1,3 +1,128 @@
-from django.test import TestCase
+import random
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from billing.bulk import bulk_create_receipts
+from billing.management.commands.benchmark_bulk_receipts import synthetic_payloads
+from billing.serializers import ReceiptCreateSerializer
+
+from . import resolver
+from .management.commands.benchmark_seller_index import misread, synthetic_names
+from .models import PLACEHOLDER_TIN, Seller
+from .resolver import (
+    SellerIndex, get_index, match_seller, name_score, normalize_name, suggest_seller,
+)
+
+
+class SellerIndexTests(SimpleTestCase):
+    def test_name_score(self):
+        self.assertEqual(normalize_name("Jollibee Foods Corp."), "JOLLIBEE FOODS")
+        self.assertGreaterEqual(
+            name_score(normalize_name("Aling Nena's Eatery"), normalize_name("ALING NENAS EATERY INC")), 90
+        )
+        self.assertEqual(name_score("TRADING GOLDEN HARVEST", "GOLDEN HARVEST TRADING"), 100)
+        self.assertGreaterEqual(name_score("STAR SPRING TIRE SUPPLY", "SAR SPRING TIRE SUPPLY"), 90)
+        # one different word, or another branch, is another seller
+        self.assertLess(name_score("DIAMOND UNITY PRINTING PRESS", "DIAMOND TRINITY PRINTING PRESS"), 75)
+        self.assertLess(name_score("MERCURY DRUG BRANCH 12", "MERCURY DRUG BRANCH 17"), 75)
+        # a name of numbers only leaves the other name's words unmatched
+        self.assertLess(name_score("A 7", "7 7"), 75)
+
+    def test_lookup_by_tin_then_name(self):
+        index = SellerIndex([
+            (1, "Golden Harvest Trading", "123-456-789-000"),
+            (2, "Golden Harvest Trading", "123-456-789-002"),
+            (3, "Golden Harvest Bakeshop", PLACEHOLDER_TIN),
+            (4, "Blue Bay Hardware", PLACEHOLDER_TIN),
+        ])
+        found = index.lookup("Golden Harvest", tin="123-456-789-002")
+        self.assertEqual([(m["id"], m["match"]) for m in found], [(2, "tin"), (1, "tin"), (3, "name")])
+        self.assertEqual(index.best("G0LDEN HARVEST BAKESHOP", min_score=90)["id"], 3)
+        self.assertIsNone(index.best("Red Bay Pharmacy", min_score=75))
+        # the placeholder TIN matches nobody
+        self.assertEqual(index.lookup("", tin=PLACEHOLDER_TIN), [])
+
+    def test_upsert_and_remove(self):
+        index = SellerIndex([(1, "Blue Bay Hardware", "")])
+        index.upsert(1, "Mabuhay Lumber", "")
+        self.assertIsNone(index.best("Blue Bay Hardware", min_score=75))
+        self.assertEqual(index.best("Mabuhay Lumber")["id"], 1)
+        index.remove(1)
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.best("Mabuhay Lumber"))
+
+    def test_same_best_match_as_scanning_every_seller(self):
+        rng = random.Random(3)
+        names = synthetic_names(3000, rng)
+        index = SellerIndex((n, name, "") for n, name in enumerate(names))
+        normalized = [normalize_name(name) for name in names]
+        agree = 0
+        queries = [misread(rng.choice(names), rng) for _ in range(200)]
+        for query in queries:
+            q = normalize_name(query)
+            top = max(name_score(q, name) for name in normalized)
+            best = index.best(query, min_score=75)
+            expected = top if top >= 75 else None
+            agree += (best["score"] if best else None) == (round(expected, 1) if expected else None)
+        # the trigram shortlist may miss a heavily misread name, rarely
+        self.assertGreaterEqual(agree / len(queries), 0.97)
+
+
+class SellerResolutionTests(TestCase):
+    def setUp(self):
+        resolver.invalidate_index()
+        self.payload = synthetic_payloads(1)[0]
+        self.payload.update(seller_tin="", seller_name="Aling Nena's Carinderia")
+
+    def _create(self, **changes):
+        serializer = ReceiptCreateSerializer(data={**self.payload, **changes})
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            return serializer.save()
+
+    def test_receipts_without_tin_reuse_the_seller(self):
+        first = self._create()
+        again = self._create(seller_name="ALING NENAS CARINDERIA", serial_number="2")
+        other = self._create(seller_name="Mang Inasal", serial_number="3")
+        self.assertEqual(again.seller_id, first.seller_id)
+        self.assertNotEqual(other.seller_id, first.seller_id)
+        self.assertEqual(suggest_seller("ALING NENA CARINDERIA")["id"], first.seller_id)
+
+    def test_name_alone_does_not_link_a_registered_seller(self):
+        registered = Seller.objects.create(
+            registered_business_name="Aling Nena's Carinderia", business_address="",
+            tin="123-456-789-000", vat_status=Seller.VAT,
+        )
+        first = self._create()
+        self.assertNotEqual(first.seller_id, registered.pk)
+        self.assertEqual(self._create(serial_number="2").seller_id, first.seller_id)
+        (result,) = bulk_create_receipts([dict(self.payload, serial_number="3")])
+        self.assertEqual(Seller.objects.get(receipts__pk=result["id"]).pk, first.seller_id)
+        self.assertEqual(match_seller("ALING NENAS CARINDERIA", allow_tin=True)["id"], registered.pk)
+
+    def test_bulk_reuses_and_shares_sellers(self):
+        existing = self._create()
+        rows = [dict(self.payload, serial_number=str(n)) for n in range(4)]
+        rows[1]["seller_name"] = "Aling Nenas Carinderia Inc."
+        rows[2]["seller_name"] = "Kuya J Restaurant"
+        rows[3]["seller_name"] = "KUYA J RESTAURANT"
+        with self.captureOnCommitCallbacks(execute=True):
+            results = bulk_create_receipts(rows)
+        sellers = [Seller.objects.get(receipts__pk=r["id"]).pk for r in results]
+        self.assertEqual(sellers[:2], [existing.seller_id] * 2)
+        self.assertEqual(sellers[2], sellers[3])
+        self.assertEqual(Seller.objects.count(), 2)
+
+    def test_picks_up_other_processes_changes(self):
+        get_index()
+        # bulk_create sends no signal: as if another process saved it
+        Seller.objects.bulk_create([Seller(
+            registered_business_name="Bagong Buhay Pharmacy", business_address="",
+            tin=PLACEHOLDER_TIN, vat_status=Seller.NON_VAT,
+        )])
+        resolver._state["checked_at"] = 0.0
+        self.assertIsNotNone(suggest_seller("Bagong Buhay Pharmacy"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Seller.objects.get(registered_business_name="Bagong Buhay Pharmacy").delete()
+        self.assertIsNone(suggest_seller("Bagong Buhay Pharmacy"))
@@ -1,6 +1,11 @@
 """Gunicorn configuration for production"""
 import multiprocessing
 import os
+import tempfile
+
+# workers share latency metrics through per-process files here; read by
+# the settings, which load after this file
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "credit_system_metrics"))
 
 # Server socket
 bind = "0.0.0.0:8000"
@@ -8,7 +13,11 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# gthread heartbeats from its main loop while a request runs, so a long
+# streaming response (receipt export) is not killed by `timeout` the way a
+# sync worker would be; one thread keeps one request per process as before.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
@@ -44,14 +53,59 @@ preload_app = True
 def on_starting(server):
     """Called just before the master process is initialized"""
     print("Starting Gunicorn server...")
+    # a new server starts its metrics from zero (and pids get reused)
+    from AdminServer import metrics
+    metrics.reset()
 
 def on_reload(server):
     """Called to recycle workers during a reload via SIGHUP"""
     print("Reloading Gunicorn server...")
 
+def _ocr_warm_start():
+    from django.conf import settings
+    return getattr(settings, "OCR_WARM_START", False)
+
 def when_ready(server):
     """Called just after the server is started"""
     print(f"Gunicorn server is ready. Listening on: {bind}")
+    # With preload_app the master loads the OCR weights once, before any
+    # worker is forked, so workers share them copy-on-write.  Only load
+    # here: running inference would start torch thread pools in the
+    # master, which must not exist across fork().
+    if _ocr_warm_start():
+        from django.conf import settings
+        if not getattr(settings, "OCR_SERVER_SOCKET", None):
+            from ocr.services import load_reader
+            load_reader()
+            print("OCR reader loaded in master")
+
+def post_fork(server, worker):
+    """Called just after a worker has been forked"""
+    from django.conf import settings
+    if getattr(settings, "OCR_CPU_AFFINITY", False):
+        from ocr.services import pin_to_cpus
+        cpus = pin_to_cpus(worker.age)
+        if cpus:
+            print(f"Worker {worker.pid} pinned to CPUs {sorted(cpus)}")
+    # warm-up inference (and the seller index) in the background so the
+    # worker starts answering (and heartbeating) right away;
+    # /api/ocr/ready/ reports when the reader is done
+    if _ocr_warm_start():
+        from ocr.services import start_warm_up
+        start_warm_up()
+        from businesses.resolver import start_warm_up as warm_seller_index
+        warm_seller_index()
+
+def worker_exit(server, worker):
+    """Called in the worker just before it exits"""
+    from AdminServer import metrics
+    metrics.flush()
+
+def child_exit(server, worker):
+    """Called in the master after a worker has exited"""
+    # keep its counts (workers are recycled every max_requests)
+    from AdminServer import metrics
+    metrics.mark_process_dead(worker.pid)
 
 def worker_int(worker):
     """Called when a worker receives the SIGINT or SIGQUIT signal"""
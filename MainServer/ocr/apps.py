@@ -1,6 +1,22 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class OcrConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ocr'
+
+    def ready(self):
+        from . import signals
+
+        signals.connect()
+
+        # Under gunicorn the warm start is driven by gunicorn_config.py
+        # hooks.  Here we only cover `runserver`, whose autoreloader runs
+        # the real server in a child process flagged with RUN_MAIN.
+        if getattr(settings, "OCR_WARM_START", False) and os.environ.get("RUN_MAIN") == "true":
+            from .services import start_warm_up
+
+            start_warm_up()
@@ -0,0 +1,18 @@
+"""
+Offline OCR benchmarks, run with ``manage.py ocr_benchmark <suite>``.
+
+Each suite is a module in this package exposing ``run(**options)`` and
+returning a JSON-serialisable report.  Receipts come from
+:mod:`ocr.benchmarks.corpus`, so no real (private) receipts are needed.
+"""
+
+SUITES = {
+    "preprocess": "ocr.benchmarks.preprocessing",
+    "threads": "ocr.benchmarks.threads",
+    "ordered_lines": "ocr.benchmarks.ordered_lines",
+    "parser": "ocr.benchmarks.parser",
+    "pipeline": "ocr.benchmarks.pipeline",
+    "backends": "ocr.benchmarks.backends",
+    "progressive": "ocr.benchmarks.progressive",
+    "templates": "ocr.benchmarks.templates",
+}
@@ -0,0 +1,117 @@
+"""
+The torch and ONNX Runtime inference backends on the same corpus.
+
+Each backend runs in its own fresh process (so its memory is its own):
+the reader is loaded and warmed, then every receipt of a
+:func:`~ocr.benchmarks.corpus.build_variant_corpus` corpus is OCR'd and
+parsed.  The report has load time, RSS after loading and at peak, OCR
+latency and throughput, the share of ground-truth fields parsed right,
+and how close each backend's text is to torch's.  ``onnx-*`` backends
+need ``manage.py export_onnx_models`` first.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .corpus import build_variant_corpus, field_matches
+from .stats import elapsed_ms, summarize
+
+DEFAULT_BACKENDS = ("torch", "onnx-fp32", "onnx-int8")
+
+# backend → settings, read from the environment at import
+_ENVIRONMENT = {
+    "torch": {"OCR_BACKEND": "torch"},
+    "onnx-fp32": {"OCR_BACKEND": "onnx", "OCR_ONNX_QUANTIZED": "False"},
+    "onnx-int8": {"OCR_BACKEND": "onnx", "OCR_ONNX_QUANTIZED": "True"},
+}
+
+
+def _run_backend(backend, corpus):
+    os.environ.update(_ENVIRONMENT[backend])
+    # one reader in this process, not the shared model server
+    os.environ["OCR_SERVER_SOCKET"] = ""
+
+    import django
+
+    django.setup()
+    from .. import services
+    from ..parser import parse_receipt
+    from .pipeline import _peak_rss_mb
+
+    t0 = time.perf_counter()
+    reader = services._get_reader()
+    services.warm_up_reader(reader)
+    load_ms = elapsed_ms(t0)
+    load_rss = _peak_rss_mb()
+
+    latencies, lines, right, total = [], [], 0, 0
+    wall = time.perf_counter()
+    for data, truth in corpus:
+        rgb, grey = services._decode_image(data)
+        t0 = time.perf_counter()
+        raw = services._readtext_batched(reader, [(rgb, grey)])[0]
+        latencies.append(elapsed_ms(t0))
+        result = services._build_result(raw)
+        lines.append("\n".join(result["lines"]))
+        matches = field_matches(
+            parse_receipt(result["lines"], result["paragraph"], result["layout"]), truth
+        )
+        right += sum(matches.values())
+        total += len(matches)
+    wall = time.perf_counter() - wall
+
+    return {
+        "backend": backend,
+        "load_ms": round(load_ms, 1),
+        "load_rss_mb": load_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+        "ocr_ms": summarize(latencies),
+        "images_per_second": round(len(corpus) / wall, 3),
+        "fields": round(right / max(total, 1), 4),
+        "lines": lines,
+    }
+
+
+def run(images=8, seed=0, backends=DEFAULT_BACKENDS, **_):
+    from rapidfuzz import fuzz
+
+    corpus = [(item["data"], item["truth"]) for item in build_variant_corpus(images, seed=seed)]
+    rows = []
+    ctx = get_context("spawn")
+    for backend in backends:
+        if backend not in _ENVIRONMENT:
+            raise ValueError(f"Unknown backend {backend!r}; choose from {', '.join(_ENVIRONMENT)}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            rows.append(pool.submit(_run_backend, backend, corpus).result())
+
+    reference = rows[0]["lines"]
+    for row in rows:
+        texts = row.pop("lines")
+        row["text_similarity"] = round(
+            sum(fuzz.ratio(a, b) for a, b in zip(texts, reference)) / max(len(texts), 1), 2
+        )
+    return {
+        "suite": "backends",
+        "images": len(corpus),
+        "seed": seed,
+        "reference": rows[0]["backend"],
+        "cpu_count": os.cpu_count(),
+        "results": rows,
+    }
+
+
+def format_rows(report):
+    out = [
+        f"{'backend':<10} {'load ms':>8} {'RSS MB':>7} {'peak MB':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'img/s':>7} {'fields':>7} {'text':>6}"
+    ]
+    for row in report["results"]:
+        lat = row["ocr_ms"]
+        out.append(
+            f"{row['backend']:<10} {row['load_ms']:>8} {row['load_rss_mb']:>7} "
+            f"{row['peak_rss_mb']:>8} {lat['p50']:>8} {lat['p95']:>8} "
+            f"{row['images_per_second']:>7} {row['fields']:>7.1%} {row['text_similarity']:>6}"
+        )
+    return out
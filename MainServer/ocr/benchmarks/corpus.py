@@ -0,0 +1,317 @@
+"""
+Synthetic BIR receipts with known ground truth.
+
+Each receipt is rendered flat with Pillow, then photographed the way
+users upload them: scaled up to phone-camera resolution, rotated a few
+degrees, dropped on a dark table and given sensor noise + JPEG
+compression.  ``truth`` holds the fields :func:`field_matches` checks
+against ``parse_receipt`` output.
+
+:func:`build_variant_corpus` also varies the font, the layout (one
+column, or seller / receipt blocks side by side over right-aligned
+amount columns), the photo resolution and the noise, and keeps the
+rendered text boxes – what a perfect OCR pass would return.
+"""
+
+import itertools
+import random
+import re
+from datetime import date, timedelta
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+_SELLERS = [
+    "GOLDEN HARVEST TRADING",
+    "SAN MIGUEL HARDWARE",
+    "BLUE RIDGE OFFICE SUPPLY",
+    "MABUHAY PRINTING SERVICES",
+    "PACIFIC CREST PHARMACY",
+    "NORTHPOINT AUTO PARTS",
+]
+_STREETS = ["Rizal Ave.", "Mabini St.", "Quezon Blvd.", "Bonifacio Dr.", "Luna St."]
+_CITIES = ["Makati City", "Quezon City", "Pasig City", "Cebu City", "Davao City"]
+_ITEMS = [
+    ("Bond paper A4", 250.00),
+    ("Printer ink black", 780.00),
+    ("Ballpen box", 145.50),
+    ("Folder long", 12.75),
+    ("Stapler heavy duty", 325.00),
+    ("Notebook", 48.00),
+    ("Correction tape", 39.25),
+]
+_BUYERS = ["LIFEWOOD DATA TECHNOLOGY", "JUAN DELA CRUZ", "ACME SOLUTIONS INC"]
+
+# Photo size of a 12 MP phone camera, portrait.
+PHOTO_SIZE = (3000, 4000)
+# 12 MP and 8 MP phone photos, and a photo re-sent through a chat app
+PHOTO_SIZES = {"12mp": PHOTO_SIZE, "8mp": (2448, 3264), "2mp": (1200, 1600)}
+
+# Pillow's bundled sans, the same stroked bold, and its bitmap font
+# scaled up like a dot-matrix printout; any other value is a font file
+FONTS = ("sans", "bold", "dotmatrix")
+LAYOUTS = ("single", "two_column")
+NOISE_LEVELS = (0.0, 6.0, 14.0)
+
+_AMOUNT_RE = re.compile(r"^[\d,]+\.\d{2}$")
+# pixel height of Pillow's bitmap font
+_BITMAP_SIZE = 11
+
+
+def _tin(rng):
+    return "-".join(f"{rng.randint(0, 999):03d}" for _ in range(3)) + "-000"
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def make_merchant(seed, name=None):
+    """A fixed seller ``{"name", "address", "tin"}`` whose receipts
+    :func:`make_variant` can print (``merchant=``)."""
+    rng = random.Random(seed)
+    return {
+        "name": name or rng.choice(_SELLERS),
+        "address": f"{rng.randint(10, 999)} {rng.choice(_STREETS)}, {rng.choice(_CITIES)}",
+        "tin": _tin(rng),
+    }
+
+
+def _receipt_lines(rng, merchant=None):
+    seller = rng.choice(_SELLERS)
+    tin = _tin(rng)
+    serial = f"{rng.randint(1000, 999999):07d}"
+    when = date(2024, 1, 1) + timedelta(days=rng.randint(0, 600))
+
+    items = rng.sample(_ITEMS, rng.randint(2, 5))
+    rows, total = [], 0.0
+    for desc, unit in items:
+        qty = rng.randint(1, 6)
+        total += qty * unit
+        rows.append(f"{qty} {desc} {_money(unit)} {_money(qty * unit)}")
+    vatable = total / 1.12
+    address = f"{rng.randint(10, 999)} {rng.choice(_STREETS)}, {rng.choice(_CITIES)}"
+    if merchant:
+        # drawn all the same, so the rest of the receipt does not change
+        seller, address, tin = merchant["name"], merchant["address"], merchant["tin"]
+
+    lines = [
+        seller,
+        address,
+        f"VAT REG TIN: {tin}",
+        "OFFICIAL RECEIPT",
+        f"No. {serial}",
+        f"Date: {when:%m/%d/%Y}",
+        f"Sold to: {rng.choice(_BUYERS)}",
+        "",
+        *rows,
+        "",
+        f"VATABLE SALES {_money(vatable)}",
+        f"VAT AMOUNT {_money(total - vatable)}",
+        f"TOTAL AMOUNT DUE {_money(total)}",
+    ]
+    truth = {
+        "registered_business_name": seller,
+        "tin": tin,
+        "serial_number": serial,
+        "transaction_date": when.isoformat(),
+        "total_amount_due": f"{total:.2f}",
+    }
+    return lines, truth
+
+
+def _load_font(font, size):
+    if font == "dotmatrix":
+        return ImageFont.load_default_imagefont()
+    if font in ("sans", "bold"):
+        return ImageFont.load_default(size=size)
+    return ImageFont.truetype(font, size)
+
+
+def _split_amounts(line):
+    """``("2 Ballpen box", ["145.50", "291.00"])`` – the trailing amounts
+    go in right-aligned columns in the two-column layout."""
+    words = line.split(" ")
+    n = len(words)
+    while n > 1 and _AMOUNT_RE.match(words[n - 1]):
+        n -= 1
+    return " ".join(words[:n]), words[n:]
+
+
+def _render(lines, font_size=28, font="sans", layout="single"):
+    """
+    ``(page, boxes)``: the receipt drawn on a white page, and
+    ``[(x0, y0, x1, y1, text), ...]`` for every piece of text drawn.
+    """
+    size = _BITMAP_SIZE if font == "dotmatrix" else font_size
+    face = _load_font(font, size)
+    stroke = 1 if font == "bold" else 0
+    line_h = int(size * 1.5)
+    margin = size * 2
+
+    def width_of(text):
+        return int(np.ceil(face.getlength(text))) + 2 * stroke
+
+    # (row, x, text, right-aligned)
+    pieces = []
+    if layout == "two_column":
+        # seller block | receipt block, then rows with amount columns
+        left, right, rest = lines[:3], lines[3:6], lines[6:]
+        right_x = margin + max(map(width_of, left)) + 2 * size
+        header_w = right_x + max(map(width_of, right)) + margin
+        split = [_split_amounts(line) for line in rest]
+        text_w = max(width_of(text) for text, _ in split)
+        amount_w = max([width_of(a) for _, amounts in split for a in amounts] or [0])
+        columns = max(len(amounts) for _, amounts in split)
+        width = max(header_w, margin * 2 + text_w + columns * (amount_w + 2 * size))
+        for row, (a, b) in enumerate(zip(left, right)):
+            pieces += [(row, margin, a, False), (row, right_x, b, False)]
+        for row, (text, amounts) in enumerate(split, len(left)):
+            pieces.append((row, margin, text, False))
+            for k, amount in enumerate(reversed(amounts)):
+                pieces.append((row, width - margin - k * (amount_w + 2 * size), amount, True))
+        rows = len(left) + len(split)
+    else:
+        width = size * 24
+        pieces = [(row, margin, text, False) for row, text in enumerate(lines)]
+        rows = len(lines)
+
+    page = Image.new("L", (width, margin * 2 + line_h * rows), 250)
+    draw = ImageDraw.Draw(page)
+    boxes = []
+    for row, x, text, right_aligned in pieces:
+        if not text:
+            continue
+        if right_aligned:
+            x -= width_of(text)
+        xy = (x, margin + row * line_h)
+        draw.text(xy, text, fill=15, font=face, stroke_width=stroke, stroke_fill=15)
+        boxes.append((*draw.textbbox(xy, text, font=face, stroke_width=stroke), text))
+
+    page = np.asarray(page)
+    if font == "dotmatrix":
+        scale = font_size / _BITMAP_SIZE
+        page = cv2.resize(page, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        boxes = [(x0 * scale, y0 * scale, x1 * scale, y1 * scale, t) for x0, y0, x1, y1, t in boxes]
+    return page, boxes
+
+
+def _render_flat(lines, font_size):
+    return _render(lines, font_size)[0]
+
+
+def _shoot(page, rng, angle, noise, photo_size=PHOTO_SIZE):
+    """
+    Place *page* on a dark background at phone resolution.  Returns the
+    BGR photo and the 2×3 matrix from page to photo coordinates.
+    """
+    pw, ph = photo_size
+    scale = 0.75 * min(pw / page.shape[1], ph / page.shape[0])
+    page = cv2.resize(page, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+    photo = np.full((ph, pw), rng.randint(35, 80), np.uint8)
+    y0 = (ph - page.shape[0]) // 2
+    x0 = (pw - page.shape[1]) // 2
+    photo[y0:y0 + page.shape[0], x0:x0 + page.shape[1]] = page
+
+    rot = cv2.getRotationMatrix2D((pw / 2.0, ph / 2.0), angle, 1.0)
+    photo = cv2.warpAffine(
+        photo, rot, (pw, ph), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+    )
+    photo = cv2.GaussianBlur(photo, (3, 3), 0)
+    if noise:
+        grain = np.random.default_rng(rng.randint(0, 2**31)).normal(0, noise, photo.shape)
+        photo = np.clip(photo + grain, 0, 255).astype(np.uint8)
+    place = np.array([[scale, 0.0, x0], [0.0, scale, y0], [0.0, 0.0, 1.0]])
+    return cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR), rot @ place
+
+
+def _photograph(page, rng, angle, noise):
+    """Place *page* on a dark background at phone resolution."""
+    return _shoot(page, rng, angle, noise)[0]
+
+
+def _oracle_raw(boxes, matrix):
+    """Rendered text boxes in photo coordinates, as EasyOCR's
+    ``[bbox, text, confidence]`` with perfect recognition."""
+    raw = []
+    for x0, y0, x1, y1, text in boxes:
+        corners = np.array([[x0, y0, 1], [x1, y0, 1], [x1, y1, 1], [x0, y1, 1]], np.float64)
+        points = corners @ matrix.T
+        raw.append([[[round(x, 1), round(y, 1)] for x, y in points.tolist()], text, 1.0])
+    return raw
+
+
+def make_variant(seed, font="sans", layout="single", photo="12mp", noise=6.0,
+                 max_angle=4.0, font_size=28, merchant=None):
+    """Return ``(jpeg_bytes, truth, oracle_raw)`` for one synthetic
+    receipt; *photo* is a key of :data:`PHOTO_SIZES`, *merchant* a
+    :func:`make_merchant` seller (random by default)."""
+    rng = random.Random(seed)
+    lines, truth = _receipt_lines(rng, merchant)
+    page, boxes = _render(lines, font_size, font, layout)
+    photo, matrix = _shoot(page, rng, rng.uniform(-max_angle, max_angle), noise, PHOTO_SIZES[photo])
+    ok, encoded = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("Could not encode synthetic receipt")
+    return encoded.tobytes(), truth, _oracle_raw(boxes, matrix)
+
+
+def make_receipt(seed, max_angle=4.0, noise=6.0, font_size=28):
+    """Return ``(jpeg_bytes, truth)`` for one synthetic receipt."""
+    return make_variant(seed, noise=noise, max_angle=max_angle, font_size=font_size)[:2]
+
+
+def build_corpus(count, seed=0, **options):
+    """``count`` receipts as ``[(name, jpeg_bytes, truth), ...]``."""
+    corpus = []
+    for i in range(count):
+        data, truth = make_receipt(seed + i, **options)
+        corpus.append((f"synthetic-{seed + i:04d}.jpg", data, truth))
+    return corpus
+
+
+def build_variant_corpus(count, seed=0, fonts=FONTS, layouts=LAYOUTS,
+                         photos=tuple(PHOTO_SIZES), noises=NOISE_LEVELS):
+    """
+    ``count`` receipts as ``{"name", "data", "truth", "raw", "variant"}``
+    dicts.  Variants walk a shuffled grid of font × layout × photo size ×
+    noise, so every value of each dimension shows up within a few
+    receipts; *raw* holds the rendered text boxes.
+    """
+    grid = list(itertools.product(fonts, layouts, photos, noises))
+    random.Random(seed).shuffle(grid)
+    corpus = []
+    for i in range(count):
+        font, layout, photo, noise = grid[i % len(grid)]
+        data, truth, raw = make_variant(seed + i, font, layout, photo, noise)
+        corpus.append({
+            "name": f"synthetic-{seed + i:04d}.jpg",
+            "data": data,
+            "truth": truth,
+            "raw": raw,
+            # font files are reported by name
+            "variant": {"font": font.rsplit("/", 1)[-1], "layout": layout,
+                        "photo": photo, "noise": noise},
+        })
+    return corpus
+
+
+def field_matches(parsed, truth) -> dict:
+    """``{field: bool}`` – which ground-truth fields ``parse_receipt``
+    got exactly right."""
+    got = {
+        "registered_business_name": parsed["seller"]["registered_business_name"].strip().upper(),
+        "tin": parsed["seller"]["tin"],
+        "serial_number": parsed["receipt"]["serial_number"],
+        "transaction_date": (parsed["receipt"]["transaction_date"] or "")[:10],
+        "total_amount_due": parsed["receipt"]["total_amount_due"],
+    }
+    return {key: got[key] == want for key, want in truth.items()}
+
+
+def field_match_rate(parsed, truth) -> float:
+    """Share of ground-truth fields ``parse_receipt`` got exactly right."""
+    matches = field_matches(parsed, truth)
+    return sum(matches.values()) / float(len(matches))
@@ -0,0 +1,141 @@
+"""
+``_ordered_lines`` before and after vectorisation.
+
+:func:`reference_ordered_lines` is the original dict-per-box
+implementation, kept verbatim as the behavioural reference for
+``ocr.tests`` and as the baseline here.  :func:`synthetic_boxes` fakes
+EasyOCR output for a receipt with a given number of boxes.
+"""
+
+import random
+import time
+
+import numpy as np
+
+from ..services import _ordered_lines
+from .stats import elapsed_ms, summarize
+
+DEFAULT_BOX_COUNTS = (20, 100, 400, 1600)
+
+
+def reference_ordered_lines(result, line_tol_factor=0.7):
+    def min_x(b):
+        return min(p[0] for p in b)
+
+    def min_y(b):
+        return min(p[1] for p in b)
+
+    def center_y(b):
+        ys = [p[1] for p in b]
+        return (min(ys) + max(ys)) / 2
+
+    def height(b):
+        ys = [p[1] for p in b]
+        return max(ys) - min(ys)
+
+    items = []
+    for bbox, text, conf in result:
+        items.append(
+            {
+                "bbox": bbox,
+                "text": text,
+                "conf": conf,
+                "min_x": min_x(bbox),
+                "min_y": min_y(bbox),
+                "cy": center_y(bbox),
+                "h": max(1.0, float(height(bbox))),
+            }
+        )
+
+    items.sort(key=lambda d: (d["min_y"], d["min_x"]))
+
+    hs = [d["h"] for d in items] or [10.0]
+    med_h = float(np.median(hs))
+    line_tol = line_tol_factor * med_h
+
+    lines, current, current_cy = [], [], None
+
+    for d in items:
+        if current_cy is None:
+            current = [d]
+            current_cy = d["cy"]
+            continue
+        if abs(d["cy"] - current_cy) <= line_tol:
+            current.append(d)
+            current_cy = (
+                current_cy * (len(current) - 1) + d["cy"]
+            ) / len(current)
+        else:
+            lines.append(current)
+            current = [d]
+            current_cy = d["cy"]
+
+    if current:
+        lines.append(current)
+
+    out = []
+    avg_confs = []
+    for line in lines:
+        line.sort(key=lambda d: d["min_x"])
+        text = " ".join(d["text"] for d in line).strip()
+        avg_conf = np.mean([d["conf"] for d in line])
+        out.append(text)
+        avg_confs.append(float(avg_conf))
+
+    return out, avg_confs
+
+
+def synthetic_boxes(count, seed=0, columns=4):
+    """EasyOCR-style ``[bbox, text, conf]`` items laid out in rows of
+    *columns* words with jittered positions, heights and a slight skew."""
+    rng = random.Random(seed)
+    raw = []
+    for i in range(count):
+        row, col = divmod(i, columns)
+        h = rng.uniform(18, 30)
+        w = rng.uniform(40, 160)
+        x = 30 + col * 200 + rng.uniform(-8, 8)
+        y = 40 + row * 36 + rng.uniform(-6, 6) + x * 0.01
+        raw.append([
+            [[x, y], [x + w, y], [x + w, y + h], [x, y + h]],
+            f"w{i}",
+            rng.uniform(0.3, 1.0),
+        ])
+    rng.shuffle(raw)
+    return raw
+
+
+def _time(fn, raw, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(raw)
+        samples.append(elapsed_ms(t0))
+    return summarize(samples)
+
+
+def run(seed=0, box_counts=DEFAULT_BOX_COUNTS, repeat=50, **_):
+    rows = []
+    for count in box_counts:
+        raw = synthetic_boxes(count, seed=seed)
+        if _ordered_lines(raw) != reference_ordered_lines(raw):
+            raise AssertionError(f"_ordered_lines output differs for {count} boxes")
+        before = _time(reference_ordered_lines, raw, repeat)
+        after = _time(_ordered_lines, raw, repeat)
+        rows.append({
+            "boxes": count,
+            "reference_ms": before,
+            "vectorized_ms": after,
+            "speedup": round(before["p50"] / max(after["p50"], 1e-6), 2),
+        })
+    return {"suite": "ordered_lines", "repeat": repeat, "results": rows}
+
+
+def format_rows(report):
+    out = [f"{'boxes':>6} {'reference p50':>14} {'vectorized p50':>15} {'speedup':>8}"]
+    for row in report["results"]:
+        out.append(
+            f"{row['boxes']:>6} {row['reference_ms']['p50']:>14} "
+            f"{row['vectorized_ms']['p50']:>15} {row['speedup']:>7}x"
+        )
+    return out
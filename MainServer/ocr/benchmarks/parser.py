@@ -0,0 +1,469 @@
+"""
+``parse_receipt`` before and after the single-pass rewrite.
+
+:func:`reference_parse_receipt` is the previous multi-pass parser, kept
+verbatim as the behavioural reference for ``ocr.tests`` (the golden
+corpus below) and as the baseline here.
+"""
+
+import random
+import re
+import time
+
+from ..layout import analyze_layout
+from ..parser import (
+    AMOUNT_RE,
+    ATP_RE,
+    QTY_LINE_RE,
+    SERIAL_RE,
+    TIN_RE,
+    _buyer_from_layout,
+    _clean_amount,
+    _detect_receipt_type,
+    _detect_vat_status,
+    _find_date,
+    _items_from_layout,
+    _seller_from_layout,
+    parse_receipt,
+)
+from .corpus import _receipt_lines
+from .stats import elapsed_ms, summarize
+
+
+def _find_amount_near(line: str, keyword: str):
+    """Return the first decimal amount found on a line containing *keyword*."""
+    if keyword.lower() not in line.lower():
+        return None
+    m = AMOUNT_RE.findall(line)
+    return _clean_amount(m[-1]) if m else None
+
+
+def reference_parse_receipt(lines, paragraph, layout=None):
+    # verbatim copy of the multi-pass parser
+
+    result = {
+        "seller": {
+            "registered_business_name": "",
+            "business_address": "",
+            "tin": "",
+            "vat_status": "NON_VAT",
+        },
+        "buyer": {
+            "buyer_name": "",
+            "buyer_address": "",
+            "buyer_tin": "",
+        },
+        "receipt": {
+            "receipt_type": "OFFICIAL_RECEIPT",
+            "serial_number": "",
+            "transaction_date": "",
+            "gross_sales": "",
+            "vatable_sales": "",
+            "vat_amount": "",
+            "vat_exempt_sales": "",
+            "zero_rated_sales": "",
+            "total_amount_due": "",
+        },
+        "items": [],
+        "printer": {
+            "authority_to_print_number": "",
+            "printer_name": "",
+            "printer_tin": "",
+            "printer_address": "",
+            "atp_issue_date": "",
+            "bir_permit_number": "",
+            "serial_start": "",
+            "serial_end": "",
+        },
+        "raw_text": paragraph,
+    }
+
+    if not lines:
+        return result
+
+    upper_paragraph = paragraph.upper()
+
+    # ── receipt type ────────────────────────────────────────────────
+    result["receipt"]["receipt_type"] = _detect_receipt_type(paragraph)
+    result["seller"]["vat_status"] = _detect_vat_status(paragraph)
+
+    # ── seller name: typically the first non-empty line ─────────────
+    header_lines = []
+    for ln in lines[:6]:
+        up = ln.upper().strip()
+        if any(
+            kw in up
+            for kw in [
+                "OFFICIAL RECEIPT",
+                "SALES INVOICE",
+                "OR NO",
+                "SI NO",
+                "DATE",
+                "VAT REG",
+                "TIN",
+            ]
+        ):
+            break
+        header_lines.append(ln.strip())
+
+    if header_lines:
+        result["seller"]["registered_business_name"] = header_lines[0]
+        if len(header_lines) > 1:
+            result["seller"]["business_address"] = " ".join(header_lines[1:])
+
+    seller_block = _seller_from_layout(layout) if layout else None
+    if seller_block:
+        result["seller"]["registered_business_name"] = seller_block[0]
+        result["seller"]["business_address"] = " ".join(seller_block[1:])
+
+    # ── TINs: first TIN → seller, second → buyer, later → printer ──
+    all_tins = []
+    for ln in lines:
+        m = TIN_RE.search(ln)
+        if m:
+            tin_str = f"{m.group(1)}-{m.group(2)}-{m.group(3)}-{m.group(4)}"
+            context = ln.upper()
+            all_tins.append((tin_str, context, ln))
+
+    if all_tins:
+        result["seller"]["tin"] = all_tins[0][0]
+    if len(all_tins) >= 2:
+        # second TIN is buyer or printer — use keyword context
+        for tin_str, ctx, _ in all_tins[1:]:
+            if any(kw in ctx for kw in ["SOLD", "BUYER", "CUSTOMER"]):
+                result["buyer"]["buyer_tin"] = tin_str
+            elif any(kw in ctx for kw in ["PRINT", "ATP", "ACCREDIT"]):
+                result["printer"]["printer_tin"] = tin_str
+            else:
+                if not result["buyer"]["buyer_tin"]:
+                    result["buyer"]["buyer_tin"] = tin_str
+                else:
+                    result["printer"]["printer_tin"] = tin_str
+
+    # ── serial number ───────────────────────────────────────────────
+    for ln in lines:
+        m = SERIAL_RE.search(ln)
+        if m:
+            result["receipt"]["serial_number"] = m.group(1).strip()
+            break
+
+    # if still empty, look for a 6-digit number pattern near top
+    if not result["receipt"]["serial_number"]:
+        for ln in lines[:10]:
+            nums = re.findall(r"\b(\d{5,8})\b", ln)
+            if nums:
+                result["receipt"]["serial_number"] = nums[-1]
+                break
+
+    # ── date ────────────────────────────────────────────────────────
+    for ln in lines:
+        dt = _find_date(ln)
+        if dt:
+            result["receipt"]["transaction_date"] = dt
+            break
+
+    # ── buyer name / address ────────────────────────────────────────
+    for i, ln in enumerate(lines):
+        up = ln.upper()
+        if any(kw in up for kw in ["SOLD TO", "CUSTOMER", "BUYER"]):
+            # extract name from this line (after the keyword)
+            name_part = re.sub(
+                r"(?i)(sold\s*to|customer|buyer)\s*[:\-]?\s*", "", ln
+            ).strip()
+            if name_part:
+                result["buyer"]["buyer_name"] = name_part
+            # next line might be address
+            if i + 1 < len(lines):
+                next_up = lines[i + 1].upper()
+                if not any(
+                    kw in next_up
+                    for kw in ["TIN", "DATE", "QTY", "TOTAL", "VATABLE"]
+                ):
+                    result["buyer"]["buyer_address"] = lines[i + 1].strip()
+            break
+
+    if layout:
+        buyer_name, buyer_address = _buyer_from_layout(layout)
+        if buyer_name:
+            result["buyer"]["buyer_name"] = buyer_name
+        if buyer_address:
+            result["buyer"]["buyer_address"] = buyer_address
+
+    # ── financial summary ───────────────────────────────────────────
+    kw_map = {
+        "gross_sales": ["GROSS SALES", "GROSS"],
+        "vatable_sales": ["VATABLE SALES", "VATABLE"],
+        "vat_amount": ["VAT AMOUNT", "VAT AMT", "12%", "OUTPUT TAX"],
+        "vat_exempt_sales": ["VAT-EXEMPT", "VAT EXEMPT", "EXEMPT SALES"],
+        "zero_rated_sales": ["ZERO-RATED", "ZERO RATED"],
+        "total_amount_due": [
+            "TOTAL AMOUNT DUE",
+            "TOTAL DUE",
+            "AMOUNT DUE",
+            "TOTAL AMT",
+            "GRAND TOTAL",
+            "TOTAL SALE",
+        ],
+    }
+
+    for field, keywords in kw_map.items():
+        for ln in lines:
+            for kw in keywords:
+                val = _find_amount_near(ln, kw)
+                if val:
+                    result["receipt"][field] = val
+                    break
+            if result["receipt"][field]:
+                break
+
+    # fallback: if total_amount_due empty, use the largest amount found
+    if not result["receipt"]["total_amount_due"]:
+        all_amounts = AMOUNT_RE.findall(paragraph)
+        if all_amounts:
+            largest = max(float(_clean_amount(a)) for a in all_amounts)
+            result["receipt"]["total_amount_due"] = f"{largest:.2f}"
+
+    # if gross_sales empty, copy total
+    if not result["receipt"]["gross_sales"]:
+        result["receipt"]["gross_sales"] = result["receipt"]["total_amount_due"]
+
+    # ── line items ──────────────────────────────────────────────────
+    if layout:
+        result["items"] = _items_from_layout(layout)
+
+    if not result["items"]:
+        for ln in lines:
+            m = QTY_LINE_RE.match(ln.strip())
+            if m:
+                result["items"].append(
+                    {
+                        "quantity": m.group(1),
+                        "description": m.group(2).strip(),
+                        "unit_cost": _clean_amount(m.group(3)),
+                        "line_total": _clean_amount(m.group(4)),
+                    }
+                )
+
+    # ── ATP / printer ──────────────────────────────────────────────
+    for ln in lines:
+        m = ATP_RE.search(ln)
+        if m:
+            result["printer"]["authority_to_print_number"] = m.group(1).strip()
+            break
+
+    for i, ln in enumerate(lines):
+        up = ln.upper()
+        if any(kw in up for kw in ["PRINTED BY", "PRINTER"]):
+            name_part = re.sub(
+                r"(?i)(printed\s*by|printer)\s*[:\-]?\s*", "", ln
+            ).strip()
+            if name_part:
+                result["printer"]["printer_name"] = name_part
+            if i + 1 < len(lines):
+                result["printer"]["printer_address"] = lines[i + 1].strip()
+            break
+
+    # ── ATP date ────────────────────────────────────────────────────
+    for ln in lines:
+        up = ln.upper()
+        if "DATE ISSUED" in up or "ISSUE DATE" in up:
+            dt = _find_date(ln)
+            if dt:
+                result["printer"]["atp_issue_date"] = dt[:10]
+            break
+
+    # ── serial range ────────────────────────────────────────────────
+    for ln in lines:
+        up = ln.upper()
+        if "SERIAL" in up and ("RANGE" in up or "-" in ln):
+            nums = re.findall(r"\b(\d{4,})\b", ln)
+            if len(nums) >= 2:
+                result["printer"]["serial_start"] = nums[0]
+                result["printer"]["serial_end"] = nums[1]
+            break
+
+    return result
+
+# ── golden corpus ───────────────────────────────────────────────────
+_EDGE_CASES = [
+    [],
+    [""],
+    ["ACME STORE"],
+    [
+        "MABUHAY PRINTING SERVICES",
+        "Unit 4, Bldg. B, Quezon Blvd.",
+        "Quezon City",
+        "NON-VAT Reg. TIN 123-456-789-000",
+        "SALES INVOICE",
+        "SI No. 004521",
+        "Date: Jan. 5, 2025",
+        "Sold to: JUAN DELA CRUZ",
+        "TIN: 987 654 321 000",
+        "2 Business cards 450.00 900.00",
+        "1 Tarpaulin 3x6 ft 1,250.00 1,250.00",
+        "VAT-EXEMPT SALES 2,150.00",
+        "ZERO-RATED SALES 0.00",
+        "TOTAL DUE P2,150.00",
+        "Printed by: QUICKPRINT PRESS",
+        "88 Luna St., Pasig City",
+        "Printer's TIN 111-222-333-000",
+        "ATP No. OCN4AU0001234567",
+        "Date Issued: 03/14/2023",
+        "Serial Nos. 000001-050000",
+    ],
+    [
+        "Café Niño Ñandú",              # non-ASCII: upper()/lower() differ in length
+        "STRAßE 12 İstanbul",
+        "Customer: ŁUKASZ ŻÓŁĆ",
+        "Gross sales ₱ 1,200.00",
+        "vatable sales 1,071.43 vat amt 128.57",
+        "Grand Total 1,200.00",
+        "ſerial range 1001-2000",
+    ],
+    [
+        "OR NO 12",
+        "Receipt # A-77812",
+        "12% 99.00",
+        "AMOUNT DUE",
+        "TOTAL SALE 5.00 6.00",
+        "Buyer",
+        "TIN 000-111-222-333",
+        "Date 13/45/2024",
+        "Date 02/03/2024",
+        "accredited printer tin 555-444-333-000 ATP: 12-ABC",
+        "ISSUE DATE Feb 30, 2020",
+        "SERIAL RANGE 0001 TO 9999",
+    ],
+    [
+        "NO DATE STORE",
+        "123456 7654321",
+        "SOLD TO:",
+        "QTY DESCRIPTION",
+        "Output tax 10.71",
+        "PRINTER",
+    ],
+]
+
+
+def golden_corpus(count=200, seed=0):
+    """Line lists for the equivalence test: hand-picked edge cases plus
+    synthetic receipts with shuffled and corrupted lines."""
+    rng = random.Random(seed)
+    corpus = [list(case) for case in _EDGE_CASES]
+    extra = [line for case in _EDGE_CASES for line in case]
+    for _ in range(count):
+        lines, _truth = _receipt_lines(rng)
+        lines = [ln for ln in lines if ln]
+        if rng.random() < 0.5:
+            lines += rng.sample(extra, rng.randint(1, 6))
+        if rng.random() < 0.3:
+            rng.shuffle(lines)
+        if rng.random() < 0.3:
+            lines = [ln.lower() if rng.random() < 0.5 else ln for ln in lines]
+        corpus.append(lines)
+    return corpus
+
+
+def _box(x, y, w, h=20):
+    return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+
+
+def golden_layouts():
+    """``(lines, layout)`` pairs: side-by-side seller / buyer block over
+    an item table, and a flat receipt with a two-column summary."""
+    two_column = [
+        (_box(10, 10, 200), "NORTHPOINT AUTO PARTS", 0.9),
+        (_box(400, 10, 180), "Sold to: ACME SOLUTIONS", 0.9),
+        (_box(10, 40, 200), "12 Rizal Ave., Cebu City", 0.9),
+        (_box(400, 40, 180), "45 Luna St., Pasig", 0.9),
+        (_box(10, 100, 30), "2", 0.9),
+        (_box(60, 100, 150), "Brake pads", 0.9),
+        (_box(400, 100, 80), "850.00", 0.9),
+        (_box(500, 100, 80), "1,700.00", 0.9),
+        (_box(10, 130, 30), "1", 0.9),
+        (_box(60, 130, 150), "Oil filter", 0.9),
+        (_box(400, 130, 80), "320.00", 0.9),
+        (_box(500, 130, 80), "320.00", 0.9),
+        (_box(60, 160, 150), "TOTAL", 0.9),
+        (_box(500, 160, 80), "2,020.00", 0.9),
+    ]
+    summary = [
+        (_box(10, 10, 200), "PACIFIC CREST PHARMACY", 0.9),
+        (_box(10, 40, 200), "VAT REG TIN 123-456-789-000", 0.9),
+        (_box(10, 70, 150), "VATABLE SALES", 0.9),
+        (_box(400, 70, 80), "89.29", 0.9),
+        (_box(10, 100, 150), "TOTAL AMOUNT DUE", 0.9),
+        (_box(400, 100, 80), "100.00", 0.9),
+    ]
+    cases = []
+    for raw in (two_column, summary):
+        layout = analyze_layout(raw)
+        lines = [" ".join(c["text"] for c in row["cells"]) for row in layout["rows"]]
+        cases.append((lines, layout))
+    return cases
+
+
+def paragraph_of(lines):
+    return " ".join(" ".join(lines).split())
+
+
+def long_receipts(count=50, seed=0, items=40):
+    """Receipts with a long item table, closer to a multi-page invoice
+    than the golden corpus's 2–5 items."""
+    rng = random.Random(seed)
+    receipts = []
+    for _ in range(count):
+        lines, _truth = _receipt_lines(rng)
+        rows = [ln for ln in lines if QTY_LINE_RE.match(ln)]
+        extra = []
+        while len(extra) < items:
+            more, _truth = _receipt_lines(rng)
+            extra += [ln for ln in more if QTY_LINE_RE.match(ln)]
+        cut = lines.index(rows[-1]) + 1
+        receipts.append(lines[:cut] + extra[:items] + lines[cut:])
+    return receipts
+
+
+# ── benchmark ───────────────────────────────────────────────────────
+def _time(fn, corpus, repeat):
+    paragraphs = [paragraph_of(lines) for lines in corpus]
+    samples = []
+    for _ in range(repeat):
+        for lines, paragraph in zip(corpus, paragraphs):
+            t0 = time.perf_counter()
+            fn(lines, paragraph)
+            samples.append(elapsed_ms(t0) * 1000.0)
+    return summarize(samples)
+
+
+def run(images=200, seed=0, repeat=20, **_):
+    workloads = {
+        "golden": golden_corpus(images, seed=seed),
+        "long": long_receipts(max(1, images // 4), seed=seed),
+    }
+    report = {"suite": "parser", "unit": "us per receipt", "workloads": {}}
+    for name, corpus in workloads.items():
+        for lines in corpus:
+            paragraph = paragraph_of(lines)
+            if parse_receipt(lines, paragraph) != reference_parse_receipt(lines, paragraph):
+                raise AssertionError(f"parse_receipt output differs for {lines!r}")
+        before = _time(reference_parse_receipt, corpus, repeat)
+        after = _time(parse_receipt, corpus, repeat)
+        report["workloads"][name] = {
+            "receipts": len(corpus),
+            "lines_per_receipt": round(sum(map(len, corpus)) / len(corpus), 1),
+            "reference": before,
+            "single_pass": after,
+            "speedup": round(before["mean"] / max(after["mean"], 1e-9), 2),
+        }
+    return report
+
+
+def format_rows(report):
+    rows = [f"{'workload':<8} {'lines':>6} {'reference us':>13} {'single-pass us':>15} {'speedup':>8}"]
+    for name, w in report["workloads"].items():
+        rows.append(
+            f"{name:<8} {w['lines_per_receipt']:>6} {w['reference']['mean']:>13} "
+            f"{w['single_pass']['mean']:>15} {w['speedup']:>7}x"
+        )
+    return rows
@@ -0,0 +1,225 @@
+"""
+The whole receipt pipeline, stage by stage, on a varied synthetic corpus.
+
+Each receipt goes through what ``ocr.pipeline.process_receipt`` does for
+an upload – decode, EasyOCR (pre-processing per ``OCR_PREPROCESS``),
+``_ordered_lines``, ``analyze_layout``, ``parse_receipt`` and
+``categorize`` – with every stage timed.  The report has p50 / p95 / p99
+per stage, throughput, peak RSS, and how many ground-truth fields were
+parsed right, overall and per corpus variant (font, layout, photo size,
+noise).
+
+``ocr="oracle"`` replaces the EasyOCR pass with the rendered text boxes,
+for timing and checking everything after OCR without the models.
+
+Reports are plain JSON; :func:`compare` diffs one against a saved
+baseline (``ocr_benchmark pipeline --compare baseline.json``).
+"""
+
+import os
+import platform
+import resource
+import sys
+import time
+
+from .. import preprocess
+from ..categorizer import categorize
+from ..layout import analyze_layout
+from ..parser import parse_receipt
+from ..pipeline import CATEGORY_CANDIDATES
+from .corpus import FONTS, build_variant_corpus, field_matches
+from .stats import elapsed_ms, summarize
+
+STAGES = ("decode", "readtext", "ordered_lines", "layout", "parse", "categorize", "total")
+DIMENSIONS = ("font", "layout", "photo", "noise")
+
+# latency regressions smaller than this (relative, and in ms) are noise
+_COMPARE_TOLERANCE = 0.10
+_COMPARE_MIN_MS = 1.0
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def _process(item, reader, cfg):
+    """Run one receipt through the pipeline; ``(timings_ms, parsed)``."""
+    from .. import services
+
+    ms = {}
+    start = t0 = time.perf_counter()
+    rgb, grey = services._decode_image(item["data"])
+    ms["decode"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    raw = item["raw"] if reader is None else services._run_reader(reader, [(rgb, grey)], cfg)[0]
+    raw = services._plain_raw(raw)
+    ms["readtext"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    lines, _confs = services._ordered_lines(raw)
+    paragraph = " ".join(" ".join(lines).split())
+    ms["ordered_lines"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    layout = analyze_layout(raw)
+    ms["layout"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    parsed = parse_receipt(lines, paragraph, layout)
+    ms["parse"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    categorize(paragraph, limit=CATEGORY_CANDIDATES)
+    ms["categorize"] = elapsed_ms(t0)
+
+    ms["total"] = elapsed_ms(start)
+    return ms, parsed
+
+
+def _accuracy(matches):
+    """Share of all fields right, and per field."""
+    fields = {}
+    for row in matches:
+        for field, ok in row.items():
+            fields.setdefault(field, []).append(ok)
+    total = [ok for row in matches for ok in row.values()]
+    return {
+        "fields": round(sum(total) / max(len(total), 1), 4),
+        "receipts_all_right": round(sum(all(row.values()) for row in matches) / max(len(matches), 1), 4),
+        "per_field": {f: round(sum(oks) / len(oks), 4) for f, oks in fields.items()},
+    }
+
+
+def run(images=8, seed=0, ocr="easyocr", fonts=None, **_):
+    corpus = build_variant_corpus(images, seed=seed, fonts=tuple(fonts or FONTS))
+    cfg = preprocess.get_config()
+    reader = None
+    if ocr != "oracle":
+        from .. import services
+
+        reader = services._get_reader()
+        services.warm_up_reader(reader)
+
+    # first call builds the category index and warms caches
+    _process(corpus[0], reader, cfg)
+
+    samples = {stage: [] for stage in STAGES}
+    matches, variants = [], []
+    wall = time.perf_counter()
+    for item in corpus:
+        ms, parsed = _process(item, reader, cfg)
+        for stage in STAGES:
+            samples[stage].append(ms[stage])
+        matches.append(field_matches(parsed, item["truth"]))
+        variants.append(item["variant"])
+    wall = time.perf_counter() - wall
+
+    by_variant = {}
+    for dim in DIMENSIONS:
+        groups = {}
+        for n, variant in enumerate(variants):
+            groups.setdefault(str(variant[dim]), []).append(n)
+        by_variant[dim] = {
+            value: {
+                "receipts": len(idx),
+                "fields": _accuracy([matches[n] for n in idx])["fields"],
+                "total_p50_ms": summarize([samples["total"][n] for n in idx])["p50"],
+            }
+            for value, idx in sorted(groups.items())
+        }
+
+    return {
+        "suite": "pipeline",
+        "ocr": ocr,
+        "images": len(corpus),
+        "seed": seed,
+        "preprocess": cfg["enabled"],
+        "stages_ms": {stage: summarize(samples[stage]) for stage in STAGES},
+        "images_per_second": round(len(corpus) / wall, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "accuracy": _accuracy(matches),
+        "by_variant": by_variant,
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+
+
+def compare(report, baseline) -> dict:
+    """
+    Differences from *baseline* (an earlier report): per-stage latency
+    ratios, throughput, peak RSS and accuracy deltas, and the list of
+    regressions – stages more than 10% (and 1 ms) slower at p50 or
+    p95, or any field parsed right less often.
+    """
+    stages = {}
+    regressions = []
+    for stage, now in report["stages_ms"].items():
+        before = baseline.get("stages_ms", {}).get(stage)
+        if not before or not before.get("n") or not now.get("n"):
+            continue
+        stages[stage] = {}
+        for q in ("p50", "p95", "p99"):
+            if q not in now or q not in before:
+                continue
+            ratio = round(now[q] / max(before[q], 1e-9), 3)
+            stages[stage][q] = {"before": before[q], "after": now[q], "ratio": ratio}
+            slower = ratio > 1 + _COMPARE_TOLERANCE and now[q] - before[q] >= _COMPARE_MIN_MS
+            if q != "p99" and slower:
+                regressions.append(f"{stage} {q} {ratio}x")
+
+    fields = {}
+    before_fields = baseline.get("accuracy", {}).get("per_field", {})
+    for field, now in report["accuracy"]["per_field"].items():
+        if field in before_fields:
+            fields[field] = round(now - before_fields[field], 4)
+            if fields[field] < 0:
+                regressions.append(f"{field} accuracy {fields[field]:+}")
+
+    return {
+        "stages_ms": stages,
+        "images_per_second": round(
+            report["images_per_second"] - baseline.get("images_per_second", 0), 3
+        ),
+        "peak_rss_mb": round(report["peak_rss_mb"] - baseline.get("peak_rss_mb", 0), 1),
+        "accuracy_fields": round(
+            report["accuracy"]["fields"] - baseline.get("accuracy", {}).get("fields", 0), 4
+        ),
+        "per_field": fields,
+        "same_corpus": all(
+            report.get(k) == baseline.get(k) for k in ("images", "seed", "ocr")
+        ),
+        "regressions": regressions,
+    }
+
+
+def format_rows(report):
+    out = [f"{'stage':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for stage, s in report["stages_ms"].items():
+        out.append(f"{stage:<14} {s['p50']:>9} {s['p95']:>9} {s['p99']:>9}")
+    acc = report["accuracy"]
+    out.append(
+        f"{report['images_per_second']} img/s, peak RSS {report['peak_rss_mb']} MB, "
+        f"fields right {acc['fields']:.1%}, receipts fully right {acc['receipts_all_right']:.1%}"
+    )
+    for dim, values in report["by_variant"].items():
+        out.append(f"  {dim}: " + ", ".join(
+            f"{value} {row['fields']:.0%}" for value, row in values.items()
+        ))
+    diff = report.get("compare")
+    if diff:
+        for stage, qs in diff["stages_ms"].items():
+            out.append(f"  vs baseline {stage:<14} " + " ".join(
+                f"{q} {d['ratio']}x" for q, d in qs.items()
+            ))
+        out.append(
+            f"  vs baseline: {diff['images_per_second']:+} img/s, "
+            f"{diff['peak_rss_mb']:+} MB, fields {diff['accuracy_fields']:+}"
+        )
+        out.append("  regressions: " + (", ".join(diff["regressions"]) or "none"))
+    return out
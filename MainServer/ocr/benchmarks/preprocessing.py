@@ -0,0 +1,89 @@
+"""
+Latency vs. accuracy of ``ocr.preprocess`` at several target sizes.
+
+For every ``max_long_edge`` in *sizes* (``0`` = pre-processing off, the
+full-resolution baseline) each synthetic receipt goes through decode →
+pre-process → detect + recognise → ``parse_receipt``, and the suite
+reports per-stage latency plus the field match rate against the
+receipt's ground truth.
+"""
+
+import time
+
+import numpy as np
+
+from .. import preprocess, services
+from ..parser import parse_receipt
+from .corpus import build_corpus, field_match_rate
+from .stats import elapsed_ms, summarize
+
+DEFAULT_SIZES = (0, 2000, 1600, 1280, 960)
+
+
+def _run_one(reader, data, cfg):
+    timing = {}
+    t0 = time.perf_counter()
+    rgb, grey = services._decode_image(data)
+    timing["decode"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    transform = None
+    if cfg["enabled"]:
+        rgb, grey, transform = preprocess.preprocess(rgb, grey, cfg)
+    timing["preprocess"] = elapsed_ms(t0)
+    pixels = rgb.shape[0] * rgb.shape[1]
+
+    t0 = time.perf_counter()
+    raw = services._readtext_batched(reader, [(rgb, grey)])[0]
+    if transform is not None:
+        raw = transform.map_raw(raw)
+    timing["ocr"] = elapsed_ms(t0)
+
+    t0 = time.perf_counter()
+    ocr = services._build_result(raw)
+    parsed = parse_receipt(ocr["lines"], ocr["paragraph"])
+    timing["parse"] = elapsed_ms(t0)
+    return parsed, timing, pixels
+
+
+def run(images=8, seed=0, sizes=DEFAULT_SIZES, **_):
+    corpus = build_corpus(images, seed=seed)
+    reader = services._get_reader()
+    # first inference pays for lazy torch initialisation; keep it out
+    _run_one(reader, corpus[0][1], preprocess.get_config({"enabled": False}))
+
+    rows = []
+    for size in sizes:
+        cfg = preprocess.get_config({"enabled": bool(size), "max_long_edge": size or None})
+        stages = {"decode": [], "preprocess": [], "ocr": [], "parse": [], "total": []}
+        matches, pixels = [], []
+        for _, data, truth in corpus:
+            parsed, timing, px = _run_one(reader, data, cfg)
+            timing["total"] = sum(timing.values())
+            for name, value in timing.items():
+                stages[name].append(value)
+            matches.append(field_match_rate(parsed, truth))
+            pixels.append(px)
+
+        rows.append({
+            "max_long_edge": size or None,
+            "preprocess": cfg["enabled"],
+            "detector_megapixels": round(float(np.mean(pixels)) / 1e6, 2),
+            "field_match_rate": round(float(np.mean(matches)), 4),
+            "latency_ms": {name: summarize(v) for name, v in stages.items()},
+        })
+
+    return {"suite": "preprocess", "images": len(corpus), "results": rows}
+
+
+def format_rows(report):
+    """Plain-text table for the console."""
+    out = [f"{'long edge':>10} {'MP':>6} {'total p50':>10} {'ocr p50':>9} {'match':>7}"]
+    for row in report["results"]:
+        lat = row["latency_ms"]
+        out.append(
+            f"{row['max_long_edge'] or 'full':>10} {row['detector_megapixels']:>6} "
+            f"{lat['total']['p50']:>10} {lat['ocr']['p50']:>9} "
+            f"{row['field_match_rate']:>7.1%}"
+        )
+    return out
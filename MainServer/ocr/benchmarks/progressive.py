@@ -0,0 +1,108 @@
+"""
+Progressive OCR (``ocr.progressive``) against the usual single pass.
+
+Every receipt of a :func:`~ocr.benchmarks.corpus.build_variant_corpus`
+corpus is OCR'd and parsed once per mode: ``full`` (progressive off, the
+baseline) and progressive with each first-pass long edge in *sizes*.
+Pre-processing follows ``OCR_PREPROCESS`` in every mode.  The report
+has wall time and CPU time (all threads) per receipt, the share of boxes
+read twice and of receipts that fell back to a full pass, and the share
+of ground-truth fields parsed right – with every field parsed right less
+often than in ``full`` listed as a regression.
+"""
+
+import os
+import time
+
+from .. import preprocess, progressive, services
+from ..parser import parse_receipt
+from .corpus import build_variant_corpus, field_matches
+from .pipeline import _accuracy
+from .stats import elapsed_ms, summarize
+
+DEFAULT_SIZES = (1200, 960)
+
+
+def _run_one(reader, data, cfg, progressive_cfg):
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    rgb, grey = services._decode_image(data)
+    if progressive_cfg["enabled"]:
+        raw, info = services._run_progressive(reader, [(rgb, grey)], cfg, progressive_cfg)[0]
+    else:
+        raw = services._run_single_pass(reader, [(rgb, grey)], cfg)[0]
+        info = {"boxes": len(raw), "reread": 0, "full_pass": False}
+    result = services._build_result(raw)
+    parsed = parse_receipt(result["lines"], result["paragraph"], result["layout"])
+    timing = {"wall": elapsed_ms(t0), "cpu": round((time.process_time() - cpu0) * 1000, 3)}
+    return parsed, timing, info
+
+
+def run(images=8, seed=0, sizes=DEFAULT_SIZES, **_):
+    corpus = build_variant_corpus(images, seed=seed)
+    cfg = preprocess.get_config()
+    reader = services._get_reader()
+    services.warm_up_reader(reader)
+
+    modes = [("full", progressive.get_config({"enabled": False}))]
+    modes += [
+        (f"progressive-{size}", progressive.get_config({"enabled": True, "long_edge": size}))
+        for size in sizes
+    ]
+
+    rows = []
+    for name, progressive_cfg in modes:
+        wall, cpu, matches = [], [], []
+        boxes = reread = full_passes = 0
+        for item in corpus:
+            parsed, timing, info = _run_one(reader, item["data"], cfg, progressive_cfg)
+            wall.append(timing["wall"])
+            cpu.append(timing["cpu"])
+            matches.append(field_matches(parsed, item["truth"]))
+            boxes += info["boxes"]
+            reread += info["reread"]
+            full_passes += info["full_pass"]
+        rows.append({
+            "mode": name,
+            "long_edge": progressive_cfg["long_edge"] if progressive_cfg["enabled"] else None,
+            "wall_ms": summarize(wall),
+            "cpu_ms": summarize(cpu),
+            "cpu_ms_mean": round(sum(cpu) / max(len(cpu), 1), 2),
+            "reread_share": round(reread / max(boxes, 1), 4),
+            "full_pass_share": round(full_passes / max(len(corpus), 1), 4),
+            "accuracy": _accuracy(matches),
+        })
+
+    baseline = rows[0]
+    for row in rows[1:]:
+        row["cpu_ratio"] = round(row["cpu_ms_mean"] / max(baseline["cpu_ms_mean"], 1e-9), 3)
+        row["regressions"] = [
+            f"{field} {now - baseline['accuracy']['per_field'][field]:+.4f}"
+            for field, now in row["accuracy"]["per_field"].items()
+            if now < baseline["accuracy"]["per_field"][field]
+        ]
+
+    return {
+        "suite": "progressive",
+        "images": len(corpus),
+        "seed": seed,
+        "preprocess": cfg["enabled"],
+        "cpu_count": os.cpu_count(),
+        "results": rows,
+    }
+
+
+def format_rows(report):
+    out = [
+        f"{'mode':<18} {'cpu ms':>9} {'x full':>7} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'re-read':>8} {'full':>6} {'fields':>7}"
+    ]
+    for row in report["results"]:
+        out.append(
+            f"{row['mode']:<18} {row['cpu_ms_mean']:>9} {row.get('cpu_ratio', 1.0):>7} "
+            f"{row['wall_ms']['p50']:>9} {row['wall_ms']['p95']:>9} "
+            f"{row['reread_share']:>8.1%} {row['full_pass_share']:>6.0%} "
+            f"{row['accuracy']['fields']:>7.1%}"
+        )
+    for row in report["results"][1:]:
+        out.append(f"  {row['mode']} regressions: " + (", ".join(row["regressions"]) or "none"))
+    return out
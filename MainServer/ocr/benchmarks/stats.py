@@ -0,0 +1,24 @@
+"""Small helpers shared by the benchmark suites."""
+
+import time
+
+import numpy as np
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000.0
+
+
+def summarize(samples_ms) -> dict:
+    """Mean and tail latency of a list of millisecond samples."""
+    if not samples_ms:
+        return {"n": 0}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "n": int(arr.size),
+        "mean": round(float(arr.mean()), 2),
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "p99": round(float(np.percentile(arr, 99)), 2),
+        "max": round(float(arr.max()), 2),
+    }
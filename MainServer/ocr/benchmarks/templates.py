@@ -0,0 +1,224 @@
+"""
+Per-seller layout templates (``ocr.templates``) against the generic parser.
+
+The corpus is *merchants* fixed sellers (:func:`~ocr.benchmarks.corpus.
+make_merchant`), each printing in its own font and layout; photo size,
+noise, angle and the receipt's contents vary.  Every merchant's first
+*learn* receipts are "confirmed" – parsed from their clean text, with
+the ground truth on top, as a reviewer would save them – and learned
+into its template; the next *images* receipts, spread over the
+merchants, are parsed both ways.
+
+Only parsing is timed: ``parse_receipt`` against identifying the seller
+and :func:`~ocr.templates.parse_with_template`.  The report has both
+latencies, the share of receipts that skip the generic parser, the share of
+ground-truth fields parsed right, and corrections – review-form fields
+that differ from the confirmed receipt – per receipt.
+
+``ocr="oracle"`` uses the rendered text boxes instead of EasyOCR.
+"""
+
+import random
+import time
+
+from .. import preprocess, templates
+from ..parser import parse_receipt
+from .corpus import (
+    _SELLERS,
+    FONTS,
+    LAYOUTS,
+    NOISE_LEVELS,
+    PHOTO_SIZES,
+    _receipt_lines,
+    field_matches,
+    make_merchant,
+    make_variant,
+)
+from .pipeline import _accuracy
+from .stats import elapsed_ms, summarize
+
+# review-form fields counted as corrections
+REVIEW_FIELDS = [
+    ("seller", "registered_business_name"),
+    ("seller", "business_address"),
+    ("seller", "tin"),
+    *((section, field) for field, (section, _) in templates.FIELDS.items()),
+]
+
+
+def _confirmed(seed, merchant, truth):
+    """What a reviewer saves for the receipt: its clean text parsed, with
+    the ground truth on top."""
+    lines = [ln for ln in _receipt_lines(random.Random(seed), merchant)[0] if ln]
+    parsed = parse_receipt(lines, " ".join(lines))
+    parsed["seller"].update(
+        registered_business_name=truth["registered_business_name"],
+        business_address=merchant["address"],
+        tin=truth["tin"],
+    )
+    # the corpus prints no buyer address
+    parsed["buyer"]["buyer_address"] = ""
+    parsed["receipt"].update(
+        serial_number=truth["serial_number"],
+        transaction_date=truth["transaction_date"],
+        total_amount_due=truth["total_amount_due"],
+    )
+    return parsed
+
+
+def _review_value(result, section, field):
+    value = result[section][field] or ""
+    # the form shows the date only
+    return value[:10] if field == "transaction_date" else value
+
+
+def _corrections(parsed, confirmed):
+    return sum(
+        _review_value(parsed, section, field) != _review_value(confirmed, section, field)
+        for section, field in REVIEW_FIELDS
+    )
+
+
+def _ocr(item, reader, cfg):
+    from .. import services
+
+    raw = item["raw"]
+    if reader is not None:
+        rgb, grey = services._decode_image(item["data"])
+        raw = services._run_reader(reader, [(rgb, grey)], cfg)[0]
+    return services._build_result(services._plain_raw(raw))
+
+
+def _corpus(images, learn, merchants, seed):
+    rng = random.Random(seed)
+    photos, noises = list(PHOTO_SIZES), list(NOISE_LEVELS)
+    shops = [
+        {
+            "merchant": make_merchant(seed + n, _SELLERS[n % len(_SELLERS)]),
+            "font": FONTS[n % len(FONTS)],
+            "layout": LAYOUTS[n % len(LAYOUTS)],
+        }
+        for n in range(merchants)
+    ]
+    # every merchant's first `learn` receipts, then the rest round-robin
+    plan = [(n, True) for n in range(merchants) for _ in range(learn)]
+    plan += [(i % merchants, False) for i in range(images)]
+    corpus = []
+    for i, (n, learning) in enumerate(plan):
+        shop, receipt_seed = shops[n], seed + 1000 + i
+        data, truth, raw = make_variant(
+            receipt_seed, shop["font"], shop["layout"], rng.choice(photos), rng.choice(noises),
+            merchant=shop["merchant"],
+        )
+        corpus.append({
+            "shop": n,
+            "learn": learning,
+            "data": data,
+            "truth": truth,
+            "raw": raw,
+            "confirmed": _confirmed(receipt_seed, shop["merchant"], truth),
+        })
+    return shops, corpus
+
+
+def run(images=8, seed=0, merchants=4, learn=3, ocr="easyocr", **_):
+    shops, corpus = _corpus(images, learn, merchants, seed)
+    cfg = preprocess.get_config()
+    reader = None
+    if ocr == "easyocr":
+        from .. import services
+
+        reader = services._get_reader()
+        services.warm_up_reader(reader)
+
+    layouts = [{} for _ in shops]
+    sellers = [{} for _ in shops]
+    keys = {}
+    for n, shop in enumerate(shops):
+        keys[f"tin:{''.join(c for c in shop['merchant']['tin'] if c.isdigit())}"] = n
+
+    for item in corpus:
+        if item["learn"]:
+            result, confirmed = _ocr(item, reader, cfg), item["confirmed"]
+            values = {
+                field: confirmed[section][field]
+                for field, (section, _) in templates.FIELDS.items()
+                if confirmed[section][field]
+            }
+            layouts[item["shop"]] = templates.learn(layouts[item["shop"]], result["raw_result"], values)
+            sellers[item["shop"]] = dict(confirmed["seller"])
+    # as the template store keeps them
+    cached = [templates.LayoutTemplate(n, layouts[n], sellers[n]) for n in range(len(shops))]
+
+    generic_ms, template_ms = [], []
+    generic_fix, template_fix = [], []
+    generic_matches, template_matches = [], []
+    skipped = identified = 0
+    for item in corpus:
+        if item["learn"]:
+            continue
+        result, confirmed = _ocr(item, reader, cfg), item["confirmed"]
+
+        t0 = time.perf_counter()
+        parsed = parse_receipt(result["lines"], result["paragraph"], result["layout"])
+        generic_ms.append(elapsed_ms(t0))
+        generic_fix.append(_corrections(parsed, confirmed))
+        generic_matches.append(field_matches(parsed, item["truth"]))
+
+        t0 = time.perf_counter()
+        n = templates.identify(result["lines"], keys)
+        if n is None:
+            parsed = parse_receipt(result["lines"], result["paragraph"], result["layout"])
+        else:
+            parsed = templates.parse_with_template(
+                cached[n], result["lines"], result["paragraph"], result["layout"], result["raw_result"]
+            )
+        template_ms.append(elapsed_ms(t0))
+        template_fix.append(_corrections(parsed, confirmed))
+        template_matches.append(field_matches(parsed, item["truth"]))
+        identified += n == item["shop"]
+        skipped += bool(parsed.get("layout_template", {}).get("generic_skipped"))
+
+    tested = max(len(generic_ms), 1)
+    rows = [
+        {
+            "mode": "generic",
+            "parse_ms": summarize(generic_ms),
+            "corrections": round(sum(generic_fix) / tested, 3),
+            "accuracy": _accuracy(generic_matches),
+        },
+        {
+            "mode": "template",
+            "parse_ms": summarize(template_ms),
+            "corrections": round(sum(template_fix) / tested, 3),
+            "accuracy": _accuracy(template_matches),
+            "identified_share": round(identified / tested, 4),
+            "generic_skipped_share": round(skipped / tested, 4),
+        },
+    ]
+    rows[1]["speedup"] = round(
+        rows[0]["parse_ms"].get("mean", 0) / max(rows[1]["parse_ms"].get("mean", 0), 1e-9), 2
+    )
+    return {
+        "suite": "templates",
+        "images": len(generic_ms),
+        "seed": seed,
+        "merchants": merchants,
+        "learned_per_merchant": learn,
+        "ocr": ocr,
+        "results": rows,
+    }
+
+
+def format_rows(report):
+    out = [
+        f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'fixes':>6} "
+        f"{'fields':>7} {'skip':>6}"
+    ]
+    for row in report["results"]:
+        out.append(
+            f"{row['mode']:<10} {row['parse_ms']['p50']:>8} {row['parse_ms']['p95']:>8} "
+            f"{row.get('speedup', 1.0):>8} {row['corrections']:>6} "
+            f"{row['accuracy']['fields']:>7.1%} {row.get('generic_skipped_share', 0):>6.0%}"
+        )
+    return out
@@ -0,0 +1,104 @@
+"""
+Throughput of OCR inference for combinations of worker processes and
+torch threads per process (``OCR_TORCH_THREADS``).
+
+Each combination starts *workers* fresh processes with the thread budget
+applied, waits until every one has loaded and warmed its reader, then
+pushes the whole corpus through them and measures images per second and
+per-image latency.  Use it to pick ``GUNICORN_WORKERS`` /
+``OCR_TORCH_THREADS`` for a given box: the best setting is usually far
+from "every worker uses every core".
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .corpus import build_corpus
+from .stats import elapsed_ms, summarize
+
+DEFAULT_COMBOS = ((1, 1), (1, 2), (1, 4), (2, 1), (2, 2), (4, 1))
+
+_reader = None
+
+
+def _init_worker(threads, barrier):
+    # settings read the budget from the environment at import time
+    os.environ["OCR_TORCH_THREADS"] = str(threads)
+    os.environ["OCR_INTEROP_THREADS"] = "1"
+    os.environ["OCR_MAX_CONCURRENT"] = "1"
+
+    import django
+
+    django.setup()
+    from .. import services
+
+    global _reader
+    _reader = services._get_reader()
+    services.warm_up_reader(_reader)
+    barrier.wait()
+
+
+def _ready(_):
+    return os.getpid()
+
+
+def _ocr_one(data):
+    from .. import services
+
+    t0 = time.perf_counter()
+    rgb, grey = services._decode_image(data)
+    raw = services._readtext_batched(_reader, [(rgb, grey)])[0]
+    services._build_result(raw)
+    return elapsed_ms(t0)
+
+
+def _run_combo(corpus, workers, threads):
+    ctx = get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(threads, barrier),
+    ) as pool:
+        # one trivial task per worker forces every initializer to run
+        # (and finish warming) before the clock starts
+        list(pool.map(_ready, range(workers)))
+
+        t0 = time.perf_counter()
+        latencies = list(pool.map(_ocr_one, [data for _, data, _ in corpus]))
+        wall = time.perf_counter() - t0
+
+    return {
+        "workers": workers,
+        "torch_threads": threads,
+        "cores_used": workers * threads,
+        "oversubscribed": workers * threads > (os.cpu_count() or 1),
+        "images_per_second": round(len(corpus) / wall, 3),
+        "latency_ms": summarize(latencies),
+    }
+
+
+def run(images=8, seed=0, combos=DEFAULT_COMBOS, **_):
+    corpus = build_corpus(images, seed=seed)
+    rows = [_run_combo(corpus, w, t) for w, t in combos]
+    return {
+        "suite": "threads",
+        "images": len(corpus),
+        "cpu_count": os.cpu_count(),
+        "results": rows,
+    }
+
+
+def format_rows(report):
+    out = [f"{'workers':>7} {'threads':>7} {'img/s':>8} {'p50 ms':>9} {'p95 ms':>9}"]
+    for row in report["results"]:
+        lat = row["latency_ms"]
+        flag = "  (oversubscribed)" if row["oversubscribed"] else ""
+        out.append(
+            f"{row['workers']:>7} {row['torch_threads']:>7} "
+            f"{row['images_per_second']:>8} {lat['p50']:>9} {lat['p95']:>9}{flag}"
+        )
+    return out
@@ -0,0 +1,206 @@
+"""
+Content-addressed cache for OCR results.
+
+Entries are keyed by the SHA-256 of the uploaded image bytes and hold
+the ordered lines, per-line confidences and raw EasyOCR boxes, so a
+re-uploaded receipt skips the EasyOCR pass entirely.
+
+Two tiers:
+
+* the Django cache (``OCR_CACHE_ALIAS`` – locmem in development, Redis
+  in production), and
+* a local on-disk directory (``OCR_CACHE_DIR``) that survives restarts
+  and Redis evictions.  It is trimmed to ``OCR_CACHE_DISK_MAX_BYTES``,
+  least-recently-used files first.
+
+Both tiers expire entries after ``OCR_CACHE_TTL`` seconds.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached payload format or the OCR output changes.
+CACHE_VERSION = "1"
+
+_STAT_NAMES = ("memory_hits", "disk_hits", "misses", "writes")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class OcrResultCache:
+    # re-scan the disk tier for size eviction every N writes
+    PRUNE_EVERY = 50
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(_STAT_NAMES, 0)
+        self._writes_since_prune = 0
+
+    # ── configuration (read lazily so override_settings works) ────
+    @property
+    def enabled(self):
+        return _setting("OCR_CACHE_ENABLED", True)
+
+    @property
+    def ttl(self):
+        return _setting("OCR_CACHE_TTL", 7 * 24 * 3600)
+
+    @property
+    def disk_dir(self):
+        path = _setting("OCR_CACHE_DIR", None)
+        return Path(path) if path else None
+
+    @property
+    def backend(self):
+        return caches[_setting("OCR_CACHE_ALIAS", "default")]
+
+    def _key(self, digest):
+        return f"ocr:result:{CACHE_VERSION}:{digest}"
+
+    def _disk_path(self, digest):
+        return self.disk_dir / CACHE_VERSION / digest[:2] / f"{digest}.json"
+
+    # ── counters ────────────────────────────────────────────────────
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+        # best-effort cross-worker total (shared when the backend is Redis)
+        try:
+            key = f"ocr:cache-stats:{name}"
+            if not self.backend.add(key, 1, timeout=None):
+                self.backend.incr(key)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            local = dict(self._stats)
+        shared = {}
+        try:
+            shared = {
+                name: self.backend.get(f"ocr:cache-stats:{name}", 0)
+                for name in _STAT_NAMES
+            }
+        except Exception:
+            pass
+        return {"process": local, "shared": shared}
+
+    # ── lookups ─────────────────────────────────────────────────────
+    def get(self, digest):
+        """Return the cached entry for *digest* or ``None``."""
+        if not self.enabled:
+            return None
+
+        try:
+            entry = self.backend.get(self._key(digest))
+        except Exception:
+            logger.warning("OCR cache backend unavailable", exc_info=True)
+            entry = None
+        if entry is not None:
+            self._count("memory_hits")
+            return entry
+
+        entry = self._disk_get(digest)
+        if entry is not None:
+            self._count("disk_hits")
+            self._memory_set(digest, entry)
+            return entry
+
+        self._count("misses")
+        return None
+
+    def set(self, digest, entry: dict):
+        """Store a JSON-serialisable *entry* in both tiers."""
+        if not self.enabled:
+            return
+        self._memory_set(digest, entry)
+        self._disk_set(digest, entry)
+        self._count("writes")
+
+    def _memory_set(self, digest, entry):
+        try:
+            self.backend.set(self._key(digest), entry, timeout=self.ttl)
+        except Exception:
+            logger.warning("OCR cache backend unavailable", exc_info=True)
+
+    # ── disk tier ───────────────────────────────────────────────────
+    def _disk_get(self, digest):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(digest)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "r", encoding="utf-8") as fh:
+                entry = json.load(fh)
+            os.utime(path)  # mtime doubles as "last used" for eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _disk_set(self, digest, entry):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(entry, fh)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Could not write OCR cache file %s", path, exc_info=True)
+            return
+
+        with self._lock:
+            self._writes_since_prune += 1
+            due = self._writes_since_prune >= self.PRUNE_EVERY
+            if due:
+                self._writes_since_prune = 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Drop expired files, then the least recently used until the
+        disk tier fits in ``OCR_CACHE_DISK_MAX_BYTES``."""
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return
+        max_bytes = _setting("OCR_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024)
+        now = time.time()
+
+        files, total = [], 0
+        for path in self.disk_dir.rglob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= max_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= max_bytes * 0.9:
+                break
+
+
+result_cache = OcrResultCache()
@@ -1,10 +1,39 @@
 """
-Simple keyword matcher that suggests an ExpenseCategory
-based on the OCR text.
+Suggests an ExpenseCategory for the OCR text: the trained classifier
+(``ocr.classifier``) when it is confident, otherwise a keyword match.
+
+Keywords come from ``ExpenseCategory.keywords`` plus :data:`DEFAULT_RULES`
+and are compiled once into a trie over word tokens, so a suggestion is
+one pass over the text with no database queries.  Precedence is as it
+was before the index: the first DB category (model ordering) with a
+matching keyword, else the first default rule that matches.  One
+behaviour change: keywords match whole words only, so "pen" no longer
+matches "expense" and "gas" no longer matches "Vegas".  Plurals still
+match: words lose an "-s" / "-es" / "-ies" ending on both sides (see
+:func:`_stem`), so "taxes" matches "tax".
+
+The compiled index is dropped when an ExpenseCategory is saved or deleted
+(see ``ocr.signals``).  Other processes notice through a version counter
+in the Django cache, checked at most every
+``OCR_CATEGORY_INDEX_CHECK_SECONDS``.  ``QuerySet.update()`` and
+``bulk_create()`` send no signals; call :func:`invalidate_index` after
+using them.
 """
 
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
 from billing.models import ExpenseCategory
 
+from .classifier import predict_category
+
+logger = logging.getLogger(__name__)
+
 # Fallback mapping when the DB has no keyword data yet
 DEFAULT_RULES = {
     "Office Supplies": [
@@ -50,31 +79,214 @@ DEFAULT_RULES = {
     "Admin Expense": ["admin", "administrative", "miscellaneous"],
 }
 
+UNCATEGORIZED = {"id": None, "name": "Uncategorized"}
+
+# words, and punctuation as single tokens ("a/c" → a, /, c)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# trie node key marking the end of a keyword
+_END = ""
+
+_VERSION_KEY = "ocr:category-index-version"
+
+
+def _stem(token):
+    """
+    *token* without a plural ending, crudely: "-ies" → "-y", then a
+    final "s" (not "-ss", "-us", "-is") and a final "e" go, in words of
+    more than three letters.  Keywords and text are stemmed alike, so
+    "taxes" / "tax" and "licenses" / "license" meet.
+    """
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        token = token[:-1]
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def _tokens(text):
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+class KeywordIndex:
+    """
+    Trie over the word tokens of every category keyword.  Matching walks
+    it from each token of the text, so cost is linear in the text length
+    (times the longest keyword, a few tokens).
+    """
+
+    def __init__(self, categories, category_names=None):
+        """*categories*: ``[(id | None, name, [keyword, ...]), ...]`` in
+        priority order; a category may appear more than once.
+        *category_names*: ``{id: name}`` of every ExpenseCategory."""
+        self.category_names = category_names or {}
+        self.categories = []
+        self._root = {}
+        for rank, (cat_id, name, keywords) in enumerate(categories):
+            self.categories.append({"id": cat_id, "name": name})
+            for kw in keywords:
+                tokens = _tokens(kw)
+                if not tokens:
+                    continue
+                node = self._root
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(_END, set()).add(rank)
+
+    def hits(self, text) -> dict:
+        """``{category rank: keyword occurrences}`` for *text*."""
+        tokens = _tokens(text)
+        counts = {}
+        root, n = self._root, len(tokens)
+        for i in range(n):
+            node = root.get(tokens[i])
+            j = i + 1
+            while node is not None:
+                for rank in node.get(_END, ()):
+                    counts[rank] = counts.get(rank, 0) + 1
+                if j == n:
+                    break
+                node = node.get(tokens[j])
+                j += 1
+        return counts
+
+    def candidates(self, text) -> list:
+        """Every matching category once, in priority order, with its
+        keyword hits."""
+        counts = self.hits(text)
+        found = {}
+        for rank in sorted(counts):
+            category = self.categories[rank]
+            key = (category["id"], category["name"])
+            if key in found:
+                found[key]["hits"] += counts[rank]
+            else:
+                found[key] = dict(category, hits=counts[rank])
+        return list(found.values())
+
+
+def build_index() -> KeywordIndex:
+    """
+    One query: DB categories with keywords first (in model ordering),
+    then :data:`DEFAULT_RULES`, which take the id of the DB category
+    with the same name.
+    """
+    categories, db_ids = [], {}
+    for cat_id, name, keywords in ExpenseCategory.objects.values_list("id", "name", "keywords"):
+        db_ids[name] = cat_id
+        kws = [k.strip() for k in (keywords or "").split(",") if k.strip()]
+        if kws:
+            categories.append((cat_id, name, kws))
+    for name, kws in DEFAULT_RULES.items():
+        categories.append((db_ids.get(name), name, kws))
+
+    return KeywordIndex(categories, {cat_id: name for name, cat_id in db_ids.items()})
+
+
+# ── process-wide index ──────────────────────────────────────────────
+_lock = threading.Lock()
+_state = {"index": None, "version": None, "checked_at": 0.0}
+
+
+def _version_cache():
+    return caches[getattr(settings, "OCR_CACHE_ALIAS", "default")]
+
+
+def _shared_version():
+    try:
+        return _version_cache().get(_VERSION_KEY, 0)
+    except Exception:
+        logger.warning("Category index version unavailable", exc_info=True)
+        return None
+
+
+def get_index() -> KeywordIndex:
+    """The compiled index, rebuilt when another process invalidated it."""
+    interval = getattr(settings, "OCR_CATEGORY_INDEX_CHECK_SECONDS", 5)
+    now = time.monotonic()
+    index = _state["index"]
+    if index is not None and now - _state["checked_at"] < interval:
+        return index
+
+    version = _shared_version()
+    with _lock:
+        if _state["index"] is None or (version is not None and version != _state["version"]):
+            _state["index"] = build_index()
+            _state["version"] = version
+        _state["checked_at"] = now
+        return _state["index"]
+
+
+def invalidate_index(**kwargs):
+    """Drop the compiled index here and, via the cache, in every process.
+    Connected to ExpenseCategory ``post_save`` / ``post_delete``."""
+    with _lock:
+        _state["index"] = None
+    try:
+        cache = _version_cache()
+        if not cache.add(_VERSION_KEY, 1, timeout=None):
+            cache.incr(_VERSION_KEY)
+    except Exception:
+        logger.warning("Category index version unavailable", exc_info=True)
+
+
+# ── public API ──────────────────────────────────────────────────────
+def category_candidates(paragraph: str, limit: int = None) -> list:
+    """
+    Every category with a keyword in *paragraph* as
+    ``{"id": <int|None>, "name": "<str>", "hits": <int>}``: DB keyword
+    matches first, then default rules, each in priority order (not by
+    hits).  The first is the keyword suggestion.
+    """
+    found = get_index().candidates(paragraph)
+    return found[:limit] if limit else found
+
+
+def category_predictions(paragraph: str, limit: int = 3) -> list:
+    """
+    Classifier top-*limit* as ``{"id", "name", "probability"}``, limited
+    to categories that still exist (names as currently in the DB).
+    """
+    names = get_index().category_names
+    found = []
+    for pred in predict_category(paragraph, k=len(names) or limit):
+        if pred["id"] in names:
+            found.append(dict(pred, name=names[pred["id"]]))
+            if len(found) == limit:
+                break
+    return found
+
+
+def categorize(paragraph: str, limit: int = 3) -> dict:
+    """
+    ``suggested_category`` plus the scored alternatives behind it:
+    ``category_predictions`` (classifier) and ``category_candidates``
+    (keywords).  The classifier's top category wins when its probability
+    reaches ``OCR_CLASSIFIER_MIN_CONFIDENCE``.
+    """
+    predictions = category_predictions(paragraph, limit)
+    candidates = category_candidates(paragraph, limit)
+    threshold = getattr(settings, "OCR_CLASSIFIER_MIN_CONFIDENCE", 0.6)
+
+    if predictions and predictions[0]["probability"] >= threshold:
+        best = predictions[0]
+    elif candidates:
+        best = candidates[0]
+    else:
+        best = UNCATEGORIZED
+    return {
+        "suggested_category": {"id": best["id"], "name": best["name"]},
+        "category_predictions": predictions,
+        "category_candidates": candidates,
+    }
+
 
 def suggest_category(paragraph: str) -> dict:
     """
     Return ``{"id": <int|None>, "name": "<str>"}`` for the best-matching
     expense category.
     """
-    text = paragraph.lower()
-
-    # 1. Try DB-stored keywords first
-    for cat in ExpenseCategory.objects.all():
-        if cat.keywords:
-            kws = [k.strip().lower() for k in cat.keywords.split(",") if k.strip()]
-            for kw in kws:
-                if kw in text:
-                    return {"id": cat.id, "name": cat.name}
-
-    # 2. Fallback to hardcoded rules
-    for cat_name, kws in DEFAULT_RULES.items():
-        for kw in kws:
-            if kw in text:
-                # try to find the category in DB to get its id
-                try:
-                    cat = ExpenseCategory.objects.get(name=cat_name)
-                    return {"id": cat.id, "name": cat.name}
-                except ExpenseCategory.DoesNotExist:
-                    return {"id": None, "name": cat_name}
-
-    return {"id": None, "name": "Uncategorized"}
\ No newline at end of file
+    return categorize(paragraph, limit=1)["suggested_category"]
@@ -0,0 +1,247 @@
+"""
+Multinomial naive Bayes over hashed word n-grams, trained from confirmed
+receipts (``Receipt.raw_ocr_text`` → ``Receipt.category``).
+
+Model directory (``OCR_CLASSIFIER_DIR``)::
+
+    meta.json              classes, document counts, training watermark
+    log_prob.<gen>.npy     float32 (classes × features) – memory-mapped
+    counts.<gen>.npy       float32 (classes × features) – training state
+
+Naive Bayes is just counting, so training is incremental:
+``manage.py train_category_model`` loads ``counts``, adds receipts saved
+since the last run and writes a new generation.  ``meta.json`` is
+replaced last, atomically; running processes pick up the new generation
+on their next check (``RELOAD_CHECK_SECONDS``).
+
+Prediction hashes the text into a few hundred feature indices and sums
+that many columns of ``log_prob`` – well under a millisecond.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DEFAULT_FEATURES = 2 ** 16
+# Laplace smoothing
+ALPHA = 0.1
+RELOAD_CHECK_SECONDS = 10
+
+_TOKEN_RE = re.compile(r"[^\W\d_]{2,}")
+
+
+def model_dir():
+    path = getattr(settings, "OCR_CLASSIFIER_DIR", None)
+    return Path(path) if path else None
+
+
+# ── features ────────────────────────────────────────────────────────
+def features(text: str, n_features: int):
+    """
+    ``(indices, counts)`` of the hashed word unigrams and bigrams in
+    *text*.  Digits are dropped – amounts and dates say nothing about
+    the category.  CRC32 rather than ``hash()``, which is salted per
+    process.
+    """
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, np.int64), np.zeros(0, np.float32)
+    hashed = np.fromiter(
+        (zlib.crc32(g.encode()) for g in grams), dtype=np.int64, count=len(grams)
+    )
+    indices, counts = np.unique(hashed % n_features, return_counts=True)
+    return indices, counts.astype(np.float32)
+
+
+# ── inference ───────────────────────────────────────────────────────
+class CategoryModel:
+    """A trained model; ``log_prob`` is usually a read-only memmap."""
+
+    def __init__(self, meta, log_prob):
+        self.meta = meta
+        self.classes = meta["classes"]
+        self.n_features = meta["n_features"]
+        self.log_prob = log_prob
+        docs = np.asarray(meta["doc_counts"], dtype=np.float64)
+        self.log_prior = np.log(docs / docs.sum())
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map the model in *directory*; ``None`` if there is none."""
+        try:
+            meta = json.loads((Path(directory) / "meta.json").read_text())
+        except FileNotFoundError:
+            return None
+        if meta.get("version") != FORMAT_VERSION or not meta["classes"]:
+            return None
+        log_prob = np.load(Path(directory) / meta["log_prob"], mmap_mode="r")
+        return cls(meta, log_prob)
+
+    def predict(self, text: str, k: int = 3) -> list:
+        """Top *k* ``{"id", "name", "probability"}``, most likely first."""
+        indices, counts = features(text, self.n_features)
+        if not len(indices):
+            return []
+        joint = self.log_prior + self.log_prob[:, indices] @ counts
+        probs = np.exp(joint - joint.max())
+        probs /= probs.sum()
+        top = np.argsort(-probs, kind="stable")[:k]
+        return [
+            dict(self.classes[i], probability=round(float(probs[i]), 4)) for i in top
+        ]
+
+
+_lock = threading.Lock()
+_state = {"model": None, "mtime": None, "checked_at": None}
+
+
+def get_model():
+    """The current model for this process, or ``None`` if none is trained."""
+    now = time.monotonic()
+    checked_at = _state["checked_at"]
+    if checked_at is not None and now - checked_at < RELOAD_CHECK_SECONDS:
+        return _state["model"]
+
+    directory = model_dir()
+    with _lock:
+        _state["checked_at"] = now
+        try:
+            mtime = os.stat(directory / "meta.json").st_mtime_ns if directory else None
+        except FileNotFoundError:
+            mtime = None
+        if mtime != _state["mtime"]:
+            try:
+                _state["model"] = CategoryModel.load(directory) if mtime else None
+            except (OSError, ValueError, KeyError):
+                logger.exception("Could not load the category model from %s", directory)
+                _state["model"] = None
+            _state["mtime"] = mtime
+        return _state["model"]
+
+
+def predict_category(text: str, k: int = 3) -> list:
+    """Top-*k* categories with probabilities; ``[]`` without a model."""
+    model = get_model()
+    return model.predict(text, k) if model else []
+
+
+# ── training ────────────────────────────────────────────────────────
+class Trainer:
+    """Feature counts per class, grown as new categories appear."""
+
+    def __init__(self, n_features=None):
+        self.n_features = n_features or getattr(
+            settings, "OCR_CLASSIFIER_FEATURES", DEFAULT_FEATURES
+        )
+        self.classes = []
+        self.doc_counts = []
+        self.counts = np.zeros((0, self.n_features), np.float32)
+        self.last_receipt_id = 0
+        self._rows = {}
+
+    @classmethod
+    def resume(cls, directory):
+        """Continue from the model in *directory*, if any."""
+        model = CategoryModel.load(directory) if directory else None
+        if model is None:
+            return cls()
+        trainer = cls(model.n_features)
+        trainer.classes = [dict(c) for c in model.meta["classes"]]
+        trainer.doc_counts = list(model.meta["doc_counts"])
+        trainer.counts = np.load(Path(directory) / model.meta["counts"])
+        trainer.last_receipt_id = model.meta["last_receipt_id"]
+        trainer._rows = {c["id"]: i for i, c in enumerate(trainer.classes)}
+        return trainer
+
+    def _row(self, category_id, name):
+        row = self._rows.get(category_id)
+        if row is None:
+            row = self._rows[category_id] = len(self.classes)
+            self.classes.append({"id": category_id, "name": name})
+            self.doc_counts.append(0)
+            self.counts = np.vstack([self.counts, np.zeros((1, self.n_features), np.float32)])
+        else:
+            self.classes[row]["name"] = name
+        return row
+
+    def add(self, text, category_id, name):
+        indices, counts = features(text, self.n_features)
+        if not len(indices):
+            return False
+        row = self._row(category_id, name)
+        self.counts[row, indices] += counts
+        self.doc_counts[row] += 1
+        return True
+
+    def log_prob(self):
+        smoothed = self.counts.astype(np.float64) + ALPHA
+        smoothed /= smoothed.sum(axis=1, keepdims=True)
+        return np.log(smoothed).astype(np.float32)
+
+    def model(self):
+        """The in-memory model, e.g. for evaluation without saving."""
+        return CategoryModel(self._meta(None), self.log_prob())
+
+    def _meta(self, generation):
+        return {
+            "version": FORMAT_VERSION,
+            "n_features": self.n_features,
+            "alpha": ALPHA,
+            "classes": self.classes,
+            "doc_counts": self.doc_counts,
+            "last_receipt_id": self.last_receipt_id,
+            "generation": generation,
+            "log_prob": f"log_prob.{generation}.npy",
+            "counts": f"counts.{generation}.npy",
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def save(self, directory):
+        """Write a new generation, switch ``meta.json`` to it atomically,
+        then remove older generations."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        generation = time.time_ns()
+        meta = self._meta(generation)
+        np.save(directory / meta["counts"], self.counts)
+        np.save(directory / meta["log_prob"], self.log_prob())
+
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, directory / "meta.json")
+
+        # processes still mapping an old file keep it until they reload
+        keep = {meta["counts"], meta["log_prob"]}
+        for path in directory.glob("*.npy"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+        return meta
+
+
+def training_rows(after_id=0):
+    """``(receipt id, category id, category name, text)`` for categorised
+    receipts with OCR text, oldest first."""
+    from billing.models import Receipt
+
+    return (
+        Receipt.objects.filter(id__gt=after_id, category__isnull=False)
+        .exclude(raw_ocr_text__isnull=True)
+        .exclude(raw_ocr_text="")
+        .order_by("id")
+        .values_list("id", "category_id", "category__name", "raw_ocr_text")
+        .iterator(chunk_size=500)
+    )
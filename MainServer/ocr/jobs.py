@@ -0,0 +1,226 @@
+"""
+Database-backed OCR job queue.
+
+Web requests call :func:`submit_job` and return immediately; a pool of
+local worker threads (``manage.py ocr_worker``) drains the queue with
+:func:`claim_next_job` / :func:`run_job`.  Claiming uses
+``SELECT … FOR UPDATE SKIP LOCKED`` so several worker processes can
+share one table safely.  A RUNNING job whose worker looks dead is
+claimed again; each claim gets a new ``claim_token`` and only the worker
+holding the current one stores the outcome, so a slow worker that was
+presumed dead cannot overwrite its successor.  A job that fails because
+the OCR model server is unreachable is queued again, claimable
+``OCR_JOB_RETRY_DELAY`` seconds later, until ``OCR_JOB_MAX_ATTEMPTS``
+claims have been used.
+
+Layout templates are learned on the same queue (:func:`submit_learning`)
+rather than in the request that saves the receipt.
+"""
+
+import logging
+import secrets
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import templates
+from .model_server import OcrServerError
+from .models import OcrJob
+from .pipeline import process_receipt
+from .serializers import OCRResultSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by :func:`submit_job` when the backlog limit is reached."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def pending_count() -> int:
+    return OcrJob.objects.filter(
+        kind=OcrJob.OCR, status__in=[OcrJob.QUEUED, OcrJob.RUNNING]
+    ).count()
+
+
+def submit_job(image, owner=None) -> OcrJob:
+    """
+    Persist *image* and enqueue it for *owner* (a user, or ``None``; an
+    anonymous job gets a random ``poll_secret``).  Raises
+    :class:`QueueFull` when ``OCR_JOB_QUEUE_MAX`` jobs are already
+    waiting or running.
+    """
+    if pending_count() >= _setting("OCR_JOB_QUEUE_MAX", 50):
+        raise QueueFull()
+    secret = "" if owner is not None else secrets.token_urlsafe(32)
+    return OcrJob.objects.create(image=image, owner=owner, poll_secret=secret)
+
+
+def submit_learning(receipt) -> OcrJob:
+    """
+    Enqueue learning *receipt*'s layout into its seller's template.  Not
+    limited by ``OCR_JOB_QUEUE_MAX``: the receipt is already saved.
+    """
+    return OcrJob.objects.create(kind=OcrJob.LEARN_LAYOUT, receipt=receipt)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest QUEUED job (or a RUNNING job whose worker
+    died, see ``OCR_JOB_STALE_SECONDS``) to RUNNING and return it.  A job
+    queued again after a failed attempt waits ``OCR_JOB_RETRY_DELAY``
+    seconds from that attempt's start.  Returns ``None`` when the queue
+    is empty.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(
+        seconds=_setting("OCR_JOB_STALE_SECONDS", 300)
+    )
+    retry_before = now - timedelta(
+        seconds=_setting("OCR_JOB_RETRY_DELAY", 10)
+    )
+    max_attempts = _setting("OCR_JOB_MAX_ATTEMPTS", 3)
+
+    # give up on jobs that keep killing their worker
+    OcrJob.objects.filter(
+        status=OcrJob.RUNNING,
+        started_at__lt=stale_before,
+        attempts__gte=max_attempts,
+    ).update(
+        status=OcrJob.FAILED,
+        error="OCR worker stopped before the job finished.",
+        finished_at=now,
+        claim_token=None,
+    )
+
+    with transaction.atomic():
+        job = (
+            OcrJob.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=max_attempts)
+            .filter(
+                Q(status=OcrJob.QUEUED, started_at__isnull=True)
+                | Q(status=OcrJob.QUEUED, started_at__lt=retry_before)
+                | Q(status=OcrJob.RUNNING, started_at__lt=stale_before)
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = OcrJob.RUNNING
+        job.started_at = now
+        job.attempts += 1
+        job.claim_token = uuid.uuid4()
+        job.save(update_fields=["status", "started_at", "attempts", "claim_token"])
+    return job
+
+
+def run_job(job: OcrJob) -> OcrJob:
+    """
+    Run the OCR pipeline (or, for a LEARN_LAYOUT job, learn the receipt's
+    layout) for a claimed job and store the outcome, unless the job has
+    been claimed again (or given up on) in the meantime.  An unreachable
+    model server is not the image's fault: the job is queued again while
+    it has attempts left.
+    """
+    try:
+        if job.kind == OcrJob.LEARN_LAYOUT:
+            job.result = {"learned": templates.learn_receipt(job.receipt)}
+        else:
+            with job.image.open("rb") as fh:
+                payload = process_receipt(fh)
+            job.result = OCRResultSerializer(payload).data
+        job.status = OcrJob.DONE
+        job.error = ""
+    except OcrServerError as exc:
+        retry = job.attempts < _setting("OCR_JOB_MAX_ATTEMPTS", 3)
+        logger.warning(
+            "OCR job %s: model server unavailable (attempt %s)%s",
+            job.id, job.attempts, ", will retry" if retry else "", exc_info=True,
+        )
+        job.status = OcrJob.QUEUED if retry else OcrJob.FAILED
+        job.error = f"OCR service unavailable: {exc}"
+    except Exception as exc:
+        logger.exception("OCR job %s failed", job.id)
+        job.status = OcrJob.FAILED
+        job.error = str(exc) or exc.__class__.__name__
+
+    claim = OcrJob.objects.filter(pk=job.pk, claim_token=job.claim_token)
+    if job.status == OcrJob.QUEUED:
+        # released: the next claim issues a new token
+        if not claim.update(status=job.status, error=job.error, claim_token=None):
+            logger.warning("OCR job %s was claimed again; not queueing it", job.id)
+        job.claim_token = None
+        return job
+
+    job.finished_at = timezone.now()
+    stored = claim.update(
+        result=job.result, status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    if not stored:
+        logger.warning("OCR job %s was claimed again; discarding this attempt's outcome", job.id)
+        return job
+
+    # the upload is only needed while the job is in flight
+    if job.image:
+        job.image.delete(save=False)
+        OcrJob.objects.filter(pk=job.pk).update(image="")
+    return job
+
+
+class WorkerPool:
+    """
+    ``concurrency`` threads that each poll the queue, sleeping
+    ``poll_interval`` seconds when it is empty.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None):
+        self.concurrency = concurrency or _setting("OCR_JOB_CONCURRENCY", 2)
+        self.poll_interval = (
+            poll_interval
+            if poll_interval is not None
+            else _setting("OCR_JOB_POLL_INTERVAL", 1.0)
+        )
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _loop(self, drain):
+        while not self._stop.is_set():
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if drain:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+            run_job(job)
+        close_old_connections()
+
+    def start(self, drain=False):
+        for i in range(self.concurrency):
+            t = threading.Thread(
+                target=self._loop,
+                args=(drain,),
+                name=f"ocr-worker-{i}",
+                daemon=True,
+            )
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+
+    def is_alive(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
@@ -0,0 +1,218 @@
+"""
+Column-aware layout reconstruction from EasyOCR box geometry.
+
+``_ordered_lines`` flattens every y-band into one string, so two-column
+invoices (item | amount tables, side-by-side seller / buyer blocks) come
+out interleaved.  :func:`analyze_layout` keeps the geometry instead::
+
+    {
+        "rows": [
+            {
+                "bbox": [x0, y0, x1, y1],
+                "region": 0,                   # or None
+                "cells": [
+                    {"text": "..", "conf": 0.93, "bbox": [..],
+                     "column": 0, "span": 1},
+                ],
+            },
+        ],
+        "regions": [
+            {"start": 4, "end": 9,             # row range
+             "kind": "table",                  # or "text"
+             "columns": [[x0, x1], ...]},
+        ],
+    }
+
+* rows    – boxes whose centres share a y-band (same rule as
+            ``_ordered_lines``);
+* cells   – boxes in a row closer than about one text height, merged;
+* regions – runs of two or more multi-cell rows that share one set of
+            column gutters (x-gaps no cell crosses).  ``table`` regions
+            have numbers in most rows (item / amount tables); ``text``
+            regions are side-by-side blocks such as seller | buyer.
+            A cell's ``column`` indexes its region's ``columns``.
+
+Everything is sorting plus linear sweeps, so O(N log N) in the number of
+boxes.
+"""
+
+import re
+from bisect import bisect_right
+
+import numpy as np
+
+# cells closer than this × median text height belong together
+CELL_GAP_FACTOR = 1.0
+# a gutter is at least this × median text height wide
+GUTTER_FACTOR = 1.0
+
+NUMBER_RE = re.compile(r"\d[\d,]*\.\d{2}\b|^\d+$")
+
+
+def _round(values):
+    return [round(float(v), 1) for v in values]
+
+
+def _box_arrays(raw):
+    corners = np.array(
+        [c for bbox, _, _ in raw for point in bbox for c in point],
+        dtype=np.float64,
+    ).reshape(len(raw), -1, 2)
+    xs, ys = corners[:, :, 0], corners[:, :, 1]
+    return xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)
+
+
+def _group_rows(cy, tol):
+    """Indices grouped into rows: boxes sorted by centre-y join the
+    current row while within *tol* of its running mean centre."""
+    order = np.argsort(cy, kind="stable").tolist()
+    cy = cy.tolist()
+    rows, current, mean = [], [], None
+    for i in order:
+        y = cy[i]
+        if mean is not None and abs(y - mean) <= tol:
+            current.append(i)
+            mean += (y - mean) / len(current)
+        else:
+            if current:
+                rows.append(current)
+            current, mean = [i], y
+    if current:
+        rows.append(current)
+    return rows
+
+
+def _merge_cells(members, x0, y0, x1, y1, texts, confs, gap):
+    members = sorted(members, key=lambda i: x0[i])
+    cells = []
+    for i in members:
+        if cells and x0[i] - cells[-1]["x1"] < gap:
+            cell = cells[-1]
+            cell["parts"].append(i)
+            cell["x1"] = max(cell["x1"], x1[i])
+        else:
+            cells.append({"parts": [i], "x0": x0[i], "x1": x1[i]})
+
+    out = []
+    for cell in cells:
+        parts = cell["parts"]
+        out.append({
+            "text": " ".join(texts[i] for i in parts).strip(),
+            "conf": round(sum(confs[i] for i in parts) / len(parts), 4),
+            "bbox": _round([
+                cell["x0"],
+                min(y0[i] for i in parts),
+                cell["x1"],
+                max(y1[i] for i in parts),
+            ]),
+        })
+    return out
+
+
+def _merge_spans(spans, min_gutter):
+    """Union of x-intervals; gaps narrower than *min_gutter* are closed."""
+    merged = []
+    for a, b in sorted(spans):
+        if merged and a - merged[-1][1] < min_gutter:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
+
+
+def _cell_spans(row):
+    return [[c["bbox"][0], c["bbox"][2]] for c in row["cells"]]
+
+
+def _find_regions(rows, min_gutter):
+    """
+    Runs of consecutive multi-cell rows sharing one column structure.  A
+    row joins the current region when adding its cells leaves the number
+    of columns unchanged, i.e. every cell lands inside an existing column
+    and none bridges a gutter.
+    """
+    regions, current = [], None
+
+    def close():
+        if current and current["end"] - current["start"] >= 2:
+            regions.append(current)
+
+    for i, row in enumerate(rows):
+        if len(row["cells"]) < 2:
+            close()
+            current = None
+            continue
+        spans = _cell_spans(row)
+        if current is not None:
+            merged = _merge_spans(current["columns"] + spans, min_gutter)
+            if len(merged) == len(current["columns"]):
+                current["columns"], current["end"] = merged, i + 1
+                continue
+            close()
+        current = {"start": i, "end": i + 1, "columns": _merge_spans(spans, min_gutter)}
+    close()
+    return regions
+
+
+def _assign_columns(cells, columns):
+    starts = [c[0] for c in columns]
+    for cell in cells:
+        x0, _, x1, _ = cell["bbox"]
+        first = max(0, bisect_right(starts, x0 + 0.5) - 1)
+        last = max(first, bisect_right(starts, x1 - 0.5) - 1)
+        cell["column"] = first
+        cell["span"] = last - first + 1
+
+
+def _is_numeric(text):
+    return bool(NUMBER_RE.search(text))
+
+
+def analyze_layout(raw, line_tol_factor=0.7) -> dict:
+    """Rows, cells, columns and tables for EasyOCR ``raw`` results."""
+    if not raw:
+        return {"rows": [], "regions": []}
+
+    texts = [str(text) for _, text, _ in raw]
+    confs = [float(conf) for _, _, conf in raw]
+    x0, y0, x1, y1 = _box_arrays(raw)
+    med_h = float(np.median(np.maximum(y1 - y0, 1.0)))
+    groups = _group_rows((y0 + y1) / 2, line_tol_factor * med_h)
+    # plain lists from here on: per-element numpy indexing is slow
+    x0, y0, x1, y1 = x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist()
+
+    rows = []
+    for members in groups:
+        cells = _merge_cells(
+            members, x0, y0, x1, y1, texts, confs, CELL_GAP_FACTOR * med_h
+        )
+        rows.append({
+            "bbox": _round([
+                min(x0[i] for i in members),
+                min(y0[i] for i in members),
+                max(x1[i] for i in members),
+                max(y1[i] for i in members),
+            ]),
+            "cells": cells,
+        })
+
+    regions = _find_regions(rows, GUTTER_FACTOR * med_h)
+    for index, region in enumerate(regions):
+        region_rows = rows[region["start"]:region["end"]]
+        numeric = sum(
+            1 for row in region_rows if any(_is_numeric(c["text"]) for c in row["cells"])
+        )
+        region["kind"] = "table" if 2 * numeric >= len(region_rows) else "text"
+        region["columns"] = [_round(c) for c in region["columns"]]
+        for row in region_rows:
+            row["region"] = index
+            _assign_columns(row["cells"], region["columns"])
+
+    # rows outside any region: cells numbered left to right
+    for row in rows:
+        if "region" not in row:
+            row["region"] = None
+            for n, cell in enumerate(row["cells"]):
+                cell["column"], cell["span"] = n, 1
+
+    return {"rows": rows, "regions": regions}
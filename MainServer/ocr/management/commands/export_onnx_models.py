@@ -0,0 +1,98 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr.benchmarks.corpus import build_variant_corpus
+from ocr.onnx_backend import (
+    MANIFEST,
+    OPSET,
+    _torch_reader,
+    compare_networks,
+    compare_readers,
+    export_models,
+    load_onnx_reader,
+)
+
+# an fp32 export must reproduce torch; anything looser is an export bug
+_FP32_MAX_DIFF = 1e-3
+_FP32_MIN_AGREEMENT = 0.999
+
+
+class Command(BaseCommand):
+    help = (
+        "Export EasyOCR's detector and recognizer to ONNX (plus int8 "
+        "copies) for OCR_BACKEND=onnx, then check them against the torch "
+        "networks and on synthetic receipts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Directory for the models (default: OCR_ONNX_DIR)")
+        parser.add_argument("--no-quantize", action="store_true", help="Export fp32 models only")
+        parser.add_argument("--opset", type=int, default=OPSET)
+        parser.add_argument(
+            "--validate",
+            type=int,
+            default=12,
+            metavar="N",
+            help="Synthetic receipts to compare with the torch reader (0 = skip; default: 12)",
+        )
+        parser.add_argument(
+            "--max-accuracy-drop",
+            type=float,
+            default=0.02,
+            help="Largest drop in parsed-field accuracy accepted from int8 (default: 0.02)",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["output"] or getattr(settings, "OCR_ONNX_DIR", None)
+        if not directory:
+            raise CommandError("Pass --output or set OCR_ONNX_DIR")
+        try:
+            import onnx  # noqa: F401  (torch.onnx.export needs it)
+            import onnxruntime  # noqa: F401
+        except ImportError as exc:
+            raise CommandError(f"{exc.name} is not installed (see requirements.txt)")
+
+        manifest = export_models(directory, quantize=not options["no_quantize"], opset=options["opset"])
+        for name, entry in manifest["files"].items():
+            self.stdout.write(f"{name:<16} {entry['bytes'] / 2 ** 20:8.1f} MB  {entry['file']}")
+
+        variants = [False] if options["no_quantize"] else [False, True]
+        validation = {}
+        for quantized in variants:
+            tag = "onnx-int8" if quantized else "onnx-fp32"
+            validation[tag] = compare_networks(directory, quantized)
+            self.stdout.write(f"{tag}: {validation[tag]}")
+        fp32 = validation["onnx-fp32"]
+        if (
+            fp32["detector_max_abs_diff"] > _FP32_MAX_DIFF
+            or fp32["recognizer_argmax_agreement"] < _FP32_MIN_AGREEMENT
+        ):
+            raise CommandError(f"The fp32 export does not match the torch networks: {fp32}")
+
+        if options["validate"]:
+            readers = {"torch": _torch_reader(quantize=True)}
+            for quantized in variants:
+                tag = "onnx-int8" if quantized else "onnx-fp32"
+                readers[tag] = load_onnx_reader(directory, quantized=quantized)
+            corpus = build_variant_corpus(options["validate"], seed=0)
+            validation["receipts"] = compare_readers(readers, corpus)
+            for name, row in validation["receipts"].items():
+                self.stdout.write(
+                    f"{name:<10} fields right {row['fields']:.1%}, "
+                    f"text similarity to torch {row['text_similarity']}"
+                )
+            if "onnx-int8" in readers:
+                drop = validation["receipts"]["torch"]["fields"] - validation["receipts"]["onnx-int8"]["fields"]
+                if drop > options["max_accuracy_drop"]:
+                    raise CommandError(
+                        f"int8 models parse {drop:.1%} fewer fields right than torch; "
+                        "use OCR_ONNX_QUANTIZED=False or raise --max-accuracy-drop"
+                    )
+
+        manifest["validation"] = validation
+        with open(os.path.join(directory, MANIFEST), "w") as fh:
+            json.dump(manifest, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"ONNX models written to {directory}"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from billing.models import Receipt
+from ocr.models import SellerLayoutTemplate
+from ocr.templates import learn_receipt, store
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every seller's layout template from its saved receipts. "
+        "Receipts are read from the OCR result cache unless --ocr is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ocr",
+            action="store_true",
+            help="OCR receipt images missing from the result cache (slow)",
+        )
+
+    def handle(self, *args, **options):
+        deleted, _ = SellerLayoutTemplate.objects.all().delete()
+        store.forget()
+
+        receipts = (
+            Receipt.objects.exclude(receipt_image="")
+            .exclude(receipt_image__isnull=True)
+            .select_related("seller", "buyer")
+            .order_by("pk")
+        )
+        learned = skipped = 0
+        for receipt in receipts.iterator():
+            if learn_receipt(receipt, run_ocr=options["ocr"]):
+                learned += 1
+            else:
+                skipped += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Learned {learned} receipt(s) into "
+                f"{SellerLayoutTemplate.objects.count()} template(s) "
+                f"(replaced {deleted}); skipped {skipped} without a seller TIN or OCR result"
+            )
+        )
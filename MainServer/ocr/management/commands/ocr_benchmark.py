@@ -0,0 +1,110 @@
+import importlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run an OCR benchmark suite on synthetic receipts and print a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES))
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=8,
+            help="Number of synthetic receipts (default: 8)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--sizes",
+            default=None,
+            help=(
+                "Comma-separated max long edges for the preprocess suite (0 = off), "
+                "or first-pass long edges for the progressive suite"
+            ),
+        )
+        parser.add_argument(
+            "--combos",
+            default=None,
+            help="Comma-separated WORKERSxTHREADS pairs for the threads suite, e.g. 1x4,2x2,4x1",
+        )
+        parser.add_argument(
+            "--ocr",
+            choices=("easyocr", "oracle"),
+            default="easyocr",
+            help=(
+                "pipeline and templates suites: run EasyOCR, or use the rendered text boxes "
+                "(no models needed)"
+            ),
+        )
+        parser.add_argument(
+            "--backends",
+            default=None,
+            help="Comma-separated backends for the backends suite: torch, onnx-fp32, onnx-int8",
+        )
+        parser.add_argument(
+            "--fonts",
+            default=None,
+            help="Comma-separated fonts for the pipeline suite: sans, bold, dotmatrix or .ttf paths",
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="PATH",
+            help="Compare the report with a baseline JSON report (suites with compare())",
+        )
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        module = importlib.import_module(SUITES[options["suite"]])
+
+        kwargs = {"images": options["images"], "seed": options["seed"]}
+        if options["sizes"]:
+            try:
+                kwargs["sizes"] = [int(s) for s in options["sizes"].split(",")]
+            except ValueError:
+                raise CommandError("--sizes must be comma-separated integers")
+
+        if options["combos"]:
+            try:
+                kwargs["combos"] = [
+                    tuple(int(n) for n in combo.lower().split("x"))
+                    for combo in options["combos"].split(",")
+                ]
+            except ValueError:
+                raise CommandError("--combos must look like 1x4,2x2")
+
+        if options["backends"]:
+            kwargs["backends"] = [b.strip() for b in options["backends"].split(",")]
+
+        if options["suite"] in ("pipeline", "templates"):
+            kwargs["ocr"] = options["ocr"]
+        if options["suite"] == "pipeline":
+            if options["fonts"]:
+                kwargs["fonts"] = options["fonts"].split(",")
+
+        baseline = None
+        if options["compare"]:
+            if not hasattr(module, "compare"):
+                raise CommandError(f"The {options['suite']} suite cannot compare reports")
+            try:
+                with open(options["compare"], encoding="utf-8") as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read {options['compare']}: {exc}")
+
+        report = module.run(**kwargs)
+        if baseline is not None:
+            report["compare"] = module.compare(report, baseline)
+
+        if hasattr(module, "format_rows"):
+            for line in module.format_rows(report):
+                self.stdout.write(line)
+        payload = json.dumps(report, indent=2)
+        self.stdout.write(payload)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
@@ -0,0 +1,55 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr.model_server import OcrModelServer
+from ocr.services import load_local_reader, warm_up_reader
+
+
+class Command(BaseCommand):
+    help = "Run the OCR model server that holds the shared EasyOCR reader"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "OCR_SERVER_SOCKET", None),
+            help="Unix socket path (default: OCR_SERVER_SOCKET)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "OCR_SERVER_CONCURRENCY", 2),
+            help="Inferences run at once (default: OCR_SERVER_CONCURRENCY)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["socket"]
+        if not path:
+            raise CommandError("Set OCR_SERVER_SOCKET or pass --socket")
+
+        self.stdout.write("Loading EasyOCR models…")
+        reader = load_local_reader()
+        warm_up_reader(reader)
+        server = OcrModelServer(path, reader, options["concurrency"])
+
+        def _shutdown(signum, frame):
+            self.stdout.write("Stopping OCR server…")
+            # shutdown() blocks until serve_forever returns; not from its own thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"OCR server listening on {path} "
+                f"({server.concurrency} concurrent inference(s))"
+            )
+        )
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        self.stdout.write(self.style.SUCCESS("OCR server stopped"))
@@ -0,0 +1,48 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ocr.jobs import WorkerPool
+from ocr.services import warm_up
+
+
+class Command(BaseCommand):
+    help = "Run a pool of local OCR workers that drain the OcrJob queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "OCR_JOB_CONCURRENCY", 2),
+            help="Number of worker threads (default: OCR_JOB_CONCURRENCY)",
+        )
+        parser.add_argument(
+            "--drain",
+            action="store_true",
+            help="Process everything currently queued, then exit",
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, "OCR_WARM_START", False):
+            self.stdout.write("Warming up the OCR reader…")
+            warm_up()
+
+        pool = WorkerPool(concurrency=options["concurrency"])
+
+        def _shutdown(signum, frame):
+            self.stdout.write("Stopping OCR workers…")
+            pool.stop()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"OCR worker pool started with {pool.concurrency} thread(s)"
+            )
+        )
+        pool.start(drain=options["drain"])
+        while pool.is_alive():
+            pool.join(timeout=1.0)
+        self.stdout.write(self.style.SUCCESS("OCR workers stopped"))
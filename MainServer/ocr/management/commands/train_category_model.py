@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr.categorizer import category_candidates
+from ocr.classifier import Trainer, model_dir, training_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the expense-category classifier from categorised receipts. "
+        "By default only receipts saved since the last run are added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Retrain from scratch (picks up re-categorised receipts)",
+        )
+        parser.add_argument(
+            "--evaluate",
+            action="store_true",
+            help="Hold out every 5th receipt, report top-1 / top-3 accuracy "
+                 "against the keyword matcher and save nothing",
+        )
+
+    def handle(self, *args, **options):
+        if options["evaluate"]:
+            return self._evaluate()
+
+        directory = model_dir()
+        if directory is None:
+            raise CommandError("OCR_CLASSIFIER_DIR is not set")
+
+        trainer = Trainer() if options["full"] else Trainer.resume(directory)
+        start = trainer.last_receipt_id
+        added = 0
+        for receipt_id, category_id, name, text in training_rows(after_id=start):
+            added += trainer.add(text, category_id, name)
+            trainer.last_receipt_id = receipt_id
+
+        if not added and trainer.last_receipt_id == start:
+            self.stdout.write("No new categorised receipts since the last run")
+            return
+
+        meta = trainer.save(directory)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Trained on {added} new receipt(s); model has "
+                f"{sum(meta['doc_counts'])} receipt(s) in {len(meta['classes'])} "
+                f"categories → {directory}"
+            )
+        )
+
+    def _evaluate(self):
+        trainer, held_out = Trainer(), []
+        for n, (_, category_id, name, text) in enumerate(training_rows()):
+            if n % 5 == 4:
+                held_out.append((category_id, text))
+            else:
+                trainer.add(text, category_id, name)
+        if not held_out or not trainer.classes:
+            raise CommandError("Not enough categorised receipts to evaluate")
+
+        model = trainer.model()
+        top1 = top3 = keyword = 0
+        for category_id, text in held_out:
+            ids = [p["id"] for p in model.predict(text, k=3)]
+            top1 += ids[:1] == [category_id]
+            top3 += category_id in ids
+            matched = category_candidates(text, limit=1)
+            keyword += bool(matched) and matched[0]["id"] == category_id
+
+        total = len(held_out)
+        self.stdout.write(f"held-out receipts      {total}")
+        self.stdout.write(f"classifier top-1       {top1 / total:.1%}")
+        self.stdout.write(f"classifier top-3       {top3 / total:.1%}")
+        self.stdout.write(f"keyword matcher top-1  {keyword / total:.1%}")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0003_seller_updated_at_idx'),
+        ('ocr', '0001_initial'),
+        ('printing', '0002_atp_number_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerLayoutTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tin', models.CharField(blank=True, max_length=12)),
+                ('header_key', models.CharField(blank=True, max_length=255)),
+                ('receipts', models.PositiveIntegerField(default=0)),
+                ('layout', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('atp', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='printing.printeraccreditation')),
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='layout_template', to='businesses.seller')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr', '0003_ocrjob_owner_claim_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrjob',
+            name='poll_secret',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
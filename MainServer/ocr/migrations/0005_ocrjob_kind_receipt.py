@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_receipt_fingerprint'),
+        ('ocr', '0004_ocrjob_poll_secret'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrjob',
+            name='kind',
+            field=models.CharField(choices=[('OCR', 'Receipt OCR'), ('LEARN_LAYOUT', 'Learn layout template')], default='OCR', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='ocrjob',
+            name='receipt',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='billing.receipt'),
+        ),
+    ]
@@ -0,0 +1,222 @@
+"""
+Local OCR model server.
+
+One process (``manage.py ocr_server``) holds the only ``easyocr.Reader``
+and answers detect / recognise requests over a Unix socket.  Web and
+job workers talk to it through :class:`RemoteReader`, which mimics the
+parts of the EasyOCR reader API ``ocr.services`` uses, so gunicorn
+workers never load PyTorch weights themselves.  OCR concurrency is set
+by ``OCR_SERVER_CONCURRENCY`` independently of the HTTP worker count.
+
+Wire format – every message, in both directions, is one frame::
+
+    !I header length | JSON header | raw array bytes
+
+The header describes the arrays (``dtype`` / ``shape``) that follow it,
+so images cross the socket as raw pixels with no pickling or encoding.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_LEN = struct.Struct("!I")
+
+
+class OcrServerError(RuntimeError):
+    """The OCR server could not be reached or failed the request."""
+
+
+# ── framing ─────────────────────────────────────────────────────────
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:], size - got)
+        if not n:
+            raise ConnectionError("OCR server connection closed")
+        got += n
+    return buf
+
+
+def send_message(sock, header, arrays=()):
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    header = dict(header, arrays=[{"dtype": a.dtype.str, "shape": a.shape} for a in arrays])
+    blob = json.dumps(header).encode()
+    sock.sendall(_LEN.pack(len(blob)) + blob)
+    for a in arrays:
+        # memoryview cannot cast an empty array; it has no bytes anyway
+        if a.size:
+            sock.sendall(memoryview(a).cast("B"))
+
+
+def recv_message(sock):
+    (size,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, size))
+    arrays = []
+    for spec in header.pop("arrays", []):
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        data = _recv_exact(sock, count * dtype.itemsize)
+        arrays.append(np.frombuffer(data, dtype=dtype).reshape(spec["shape"]))
+    return header, arrays
+
+
+def _plain(value):
+    """numpy scalars / arrays / tuples → JSON-friendly values."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+# ── server ──────────────────────────────────────────────────────────
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves requests on one client connection until it closes."""
+
+    def handle(self):
+        while True:
+            try:
+                header, arrays = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply = {"ok": True, "result": self.server.dispatch(header, arrays)}
+            except Exception as exc:
+                logger.exception("OCR server request failed")
+                reply = {"ok": False, "error": str(exc) or exc.__class__.__name__}
+            try:
+                send_message(self.request, reply)
+            except OSError:
+                return
+
+
+class OcrModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded Unix-socket server around one shared reader.  A semaphore
+    caps how many inferences run at once; torch releases the GIL, so
+    ``concurrency`` threads really do run in parallel.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, reader, concurrency=None):
+        if os.path.exists(path):
+            os.unlink(path)  # left behind by a previous run
+        self.reader = reader
+        self.concurrency = concurrency or getattr(settings, "OCR_SERVER_CONCURRENCY", 2)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        super().__init__(path, _Handler)
+
+    def dispatch(self, header, arrays):
+        op = header.get("op")
+        if op == "ping":
+            return "pong"
+
+        with self._slots:
+            if op == "detect":
+                horizontal, free = self.reader.detect(arrays[0], reformat=False)
+                return [_plain(horizontal), _plain(free)]
+            if op == "recognize":
+                raw = self.reader.recognize(
+                    arrays[0], header["horizontal_list"], header["free_list"],
+                    reformat=False,
+                )
+                return _plain(raw)
+            if op == "readtext":
+                # encoded image file bytes; EasyOCR decodes them itself
+                return _plain(self.reader.readtext(arrays[0].tobytes()))
+        raise ValueError(f"Unknown OCR server op: {op!r}")
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+# ── client ──────────────────────────────────────────────────────────
+class RemoteReader:
+    """
+    Drop-in for the ``easyocr.Reader`` methods used by ``ocr.services``
+    (``detect``, ``recognize``, ``readtext``), forwarding each call to
+    the OCR server.  Each thread keeps its own connection.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout or getattr(settings, "OCR_SERVER_TIMEOUT", 120)
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as exc:
+            sock.close()
+            raise OcrServerError(f"OCR server unavailable at {self.path}: {exc}") from exc
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _call(self, header, arrays=()):
+        # one reconnect covers a server restart between requests
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            if fresh:
+                sock = self._local.sock = self._connect()
+            try:
+                send_message(sock, header, arrays)
+                reply, _ = recv_message(sock)
+                break
+            except socket.timeout as exc:
+                self._drop()
+                raise OcrServerError("OCR server timed out") from exc
+            except (ConnectionError, OSError) as exc:
+                self._drop()
+                if fresh or attempt == 2:
+                    raise OcrServerError(f"OCR server connection failed: {exc}") from exc
+
+        if not reply["ok"]:
+            raise OcrServerError(reply["error"])
+        return reply["result"]
+
+    def ping(self):
+        return self._call({"op": "ping"}) == "pong"
+
+    def detect(self, img, reformat=False, **kwargs):
+        horizontal, free = self._call({"op": "detect"}, [img])
+        return horizontal, free
+
+    def recognize(self, grey, horizontal_list, free_list, reformat=False, **kwargs):
+        raw = self._call(
+            {"op": "recognize", "horizontal_list": horizontal_list, "free_list": free_list},
+            [grey],
+        )
+        return [(bbox, text, conf) for bbox, text, conf in raw]
+
+    def readtext(self, image, **kwargs):
+        with open(image, "rb") as fh:
+            data = np.frombuffer(fh.read(), np.uint8)
+        raw = self._call({"op": "readtext"}, [data])
+        return [(bbox, text, conf) for bbox, text, conf in raw]
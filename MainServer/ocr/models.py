@@ -1,3 +1,113 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class OcrJob(models.Model):
+    """
+    A queued receipt OCR request.  The database row *is* the queue:
+    web workers insert QUEUED rows and ``manage.py ocr_worker`` claims
+    them, so no Redis / broker is needed.  A job is only shown to the
+    user who submitted it (``owner``), or for an anonymous upload to a
+    request carrying its ``poll_secret``.
+
+    The same workers learn layout templates from saved receipts
+    (``LEARN_LAYOUT`` jobs, see ``ocr.templates.learn_receipt``), so
+    saving a receipt does not wait for it.
+    """
+
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    OCR = "OCR"
+    LEARN_LAYOUT = "LEARN_LAYOUT"
+
+    KIND_CHOICES = [
+        (OCR, "Receipt OCR"),
+        (LEARN_LAYOUT, "Learn layout template"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default=OCR)
+    image = models.ImageField(upload_to="ocr_jobs/%Y/%m/", null=True, blank=True)
+    # LEARN_LAYOUT jobs only: the saved receipt to learn from
+    receipt = models.ForeignKey(
+        "billing.Receipt",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # new on every claim; only the worker holding it may store the outcome
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # anonymous jobs only: returned once, on submit
+    poll_secret = models.CharField(max_length=64, blank=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="ocrjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"OCR job {self.id} ({self.status})"
+
+
+class SellerLayoutTemplate(models.Model):
+    """
+    Where the fields sit on one seller's receipts, learned from its
+    confirmed receipts (see ``ocr.templates``).  ``tin`` and
+    ``header_key`` identify the seller from a new receipt's header.
+    """
+
+    seller = models.OneToOneField(
+        "businesses.Seller",
+        on_delete=models.CASCADE,
+        related_name="layout_template",
+    )
+    tin = models.CharField(max_length=12, blank=True)
+    header_key = models.CharField(max_length=255, blank=True)
+    # the printer details of the latest confirmed receipt
+    atp = models.ForeignKey(
+        "printing.PrinterAccreditation",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    receipts = models.PositiveIntegerField(default=0)
+    layout = models.JSONField(default=dict)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Layout template for seller {self.seller_id} ({self.receipts} receipts)"
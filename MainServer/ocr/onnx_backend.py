@@ -0,0 +1,290 @@
+"""
+ONNX Runtime inference for EasyOCR (``OCR_BACKEND = "onnx"``).
+
+``manage.py export_onnx_models`` exports the CRAFT detector and the CRNN
+recognizer of the English reader to ONNX and quantises their weights to
+int8 (onnxruntime dynamic quantisation).  :func:`load_onnx_reader` builds
+an ``easyocr.Reader`` without its torch networks and plugs ONNX Runtime
+sessions in their place.  Everything around the networks – resizing,
+box merging, CTC decoding, confidences – stays EasyOCR's own code, so
+``detect`` / ``recognize`` / ``readtext`` return the same
+``(bbox, text, conf)`` tuples ``_ordered_lines`` expects.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import torch
+from django.conf import settings
+
+DETECTOR = "detector"
+RECOGNIZER = "recognizer"
+MANIFEST = "manifest.json"
+OPSET = 17
+
+# shapes traced at export; batch, height and width stay dynamic
+_DETECTOR_SAMPLE = (1, 3, 640, 480)
+_RECOGNIZER_SAMPLE = (1, 1, 64, 320)  # grey line crops, EasyOCR's imgH
+
+
+def model_path(directory, name, quantized=True) -> str:
+    return os.path.join(directory, f"{name}.int8.onnx" if quantized else f"{name}.onnx")
+
+
+# ── networks as EasyOCR calls them ──────────────────────────────────
+class OnnxDetector:
+    """Stands in for EasyOCR's CRAFT module: ``net(x) -> (score, feature)``
+    (``detection.test_net`` only reads the score maps)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input = session.get_inputs()[0].name
+        self.output = session.get_outputs()[0].name
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        (score,) = self.session.run([self.output], {self.input: x.numpy()})
+        return torch.from_numpy(score), None
+
+
+class OnnxRecognizer:
+    """Stands in for EasyOCR's recognizer module:
+    ``model(image, text) -> logits`` (``text`` is unused at inference)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input = session.get_inputs()[0].name
+        self.classes = session.get_outputs()[0].shape[-1]
+
+    def eval(self):
+        return self
+
+    def __call__(self, image, text=None):
+        (logits,) = self.session.run(None, {self.input: image.numpy()})
+        return torch.from_numpy(logits)
+
+
+class LineRecognizer(torch.nn.Module):
+    """
+    The recognizer's forward pass for export.  ``AdaptiveAvgPool2d((None,
+    1))`` pools the feature height to 1, i.e. takes its mean, but does not
+    export with a dynamic line width; the mean does.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        m = self.model
+        feature = m.FeatureExtraction(image).permute(0, 3, 1, 2).mean(dim=3)
+        return m.Prediction(m.SequenceModeling(feature).contiguous())
+
+
+def _session(path):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # the same CPU budget as torch inference
+    threads = getattr(settings, "OCR_TORCH_THREADS", 0)
+    interop = getattr(settings, "OCR_INTEROP_THREADS", 0)
+    if threads:
+        options.intra_op_num_threads = threads
+    if interop:
+        options.inter_op_num_threads = interop
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def load_onnx_reader(directory=None, quantized=None):
+    """An ``easyocr.Reader`` running the exported networks on ONNX
+    Runtime (``OCR_ONNX_DIR``; int8 unless ``OCR_ONNX_QUANTIZED`` is off)."""
+    import easyocr
+    from easyocr.config import BASE_PATH
+    from easyocr.detection import get_textbox
+    from easyocr.utils import CTCLabelConverter
+
+    directory = directory or getattr(settings, "OCR_ONNX_DIR", None)
+    if quantized is None:
+        quantized = getattr(settings, "OCR_ONNX_QUANTIZED", True)
+    paths = {name: model_path(directory or "", name, quantized) for name in (DETECTOR, RECOGNIZER)}
+    missing = [path for path in paths.values() if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(
+            f"Missing ONNX model(s) {', '.join(missing)}; run `manage.py export_onnx_models`"
+        )
+
+    # character set, language filter and image height, without the networks
+    reader = easyocr.Reader(["en"], gpu=False, detector=False, recognizer=False, verbose=False)
+    reader.detect_network = "craft"
+    reader.get_textbox = get_textbox
+    reader.converter = CTCLabelConverter(
+        reader.character, {}, {"en": os.path.join(BASE_PATH, "dict", "en.txt")}
+    )
+    reader.detector = OnnxDetector(_session(paths[DETECTOR]))
+    reader.recognizer = OnnxRecognizer(_session(paths[RECOGNIZER]))
+    if reader.recognizer.classes != len(reader.converter.character):
+        raise ValueError(
+            f"{paths[RECOGNIZER]} predicts {reader.recognizer.classes} characters, the installed "
+            f"EasyOCR has {len(reader.converter.character)}; export the models again"
+        )
+    return reader
+
+
+# ── export ──────────────────────────────────────────────────────────
+def _torch_reader(quantize):
+    """EasyOCR as ``ocr.services`` loads it; *quantize* is EasyOCR's own
+    torch dynamic quantisation (on by default, off for export)."""
+    import easyocr
+
+    return easyocr.Reader(
+        ["en"],
+        gpu=False,
+        model_storage_directory=getattr(settings, "EASYOCR_MODEL_DIR", None),
+        quantize=quantize,
+        verbose=False,
+    )
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_models(directory, quantize=True, opset=OPSET) -> dict:
+    """
+    Export the fp32 networks to ``<name>.onnx`` in *directory* and, with
+    *quantize*, int8 copies to ``<name>.int8.onnx``.  Writes and returns
+    the manifest (versions, files and their SHA-256).
+    """
+    import easyocr
+
+    os.makedirs(directory, exist_ok=True)
+    reader = _torch_reader(quantize=False)
+    files = {}
+    with torch.no_grad():
+        path = model_path(directory, DETECTOR, quantized=False)
+        torch.onnx.export(
+            reader.detector.eval(),
+            torch.randn(*_DETECTOR_SAMPLE),
+            path,
+            input_names=["image"],
+            output_names=["score", "feature"],
+            dynamic_axes={
+                "image": {0: "batch", 2: "height", 3: "width"},
+                "score": {0: "batch", 1: "score_height", 2: "score_width"},
+                "feature": {0: "batch", 2: "feature_height", 3: "feature_width"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+        files[DETECTOR] = path
+
+        path = model_path(directory, RECOGNIZER, quantized=False)
+        torch.onnx.export(
+            LineRecognizer(reader.recognizer).eval(),
+            torch.randn(*_RECOGNIZER_SAMPLE),
+            path,
+            input_names=["image"],
+            output_names=["logits"],
+            dynamic_axes={"image": {0: "batch", 3: "width"}, "logits": {0: "batch", 1: "steps"}},
+            opset_version=opset,
+            dynamo=False,
+        )
+        files[RECOGNIZER] = path
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        for name in (DETECTOR, RECOGNIZER):
+            path = model_path(directory, name, quantized=True)
+            quantize_dynamic(files[name], path, weight_type=QuantType.QInt8)
+            files[f"{name}.int8"] = path
+
+    manifest = {
+        "easyocr": easyocr.__version__,
+        "torch": torch.__version__,
+        "opset": opset,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "files": {
+            name: {"file": os.path.basename(path), "bytes": os.path.getsize(path), "sha256": _sha256(path)}
+            for name, path in files.items()
+        },
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+# ── validation ──────────────────────────────────────────────────────
+def compare_networks(directory, quantized, samples=3, seed=0) -> dict:
+    """
+    Raw network outputs of the ONNX models against the fp32 torch ones
+    on random inputs: the largest score-map difference of the detector
+    and the share of recognizer time steps with the same best character.
+    """
+    import numpy as np
+
+    reader = _torch_reader(quantize=False)
+    detector = OnnxDetector(_session(model_path(directory, DETECTOR, quantized)))
+    recognizer = OnnxRecognizer(_session(model_path(directory, RECOGNIZER, quantized)))
+    generator = torch.Generator().manual_seed(seed)
+    score_diff, same, steps = 0.0, 0, 0
+    with torch.no_grad():
+        for n in range(samples):
+            # different sizes exercise the dynamic axes
+            image = torch.rand(1, 3, 480 + 32 * n, 640 - 32 * n, generator=generator)
+            expected = reader.detector(image)[0].numpy()
+            score_diff = max(score_diff, float(np.abs(detector(image)[0].numpy() - expected).max()))
+
+            line = torch.rand(2, 1, 64, 200 + 60 * n, generator=generator)
+            expected = reader.recognizer(line, None).argmax(dim=2)
+            got = recognizer(line).argmax(dim=2)
+            same += int((got == expected).sum())
+            steps += expected.numel()
+    return {"detector_max_abs_diff": round(score_diff, 5), "recognizer_argmax_agreement": round(same / steps, 4)}
+
+
+def compare_readers(readers, corpus) -> dict:
+    """
+    OCR *corpus* (``build_variant_corpus`` items) with each of *readers*
+    (``{name: reader}``, the first is the reference): mean line-text
+    similarity to the reference (RapidFuzz ratio, 0-100) and the share of
+    ground-truth fields parsed right.
+    """
+    from rapidfuzz import fuzz
+
+    from . import services
+    from .benchmarks.corpus import field_matches
+    from .parser import parse_receipt
+
+    texts, fields = {}, {}
+    for name, reader in readers.items():
+        texts[name], right, total = [], 0, 0
+        for item in corpus:
+            rgb, grey = services._decode_image(item["data"])
+            result = services._build_result(services._readtext_batched(reader, [(rgb, grey)])[0])
+            texts[name].append("\n".join(result["lines"]))
+            parsed = parse_receipt(result["lines"], result["paragraph"], result["layout"])
+            matches = field_matches(parsed, item["truth"])
+            right += sum(matches.values())
+            total += len(matches)
+        fields[name] = round(right / max(total, 1), 4)
+
+    reference = next(iter(readers))
+    return {
+        name: {
+            "fields": fields[name],
+            "text_similarity": round(
+                sum(fuzz.ratio(a, b) for a, b in zip(texts[name], texts[reference])) / max(len(corpus), 1), 2
+            ),
+        }
+        for name in readers
+    }
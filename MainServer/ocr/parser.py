@@ -21,6 +21,7 @@ DATE_RE = re.compile(
     r")",
     re.IGNORECASE,
 )
+NUMERIC_DATE_RE = re.compile(r"(\d{1,2})([/\-])(\d{1,2})\2([12]\d{3})")
 SERIAL_RE = re.compile(
     r"(?:No\.?|#|Receipt\s*(?:No|#)\.?)\s*[:\-]?\s*([A-Z0-9\-]+)",
     re.IGNORECASE,
@@ -38,12 +39,17 @@ def _clean_amount(s: str) -> str:
     return s.replace(",", "")
 
 
-def _find_amount_near(line: str, keyword: str):
-    """Return the first decimal amount found on a line containing *keyword*."""
-    if keyword.lower() not in line.lower():
+def _flat_item(line: str):
+    """A "qty description unit-cost total" line as an item, or None."""
+    m = QTY_LINE_RE.match(line.strip())
+    if not m:
         return None
-    m = AMOUNT_RE.findall(line)
-    return _clean_amount(m[-1]) if m else None
+    return {
+        "quantity": m.group(1),
+        "description": m.group(2).strip(),
+        "unit_cost": _clean_amount(m.group(3)),
+        "line_total": _clean_amount(m.group(4)),
+    }
 
 
 def _find_tin(text: str):
@@ -53,9 +59,26 @@ def _find_tin(text: str):
     return None
 
 
+def _numeric_date(text: str):
+    """``dateutil``'s reading of "M/D/YYYY" (day first when the month
+    cannot be), without its tokenizer; None for anything else."""
+    m = NUMERIC_DATE_RE.fullmatch(text)
+    if not m:
+        return None
+    first, second, year = int(m.group(1)), int(m.group(3)), int(m.group(4))
+    month, day = (first, second) if first <= 12 else (second, first)
+    try:
+        return datetime(year, month, day).isoformat()
+    except ValueError:
+        return ""
+
+
 def _find_date(text: str):
     m = DATE_RE.search(text)
     if m:
+        numeric = _numeric_date(m.group(0))
+        if numeric is not None:
+            return numeric or None
         try:
             dt = dateutil_parser.parse(m.group(0), dayfirst=False)
             return dt.isoformat()
@@ -80,15 +103,205 @@ def _detect_vat_status(paragraph: str):
     return "NON_VAT"
 
 
-# ── main parser ─────────────────────────────────────────────────────
-def parse_receipt(lines: list[str], paragraph: str) -> dict:
+# ── layout-based extraction (see ocr.layout) ───────────────────────
+AMOUNT_CELL_RE = re.compile(r"^(?:PHP|P|₱)?\s*([\d,]+\.\d{2})$", re.IGNORECASE)
+QTY_CELL_RE = re.compile(r"^\d+(?:\.\d+)?$")
+LEADING_QTY_RE = re.compile(r"^(\d+(?:\.\d+)?)\s+(.+)$")
+SUMMARY_KEYWORDS = [
+    "TOTAL", "VAT", "AMOUNT DUE", "GROSS", "DISCOUNT",
+    "CHANGE", "CASH", "TENDER", "EXEMPT", "ZERO",
+]
+
+
+def _item_from_cells(texts):
+    """One item from a table row's cell texts, or ``None``."""
+    if any(kw in " ".join(texts).upper() for kw in SUMMARY_KEYWORDS):
+        return None
+
+    amounts, quantity, description = [], "", []
+    for text in texts:
+        m = AMOUNT_CELL_RE.match(text.strip())
+        if m:
+            amounts.append(_clean_amount(m.group(1)))
+        elif not quantity and not description and QTY_CELL_RE.match(text.strip()):
+            quantity = text.strip()
+        else:
+            description.append(text.strip())
+    description = " ".join(description).strip()
+    if not amounts or not description:
+        return None
+
+    if not quantity:
+        m = LEADING_QTY_RE.match(description)
+        if m and len(amounts) > 1:
+            quantity, description = m.group(1), m.group(2)
+
+    line_total = amounts[-1]
+    if len(amounts) > 1:
+        unit_cost = amounts[-2]
+    elif quantity and float(quantity):
+        unit_cost = f"{float(line_total) / float(quantity):.2f}"
+    else:
+        quantity, unit_cost = "1", line_total
+
+    return {
+        "quantity": quantity or "1",
+        "description": description,
+        "unit_cost": unit_cost,
+        "line_total": line_total,
+    }
+
+
+def _items_from_layout(layout):
+    items = []
+    for region in layout.get("regions", []):
+        if region["kind"] != "table":
+            continue
+        for row in layout["rows"][region["start"]:region["end"]]:
+            item = _item_from_cells([cell["text"] for cell in row["cells"]])
+            if item:
+                items.append(item)
+    return items
+
+
+def _cell_in_column(row, column):
+    for cell in row["cells"]:
+        if cell["column"] == column:
+            return cell["text"].strip()
+    return ""
+
+
+def _buyer_from_layout(layout):
     """
-    Best-effort extraction.  Returns a dict ready for the frontend
-    review form.  Every value is a string or None so it serialises
-    cleanly to JSON.
+    ``(name, address)`` when the "Sold to" row is inside a side-by-side
+    block: the cell holding it (or the cell right of it) and the cell
+    below it – so the seller block next to it does not leak in.
+    ``("", "")`` otherwise; the flat-line rules read single-column
+    receipts.
     """
+    rows = layout.get("rows", [])
+    for r, row in enumerate(rows):
+        cells = row["cells"]
+        for i, cell in enumerate(cells):
+            if not any(kw in cell["text"].upper() for kw in ["SOLD TO", "CUSTOMER", "BUYER"]):
+                continue
+            if row["region"] is None:
+                return "", ""
+            name = re.sub(
+                r"(?i)(sold\s*to|customer|buyer)\s*[:\-]?\s*", "", cell["text"]
+            ).strip()
+            column = cell["column"]
+            if not name and i + 1 < len(cells):
+                name = cells[i + 1]["text"].strip()
+                column = cells[i + 1]["column"]
+            address = ""
+            below = rows[r + 1] if r + 1 < len(rows) else None
+            if below and below["region"] == row["region"]:
+                address = _cell_in_column(below, column)
+            return name, address
+    return "", ""
+
+
+def _seller_from_layout(layout):
+    """Seller name / address when the header is a side-by-side block:
+    the first column of the region the first row belongs to."""
+    rows = layout.get("rows", [])
+    if not rows or rows[0]["region"] is None:
+        return None
+    region = layout["regions"][rows[0]["region"]]
+    if region["kind"] != "text":
+        return None
+    block = [_cell_in_column(row, 0) for row in rows[region["start"]:region["end"]]]
+    block = [text for text in block if text]
+    return block or None
+
+
+# ── single-pass keyword matching ────────────────────────────────────
+HEADER_STOP_KEYWORDS = frozenset([
+    "OFFICIAL RECEIPT", "SALES INVOICE", "OR NO", "SI NO", "DATE", "VAT REG", "TIN",
+])
+BUYER_KEYWORDS = frozenset(["SOLD TO", "CUSTOMER", "BUYER"])
+BUYER_ADDRESS_STOP_KEYWORDS = frozenset(["TIN", "DATE", "QTY", "TOTAL", "VATABLE"])
+BUYER_TIN_KEYWORDS = frozenset(["SOLD", "BUYER", "CUSTOMER"])
+PRINTER_TIN_KEYWORDS = frozenset(["PRINT", "ATP", "ACCREDIT"])
+PRINTER_KEYWORDS = frozenset(["PRINTED BY", "PRINTER"])
+ATP_DATE_KEYWORDS = frozenset(["DATE ISSUED", "ISSUE DATE"])
+FIELD_KEYWORDS = {
+    "gross_sales": ["GROSS SALES", "GROSS"],
+    "vatable_sales": ["VATABLE SALES", "VATABLE"],
+    "vat_amount": ["VAT AMOUNT", "VAT AMT", "12%", "OUTPUT TAX"],
+    "vat_exempt_sales": ["VAT-EXEMPT", "VAT EXEMPT", "EXEMPT SALES"],
+    "zero_rated_sales": ["ZERO-RATED", "ZERO RATED"],
+    "total_amount_due": [
+        "TOTAL AMOUNT DUE",
+        "TOTAL DUE",
+        "AMOUNT DUE",
+        "TOTAL AMT",
+        "GRAND TOTAL",
+        "TOTAL SALE",
+    ],
+}
+_FIELD_LOWER = {field: [kw.lower() for kw in kws] for field, kws in FIELD_KEYWORDS.items()}
+
+_KEYWORDS = sorted(
+    set().union(
+        HEADER_STOP_KEYWORDS, BUYER_KEYWORDS, BUYER_ADDRESS_STOP_KEYWORDS,
+        BUYER_TIN_KEYWORDS, PRINTER_TIN_KEYWORDS, PRINTER_KEYWORDS,
+        ATP_DATE_KEYWORDS, ["SERIAL", "RANGE"], *FIELD_KEYWORDS.values(),
+    ),
+    key=lambda kw: (-len(kw), kw),
+)
+# zero-width so every start position is tried (overlapping hits); the
+# alternation prefers the longest keyword, shorter keywords starting at
+# the same position are its prefixes and are added from _PREFIXES.  The
+# leading class skips positions no keyword can start at.
+_KEYWORD_RE = re.compile(
+    "(?=[" + "".join(sorted({re.escape(kw[0]) for kw in _KEYWORDS})) + "])"
+    "(?=(" + "|".join(re.escape(kw) for kw in _KEYWORDS) + "))"
+)
+_PREFIXES = {
+    kw: frozenset(other for other in _KEYWORDS if kw.startswith(other))
+    for kw in _KEYWORDS
+}
+
+_SERIAL_FALLBACK_RE = re.compile(r"\b(\d{5,8})\b")
+_SERIAL_RANGE_RE = re.compile(r"\b(\d{4,})\b")
+_BUYER_PREFIX_RE = re.compile(r"(?i)(sold\s*to|customer|buyer)\s*[:\-]?\s*")
+_PRINTER_PREFIX_RE = re.compile(r"(?i)(printed\s*by|printer)\s*[:\-]?\s*")
+
+
+def _line_keywords(up: str) -> frozenset:
+    """Every keyword above that occurs in the upper-cased line *up*."""
+    found = _KEYWORD_RE.findall(up)
+    if not found:
+        return frozenset()
+    if len(found) == 1:
+        return _PREFIXES[found[0]]
+    return frozenset().union(*(_PREFIXES[kw] for kw in found))
+
+
+_KEYWORD_FIELDS = {}
+for _field, _kws in FIELD_KEYWORDS.items():
+    for _kw in _kws:
+        _KEYWORD_FIELDS.setdefault(_kw, set()).add(_field)
+
+
+def _line_fields(ln: str, hits: frozenset) -> set:
+    """Financial-summary fields whose keywords occur in *ln*."""
+    if ln.isascii():
+        return {f for kw in hits for f in _KEYWORD_FIELDS.get(kw, ())}
+    # upper() and lower() disagree outside ASCII ("ſ" → "S" / "ſ"); these
+    # keywords have always been matched case-insensitively via lower()
+    low = ln.lower()
+    return {
+        field for field, kws in _FIELD_LOWER.items() if any(kw in low for kw in kws)
+    }
 
-    result = {
+
+# ── main parser ─────────────────────────────────────────────────────
+def empty_result(paragraph: str) -> dict:
+    """:func:`parse_receipt`'s result with no field filled in."""
+    return {
         "seller": {
             "registered_business_name": "",
             "business_address": "",
@@ -125,131 +338,168 @@ def parse_receipt(lines: list[str], paragraph: str) -> dict:
         "raw_text": paragraph,
     }
 
+
+def parse_receipt(lines: list[str], paragraph: str, layout: dict = None) -> dict:
+    """
+    Best-effort extraction.  Returns a dict ready for the frontend
+    review form.  Every value is a string or None so it serialises
+    cleanly to JSON.
+
+    *layout* (``ocr.layout.analyze_layout`` output) is optional; with it,
+    line items are read from table regions, and side-by-side seller /
+    buyer blocks are read per column, falling back to the flat-line
+    rules.
+
+    The lines are scanned once: each is upper-cased and matched against
+    every keyword in one regex, and the field rules share the result.
+    """
+
+    result = empty_result(paragraph)
+
     if not lines:
         return result
 
-    upper_paragraph = paragraph.upper()
-
     # ── receipt type ────────────────────────────────────────────────
     result["receipt"]["receipt_type"] = _detect_receipt_type(paragraph)
     result["seller"]["vat_status"] = _detect_vat_status(paragraph)
 
-    # ── seller name: typically the first non-empty line ─────────────
-    header_lines = []
-    for ln in lines[:6]:
-        up = ln.upper().strip()
-        if any(
-            kw in up
-            for kw in [
-                "OFFICIAL RECEIPT",
-                "SALES INVOICE",
-                "OR NO",
-                "SI NO",
-                "DATE",
-                "VAT REG",
-                "TIN",
-            ]
-        ):
-            break
-        header_lines.append(ln.strip())
+    # Every rule below reads the same lines, so upper-case and keyword-
+    # match each line once and let one pass feed all of them.  Rules
+    # that take the first matching line stop looking once satisfied.
+    ups = [ln.upper() for ln in lines]
+    hits = [_line_keywords(up) for up in ups]
+
+    header_lines, header_done = [], False
+    all_tins = []
+    serial = txn_date = atp = None
+    buyer_done = printer_done = atp_date_done = serial_range_done = False
+    fields = {}
+    pending_fields = set(FIELD_KEYWORDS)
+    flat_items = []
+
+    for i, ln in enumerate(lines):
+        kws = hits[i]
+
+        # ── seller name: typically the first non-empty line ─────────
+        if not header_done:
+            if i >= 6 or not kws.isdisjoint(HEADER_STOP_KEYWORDS):
+                header_done = True
+            else:
+                header_lines.append(ln.strip())
+
+        # ── TINs ────────────────────────────────────────────────────
+        m = TIN_RE.search(ln)
+        if m:
+            all_tins.append((f"{m.group(1)}-{m.group(2)}-{m.group(3)}-{m.group(4)}", kws))
+
+        # ── serial number / date / ATP number ───────────────────────
+        # (on ASCII lines, skip the regexes when their literal parts are absent)
+        ascii_line = ln.isascii()
+        up = ups[i]
+        if serial is None and (not ascii_line or "NO" in up or "#" in ln):
+            m = SERIAL_RE.search(ln)
+            if m:
+                serial = m.group(1).strip()
+        if txn_date is None:
+            txn_date = _find_date(ln)
+        if atp is None and (not ascii_line or "ATP" in up or "AUTHORITY" in up):
+            m = ATP_RE.search(ln)
+            if m:
+                atp = m.group(1).strip()
+
+        # ── buyer name / address ────────────────────────────────────
+        if not buyer_done and not kws.isdisjoint(BUYER_KEYWORDS):
+            buyer_done = True
+            name_part = _BUYER_PREFIX_RE.sub("", ln).strip()
+            if name_part:
+                result["buyer"]["buyer_name"] = name_part
+            if i + 1 < len(lines) and hits[i + 1].isdisjoint(BUYER_ADDRESS_STOP_KEYWORDS):
+                result["buyer"]["buyer_address"] = lines[i + 1].strip()
+
+        # ── financial summary: last amount on the first keyword line ─
+        if pending_fields and (kws or not ascii_line):
+            line_fields = pending_fields & _line_fields(ln, kws)
+            if line_fields:
+                amounts = AMOUNT_RE.findall(ln)
+                if amounts:
+                    for field in line_fields:
+                        fields[field] = _clean_amount(amounts[-1])
+                    pending_fields -= line_fields
+
+        # ── line items ──────────────────────────────────────────────
+        item = _flat_item(ln)
+        if item:
+            flat_items.append(item)
+
+        # ── printer / ATP date / serial range ───────────────────────
+        if not printer_done and not kws.isdisjoint(PRINTER_KEYWORDS):
+            printer_done = True
+            name_part = _PRINTER_PREFIX_RE.sub("", ln).strip()
+            if name_part:
+                result["printer"]["printer_name"] = name_part
+            if i + 1 < len(lines):
+                result["printer"]["printer_address"] = lines[i + 1].strip()
+
+        if not atp_date_done and not kws.isdisjoint(ATP_DATE_KEYWORDS):
+            atp_date_done = True
+            dt = _find_date(ln)
+            if dt:
+                result["printer"]["atp_issue_date"] = dt[:10]
 
+        if not serial_range_done and "SERIAL" in kws and ("RANGE" in kws or "-" in ln):
+            serial_range_done = True
+            nums = _SERIAL_RANGE_RE.findall(ln)
+            if len(nums) >= 2:
+                result["printer"]["serial_start"] = nums[0]
+                result["printer"]["serial_end"] = nums[1]
+
+    # ── seller ──────────────────────────────────────────────────────
     if header_lines:
         result["seller"]["registered_business_name"] = header_lines[0]
         if len(header_lines) > 1:
             result["seller"]["business_address"] = " ".join(header_lines[1:])
 
-    # ── TINs: first TIN → seller, second → buyer, later → printer ──
-    all_tins = []
-    for ln in lines:
-        m = TIN_RE.search(ln)
-        if m:
-            tin_str = f"{m.group(1)}-{m.group(2)}-{m.group(3)}-{m.group(4)}"
-            context = ln.upper()
-            all_tins.append((tin_str, context, ln))
+    seller_block = _seller_from_layout(layout) if layout else None
+    if seller_block:
+        result["seller"]["registered_business_name"] = seller_block[0]
+        result["seller"]["business_address"] = " ".join(seller_block[1:])
 
+    # ── TINs: first TIN → seller, second → buyer, later → printer ──
     if all_tins:
         result["seller"]["tin"] = all_tins[0][0]
-    if len(all_tins) >= 2:
+    for tin_str, ctx in all_tins[1:]:
         # second TIN is buyer or printer — use keyword context
-        for tin_str, ctx, _ in all_tins[1:]:
-            if any(kw in ctx for kw in ["SOLD", "BUYER", "CUSTOMER"]):
-                result["buyer"]["buyer_tin"] = tin_str
-            elif any(kw in ctx for kw in ["PRINT", "ATP", "ACCREDIT"]):
-                result["printer"]["printer_tin"] = tin_str
-            else:
-                if not result["buyer"]["buyer_tin"]:
-                    result["buyer"]["buyer_tin"] = tin_str
-                else:
-                    result["printer"]["printer_tin"] = tin_str
-
-    # ── serial number ───────────────────────────────────────────────
-    for ln in lines:
-        m = SERIAL_RE.search(ln)
-        if m:
-            result["receipt"]["serial_number"] = m.group(1).strip()
-            break
-
-    # if still empty, look for a 6-digit number pattern near top
-    if not result["receipt"]["serial_number"]:
+        if not ctx.isdisjoint(BUYER_TIN_KEYWORDS):
+            result["buyer"]["buyer_tin"] = tin_str
+        elif not ctx.isdisjoint(PRINTER_TIN_KEYWORDS):
+            result["printer"]["printer_tin"] = tin_str
+        elif not result["buyer"]["buyer_tin"]:
+            result["buyer"]["buyer_tin"] = tin_str
+        else:
+            result["printer"]["printer_tin"] = tin_str
+
+    # ── serial number / date ────────────────────────────────────────
+    if serial is None:
+        # look for a 5–8 digit number near the top
         for ln in lines[:10]:
-            nums = re.findall(r"\b(\d{5,8})\b", ln)
+            nums = _SERIAL_FALLBACK_RE.findall(ln)
             if nums:
-                result["receipt"]["serial_number"] = nums[-1]
+                serial = nums[-1]
                 break
-
-    # ── date ────────────────────────────────────────────────────────
-    for ln in lines:
-        dt = _find_date(ln)
-        if dt:
-            result["receipt"]["transaction_date"] = dt
-            break
-
-    # ── buyer name / address ────────────────────────────────────────
-    for i, ln in enumerate(lines):
-        up = ln.upper()
-        if any(kw in up for kw in ["SOLD TO", "CUSTOMER", "BUYER"]):
-            # extract name from this line (after the keyword)
-            name_part = re.sub(
-                r"(?i)(sold\s*to|customer|buyer)\s*[:\-]?\s*", "", ln
-            ).strip()
-            if name_part:
-                result["buyer"]["buyer_name"] = name_part
-            # next line might be address
-            if i + 1 < len(lines):
-                next_up = lines[i + 1].upper()
-                if not any(
-                    kw in next_up
-                    for kw in ["TIN", "DATE", "QTY", "TOTAL", "VATABLE"]
-                ):
-                    result["buyer"]["buyer_address"] = lines[i + 1].strip()
-            break
+    result["receipt"]["serial_number"] = serial or ""
+    result["receipt"]["transaction_date"] = txn_date or ""
+
+    # ── buyer from layout ───────────────────────────────────────────
+    if layout:
+        buyer_name, buyer_address = _buyer_from_layout(layout)
+        # never replace a flat-line value with an empty one
+        if buyer_name:
+            result["buyer"]["buyer_name"] = buyer_name
+        if buyer_address:
+            result["buyer"]["buyer_address"] = buyer_address
 
     # ── financial summary ───────────────────────────────────────────
-    kw_map = {
-        "gross_sales": ["GROSS SALES", "GROSS"],
-        "vatable_sales": ["VATABLE SALES", "VATABLE"],
-        "vat_amount": ["VAT AMOUNT", "VAT AMT", "12%", "OUTPUT TAX"],
-        "vat_exempt_sales": ["VAT-EXEMPT", "VAT EXEMPT", "EXEMPT SALES"],
-        "zero_rated_sales": ["ZERO-RATED", "ZERO RATED"],
-        "total_amount_due": [
-            "TOTAL AMOUNT DUE",
-            "TOTAL DUE",
-            "AMOUNT DUE",
-            "TOTAL AMT",
-            "GRAND TOTAL",
-            "TOTAL SALE",
-        ],
-    }
-
-    for field, keywords in kw_map.items():
-        for ln in lines:
-            for kw in keywords:
-                val = _find_amount_near(ln, kw)
-                if val:
-                    result["receipt"][field] = val
-                    break
-            if result["receipt"][field]:
-                break
+    result["receipt"].update(fields)
 
     # fallback: if total_amount_due empty, use the largest amount found
     if not result["receipt"]["total_amount_due"]:
@@ -263,54 +513,13 @@ def parse_receipt(lines: list[str], paragraph: str) -> dict:
         result["receipt"]["gross_sales"] = result["receipt"]["total_amount_due"]
 
     # ── line items ──────────────────────────────────────────────────
-    for ln in lines:
-        m = QTY_LINE_RE.match(ln.strip())
-        if m:
-            result["items"].append(
-                {
-                    "quantity": m.group(1),
-                    "description": m.group(2).strip(),
-                    "unit_cost": _clean_amount(m.group(3)),
-                    "line_total": _clean_amount(m.group(4)),
-                }
-            )
-
-    # ── ATP / printer ──────────────────────────────────────────────
-    for ln in lines:
-        m = ATP_RE.search(ln)
-        if m:
-            result["printer"]["authority_to_print_number"] = m.group(1).strip()
-            break
-
-    for i, ln in enumerate(lines):
-        up = ln.upper()
-        if any(kw in up for kw in ["PRINTED BY", "PRINTER"]):
-            name_part = re.sub(
-                r"(?i)(printed\s*by|printer)\s*[:\-]?\s*", "", ln
-            ).strip()
-            if name_part:
-                result["printer"]["printer_name"] = name_part
-            if i + 1 < len(lines):
-                result["printer"]["printer_address"] = lines[i + 1].strip()
-            break
-
-    # ── ATP date ────────────────────────────────────────────────────
-    for ln in lines:
-        up = ln.upper()
-        if "DATE ISSUED" in up or "ISSUE DATE" in up:
-            dt = _find_date(ln)
-            if dt:
-                result["printer"]["atp_issue_date"] = dt[:10]
-            break
+    if layout:
+        result["items"] = _items_from_layout(layout)
+    if not result["items"]:
+        result["items"] = flat_items
 
-    # ── serial range ────────────────────────────────────────────────
-    for ln in lines:
-        up = ln.upper()
-        if "SERIAL" in up and ("RANGE" in up or "-" in ln):
-            nums = re.findall(r"\b(\d{4,})\b", ln)
-            if len(nums) >= 2:
-                result["printer"]["serial_start"] = nums[0]
-                result["printer"]["serial_end"] = nums[1]
-            break
+    # ── ATP ─────────────────────────────────────────────────────────
+    if atp is not None:
+        result["printer"]["authority_to_print_number"] = atp
 
-    return result
\ No newline at end of file
+    return result
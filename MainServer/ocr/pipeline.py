@@ -0,0 +1,114 @@
+"""
+The receipt OCR pipeline shared by the synchronous endpoint and the
+background job workers:  OCR → parse → auto-categorise and match the
+seller (``businesses.resolver``) → look for receipts already submitted
+(``billing.duplicates``).
+"""
+
+import time
+
+from AdminServer import metrics
+from billing.duplicates import find_duplicates_many, parsed_lookup_key
+from businesses.resolver import suggest_seller
+
+from . import templates
+from .services import extract_text, extract_text_batch, perceptual_hash
+from .categorizer import categorize
+
+# scored alternatives returned next to suggested_category
+CATEGORY_CANDIDATES = 3
+
+
+def process_receipt(image_source) -> dict:
+    """
+    Run the full pipeline on a file path or uploaded file and return the
+    payload expected by ``OCRResultSerializer``.
+    """
+    # 1. OCR
+    ocr = extract_text(image_source)
+
+    # 2 + 3. Parse, auto-categorise, match the seller
+    payload = _build_payload(ocr)
+
+    # 4. Possible duplicates
+    _add_duplicates([(payload, image_source)])
+    return payload
+
+
+def _build_payload(ocr: dict) -> dict:
+    with metrics.stage("parse"):
+        parsed = templates.parse(
+            ocr["lines"], ocr["paragraph"], ocr.get("layout"), ocr.get("raw_result")
+        )
+    with metrics.stage("categorize"):
+        category = categorize(ocr["paragraph"], limit=CATEGORY_CANDIDATES)
+    with metrics.stage("seller_match"):
+        seller = suggest_seller(
+            parsed["seller"]["registered_business_name"], parsed["seller"]["tin"]
+        )
+
+    return {
+        **parsed,
+        **category,
+        "suggested_seller": seller,
+        "confidence": ocr["avg_confidence"],
+    }
+
+
+def _add_duplicates(results):
+    """Set ``duplicates`` on each ``(payload, image source)``, with one
+    lookup for all of them."""
+    with metrics.stage("duplicates"):
+        keys = [parsed_lookup_key(payload, perceptual_hash(src)) for payload, src in results]
+        for (payload, _), found in zip(results, find_duplicates_many(keys)):
+            payload["duplicates"] = found
+
+
+def process_receipt_batch(image_sources) -> list:
+    """
+    Batched variant of :func:`process_receipt`.  Returns one entry per
+    input, in input order::
+
+        {
+            "index": 0,
+            "filename": "a.jpg",
+            "status": "ok" | "error",
+            "error": "",
+            "result": <OCRResultSerializer payload or None>,
+            "timing_ms": {"decode": .., "ocr": .., "parse": .., "total": ..},
+        }
+
+    A failure on one image never affects the others.
+    """
+    sources = list(image_sources)
+    entries = []
+
+    for idx, (src, ocr) in enumerate(zip(sources, extract_text_batch(sources))):
+        timing = dict(ocr["timing_ms"])
+        entry = {
+            "index": idx,
+            "filename": getattr(src, "name", "") or "",
+            "status": "ok",
+            "error": "",
+            "result": None,
+            "timing_ms": timing,
+        }
+        if "error" in ocr:
+            entry["status"] = "error"
+            entry["error"] = ocr["error"]
+        else:
+            t0 = time.perf_counter()
+            try:
+                entry["result"] = _build_payload(ocr)
+            except Exception as exc:
+                entry["status"] = "error"
+                entry["error"] = str(exc)
+            timing["parse"] = round((time.perf_counter() - t0) * 1000, 2)
+        timing["total"] = round(sum(timing.values()), 2)
+        entries.append(entry)
+
+    _add_duplicates([
+        (entry["result"], sources[entry["index"]])
+        for entry in entries if entry["result"] is not None
+    ])
+    return entries
@@ -0,0 +1,231 @@
+"""
+Image pre-processing applied before EasyOCR detection.
+
+Phone photos of receipts arrive at 12+ megapixels, and CRAFT detection
+cost grows with pixel count.  :func:`preprocess` turns the decoded image
+into a smaller, upright, tightly cropped greyscale image and returns a
+:class:`Transform` that maps boxes found on it back to the original
+image, so ``raw_result`` coordinates do not change meaning.
+
+Steps, each switchable through ``settings.OCR_PREPROCESS``:
+
+1. EXIF orientation – ``cv2.imdecode(..., IMREAD_COLOR)`` already rotates
+   the pixels upright while decoding, so "original coordinates" are those
+   of the upright image.
+2. ``grayscale`` – work on the single greyscale plane only.
+3. ``crop`` – crop to the bounding box of the receipt (the largest bright
+   contour) when it is clearly smaller than the photo.
+4. Downscale so the long edge is at most ``max_long_edge`` and/or the
+   median text height is about ``target_text_height`` pixels.
+5. ``deskew`` – rotate by the dominant text angle (up to
+   ``max_skew_degrees``), measured before downscaling.
+"""
+
+import hashlib
+import json
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+DEFAULTS = {
+    "enabled": False,
+    "grayscale": True,
+    "crop": True,
+    "deskew": True,
+    "max_skew_degrees": 10.0,
+    "max_long_edge": 1600,
+    "target_text_height": None,
+}
+
+
+def get_config(overrides=None) -> dict:
+    """``DEFAULTS`` ← ``settings.OCR_PREPROCESS`` ← *overrides*."""
+    cfg = {**DEFAULTS, **getattr(settings, "OCR_PREPROCESS", {})}
+    if overrides:
+        cfg.update(overrides)
+    return cfg
+
+
+def fingerprint(cfg) -> str:
+    """Short stable id of a config, used to key cached OCR results."""
+    blob = json.dumps(cfg, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:10]
+
+
+class Transform:
+    """
+    Affine map from pre-processed image coordinates back to the original
+    (upright) image.  Built up step by step with :meth:`then`.
+    """
+
+    def __init__(self):
+        # forward: original → processed, as a 3×3 homogeneous matrix
+        self._forward = np.eye(3)
+
+    def then(self, matrix_2x3):
+        step = np.vstack([matrix_2x3, [0.0, 0.0, 1.0]])
+        self._forward = step @ self._forward
+        return self
+
+    @property
+    def is_identity(self):
+        return np.allclose(self._forward, np.eye(3))
+
+    def to_original(self, points):
+        """Map an ``(N, 2)`` array of processed-image points back."""
+        inv = np.linalg.inv(self._forward)[:2]
+        pts = np.asarray(points, dtype=np.float64)
+        return pts @ inv[:, :2].T + inv[:, 2]
+
+    def map_raw(self, raw):
+        """Return *raw* (EasyOCR ``(bbox, text, conf)`` items) with every
+        bbox mapped back to original coordinates."""
+        if self.is_identity:
+            return raw
+        out = []
+        for bbox, text, conf in raw:
+            pts = self.to_original(bbox)
+            out.append(([[float(x), float(y)] for x, y in pts], text, conf))
+        return out
+
+
+# ── individual steps ────────────────────────────────────────────────
+def _receipt_bounds(grey):
+    """Bounding box of the largest bright region, or ``None`` if it
+    covers (nearly) the whole photo or too little of it to be a receipt."""
+    h, w = grey.shape
+    small_scale = min(1.0, 800.0 / max(h, w))
+    small = cv2.resize(grey, None, fx=small_scale, fy=small_scale, interpolation=cv2.INTER_AREA)
+    blur = cv2.GaussianBlur(small, (5, 5), 0)
+    _, mask = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    x, y, cw, ch = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    ratio = (cw * ch) / float(small.shape[0] * small.shape[1])
+    if ratio > 0.9 or ratio < 0.15:
+        return None
+
+    margin = 4
+    x0 = max(0, int((x - margin) / small_scale))
+    y0 = max(0, int((y - margin) / small_scale))
+    x1 = min(w, int((x + cw + margin) / small_scale))
+    y1 = min(h, int((y + ch + margin) / small_scale))
+    return x0, y0, x1, y1
+
+
+def _text_mask(grey):
+    """Dark-on-light strokes as a binary mask.  A local (adaptive)
+    threshold keeps a dark background around the receipt from being
+    mistaken for ink."""
+    return cv2.adaptiveThreshold(
+        grey, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15
+    )
+
+
+def _skew_angle(grey):
+    """Dominant text angle in degrees, as the rotation to hand to
+    ``cv2.getRotationMatrix2D`` to level the lines."""
+    h, w = grey.shape
+    scale = min(1.0, 1000.0 / max(h, w))
+    small = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    mask = _text_mask(small)
+    # join characters into horizontal strokes so the rectangle follows lines
+    mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1)))
+    # RETR_LIST: the paper edge shows up as a ring that would otherwise
+    # swallow every line inside it; the shape filter below drops the ring
+    lines, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    angles, weights = [], []
+    for cnt in lines:
+        (_, _), (rw, rh), angle = cv2.minAreaRect(cnt)
+        if rw < rh:
+            rw, rh = rh, rw
+            angle -= 90.0
+        if rw < 20 or rw < 3 * rh:
+            continue  # not a text line
+        if angle > 45:
+            angle -= 90.0
+        elif angle < -45:
+            angle += 90.0
+        angles.append(angle)
+        weights.append(rw)
+
+    if not angles:
+        return 0.0
+    order = np.argsort(angles)
+    cum = np.cumsum(np.asarray(weights)[order])
+    median = float(np.asarray(angles)[order][np.searchsorted(cum, cum[-1] / 2.0)])
+    return median
+
+
+def _median_text_height(grey):
+    mask = _text_mask(grey)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # characters: not specks, not table rules / the receipt border
+    keep = (heights >= 4) & (heights < grey.shape[0] / 10) & (widths < grey.shape[1] / 4)
+    if n <= 1 or not keep.any():
+        return None
+    return float(np.median(heights[keep]))
+
+
+# ── entry point ─────────────────────────────────────────────────────
+def preprocess(rgb, grey, cfg=None):
+    """
+    Returns ``(detector_image, recognizer_grey, transform)``.
+    *detector_image* is a 3-channel array (CRAFT needs three channels).
+    """
+    cfg = cfg or get_config()
+    transform = Transform()
+    color = None if cfg["grayscale"] else rgb
+
+    if cfg["crop"]:
+        bounds = _receipt_bounds(grey)
+        if bounds:
+            x0, y0, x1, y1 = bounds
+            grey = grey[y0:y1, x0:x1]
+            if color is not None:
+                color = color[y0:y1, x0:x1]
+            transform.then(np.array([[1.0, 0.0, -x0], [0.0, 1.0, -y0]]))
+
+    # measure the skew now, but rotate after downscaling: warping the
+    # smaller image is several times cheaper
+    angle = _skew_angle(grey) if cfg["deskew"] else 0.0
+
+    h, w = grey.shape
+    scale = 1.0
+    if cfg["max_long_edge"]:
+        scale = min(scale, cfg["max_long_edge"] / float(max(h, w)))
+    if cfg["target_text_height"]:
+        text_h = _median_text_height(grey)
+        if text_h:
+            scale = min(scale, cfg["target_text_height"] / text_h)
+    if scale < 1.0:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        grey = cv2.resize(grey, size, interpolation=cv2.INTER_AREA)
+        if color is not None:
+            color = cv2.resize(color, size, interpolation=cv2.INTER_AREA)
+        transform.then(np.array([
+            [size[0] / float(w), 0.0, 0.0],
+            [0.0, size[1] / float(h), 0.0],
+        ]))
+
+    if 0.3 <= abs(angle) <= cfg["max_skew_degrees"]:
+        h, w = grey.shape
+        rot = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        grey = cv2.warpAffine(grey, rot, (w, h), flags=cv2.INTER_LINEAR, borderValue=255)
+        if color is not None:
+            color = cv2.warpAffine(
+                color, rot, (w, h), flags=cv2.INTER_LINEAR,
+                borderValue=(255, 255, 255),
+            )
+        transform.then(rot)
+
+    detector_image = color if color is not None else cv2.cvtColor(grey, cv2.COLOR_GRAY2RGB)
+    return detector_image, np.ascontiguousarray(grey), transform
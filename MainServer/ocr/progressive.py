@@ -0,0 +1,160 @@
+"""
+Progressive OCR: a cheap low-resolution pass, then full resolution only
+where it is needed.
+
+Most receipts read fine with the image downscaled to ``long_edge``, and
+CRAFT detection (the bulk of the CPU time) is far cheaper there.  After
+that first pass, :func:`weak_entries` picks the boxes worth reading
+again:
+
+* boxes recognised with a confidence below ``min_confidence``;
+* with ``fields`` on, the rows of key fields (seller TIN, serial number,
+  date, total) that ``parse_receipt`` could not fill from the first
+  pass – every box level with a box showing the field's label.
+
+Only those boxes are recognised again, on the full-resolution greyscale
+image, and their text replaces the first-pass text (:func:`merge`).
+When more than ``max_weak_share`` of the boxes are weak, or nothing was
+found at all, the low-resolution pass is not trusted and the image is
+OCR'd the usual way.
+
+Settings: ``settings.OCR_PROGRESSIVE``; see ``ocr.services._run_reader``.
+"""
+
+import re
+
+import numpy as np
+from django.conf import settings
+
+DEFAULTS = {
+    "enabled": False,
+    "long_edge": 1200,
+    "min_confidence": 0.5,
+    "fields": True,
+    "max_weak_share": 0.5,
+}
+
+# parsed field → (section, key) in parse_receipt's result, and its label
+KEY_FIELDS = {
+    "tin": (("seller", "tin"), re.compile(r"\bTIN\b", re.IGNORECASE)),
+    "serial_number": (
+        ("receipt", "serial_number"),
+        re.compile(r"\bNO\b|#|RECEIPT|INVOICE", re.IGNORECASE),
+    ),
+    "transaction_date": (("receipt", "transaction_date"), re.compile(r"\bDATE\b", re.IGNORECASE)),
+    "total_amount_due": (
+        ("receipt", "total_amount_due"),
+        re.compile(r"TOTAL|AMOUNT\s*DUE", re.IGNORECASE),
+    ),
+}
+
+
+def get_config(overrides=None) -> dict:
+    """``DEFAULTS`` ← ``settings.OCR_PROGRESSIVE`` ← *overrides*."""
+    cfg = {**DEFAULTS, **getattr(settings, "OCR_PROGRESSIVE", {})}
+    if overrides:
+        cfg.update(overrides)
+    return cfg
+
+
+def first_pass_config(pre_cfg, cfg) -> dict:
+    """The ``ocr.preprocess`` config of the low-resolution pass: the
+    configured pre-processing (if any), downscaled to ``long_edge``."""
+    if pre_cfg["enabled"]:
+        edge = min(pre_cfg["max_long_edge"] or cfg["long_edge"], cfg["long_edge"])
+        return {**pre_cfg, "max_long_edge": edge}
+    return {
+        **pre_cfg,
+        "enabled": True,
+        "crop": False,
+        "deskew": False,
+        "max_long_edge": cfg["long_edge"],
+        "target_text_height": None,
+    }
+
+
+def missing_fields(parsed) -> list:
+    """Key fields ``parse_receipt`` left empty."""
+    return [
+        name for name, ((section, key), _) in KEY_FIELDS.items()
+        if not parsed[section][key]
+    ]
+
+
+def weak_entries(raw, parsed=None, cfg=None) -> list:
+    """
+    Indices into *raw* (plain ``[bbox, text, conf]`` items, see
+    ``services._plain_raw``) to recognise again: low confidence, or on
+    the row of a key field missing from *parsed*.
+    """
+    cfg = cfg or get_config()
+    if not raw:
+        return []
+    weak = {n for n, (_, _, conf) in enumerate(raw) if conf < cfg["min_confidence"]}
+
+    labels = []
+    if cfg["fields"] and parsed is not None:
+        for name in missing_fields(parsed):
+            pattern = KEY_FIELDS[name][1]
+            labels += [n for n, (_, text, _) in enumerate(raw) if pattern.search(text)]
+    if labels:
+        ys = np.array([[y for _, y in bbox] for bbox, _, _ in raw], dtype=np.float64)
+        top, bottom = ys.min(axis=1), ys.max(axis=1)
+        centre = (top + bottom) / 2
+        for n in set(labels):
+            weak.update(np.flatnonzero((centre >= top[n]) & (centre <= bottom[n])).tolist())
+    return sorted(weak)
+
+
+def _quad(bbox, shape):
+    """*bbox* as four integer corners inside an image of *shape*."""
+    h, w = shape[:2]
+    return [
+        [int(min(max(round(x), 0), w - 1)), int(min(max(round(y), 0), h - 1))]
+        for x, y in bbox
+    ]
+
+
+def _key(quad):
+    return tuple(int(round(c)) for point in quad for c in point)
+
+
+def crop_lists(raw, indices, shape):
+    """
+    ``(horizontal_list, free_list)`` for ``Reader.recognize`` covering
+    the boxes at *indices*: axis-aligned boxes as ``[x_min, x_max, y_min,
+    y_max]``, rotated ones (after deskewing) as their four corners.
+    """
+    horizontal, free = [], []
+    for n in indices:
+        quad = _quad(raw[n][0], shape)
+        xs = sorted({x for x, _ in quad})
+        ys = sorted({y for _, y in quad})
+        if len(xs) <= 2 and len(ys) <= 2:
+            if xs[0] < xs[-1] and ys[0] < ys[-1]:
+                horizontal.append([xs[0], xs[-1], ys[0], ys[-1]])
+        else:
+            free.append(quad)
+    return horizontal, free
+
+
+def merge(raw, indices, reread, shape) -> list:
+    """
+    *raw* with the entries at *indices* replaced by their full-resolution
+    reading from *reread* (``Reader.recognize`` output for
+    :func:`crop_lists`); boxes stay as the first pass found them.
+    """
+    found = {}
+    for bbox, text, conf in reread:
+        found[_key(bbox)] = (str(text), float(conf))
+
+    out = list(raw)
+    for n in indices:
+        quad = _quad(raw[n][0], shape)
+        xs = [x for x, _ in quad]
+        ys = [y for _, y in quad]
+        rect = [[min(xs), min(ys)], [max(xs), min(ys)], [max(xs), max(ys)], [min(xs), max(ys)]]
+        hit = found.get(_key(quad)) or found.get(_key(rect))
+        if hit and hit[0].strip():
+            out[n] = [raw[n][0], hit[0], hit[1]]
+    return out
@@ -1,10 +1,23 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from billing.serializers import DuplicateCandidateSerializer
+
 
 class ReceiptUploadSerializer(serializers.Serializer):
     image = serializers.ImageField()
 
 
+class BatchReceiptUploadSerializer(serializers.Serializer):
+    # plain FileField: an unreadable image becomes a per-image error in
+    # the response instead of failing the whole batch
+    images = serializers.ListField(
+        child=serializers.FileField(),
+        allow_empty=False,
+        max_length=getattr(settings, "OCR_BATCH_MAX_IMAGES", 20),
+    )
+
+
 class ItemParsedSerializer(serializers.Serializer):
     description = serializers.CharField(allow_blank=True)
     quantity = serializers.CharField(allow_blank=True)
@@ -53,6 +66,28 @@ class CategorySuggestionSerializer(serializers.Serializer):
     name = serializers.CharField()
 
 
+class CategoryCandidateSerializer(CategorySuggestionSerializer):
+    hits = serializers.IntegerField()
+
+
+class CategoryPredictionSerializer(CategorySuggestionSerializer):
+    probability = serializers.FloatField()
+
+
+class SellerSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    tin = serializers.CharField()
+    score = serializers.FloatField()
+    match = serializers.CharField()
+
+
+class LayoutTemplateUsageSerializer(serializers.Serializer):
+    seller_id = serializers.IntegerField()
+    fields = serializers.ListField(child=serializers.CharField())
+    generic_skipped = serializers.BooleanField()
+
+
 class OCRResultSerializer(serializers.Serializer):
     seller = SellerParsedSerializer()
     buyer = BuyerParsedSerializer()
@@ -60,5 +95,33 @@ class OCRResultSerializer(serializers.Serializer):
     items = ItemParsedSerializer(many=True)
     printer = PrinterParsedSerializer()
     suggested_category = CategorySuggestionSerializer()
+    category_candidates = CategoryCandidateSerializer(many=True, required=False)
+    category_predictions = CategoryPredictionSerializer(many=True, required=False)
+    suggested_seller = SellerSuggestionSerializer(allow_null=True, required=False)
+    duplicates = DuplicateCandidateSerializer(many=True, required=False)
+    layout_template = LayoutTemplateUsageSerializer(required=False)
     raw_text = serializers.CharField()
-    confidence = serializers.FloatField()
\ No newline at end of file
+    confidence = serializers.FloatField()
+
+class OCRBatchItemSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    filename = serializers.CharField(allow_blank=True)
+    status = serializers.CharField()
+    error = serializers.CharField(allow_blank=True)
+    result = OCRResultSerializer(allow_null=True)
+    timing_ms = serializers.DictField(child=serializers.FloatField())
+
+
+class OCRBatchResultSerializer(serializers.Serializer):
+    results = OCRBatchItemSerializer(many=True)
+    timing_ms = serializers.DictField(child=serializers.FloatField())
+
+
+class OcrJobSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    status = serializers.CharField()
+    error = serializers.CharField(allow_blank=True)
+    created_at = serializers.DateTimeField()
+    started_at = serializers.DateTimeField(allow_null=True)
+    finished_at = serializers.DateTimeField(allow_null=True)
+    result = serializers.JSONField(allow_null=True)
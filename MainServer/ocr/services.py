@@ -3,102 +3,273 @@ Thin wrapper around EasyOCR.
 Initialises the reader exactly once (heavy model load) and exposes
 a function that returns ordered text lines from an image path or
 in-memory file.
+
+With ``OCR_SERVER_SOCKET`` set, the reader lives in the separate
+``manage.py ocr_server`` process instead (see ``ocr.model_server``) and
+this process never imports torch.
 """
 
+import hashlib
+import io
+import logging
+import mmap
 import os
 import threading
-import tempfile
+import time
+from contextlib import contextmanager
 
-import easyocr
+import cv2
 import numpy as np
 from django.conf import settings
 
+from AdminServer import metrics
+from billing.duplicates import image_hash
+
+from . import preprocess, progressive
+from .cache import result_cache
+from .layout import analyze_layout
+from .model_server import OcrServerError, RemoteReader
+from .parser import parse_receipt
+
+logger = logging.getLogger(__name__)
 
 _reader = None
 _lock = threading.Lock()
 
+# what the readiness endpoint reports (see reader_status)
+_status = {"loaded": False, "warm": False, "load_ms": None, "warm_ms": None, "error": ""}
+_warm_lock = threading.Lock()
+
 
 def _get_reader():
     global _reader
     if _reader is None:
         with _lock:
             if _reader is None:
-                storage = getattr(
-                    settings,
-                    "EASYOCR_MODEL_DIR",
-                    None,
-                )
-                _reader = easyocr.Reader(
-                    ["en"],
-                    model_storage_directory=storage,
-                )
+                t0 = time.perf_counter()
+                with metrics.stage("model_load"):
+                    _reader = _create_reader()
+                _status.update(loaded=True, load_ms=_ms(t0))
     return _reader
 
 
-# ── line-ordering logic (from your snippet) ────────────────────────
+def _create_reader():
+    socket_path = getattr(settings, "OCR_SERVER_SOCKET", None)
+    if socket_path:
+        return RemoteReader(socket_path)
+    return load_local_reader()
+
+
+def load_local_reader():
+    """Load EasyOCR in this process (imported lazily: torch is heavy).
+    With ``OCR_BACKEND = "onnx"`` its networks run on ONNX Runtime
+    (``ocr.onnx_backend``)."""
+    apply_thread_budget()
+    if getattr(settings, "OCR_BACKEND", "torch") == "onnx":
+        from .onnx_backend import load_onnx_reader
+
+        return load_onnx_reader()
+
+    import easyocr
+
+    storage = getattr(
+        settings,
+        "EASYOCR_MODEL_DIR",
+        None,
+    )
+    return easyocr.Reader(
+        ["en"],
+        model_storage_directory=storage,
+    )
+
+
+# ── CPU budget ──────────────────────────────────────────────────────
+_slots = None
+
+
+def apply_thread_budget(threads=None, interop_threads=None):
+    """
+    Cap torch's intra-op / inter-op thread pools (``OCR_TORCH_THREADS``,
+    ``OCR_INTEROP_THREADS``).  By default every process would start one
+    thread per core, which oversubscribes the box as soon as several
+    workers run inference together.  ``0`` keeps torch's default.
+    """
+    import torch
+
+    threads = threads if threads is not None else getattr(settings, "OCR_TORCH_THREADS", 0)
+    interop = (
+        interop_threads
+        if interop_threads is not None
+        else getattr(settings, "OCR_INTEROP_THREADS", 0)
+    )
+    if threads:
+        torch.set_num_threads(threads)
+    if interop and torch.get_num_interop_threads() != interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            # only allowed before the first parallel op in this process
+            logger.warning("Could not set torch inter-op threads to %s", interop)
+
+
+def _inference_slots():
+    global _slots
+    if _slots is None:
+        with _lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(
+                    getattr(settings, "OCR_MAX_CONCURRENT", 1)
+                )
+    return _slots
+
+
+def pin_to_cpus(index):
+    """
+    Restrict this process to its own ``OCR_TORCH_THREADS`` cores, chosen
+    round-robin by *index* (e.g. the gunicorn worker number), so workers'
+    torch threads do not migrate across each other's caches.  No-op where
+    ``sched_setaffinity`` is unavailable or the budget is unset.
+    """
+    per_worker = getattr(settings, "OCR_TORCH_THREADS", 0)
+    if not per_worker or not hasattr(os, "sched_setaffinity"):
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    if per_worker >= len(cores):
+        return None
+    start = (index * per_worker) % len(cores)
+    chosen = {cores[(start + i) % len(cores)] for i in range(per_worker)}
+    os.sched_setaffinity(0, chosen)
+    return chosen
+
+
+# ── warm start ──────────────────────────────────────────────────────
+def _warm_up_image():
+    """A small synthetic receipt, enough to run every model layer once."""
+    grey = np.full((320, 480), 255, np.uint8)
+    for i, text in enumerate(["WARM UP STORE", "TIN 000-000-000-000", "TOTAL 123.45"]):
+        cv2.putText(grey, text, (20, 60 + i * 80), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2)
+    return cv2.cvtColor(grey, cv2.COLOR_GRAY2RGB), grey
+
+
+def warm_up_reader(reader):
+    """One inference on a synthetic image, so lazy torch initialisation
+    is paid before the first real request."""
+    _readtext_batched(reader, [_warm_up_image()])
+
+
+def load_reader():
+    """Build the reader now instead of on the first request."""
+    return _get_reader()
+
+
+def warm_up():
+    """
+    Load this process's reader and warm it up (:func:`warm_up_reader`).
+    Safe to call repeatedly; only the first call does the work.
+    """
+    with _warm_lock:
+        if _status["warm"]:
+            return
+        t0 = time.perf_counter()
+        try:
+            warm_up_reader(_get_reader())
+        except Exception as exc:
+            _status["error"] = str(exc) or exc.__class__.__name__
+            raise
+        _status.update(warm=True, warm_ms=_ms(t0), error="")
+        logger.info("OCR reader warm (load %s ms, warm-up %s ms)", _status["load_ms"], _status["warm_ms"])
+
+
+def start_warm_up():
+    """Run :func:`warm_up` on a daemon thread; returns the thread."""
+
+    def _run():
+        try:
+            warm_up()
+        except Exception:
+            logger.exception("OCR warm-up failed")
+
+    thread = threading.Thread(target=_run, name="ocr-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def reader_status() -> dict:
+    """
+    :data:`_status` plus ``ready``: the reader is warm, or warm start is
+    off (``OCR_WARM_START``) and it loads lazily on the first request.
+    """
+    warm_start = getattr(settings, "OCR_WARM_START", False)
+    return {
+        **_status,
+        "warm_start": warm_start,
+        "ready": _status["warm"] or not warm_start,
+        "backend": "remote" if getattr(settings, "OCR_SERVER_SOCKET", None) else "local",
+    }
+
+
+# ── reading order: EasyOCR boxes → text lines ───────────────────────
 def _ordered_lines(result, line_tol_factor=0.7):
-    def min_x(b):
-        return min(p[0] for p in b)
-
-    def min_y(b):
-        return min(p[1] for p in b)
-
-    def center_y(b):
-        ys = [p[1] for p in b]
-        return (min(ys) + max(ys)) / 2
-
-    def height(b):
-        ys = [p[1] for p in b]
-        return max(ys) - min(ys)
-
-    items = []
-    for bbox, text, conf in result:
-        items.append(
-            {
-                "bbox": bbox,
-                "text": text,
-                "conf": conf,
-                "min_x": min_x(bbox),
-                "min_y": min_y(bbox),
-                "cy": center_y(bbox),
-                "h": max(1.0, float(height(bbox))),
-            }
-        )
-
-    items.sort(key=lambda d: (d["min_y"], d["min_x"]))
-
-    hs = [d["h"] for d in items] or [10.0]
-    med_h = float(np.median(hs))
-    line_tol = line_tol_factor * med_h
-
-    lines, current, current_cy = [], [], None
-
-    for d in items:
+    """
+    Group EasyOCR boxes into reading-order lines.  Returns
+    ``(line_texts, line_avg_confidences)``.
+
+    Boxes are taken top-to-bottom (then left-to-right); a box joins the
+    current line while its centre-y is within ``line_tol_factor`` × the
+    median box height of the line's running mean centre-y.  Features are
+    computed on one ``(N, 4, 2)`` corner array.
+    """
+    if not result:
+        return [], []
+
+    texts = [text for _, text, _ in result]
+    confs = np.array([conf for _, _, conf in result], dtype=np.float64)
+    # flattening first is much faster than np.asarray on nested lists
+    corners = np.array(
+        [c for bbox, _, _ in result for point in bbox for c in point],
+        dtype=np.float64,
+    ).reshape(len(result), -1, 2)
+
+    xs, ys = corners[:, :, 0], corners[:, :, 1]
+    min_x = xs.min(axis=1)
+    min_y = ys.min(axis=1)
+    max_y = ys.max(axis=1)
+    cy = (min_y + max_y) / 2
+    h = np.maximum(max_y - min_y, 1.0)
+
+    order = np.lexsort((min_x, min_y))  # stable, like the (min_y, min_x) sort
+    line_tol = line_tol_factor * float(np.median(h))
+
+    # The running mean makes grouping inherently sequential; a plain loop
+    # over Python floats keeps the arithmetic (and so the output) exact.
+    line_of = []
+    line = 0
+    current_cy, count = None, 0
+    for y in cy[order].tolist():
         if current_cy is None:
-            current = [d]
-            current_cy = d["cy"]
-            continue
-        if abs(d["cy"] - current_cy) <= line_tol:
-            current.append(d)
-            current_cy = (
-                current_cy * (len(current) - 1) + d["cy"]
-            ) / len(current)
+            current_cy, count = y, 1
+        elif abs(y - current_cy) <= line_tol:
+            count += 1
+            current_cy = (current_cy * (count - 1) + y) / count
         else:
-            lines.append(current)
-            current = [d]
-            current_cy = d["cy"]
+            line += 1
+            current_cy, count = y, 1
+        line_of.append(line)
+    line_of = np.array(line_of, dtype=np.intp)
 
-    if current:
-        lines.append(current)
+    # within each line: left to right, ties keep the top-down order
+    ranked = order[np.lexsort((min_x[order], line_of))]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(line_of)) + 1))
+    counts = np.diff(np.append(starts, len(ranked)))
 
-    out = []
-    avg_confs = []
-    for line in lines:
-        line.sort(key=lambda d: d["min_x"])
-        text = " ".join(d["text"] for d in line).strip()
-        avg_conf = np.mean([d["conf"] for d in line])
-        out.append(text)
-        avg_confs.append(float(avg_conf))
+    # np.add.reduce per slice is exactly the sum np.mean takes (reduceat
+    # would add sequentially and round differently), minus its overhead
+    ranked_confs = confs[ranked]
+    ranked = ranked.tolist()
+    out, avg_confs = [], []
+    for start, n in zip(starts.tolist(), counts.tolist()):
+        out.append(" ".join(texts[k] for k in ranked[start:start + n]).strip())
+        avg_confs.append(float(np.add.reduce(ranked_confs[start:start + n]) / n))
 
     return out, avg_confs
 
@@ -111,38 +282,418 @@ def extract_text(image_source) -> dict:
 
         {
             "lines": ["line1", "line2", ...],
+            "line_confidences": [0.91, 0.83, ...],
             "paragraph": "line1 line2 ...",
             "avg_confidence": 0.87,
-            "raw_result": <easyocr result list>
+            "raw_result": [[bbox, text, conf], ...],
+            "layout": {"rows": [..], "regions": [..]},  # ocr.layout
+            "image_sha256": "<hex digest of the image bytes>",
+            "cache_hit": False,
         }
+
+    Uploads are decoded straight from memory (no temp file); results are
+    cached by image hash (see ``ocr.cache``), so uploading the same bytes
+    again skips the EasyOCR pass.  An upload carrying ``sha256`` (set
+    while it was streamed in, see ``ocr.uploads``) is not hashed again.  With ``OCR_PREPROCESS`` enabled the
+    image is cropped / deskewed / downscaled first (``ocr.preprocess``);
+    ``raw_result`` boxes are still in original image coordinates.  With
+    ``OCR_PROGRESSIVE`` enabled a low-resolution pass runs first and only
+    its weak boxes are read again at full resolution (``ocr.progressive``).
+
+    Stages (hash, cache, decode, detect, recognize, ...) are timed in
+    ``AdminServer.metrics``.
     """
-    reader = _get_reader()
-
-    # If it's a Django upload file, write to a temp file first
-    if hasattr(image_source, "read"):
-        suffix = ".png"
-        if hasattr(image_source, "name"):
-            _, ext = os.path.splitext(image_source.name)
-            if ext:
-                suffix = ext
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-            for chunk in image_source.chunks():
-                tmp.write(chunk)
-            tmp_path = tmp.name
-        try:
-            raw = reader.readtext(tmp_path)
-        finally:
-            os.unlink(tmp_path)
-    else:
-        raw = reader.readtext(image_source)
+    cfg = preprocess.get_config()
+
+    # digest taken while the upload was streamed in (ocr.uploads): a
+    # cache hit returns before the bytes are opened at all
+    digest = getattr(image_source, "sha256", None)
+    if digest is not None:
+        with metrics.stage("cache"):
+            cached = result_cache.get(_cache_key(digest, cfg))
+        if cached is not None:
+            return _result_from_cache(cached, digest)
+
+    with _image_buffer(image_source) as buf:
+        if digest is None:
+            with metrics.stage("hash"):
+                digest = hashlib.sha256(buf).hexdigest()
+            with metrics.stage("cache"):
+                cached = result_cache.get(_cache_key(digest, cfg))
+            if cached is not None:
+                return _result_from_cache(cached, digest)
+        with metrics.stage("decode"):
+            rgb, grey = _decode_image(buf)
+    raw = _run_reader(_get_reader(), [(rgb, grey)], cfg)[0]
+
+    result = _build_result(raw, digest)
+    result_cache.set(_cache_key(digest, cfg), _cache_entry(result))
+    return result
 
-    lines, confs = _ordered_lines(raw)
-    paragraph = " ".join(" ".join(lines).split())
-    avg_conf = float(np.mean(confs)) if confs else 0.0
+
+def _cache_key(digest, cfg) -> str:
+    """Pre-processed results differ from full-resolution ones, so they
+    are cached per pre-processing config – and per progressive-OCR config
+    and inference backend."""
+    key = f"{digest}-{preprocess.fingerprint(cfg)}" if cfg["enabled"] else digest
+    progressive_cfg = progressive.get_config()
+    if progressive_cfg["enabled"]:
+        key = f"{key}-p{preprocess.fingerprint(progressive_cfg)}"
+    backend = backend_tag()
+    return key if backend == "torch" else f"{key}-{backend}"
+
+
+def backend_tag() -> str:
+    """``torch``, ``onnx-int8`` or ``onnx-fp32`` (``OCR_BACKEND``)."""
+    if getattr(settings, "OCR_BACKEND", "torch") != "onnx":
+        return "torch"
+    return "onnx-int8" if getattr(settings, "OCR_ONNX_QUANTIZED", True) else "onnx-fp32"
+
+
+def _plain_raw(raw):
+    """EasyOCR tuples (with numpy scalars) → JSON-friendly lists."""
+    return [
+        [[[float(x), float(y)] for x, y in bbox], str(text), float(conf)]
+        for bbox, text, conf in raw
+    ]
+
+
+def _build_result(raw, digest=None) -> dict:
+    with metrics.stage("layout"):
+        raw = _plain_raw(raw)
+        lines, confs = _ordered_lines(raw)
+        paragraph = " ".join(" ".join(lines).split())
+        avg_conf = float(np.mean(confs)) if confs else 0.0
+        layout = analyze_layout(raw)
 
     return {
         "lines": lines,
+        "line_confidences": confs,
         "paragraph": paragraph,
         "avg_confidence": round(avg_conf, 4),
         "raw_result": raw,
-    }
\ No newline at end of file
+        "layout": layout,
+        "image_sha256": digest,
+        "cache_hit": False,
+    }
+
+
+def _cache_entry(result) -> dict:
+    return {
+        "lines": result["lines"],
+        "line_confidences": result["line_confidences"],
+        "raw_result": result["raw_result"],
+    }
+
+
+def _result_from_cache(entry, digest) -> dict:
+    lines, confs = entry["lines"], entry["line_confidences"]
+    avg_conf = float(np.mean(confs)) if confs else 0.0
+    return {
+        "lines": lines,
+        "line_confidences": confs,
+        "paragraph": " ".join(" ".join(lines).split()),
+        "avg_confidence": round(avg_conf, 4),
+        "raw_result": entry["raw_result"],
+        "layout": analyze_layout(entry["raw_result"]),
+        "image_sha256": digest,
+        "cache_hit": True,
+    }
+
+
+def perceptual_hash(image_source):
+    """
+    ``billing.duplicates.image_hash`` of a file path or upload, read
+    through :func:`_image_buffer` (no copy); None if it cannot be read.
+    """
+    try:
+        with _image_buffer(image_source) as buf:
+            return image_hash(buf)
+    except (OSError, ValueError):
+        logger.warning("Could not hash image for duplicate detection", exc_info=True)
+        return None
+
+
+# ── in-memory decoding ──────────────────────────────────────────────
+@contextmanager
+def _image_buffer(upload):
+    """
+    Yield the image's bytes without copying them where possible:
+
+    * a file path → a read-only ``mmap`` of the file;
+    * InMemoryUploadedFile → a view of its ``BytesIO`` buffer;
+    * TemporaryUploadedFile, or any upload backed by a real file
+      (e.g. a ``FieldFile`` opened from storage) → a read-only ``mmap``;
+    * anything else → its chunks joined into one ``bytearray``.
+
+    Arrays created from the buffer must be dropped before the block ends.
+    """
+    if isinstance(upload, (str, os.PathLike)):
+        with open(upload, "rb") as fh:
+            # an empty file cannot be mapped
+            if os.fstat(fh.fileno()).st_size == 0:
+                yield b""
+                return
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+        return
+
+    fobj = getattr(upload, "file", upload)
+
+    if isinstance(fobj, io.BytesIO):
+        view = fobj.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+
+    try:
+        fileno = fobj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+
+    if fileno is not None and os.fstat(fileno).st_size > 0:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+        return
+
+    buf = bytearray()
+    for chunk in upload.chunks():
+        buf += chunk
+    yield buf
+
+
+def _decode_image(buf):
+    """
+    Decode encoded image bytes into ``(rgb, grey)`` arrays – the same
+    pair EasyOCR builds internally for the detector / recognizer.  The
+    colour conversion happens in place, so only one colour copy exists.
+    """
+    encoded = np.frombuffer(buf, np.uint8)
+    try:
+        img = cv2.imdecode(encoded, cv2.IMREAD_COLOR) if encoded.size else None
+    finally:
+        # a view still alive (e.g. held by a traceback) makes closing the
+        # buffer raise BufferError instead of the decode error
+        del encoded
+    if img is None:
+        raise ValueError("File is not a readable image.")
+    grey = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    return img, grey
+
+
+# ── batched OCR ─────────────────────────────────────────────────────
+# EasyOCR's detect() defaults: CRAFT scales each input so its long side
+# is mag_ratio times itself, capped at canvas_size
+_DETECT_CANVAS_SIZE = 2560
+_DETECT_MAG_RATIO = 1.0
+
+
+def _detect_group(shape):
+    """
+    Images with the same key are scaled alike by CRAFT whether run alone
+    or padded together: every image under the canvas cap, or the images
+    sharing one capped long side.  Padding a small image next to a large
+    one would otherwise shrink it by the large one's ratio.
+    """
+    side = max(shape[:2])
+    return 0 if side * _DETECT_MAG_RATIO <= _DETECT_CANVAS_SIZE else side
+
+
+def _pad_batch(rgbs):
+    if len(rgbs) == 1:
+        return rgbs[0]  # a single image needs no padded copy
+    height = max(rgb.shape[0] for rgb in rgbs)
+    width = max(rgb.shape[1] for rgb in rgbs)
+    batch = np.full((len(rgbs), height, width, 3), 255, dtype=np.uint8)
+    for i, rgb in enumerate(rgbs):
+        batch[i, : rgb.shape[0], : rgb.shape[1]] = rgb
+    return batch
+
+
+def _readtext_batched(reader, images):
+    """
+    Run the detector over several ``(rgb, grey)`` images – one forward
+    pass per :func:`_detect_group` – then recognise each image's boxes.
+    Within a pass images are padded (white, bottom/right) to a common
+    size so box coordinates stay in each image's own frame.  At most
+    ``OCR_MAX_CONCURRENT`` calls run the models at once per process.
+    """
+    groups = {}
+    for i, (rgb, _) in enumerate(images):
+        groups.setdefault(_detect_group(rgb.shape), []).append(i)
+
+    horizontal_lists, free_lists = [None] * len(images), [None] * len(images)
+    t0 = time.perf_counter()
+    with _inference_slots():
+        metrics.observe_stage("inference_wait", time.perf_counter() - t0)
+        with metrics.stage("detect"):
+            for members in groups.values():
+                horizontal, free = reader.detect(
+                    _pad_batch([images[i][0] for i in members]), reformat=False
+                )
+                for i, h, f in zip(members, horizontal, free):
+                    horizontal_lists[i], free_lists[i] = h, f
+        with metrics.stage("recognize"):
+            return [
+                reader.recognize(grey, horizontal_lists[i], free_lists[i], reformat=False)
+                for i, (_, grey) in enumerate(images)
+            ]
+
+
+def _run_reader(reader, images, cfg, progressive_cfg=None):
+    """
+    :func:`_readtext_batched`, with each image pre-processed first when
+    *cfg* is enabled and the boxes mapped back to original coordinates;
+    progressively (:func:`_run_progressive`) when *progressive_cfg*
+    (default ``OCR_PROGRESSIVE``) is enabled.
+    """
+    progressive_cfg = progressive_cfg or progressive.get_config()
+    if progressive_cfg["enabled"]:
+        return [raw for raw, _ in _run_progressive(reader, images, cfg, progressive_cfg)]
+    return _run_single_pass(reader, images, cfg)
+
+
+def _run_single_pass(reader, images, cfg):
+    if not cfg["enabled"]:
+        return _readtext_batched(reader, images)
+
+    prepared, transforms = [], []
+    with metrics.stage("preprocess"):
+        for rgb, grey in images:
+            det_img, rec_grey, transform = preprocess.preprocess(rgb, grey, cfg)
+            prepared.append((det_img, rec_grey))
+            transforms.append(transform)
+    raws = _readtext_batched(reader, prepared)
+    return [t.map_raw(raw) for t, raw in zip(transforms, raws)]
+
+
+def _first_pass_parse(raw):
+    lines, _ = _ordered_lines(raw)
+    return parse_receipt(lines, " ".join(" ".join(lines).split()), analyze_layout(raw))
+
+
+def _run_progressive(reader, images, cfg, progressive_cfg):
+    """
+    Progressive OCR (see ``ocr.progressive``): one low-resolution pass
+    over all *images*, then each image's weak boxes recognised again on
+    its full-resolution grey plane.  Returns ``(raw, info)`` per image;
+    *info* counts the boxes, those read again, and whether the image
+    needed a full pass instead.
+    """
+    first = _run_single_pass(reader, images, progressive.first_pass_config(cfg, progressive_cfg))
+    out = []
+    for (rgb, grey), raw in zip(images, first):
+        raw = _plain_raw(raw)
+        with metrics.stage("progressive_select"):
+            weak = progressive.weak_entries(
+                raw,
+                _first_pass_parse(raw) if progressive_cfg["fields"] else None,
+                progressive_cfg,
+            )
+        info = {"boxes": len(raw), "reread": len(weak), "full_pass": False}
+
+        if not raw or len(weak) > progressive_cfg["max_weak_share"] * len(raw):
+            info["full_pass"] = True
+            raw = _plain_raw(_run_single_pass(reader, [(rgb, grey)], cfg)[0])
+        elif weak:
+            horizontal, free = progressive.crop_lists(raw, weak, grey.shape)
+            with _inference_slots(), metrics.stage("reread"):
+                reread = reader.recognize(grey, horizontal, free, reformat=False)
+            raw = progressive.merge(raw, weak, reread, grey.shape)
+        out.append((raw, info))
+    return out
+
+
+def _ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def extract_text_batch(image_sources, batch_size=None) -> list:
+    """
+    OCR many images through the shared reader, ``batch_size`` images per
+    detector pass (default ``OCR_BATCH_SIZE``).  Cached images skip the
+    reader.
+
+    Returns one dict per input, in input order: the :func:`extract_text`
+    payload, or ``{"error": "<message>"}`` when that image failed.  An
+    unreachable OCR server fails the whole call (``OcrServerError``).  Each
+    dict carries ``timing_ms`` with ``decode`` and ``ocr`` (the image's
+    share of its batch) in milliseconds.
+    """
+    batch_size = batch_size or getattr(settings, "OCR_BATCH_SIZE", 4)
+    cfg = preprocess.get_config()
+    sources = list(image_sources)
+    out = [None] * len(sources)
+
+    # decode one batch at a time so peak memory stays at batch_size images
+    for start in range(0, len(sources), batch_size):
+        decoded = []
+        for idx in range(start, min(start + batch_size, len(sources))):
+            t0 = time.perf_counter()
+            try:
+                digest = getattr(sources[idx], "sha256", None)
+                cached = (
+                    result_cache.get(_cache_key(digest, cfg))
+                    if digest is not None else None
+                )
+                if cached is None:
+                    with _image_buffer(sources[idx]) as buf:
+                        if digest is None:
+                            digest = hashlib.sha256(buf).hexdigest()
+                            cached = result_cache.get(_cache_key(digest, cfg))
+                        if cached is None:
+                            rgb, grey = _decode_image(buf)
+                if cached is not None:
+                    out[idx] = {
+                        **_result_from_cache(cached, digest),
+                        "timing_ms": {"decode": _ms(t0), "ocr": 0.0},
+                    }
+                    continue
+            except Exception as exc:
+                out[idx] = {"error": str(exc), "timing_ms": {"decode": _ms(t0)}}
+                continue
+            decoded.append((idx, rgb, grey, digest, _ms(t0)))
+
+        if not decoded:
+            continue
+
+        reader = _get_reader()
+        t0 = time.perf_counter()
+        try:
+            raws = _run_reader(reader, [(d[1], d[2]) for d in decoded], cfg)
+            share = _ms(t0) / len(decoded)
+            outcomes = [(raw, share) for raw in raws]
+        except OcrServerError:
+            raise
+        except Exception:
+            # isolate the bad image: retry this batch one image at a time
+            logger.exception("Batched OCR failed, retrying images individually")
+            outcomes = []
+            for _, rgb, grey, _, _ in decoded:
+                t1 = time.perf_counter()
+                try:
+                    outcomes.append((_run_reader(reader, [(rgb, grey)], cfg)[0], _ms(t1)))
+                except OcrServerError:
+                    raise
+                except Exception as exc:
+                    outcomes.append((exc, _ms(t1)))
+
+        for (idx, _, _, digest, decode_ms), (raw, ocr_ms) in zip(decoded, outcomes):
+            timing = {"decode": decode_ms, "ocr": round(ocr_ms, 2)}
+            if isinstance(raw, Exception):
+                out[idx] = {"error": str(raw), "timing_ms": timing}
+            else:
+                result = _build_result(raw, digest)
+                result_cache.set(_cache_key(digest, cfg), _cache_entry(result))
+                out[idx] = {**result, "timing_ms": timing}
+
+    return out
@@ -0,0 +1,54 @@
+"""
+Signal receivers connected in ``OcrConfig.ready``.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from businesses.resolver import normalize_name, normalize_tin
+
+from . import jobs, templates
+from .categorizer import invalidate_index
+from .models import SellerLayoutTemplate
+
+def _category_changed(sender, **kwargs):
+    # after commit, so a rebuild in another thread cannot see the old rows
+    transaction.on_commit(invalidate_index)
+
+
+def _receipt_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.receipt_image and templates.enabled():
+        # learned by the ocr_worker pool; in the receipt's transaction, so
+        # a rolled-back receipt leaves no job behind
+        jobs.submit_learning(instance)
+
+
+def _seller_saved(sender, instance, created, raw=False, **kwargs):
+    # the keys a template is identified by follow the seller's details
+    if created or raw:
+        return
+    updated = SellerLayoutTemplate.objects.filter(seller=instance).update(
+        tin=normalize_tin(instance.tin),
+        header_key=normalize_name(instance.registered_business_name)[:255],
+    )
+    if updated:
+        transaction.on_commit(lambda: templates.store.forget(instance.pk))
+
+
+def connect():
+    post_save.connect(
+        _category_changed, sender="billing.ExpenseCategory",
+        dispatch_uid="ocr.category_index.save",
+    )
+    post_delete.connect(
+        _category_changed, sender="billing.ExpenseCategory",
+        dispatch_uid="ocr.category_index.delete",
+    )
+    post_save.connect(
+        _receipt_saved, sender="billing.Receipt",
+        dispatch_uid="ocr.layout_templates.receipt",
+    )
+    post_save.connect(
+        _seller_saved, sender="businesses.Seller",
+        dispatch_uid="ocr.layout_templates.seller",
+    )
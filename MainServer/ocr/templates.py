@@ -0,0 +1,588 @@
+"""
+Per-seller layout templates: field positions learned from a seller's
+confirmed receipts, read straight off its later ones.
+
+Most receipts come from a few merchants, and a merchant prints every
+receipt the same way.  From a seller's confirmed (saved) receipts
+:func:`learn` records where each field's value was printed: the box
+holding the confirmed serial number, date, amounts and buyer, as its
+horizontal extent relative to the text, and its distance – in lines
+(the median line spacing) – from the top and from the bottom of the
+text.  Header fields keep their distance from the top, totals from the
+bottom (they move with the number of items); the steadier of the two is
+used.
+
+On a new receipt :class:`TemplateStore` identifies the seller from the
+first ``OCR_TEMPLATE_HEADER_LINES`` lines – a TIN printed there, else
+a line that is the seller's whole normalised name – and :func:`parse_with_template` reads
+each field from the box nearest to where the template expects it.  The
+seller and printer details come from the confirmed records.  When every
+learned field is found, ``parse_receipt`` is skipped; otherwise it runs
+as usual and the fields the template found take precedence.
+
+Templates buy accuracy, not speed: reading the fields off a template
+costs as much as the single-pass generic parser or a little more
+(0.2-0.4 ms a receipt, next to seconds of OCR).  What they remove is
+review-form corrections; ``manage.py ocr_benchmark templates`` reports
+both.
+
+Templates are ``SellerLayoutTemplate`` rows, learned after a receipt
+with an image is saved – by ``manage.py ocr_worker``, from a job queued
+in ``ocr.signals``, with the OCR boxes from the result cache – or
+rebuilt by ``manage.py learn_layout_templates``.  A seller's
+template is used once it has ``OCR_TEMPLATE_MIN_RECEIPTS`` receipts.
+Each process keeps the identifying keys of all templates and an LRU
+cache of ``OCR_TEMPLATE_CACHE_SIZE`` templates, both re-read after
+``OCR_TEMPLATE_CACHE_SECONDS``.
+"""
+
+import hashlib
+import io
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from billing.rollups import local_day
+from businesses.models import PLACEHOLDER_TIN
+from businesses.resolver import normalize_name, normalize_tin
+
+from .models import SellerLayoutTemplate
+from .parser import (
+    AMOUNT_RE,
+    FIELD_KEYWORDS,
+    SERIAL_RE,
+    TIN_RE,
+    _BUYER_PREFIX_RE,
+    _clean_amount,
+    _detect_receipt_type,
+    _find_date,
+    _find_tin,
+    _flat_item,
+    _items_from_layout,
+    empty_result,
+    parse_receipt,
+)
+
+logger = logging.getLogger(__name__)
+
+# field → (section of parse_receipt's result, kind of value)
+FIELDS = {
+    "serial_number": ("receipt", "serial"),
+    "transaction_date": ("receipt", "date"),
+    "gross_sales": ("receipt", "amount"),
+    "vatable_sales": ("receipt", "amount"),
+    "vat_amount": ("receipt", "amount"),
+    "vat_exempt_sales": ("receipt", "amount"),
+    "zero_rated_sales": ("receipt", "amount"),
+    "total_amount_due": ("receipt", "amount"),
+    "buyer_name": ("buyer", "text"),
+    "buyer_address": ("buyer", "text"),
+    "buyer_tin": ("buyer", "tin"),
+}
+_AMOUNT_FIELDS = [field for field, (_, kind) in FIELDS.items() if kind == "amount"]
+
+# labels telling equal amounts apart (the total is often the gross too)
+_LABELS = {**FIELD_KEYWORDS, "total_amount_due": [*FIELD_KEYWORDS["total_amount_due"], "TOTAL"]}
+_SERIAL_TOKEN_RE = re.compile(r"[A-Z0-9\-]*\d[A-Z0-9\-]*")
+_SPACE_RE = re.compile(r"\s+")
+
+# a field is part of the template once found on this share of its receipts
+_MIN_SHARE = 0.5
+# where a field is looked for: this many standard deviations (in lines,
+# at least _MIN_TOLERANCE) around the expected line, and this share of
+# the text width either side of the learned extent
+_MIN_TOLERANCE = 0.75
+_TOLERANCE_STDS = 2.5
+_X_SLACK = 0.1
+
+
+def enabled():
+    return getattr(settings, "OCR_TEMPLATES_ENABLED", True)
+
+
+def _min_receipts():
+    return getattr(settings, "OCR_TEMPLATE_MIN_RECEIPTS", 3)
+
+
+# ── geometry ────────────────────────────────────────────────────────
+def _median(values):
+    # the upper median: np.median costs more than the rest of a lookup
+    return float(np.partition(values, len(values) // 2)[len(values) // 2])
+
+
+class _Boxes:
+    """Extents and centres of plain ``[bbox, text, conf]`` items, turned
+    level by the median slope of their top edges (a receipt photographed
+    askew), and the frame of all the text: its edges and the median
+    spacing of its lines (``height``)."""
+
+    def __init__(self, raw):
+        corners = np.fromiter(
+            chain.from_iterable(chain.from_iterable(bbox for bbox, _, _ in raw)),
+            dtype=np.float64,
+            count=8 * len(raw),
+        ).reshape(-1, 4, 2)
+        edge = corners[:, 1] - corners[:, 0]
+        angle = _median(np.arctan2(edge[:, 1], edge[:, 0]))
+        if angle:
+            cos, sin = np.cos(angle), np.sin(angle)
+            corners = corners @ np.array([[cos, -sin], [sin, cos]])
+        (self.x0, self.y0), (self.x1, self.y1) = corners.min(axis=1).T, corners.max(axis=1).T
+        self.cx = (self.x0 + self.x1) / 2
+        self.cy = (self.y0 + self.y1) / 2
+        self.texts = [text for _, text, _ in raw]
+
+        self.left, self.top = float(self.x0.min()), float(self.y0.min())
+        self.bottom = float(self.y1.max())
+        self.width = max(float(self.x1.max()) - self.left, 1.0)
+        # the line pitch: box heights vary with the text, the spacing of
+        # a printer's lines does not
+        text_height = max(_median(self.y1 - self.y0), 1.0)
+        gaps = np.diff(np.sort(self.cy))
+        gaps = gaps[gaps > text_height / 2]
+        self.height = _median(gaps) if gaps.size else text_height
+
+    def row(self, n) -> str:
+        """The text level with box *n*, left to right."""
+        level = np.flatnonzero((self.cy >= self.y0[n]) & (self.cy <= self.y1[n]))
+        return " ".join(self.texts[k] for k in level[np.argsort(self.x0[level], kind="stable")])
+
+    def position(self, n) -> dict:
+        return {
+            "x0": (float(self.x0[n]) - self.left) / self.width,
+            "x1": (float(self.x1[n]) - self.left) / self.width,
+            "top": (float(self.cy[n]) - self.top) / self.height,
+            "bottom": (self.bottom - float(self.cy[n])) / self.height,
+        }
+
+
+def _norm(text):
+    return _SPACE_RE.sub(" ", text or "").strip().upper()
+
+
+def _value_of(kind, text) -> str:
+    """The value of a *kind* field in box text *text*, formatted as
+    ``parse_receipt`` formats it; "" when there is none."""
+    if kind == "amount":
+        amounts = AMOUNT_RE.findall(text)
+        return _clean_amount(amounts[-1]) if amounts else ""
+    if kind == "date":
+        return _find_date(text) or ""
+    if kind == "tin":
+        return _find_tin(text) or ""
+    if kind == "serial":
+        m = SERIAL_RE.search(text)
+        if m and any(c.isdigit() for c in m.group(1)):
+            return m.group(1).strip()
+        tokens = _SERIAL_TOKEN_RE.findall(text.upper())
+        return tokens[-1] if tokens else ""
+    return _BUYER_PREFIX_RE.sub("", text).strip()
+
+
+def _holds(kind, text, value) -> bool:
+    """Whether box text *text* shows the confirmed *value*."""
+    if kind == "amount":
+        try:
+            want = Decimal(value)
+            return any(Decimal(_clean_amount(a)) == want for a in AMOUNT_RE.findall(text))
+        except InvalidOperation:
+            return False
+    if kind == "date":
+        return (_find_date(text) or "")[:10] == value[:10]
+    if kind == "tin":
+        found = _find_tin(text)
+        return bool(found) and normalize_tin(found)[:9] == normalize_tin(value)[:9]
+    if kind == "serial":
+        return _norm(value) in _SERIAL_TOKEN_RE.findall(text.upper())
+    return _norm(value) in _norm(_BUYER_PREFIX_RE.sub("", text))
+
+
+def _locate(boxes, field, value):
+    """The box showing *field*'s confirmed *value*, or None if there is
+    none or it is ambiguous."""
+    kind = FIELDS[field][1]
+    found = [n for n, text in enumerate(boxes.texts) if _holds(kind, text, value)]
+    if len(found) <= 1 or kind != "amount":
+        return min(found, key=lambda n: boxes.cy[n]) if found else None
+    # equal amounts: the one on a line labelled for this field
+    for label in _LABELS.get(field, ()):
+        labelled = [n for n in found if label in boxes.row(n).upper()]
+        if labelled:
+            return labelled[0]
+    return None
+
+
+# ── learning ────────────────────────────────────────────────────────
+def _update(stats, position):
+    """Running mean and sum of squared deviations (Welford) per key."""
+    n = stats["n"] = stats.get("n", 0) + 1
+    for key, value in position.items():
+        mean = stats.get(key, 0.0)
+        delta = value - mean
+        mean += delta / n
+        stats[key] = mean
+        stats[f"{key}_m2"] = stats.get(f"{key}_m2", 0.0) + delta * (value - mean)
+
+
+def learn(layout, raw, values) -> dict:
+    """
+    Add one confirmed receipt to *layout* (a template's ``layout``, or
+    ``{}``): *raw* is its OCR result (plain ``[bbox, text, conf]``
+    items), *values* its confirmed ``{field: value}`` (see
+    :func:`confirmed_values`).  Returns the updated layout.
+    """
+    layout = {"receipts": 0, "fields": {}, **(layout or {})}
+    layout["receipts"] += 1
+    if not raw:
+        return layout
+    boxes = _Boxes(raw)
+    for field, value in values.items():
+        if field not in FIELDS or not value:
+            continue
+        n = _locate(boxes, field, value)
+        if n is not None:
+            _update(layout["fields"].setdefault(field, {}), boxes.position(n))
+    return layout
+
+
+def confirmed_values(receipt) -> dict:
+    """The template fields of a saved ``billing.Receipt``, formatted as
+    ``parse_receipt`` formats them."""
+    values = {
+        "serial_number": receipt.serial_number,
+        "transaction_date": local_day(receipt.transaction_date).isoformat(),
+    }
+    for field in _AMOUNT_FIELDS:
+        amount = getattr(receipt, field)
+        if amount:
+            # as assigned: a Decimal, or a string until reloaded
+            values[field] = f"{Decimal(amount):.2f}"
+    if receipt.buyer_id:
+        buyer = receipt.buyer
+        values.update(
+            buyer_name=buyer.buyer_name,
+            buyer_address=buyer.buyer_address,
+            buyer_tin=buyer.buyer_tin or "",
+        )
+    return {field: value for field, value in values.items() if value}
+
+
+def ocr_raw(receipt, run_ocr=False):
+    """
+    The OCR boxes of *receipt*'s image from the OCR result cache (it was
+    OCR'd for review moments before it was saved) or, with *run_ocr*, a
+    new OCR pass; None when there are none.
+    """
+    from . import preprocess, services
+    from .cache import result_cache
+
+    if not receipt.receipt_image:
+        return None
+    try:
+        with receipt.receipt_image.open("rb") as fh:
+            data = fh.read()
+    except OSError:
+        logger.warning("Could not read receipt image %s", receipt.receipt_image.name, exc_info=True)
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    cached = result_cache.get(services._cache_key(digest, preprocess.get_config()))
+    if cached is not None:
+        return cached["raw_result"]
+    if run_ocr:
+        return services.extract_text(io.BytesIO(data))["raw_result"]
+    return None
+
+
+def learn_receipt(receipt, run_ocr=False) -> bool:
+    """
+    Add a saved receipt to its seller's template (creating it).  False
+    when the receipt cannot be learned from: a seller without a TIN, or
+    no OCR result for its image.
+    """
+    seller = receipt.seller
+    tin = normalize_tin(seller.tin)
+    if not tin:
+        return False
+    raw = ocr_raw(receipt, run_ocr=run_ocr)
+    if not raw:
+        return False
+
+    values = confirmed_values(receipt)
+    with transaction.atomic():
+        template, _ = SellerLayoutTemplate.objects.select_for_update().get_or_create(seller=seller)
+        template.layout = learn(template.layout, raw, values)
+        template.receipts = template.layout["receipts"]
+        template.tin = tin
+        template.header_key = normalize_name(seller.registered_business_name)[:255]
+        if receipt.atp_id:
+            template.atp_id = receipt.atp_id
+        template.save()
+    store.forget(seller.pk)
+    return True
+
+
+# ── reading fields ──────────────────────────────────────────────────
+def _std(stats, key):
+    n = stats["n"]
+    return (max(stats[f"{key}_m2"], 0.0) / (n - 1)) ** 0.5 if n > 1 else None
+
+
+def _window(stats):
+    """``(from the top?, offset, tolerance)`` of a learned field: its
+    distance from the steadier edge of the text and how far from there it
+    is looked for, in lines."""
+    std_top, std_bottom = _std(stats, "top"), _std(stats, "bottom")
+    if std_top is None:
+        # one receipt: measure from the nearer edge
+        from_top, std = stats["top"] <= stats["bottom"], 0.0
+    else:
+        from_top, std = std_top <= std_bottom, min(std_top, std_bottom)
+    offset = stats["top"] if from_top else stats["bottom"]
+    return from_top, offset, max(_MIN_TOLERANCE, _TOLERANCE_STDS * std)
+
+
+class LayoutTemplate:
+    """
+    A learned layout with its seller's confirmed details, as cached.
+    *seller* and *printer* are ``parse_receipt`` result sections.
+    """
+
+    def __init__(self, seller_id, layout, seller=None, printer=None):
+        self.seller_id = seller_id
+        self.seller = seller or {}
+        self.printer = printer or {}
+        receipts = layout.get("receipts", 0)
+        self.fields = {
+            field: stats
+            for field, stats in layout.get("fields", {}).items()
+            if field in FIELDS and stats["n"] >= _MIN_SHARE * receipts
+        }
+        # one row per field: measured from the top?, offset and tolerance
+        # (in lines), horizontal extent (share of the text width)
+        windows = np.array(
+            [(*_window(stats), stats["x0"] - _X_SLACK, stats["x1"] + _X_SLACK)
+             for stats in self.fields.values()],
+            dtype=np.float64,
+        ).reshape(-1, 5)
+        self._from_top, self._offset, self._tolerance, self._x0, self._x1 = (
+            column.reshape(-1, 1) for column in windows.T
+        )
+        self._kinds = [FIELDS[field][1] for field in self.fields]
+
+    @classmethod
+    def from_model(cls, template):
+        seller = template.seller
+        atp = template.atp
+        printer = None
+        if atp is not None:
+            printer = {
+                "authority_to_print_number": atp.authority_to_print_number,
+                "printer_name": atp.printer_name,
+                "printer_tin": atp.printer_tin,
+                "printer_address": atp.printer_address,
+                "atp_issue_date": atp.atp_issue_date.isoformat(),
+                "bir_permit_number": atp.bir_permit_number,
+                "serial_start": atp.serial_start,
+                "serial_end": atp.serial_end,
+            }
+        return cls(
+            template.seller_id,
+            template.layout,
+            seller={
+                "registered_business_name": seller.registered_business_name,
+                "business_address": seller.business_address,
+                "tin": "" if seller.tin == PLACEHOLDER_TIN else seller.tin,
+                "vat_status": seller.vat_status,
+            },
+            printer=printer,
+        )
+
+    def extract(self, raw) -> dict:
+        """``{field: value}`` for the template fields found in *raw*."""
+        if not raw or not self.fields:
+            return {}
+        boxes = _Boxes(raw)
+        # every field against every box at once
+        y = np.where(
+            self._from_top > 0,
+            boxes.top + self._offset * boxes.height,
+            boxes.bottom - self._offset * boxes.height,
+        )
+        dy = np.abs(boxes.cy - y)
+        near = (
+            (dy <= self._tolerance * boxes.height)
+            & (boxes.cx >= boxes.left + self._x0 * boxes.width)
+            & (boxes.cx <= boxes.left + self._x1 * boxes.width)
+        )
+        dy[~near] = np.inf
+        order = np.argsort(dy, axis=1, kind="stable")
+        counts = near.sum(axis=1).tolist()
+
+        found = {}
+        for f, field in enumerate(self.fields):
+            for n in order[f, : counts[f]].tolist():
+                value = _value_of(self._kinds[f], boxes.texts[n])
+                if value:
+                    found[field] = value
+                    break
+        return found
+
+
+def parse_with_template(template, lines, paragraph, layout=None, raw=None) -> dict:
+    """
+    ``parse_receipt``'s result for a receipt of *template*'s seller, plus
+    ``layout_template``: the seller id, the fields read from the template
+    and whether the generic parser was skipped (``generic_skipped``).
+    """
+    found = template.extract(raw)
+    skipped = bool(template.fields) and len(found) == len(template.fields)
+    if skipped:
+        result = empty_result(paragraph)
+        result["receipt"]["receipt_type"] = _detect_receipt_type(paragraph)
+        if layout:
+            result["items"] = _items_from_layout(layout)
+        if not result["items"]:
+            result["items"] = [item for item in map(_flat_item, lines) if item]
+    else:
+        result = parse_receipt(lines, paragraph, layout)
+
+    result["seller"].update(template.seller)
+    result["printer"].update(template.printer)
+    for field, value in found.items():
+        result[FIELDS[field][0]][field] = value
+    if skipped and not result["receipt"]["gross_sales"]:
+        result["receipt"]["gross_sales"] = result["receipt"]["total_amount_due"]
+
+    result["layout_template"] = {
+        "seller_id": template.seller_id,
+        "fields": sorted(found),
+        "generic_skipped": skipped,
+    }
+    return result
+
+
+# ── identifying the seller ──────────────────────────────────────────
+def identify(lines, keys, header_lines=None):
+    """
+    The seller id *keys* (``{"tin:<digits>" | "name:<normalised name>":
+    seller id}``) gives the receipt with these *lines*.  A TIN in the
+    header decides alone – a receipt showing another TIN is another
+    seller's, whatever its name – else a header line whose whole
+    normalised text is a seller's name.
+    """
+    header = lines[: header_lines or getattr(settings, "OCR_TEMPLATE_HEADER_LINES", 6)]
+    tins = ["".join(m.groups()) for m in map(TIN_RE.search, header) if m]
+    if tins:
+        for digits in tins:
+            # a seller registered without its branch code keys on 9 digits
+            seller_id = keys.get(f"tin:{digits}", keys.get(f"tin:{digits[:9]}"))
+            if seller_id is not None:
+                return seller_id
+        return None
+    for line in header:
+        name = normalize_name(line)[:255]
+        if name and f"name:{name}" in keys:
+            return keys[f"name:{name}"]
+    return None
+
+
+class TemplateStore:
+    """
+    The identifying keys of every usable template, and an LRU cache of
+    the templates themselves (``OCR_TEMPLATE_CACHE_SIZE``), both read
+    from the database again after ``OCR_TEMPLATE_CACHE_SECONDS``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates = OrderedDict()  # seller id → (loaded at, LayoutTemplate or None)
+        self._keys = None
+        self._keys_at = 0.0
+
+    @property
+    def max_age(self):
+        return getattr(settings, "OCR_TEMPLATE_CACHE_SECONDS", 300)
+
+    @property
+    def size(self):
+        return getattr(settings, "OCR_TEMPLATE_CACHE_SIZE", 256)
+
+    def keys(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            if self._keys is not None and now - self._keys_at < self.max_age:
+                return self._keys
+        keys = {}
+        rows = (
+            SellerLayoutTemplate.objects.filter(receipts__gte=_min_receipts())
+            .order_by("receipts", "pk")
+            .values_list("seller_id", "tin", "header_key")
+        )
+        # several branches share a TIN: the most used template wins
+        for seller_id, tin, header_key in rows:
+            if tin:
+                keys[f"tin:{tin}"] = seller_id
+            if header_key:
+                keys[f"name:{header_key}"] = seller_id
+        with self._lock:
+            self._keys, self._keys_at = keys, now
+        return keys
+
+    def get(self, seller_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._templates.get(seller_id)
+            if entry is not None and now - entry[0] < self.max_age:
+                self._templates.move_to_end(seller_id)
+                return entry[1]
+        row = (
+            SellerLayoutTemplate.objects.select_related("seller", "atp")
+            .filter(seller_id=seller_id, receipts__gte=_min_receipts())
+            .first()
+        )
+        template = LayoutTemplate.from_model(row) if row else None
+        with self._lock:
+            self._templates[seller_id] = (now, template)
+            self._templates.move_to_end(seller_id)
+            while len(self._templates) > self.size:
+                self._templates.popitem(last=False)
+        return template
+
+    def find(self, lines):
+        """The template of the seller these receipt *lines* are from, or
+        None."""
+        seller_id = identify(lines, self.keys())
+        return None if seller_id is None else self.get(seller_id)
+
+    def forget(self, seller_id=None):
+        """Drop a seller's cached template (all, without *seller_id*) and
+        the keys; both are read again on next use."""
+        with self._lock:
+            if seller_id is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(seller_id, None)
+            self._keys = None
+
+    def __len__(self):
+        return len(self._templates)
+
+
+store = TemplateStore()
+
+
+def parse(lines, paragraph, layout=None, raw=None) -> dict:
+    """``parse_receipt``, through the seller's template when the receipt
+    is from a seller with one (and ``OCR_TEMPLATES_ENABLED``)."""
+    template = store.find(lines) if enabled() and raw else None
+    if template is None:
+        return parse_receipt(lines, paragraph, layout)
+    return parse_with_template(template, lines, paragraph, layout, raw)
@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+import torch
+from dateutil import parser as dateutil_parser
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    SimpleUploadedFile,
+    TemporaryUploadedFile,
+)
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Buyer
+from billing.bulk import bulk_create_receipts
+from billing.management.commands.benchmark_bulk_receipts import synthetic_payloads
+from billing.models import ExpenseCategory, Receipt
+from businesses.models import Seller
+
+from . import categorizer, classifier, jobs, services, templates
+from .benchmarks import pipeline as pipeline_benchmark
+from .benchmarks import templates as templates_benchmark
+from .benchmarks.corpus import (
+    _AMOUNT_RE,
+    _receipt_lines,
+    build_corpus,
+    build_variant_corpus,
+    make_merchant,
+    make_variant,
+)
+from .benchmarks.ordered_lines import reference_ordered_lines, synthetic_boxes
+from .benchmarks.parser import (
+    _box,
+    golden_corpus,
+    golden_layouts,
+    long_receipts,
+    paragraph_of,
+    reference_parse_receipt,
+)
+from .cache import CACHE_VERSION, OcrResultCache, result_cache
+from .categorizer import KeywordIndex, categorize, category_candidates, get_index, invalidate_index
+from .layout import analyze_layout
+from .model_server import OcrModelServer, OcrServerError, RemoteReader, recv_message, send_message
+from .models import OcrJob, SellerLayoutTemplate
+from .onnx_backend import LineRecognizer, load_onnx_reader
+from .parser import TIN_RE, _find_date, parse_receipt
+from .preprocess import Transform, _receipt_bounds, get_config as preprocess_config, preprocess
+from .progressive import crop_lists, get_config as progressive_config, merge, weak_entries
+from .services import (
+    _DETECT_CANVAS_SIZE,
+    _build_result,
+    _cache_key,
+    _decode_image,
+    _image_buffer,
+    _ordered_lines,
+    _plain_raw,
+    _readtext_batched,
+    _run_progressive,
+    _run_reader,
+)
+
+
+class OrderedLinesEquivalenceTests(SimpleTestCase):
+    """The vectorised ``_ordered_lines`` must match the original exactly."""
+
+    def assertSameAsReference(self, raw, **kwargs):
+        self.assertEqual(
+            _ordered_lines(raw, **kwargs),
+            reference_ordered_lines(raw, **kwargs),
+        )
+
+    def test_empty_and_single_box(self):
+        self.assertSameAsReference([])
+        self.assertSameAsReference([[[[0, 0], [10, 0], [10, 8], [0, 8]], "ONLY", 0.5]])
+
+    def test_random_layouts(self):
+        for seed in range(25):
+            for count in (2, 7, 60, 300):
+                with self.subTest(seed=seed, count=count):
+                    self.assertSameAsReference(synthetic_boxes(count, seed=seed))
+
+    def test_tolerance_factor(self):
+        raw = synthetic_boxes(80, seed=3)
+        for factor in (0.0, 0.3, 1.5, 5.0):
+            with self.subTest(factor=factor):
+                self.assertSameAsReference(raw, line_tol_factor=factor)
+
+    def test_ties_and_degenerate_boxes(self):
+        rng = random.Random(7)
+        raw = []
+        for i in range(120):
+            # integer grid coordinates: many identical min_y / min_x values,
+            # zero-height boxes and duplicated boxes
+            x, y = rng.randint(0, 5) * 50, rng.randint(0, 8) * 20
+            h = rng.choice([0, 10, 10, 12])
+            raw.append([[[x, y], [x + 40, y], [x + 40, y + h], [x, y + h]], f"t{i}", rng.random()])
+        raw += raw[:10]
+        self.assertSameAsReference(raw)
+
+    def test_rotated_boxes(self):
+        rng = random.Random(11)
+        raw = []
+        for i in range(50):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 800)
+            raw.append([
+                [[x, y], [x + 60, y - 6], [x + 62, y + 14], [x + 2, y + 20]],
+                f"r{i}",
+                rng.random(),
+            ])
+        self.assertSameAsReference(raw)
+
+
+class ParseReceiptGoldenCorpusTests(SimpleTestCase):
+    """The single-pass ``parse_receipt`` must match the multi-pass original."""
+
+    def assertSameAsReference(self, lines, layout=None, paragraph=None):
+        if paragraph is None:
+            paragraph = paragraph_of(lines)
+        self.assertEqual(
+            parse_receipt(lines, paragraph, layout),
+            reference_parse_receipt(lines, paragraph, layout),
+        )
+
+    def test_golden_corpus(self):
+        for seed in range(3):
+            for n, lines in enumerate(golden_corpus(150, seed=seed)):
+                with self.subTest(seed=seed, receipt=n):
+                    self.assertSameAsReference(lines)
+
+    def test_long_receipts(self):
+        for n, lines in enumerate(long_receipts(10)):
+            with self.subTest(receipt=n):
+                self.assertSameAsReference(lines)
+
+    def test_layouts(self):
+        for n, (lines, layout) in enumerate(golden_layouts()):
+            with self.subTest(case=n):
+                self.assertSameAsReference(lines, layout)
+                self.assertSameAsReference(lines, {"rows": [], "regions": []})
+
+    def test_non_ascii_keywords(self):
+        # "ſ".upper() == "S" but "ſ".lower() != "s"
+        for lines in (
+            ["ACME", "ſERIAL RANGE 1001-2000", "groſs sales 10.00", "total due 20.00"],
+            ["Café", "Café TOTAL DUE 10.00", "ßTOTAL SALE 20.00"],
+            ["ACME", "STRAßE 1", "Gross ſales 5.00 total due 7.00"],
+        ):
+            with self.subTest(lines=lines):
+                self.assertSameAsReference(lines)
+
+    def test_paragraph_independent_of_lines(self):
+        lines = ["ACME", "No. 123"]
+        self.assertSameAsReference(lines, paragraph="")
+        self.assertSameAsReference(lines, paragraph="NON VAT SALES INVOICE 99.00")
+
+    def test_numeric_dates_match_dateutil(self):
+        def dateutil_date(text):
+            try:
+                return dateutil_parser.parse(text, dayfirst=False).isoformat()
+            except (ValueError, OverflowError):
+                return None
+
+        # every day / month pair, valid or not, including mixed separators
+        # and two-digit years, which are still left to dateutil
+        for year in ("1999", "2024", "2100", "24", "1000", "3000"):
+            for sep, sep2 in (("/", "/"), ("-", "-"), ("/", "-")):
+                for first in range(33):
+                    for second in range(33):
+                        for text in (
+                            f"{first}{sep}{second}{sep2}{year}",
+                            f"{first:02d}{sep}{second:02d}{sep2}{year}",
+                        ):
+                            self.assertEqual(_find_date(text), dateutil_date(text), text)
+
+
+class LayoutAnalysisTests(SimpleTestCase):
+    def test_empty(self):
+        self.assertEqual(analyze_layout([]), {"rows": [], "regions": []})
+
+    def test_side_by_side_block(self):
+        (_, layout), _ = golden_layouts()
+        self.assertEqual(len(layout["regions"]), 1)
+        region = layout["regions"][0]
+        self.assertEqual(region["kind"], "table")
+        self.assertEqual((region["start"], region["end"]), (0, 5))
+        # columns are the gutters every row of the region shares
+        items = layout["rows"][2]
+        self.assertEqual([c["text"] for c in items["cells"]], ["2", "Brake pads", "850.00", "1,700.00"])
+        self.assertEqual([c["column"] for c in items["cells"]], [0, 0, 1, 1])
+        self.assertEqual(layout["rows"][0]["cells"][1]["text"], "Sold to: ACME SOLUTIONS")
+
+    def test_merges_nearby_boxes(self):
+        layout = analyze_layout([
+            (_box(10, 10, 50), "Brake", 0.9),
+            (_box(65, 10, 50), "pads", 0.8),
+        ])
+        (row,) = layout["rows"]
+        self.assertEqual([c["text"] for c in row["cells"]], ["Brake pads"])
+        self.assertIsNone(row["region"])
+
+    def test_rows_outside_a_region(self):
+        _, (_, layout) = golden_layouts()
+        self.assertEqual([row["region"] for row in layout["rows"]], [None, None, 0, 0])
+        self.assertEqual([c["column"] for c in layout["rows"][2]["cells"]], [0, 1])
+
+    def test_layout_buyer_from_its_column(self):
+        (lines, layout), _ = golden_layouts()
+        result = parse_receipt(lines, paragraph_of(lines), layout)
+        self.assertEqual(result["buyer"]["buyer_name"], "ACME SOLUTIONS")
+        self.assertEqual(result["buyer"]["buyer_address"], "45 Luna St., Pasig")
+        self.assertEqual([i["description"] for i in result["items"]], ["Brake pads", "Oil filter"])
+
+    def test_single_column_keeps_flat_buyer(self):
+        raw = [
+            (_box(10, 10, 200), "GOLDEN STORE", 0.9),
+            (_box(10, 40, 250), "VAT REG TIN: 123-456-789-000", 0.9),
+            (_box(10, 70, 250), "Sold to: JUAN DELA CRUZ", 0.9),
+            (_box(10, 100, 250), "123 Rizal Ave Makati", 0.9),
+            (_box(10, 130, 150), "TOTAL AMOUNT DUE", 0.9),
+            (_box(400, 130, 80), "500.00", 0.9),
+        ]
+        lines = [text for _, text, _ in raw]
+        flat = parse_receipt(lines, paragraph_of(lines))
+        result = parse_receipt(lines, paragraph_of(lines), analyze_layout(raw))
+        self.assertEqual(result["buyer"], flat["buyer"])
+        self.assertEqual(result["buyer"]["buyer_address"], "123 Rizal Ave Makati")
+
+
+class SyntheticCorpusTests(SimpleTestCase):
+    def test_reproducible(self):
+        first = build_variant_corpus(6, seed=5)
+        again = build_variant_corpus(6, seed=5)
+        self.assertEqual([r["data"] for r in first], [r["data"] for r in again])
+        self.assertEqual([r["raw"] for r in first], [r["raw"] for r in again])
+        self.assertEqual({r["variant"]["layout"] for r in first}, {"single", "two_column"})
+        self.assertEqual(build_corpus(2, seed=5)[1][1], build_corpus(2, seed=5)[1][1])
+
+    def test_oracle_boxes_read_back_the_receipt(self):
+        lines = [ln for ln in _receipt_lines(random.Random(9))[0] if ln]
+        for font in ("sans", "bold", "dotmatrix"):
+            with self.subTest(font=font):
+                _, _, raw = make_variant(9, font=font, photo="2mp", max_angle=0)
+                self.assertEqual(_ordered_lines(raw)[0], lines)
+
+    def test_two_column_layout(self):
+        _, truth, raw = make_variant(9, layout="two_column", photo="2mp", max_angle=0)
+        lines = _ordered_lines(raw)[0]
+        self.assertEqual(lines[0], f"{truth['registered_business_name']} OFFICIAL RECEIPT")
+        # amount columns are right-aligned
+        amounts = [box for box, text, _ in raw if _AMOUNT_RE.match(text)]
+        self.assertEqual(len({round(box[1][0]) for box in amounts}), 2)
+
+    def test_compare_flags_regressions(self):
+        def report(p50, tin):
+            return {
+                "images": 8, "seed": 0, "ocr": "oracle",
+                "stages_ms": {"parse": {"n": 8, "p50": p50, "p95": p50, "p99": p50}},
+                "images_per_second": 10.0, "peak_rss_mb": 100.0,
+                "accuracy": {"fields": tin, "per_field": {"tin": tin}},
+            }
+
+        diff = pipeline_benchmark.compare(report(15.0, 0.9), report(10.0, 1.0))
+        self.assertEqual(diff["stages_ms"]["parse"]["p50"]["ratio"], 1.5)
+        self.assertEqual(diff["regressions"], ["parse p50 1.5x", "parse p95 1.5x", "tin accuracy -0.1"])
+        self.assertTrue(diff["same_corpus"])
+        # within 10%, or under a millisecond: noise
+        self.assertEqual(pipeline_benchmark.compare(report(10.5, 1.0), report(10.0, 1.0))["regressions"], [])
+        self.assertEqual(pipeline_benchmark.compare(report(0.4, 1.0), report(0.2, 1.0))["regressions"], [])
+
+
+class OnnxBackendTests(SimpleTestCase):
+    def test_export_wrapper_matches_the_recognizer(self):
+        from easyocr.model.vgg_model import Model
+
+        torch.manual_seed(0)
+        model = Model(input_channel=1, output_channel=256, hidden_size=256, num_class=97).eval()
+        with torch.no_grad():
+            for width in (64, 200, 517):
+                image = torch.rand(2, 1, 64, width)
+                with self.subTest(width=width):
+                    self.assertTrue(torch.allclose(model(image, None), LineRecognizer(model)(image), atol=1e-5))
+
+    def test_missing_models(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(OCR_ONNX_DIR=directory):
+            with self.assertRaisesMessage(FileNotFoundError, "export_onnx_models"):
+                load_onnx_reader()
+
+    def test_cache_key_per_backend(self):
+        cfg = {"enabled": False}
+        keys = set()
+        for backend, quantized in (("torch", True), ("onnx", True), ("onnx", False)):
+            with override_settings(OCR_BACKEND=backend, OCR_ONNX_QUANTIZED=quantized):
+                keys.add(_cache_key("abc", cfg))
+        self.assertEqual(keys, {"abc", "abc-onnx-int8", "abc-onnx-fp32"})
+
+
+class _ResolutionReader:
+    """
+    Reads a synthetic receipt's rendered text boxes back, like EasyOCR
+    would: detect finds them at the image's scale, recognize returns the
+    text of the box closest to each crop.  Below full resolution every
+    TIN comes out garbled and unsure.
+    """
+
+    def __init__(self, raw, height):
+        self.raw = _plain_raw(raw)
+        self.height = height
+        self.recognized = []
+
+    def _rect(self, bbox, scale):
+        xs = [x * scale for x, _ in bbox]
+        ys = [y * scale for _, y in bbox]
+        return [int(min(xs)), int(max(xs)) + 1, int(min(ys)), int(max(ys)) + 1]
+
+    def detect(self, img, reformat=False, **kwargs):
+        scale = img.shape[0] / self.height
+        return [[self._rect(bbox, scale) for bbox, _, _ in self.raw]], [[]]
+
+    def recognize(self, grey, horizontal_list, free_list, reformat=False, **kwargs):
+        scale = grey.shape[0] / self.height
+        out = []
+        for x0, x1, y0, y1 in horizontal_list:
+            cx, cy = (x0 + x1) / 2 / scale, (y0 + y1) / 2 / scale
+            _, text, conf = min(
+                self.raw,
+                key=lambda item: (sum(x for x, _ in item[0]) / 4 - cx) ** 2
+                + (sum(y for _, y in item[0]) / 4 - cy) ** 2,
+            )
+            if scale < 1 and TIN_RE.search(text):
+                text, conf = TIN_RE.sub("1O4-B8?-2l1-OOO", text), 0.3
+            out.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, conf))
+        self.recognized.append(len(horizontal_list))
+        return out
+
+
+class ProgressiveOcrTests(SimpleTestCase):
+    def setUp(self):
+        self.data, self.truth, self.raw = make_variant(4, photo="2mp", max_angle=0)
+        self.raw = _plain_raw(self.raw)
+        self.cfg = progressive_config({"enabled": True, "long_edge": 800})
+
+    def _parse(self, raw):
+        lines = _ordered_lines(raw)[0]
+        return parse_receipt(lines, " ".join(lines), None)
+
+    def test_weak_entries(self):
+        raw = [list(item) for item in self.raw]
+        raw[0][2] = 0.2
+        self.assertEqual(weak_entries(raw, self._parse(raw), self.cfg), [0])
+
+        # a TIN the parser cannot read: its whole row is re-read
+        tin = next(n for n, (_, text, _) in enumerate(raw) if TIN_RE.search(text))
+        raw[tin][1] = raw[tin][1].replace("0", "O").replace("1", "l")
+        parsed = self._parse(raw)
+        self.assertEqual(parsed["seller"]["tin"], "")
+        weak = weak_entries(raw, parsed, self.cfg)
+        self.assertIn(tin, weak)
+        self.assertLess(len(weak), 4)
+        self.assertEqual(weak_entries(raw, parsed, {**self.cfg, "fields": False}), [0])
+
+    def test_merge_keeps_boxes(self):
+        raw = [[bbox, "???", 0.1] if n == 3 else [bbox, text, conf]
+               for n, (bbox, text, conf) in enumerate(self.raw)]
+        horizontal, free = crop_lists(raw, [3], (1600, 1200))
+        self.assertEqual((len(horizontal), free), (1, []))
+        x0, x1, y0, y1 = horizontal[0]
+        reread = [([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], self.raw[3][1], 0.97)]
+        merged = merge(raw, [3], reread, (1600, 1200))
+        self.assertEqual(merged[3], [self.raw[3][0], self.raw[3][1], 0.97])
+        self.assertEqual(merged[:3], raw[:3])
+
+    def test_rereads_only_weak_boxes_at_full_resolution(self):
+        rgb, grey = _decode_image(self.data)
+        reader = _ResolutionReader(self.raw, grey.shape[0])
+        pre_cfg = preprocess_config({"enabled": False})
+        (raw, info), = _run_progressive(reader, [(rgb, grey)], pre_cfg, self.cfg)
+
+        self.assertFalse(info["full_pass"])
+        self.assertEqual(info["boxes"], len(self.raw))
+        self.assertTrue(0 < info["reread"] < len(self.raw) / 2)
+        self.assertEqual(reader.recognized[-1], info["reread"])
+        self.assertEqual(self._parse(raw)["seller"]["tin"], self.truth["tin"])
+        self.assertEqual([text for _, text, _ in raw], [text for _, text, _ in self.raw])
+
+        # too much of the first pass is weak: one full pass instead
+        with override_settings(OCR_PROGRESSIVE={**self.cfg, "min_confidence": 1.1}):
+            raw = _run_reader(_ResolutionReader(self.raw, grey.shape[0]), [(rgb, grey)], pre_cfg)[0]
+        self.assertEqual([text for _, text, _ in raw], [text for _, text, _ in self.raw])
+
+    def test_cache_key_per_progressive_config(self):
+        cfg = {"enabled": False}
+        with override_settings(OCR_PROGRESSIVE={"enabled": False}):
+            self.assertEqual(_cache_key("abc", cfg), "abc")
+        with override_settings(OCR_PROGRESSIVE={"enabled": True}):
+            key = _cache_key("abc", cfg)
+        with override_settings(OCR_PROGRESSIVE={"enabled": True, "long_edge": 960}):
+            self.assertNotIn(_cache_key("abc", cfg), {"abc", key})
+
+
+def _template_values(confirmed):
+    return {
+        field: confirmed[section][field]
+        for field, (section, _) in templates.FIELDS.items()
+        if confirmed[section][field]
+    }
+
+
+class LayoutTemplateTests(SimpleTestCase):
+    merchant = make_merchant(3, "SAN MIGUEL HARDWARE")
+
+    def _receipt(self, seed, **options):
+        """``(confirmed result, plain raw)`` of one receipt of the merchant."""
+        _, truth, raw = make_variant(seed, photo="2mp", merchant=self.merchant, **options)
+        return templates_benchmark._confirmed(seed, self.merchant, truth), _plain_raw(raw)
+
+    def setUp(self):
+        layout = {}
+        for seed in range(3):
+            confirmed, raw = self._receipt(seed)
+            layout = templates.learn(layout, raw, _template_values(confirmed))
+        self.layout = layout
+        self.template = templates.LayoutTemplate(7, layout, seller=dict(confirmed["seller"]))
+
+    def test_learns_where_fields_are_printed(self):
+        self.assertEqual(self.layout["receipts"], 3)
+        self.assertLessEqual(
+            {"serial_number", "transaction_date", "vatable_sales", "vat_amount",
+             "total_amount_due", "buyer_name"},
+            set(self.template.fields),
+        )
+        # the header keeps its place from the top, the totals from the bottom
+        self.assertTrue(templates._window(self.template.fields["serial_number"])[0])
+        self.assertFalse(templates._window(self.template.fields["total_amount_due"])[0])
+
+    def test_reads_fields_of_new_receipts(self):
+        items = set()
+        for seed in range(10, 20):
+            confirmed, raw = self._receipt(seed, noise=14.0)
+            items.add(len(confirmed["items"]))
+            found = self.template.extract(raw)
+            # parse_receipt's dates have a time
+            found["transaction_date"] = found.get("transaction_date", "")[:10]
+            expected = _template_values(confirmed)
+            for field in self.template.fields:
+                with self.subTest(seed=seed, field=field):
+                    self.assertEqual(found.get(field), expected[field])
+        self.assertGreater(len(items), 1)
+
+    def test_generic_parser_skipped_and_fallback(self):
+        confirmed, raw = self._receipt(30)
+        result = _build_result(raw)
+        parsed = templates.parse_with_template(
+            self.template, result["lines"], result["paragraph"], result["layout"], raw
+        )
+        self.assertTrue(parsed["layout_template"]["generic_skipped"])
+        self.assertEqual(parsed["layout_template"]["seller_id"], 7)
+        self.assertEqual(parsed["seller"], confirmed["seller"])
+        self.assertEqual(parsed["items"], confirmed["items"])
+        for field, value in _template_values(confirmed).items():
+            self.assertEqual(parsed[templates.FIELDS[field][0]][field][: len(value)], value)
+
+        # no date where the template expects it: the generic parser runs too
+        raw = [item for item in raw if not _find_date(item[1])]
+        result = _build_result(raw)
+        parsed = templates.parse_with_template(
+            self.template, result["lines"], result["paragraph"], result["layout"], raw
+        )
+        self.assertFalse(parsed["layout_template"]["generic_skipped"])
+        self.assertNotIn("transaction_date", parsed["layout_template"]["fields"])
+        self.assertEqual(parsed["receipt"]["serial_number"], confirmed["receipt"]["serial_number"])
+        self.assertEqual(parsed["seller"]["tin"], self.merchant["tin"])
+
+    def test_identify(self):
+        keys = {"tin:123456789000": 1, "tin:987654321": 2, "name:SAN MIGUEL HARDWARE": 3}
+        self.assertEqual(templates.identify(["ACME", "VAT REG TIN: 123-456-789-000"], keys), 1)
+        # a seller without its branch code
+        self.assertEqual(templates.identify(["TIN 987 654 321 004"], keys), 2)
+        self.assertEqual(templates.identify(["San Miguel Hardware, Inc.", "Poblacion, Naga"], keys), 3)
+        # the whole name, not its leading words
+        self.assertIsNone(templates.identify(["San Miguel Hardware - Branch 2", "NO. 123"], keys))
+        self.assertIsNone(templates.identify(["SAN MIGUEL", "NO. 123"], keys))
+        # a TIN that is no template's decides, whatever the name
+        self.assertIsNone(
+            templates.identify(["San Miguel Hardware, Inc.", "TIN 111-111-111-000"], keys)
+        )
+        self.assertIsNone(
+            templates.identify(
+                ["MERCURY DRUG CORPORATION", "VAT REG TIN 999-888-777-000"],
+                {"tin:123456789000": 1, "name:MERCURY": 1},
+            )
+        )
+        self.assertIsNone(templates.identify(["x"] * 6 + ["TIN 123-456-789-000"], keys))
+
+
+class LayoutTemplateStoreTests(TestCase):
+    merchant = make_merchant(5, "PACIFIC CREST PHARMACY")
+
+    def setUp(self):
+        templates.store.forget()
+        self.addCleanup(templates.store.forget)
+        self.seller = Seller.objects.create(
+            registered_business_name=self.merchant["name"],
+            business_address=self.merchant["address"],
+            tin=self.merchant["tin"],
+            vat_status="VAT",
+        )
+
+    def _save_receipt(self, seed):
+        """Save one of the merchant's receipts, its OCR result cached as
+        after the review upload; returns its plain raw result."""
+        data, truth, raw = make_variant(seed, photo="2mp", merchant=self.merchant)
+        raw = _plain_raw(raw)
+        digest = hashlib.sha256(data).hexdigest()
+        result_cache.set(_cache_key(digest, preprocess_config()), {"raw_result": raw})
+
+        receipt = templates_benchmark._confirmed(seed, self.merchant, truth)["receipt"]
+        Receipt.objects.create(
+            seller=self.seller,
+            buyer=Buyer.objects.create(buyer_name="LIFEWOOD DATA TECHNOLOGY", buyer_address=""),
+            receipt_type=Receipt.OFFICIAL_RECEIPT,
+            serial_number=receipt["serial_number"],
+            transaction_date=timezone.make_aware(datetime.fromisoformat(receipt["transaction_date"])),
+            gross_sales=receipt["gross_sales"],
+            vatable_sales=receipt["vatable_sales"],
+            vat_amount=receipt["vat_amount"],
+            total_amount_due=receipt["total_amount_due"],
+            receipt_image=ContentFile(data, name=f"{seed}.jpg"),
+        )
+        # learned by the job workers, not while saving
+        while (job := jobs.claim_next_job()) is not None:
+            jobs.run_job(job)
+        return raw
+
+    def test_learned_on_the_job_queue(self):
+        data, _, _ = make_variant(0, photo="2mp", merchant=self.merchant)
+        with mock.patch.object(templates, "learn_receipt", return_value=True) as learn:
+            receipt = Receipt.objects.create(
+                seller=self.seller,
+                receipt_type=Receipt.OFFICIAL_RECEIPT,
+                serial_number="1",
+                transaction_date=timezone.now(),
+                gross_sales="10.00",
+                total_amount_due="10.00",
+                receipt_image=ContentFile(data, name="0.jpg"),
+            )
+            learn.assert_not_called()
+            job = OcrJob.objects.get(kind=OcrJob.LEARN_LAYOUT)
+            self.assertEqual(job.receipt, receipt)
+            # learning jobs do not count against the upload backlog
+            self.assertEqual(jobs.pending_count(), 0)
+
+            job = jobs.run_job(jobs.claim_next_job())
+        learn.assert_called_once_with(receipt)
+        self.assertEqual((job.status, job.result), (OcrJob.DONE, {"learned": True}))
+        # nobody can poll it
+        self.assertEqual(APIClient().get(f"/api/ocr/jobs/{job.pk}/").status_code, 404)
+
+    def test_learns_saved_receipts(self):
+        self._save_receipt(0)
+        lines = _build_result(self._save_receipt(1))["lines"]
+        template = SellerLayoutTemplate.objects.get(seller=self.seller)
+        self.assertEqual((template.receipts, template.tin), (2, self.merchant["tin"].replace("-", "")))
+        self.assertEqual(template.header_key, "PACIFIC CREST PHARMACY")
+        # not used before OCR_TEMPLATE_MIN_RECEIPTS receipts
+        self.assertIsNone(templates.store.find(lines))
+        self._save_receipt(2)
+        self.assertEqual(templates.store.find(lines).seller_id, self.seller.pk)
+
+        raw = self._save_receipt(3)
+        result = _build_result(raw)
+        parsed = templates.parse(result["lines"], result["paragraph"], result["layout"], raw)
+        self.assertEqual(parsed["layout_template"]["seller_id"], self.seller.pk)
+        self.assertEqual(parsed["seller"]["business_address"], self.merchant["address"])
+        self.assertIn("total_amount_due", parsed["layout_template"]["fields"])
+
+        with override_settings(OCR_TEMPLATES_ENABLED=False):
+            self.assertNotIn("layout_template", templates.parse(result["lines"], result["paragraph"], None, raw))
+
+        # renaming the seller moves its name key
+        self.seller.registered_business_name = "PACIFIC CREST DRUGSTORE"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.save()
+        self.assertEqual(templates.store.find(["Pacific Crest Drugstore Corp."]).seller_id, self.seller.pk)
+        self.assertIsNone(templates.store.find(["PACIFIC CREST PHARMACY"]))
+
+    def test_cache(self):
+        other = Seller.objects.create(
+            registered_business_name="NORTHPOINT AUTO PARTS", business_address="",
+            tin="111-222-333-000", vat_status="VAT",
+        )
+        SellerLayoutTemplate.objects.create(seller=self.seller, receipts=3, layout={"receipts": 3})
+        SellerLayoutTemplate.objects.create(seller=other, receipts=2, layout={"receipts": 2})
+        self.assertIsNone(templates.store.get(other.pk))
+
+        with override_settings(OCR_TEMPLATE_CACHE_SIZE=1):
+            self.assertEqual(templates.store.get(self.seller.pk).seller_id, self.seller.pk)
+            with self.assertNumQueries(0):
+                templates.store.get(self.seller.pk)
+            self.assertEqual(len(templates.store), 1)
+        with override_settings(OCR_TEMPLATE_MIN_RECEIPTS=2, OCR_TEMPLATE_CACHE_SIZE=1):
+            templates.store.forget(other.pk)
+            self.assertEqual(templates.store.get(other.pk).seller_id, other.pk)
+            # the least recently used one made room
+            self.assertEqual(len(templates.store), 1)
+            with self.assertNumQueries(1):
+                templates.store.get(self.seller.pk)
+
+
+class CategoryIndexTests(TestCase):
+    def setUp(self):
+        invalidate_index()
+
+    def _categories(self, **keywords):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                ExpenseCategory.objects.create(name=name.replace("_", " "), keywords=kws)
+                for name, kws in keywords.items()
+            ]
+
+    def test_trie(self):
+        index = KeywordIndex([
+            (1, "Office", ["pen", "office supplies"]),
+            (None, "Repairs", ["a/c", "pen"]),
+            (1, "Office", ["stapler"]),
+        ])
+        self.assertEqual(index.hits("Office supplies, A/C and a PEN"), {0: 2, 1: 2})
+        self.assertEqual(
+            index.candidates("stapler, pen, office supplies, a/c"),
+            [{"id": 1, "name": "Office", "hits": 3}, {"id": None, "name": "Repairs", "hits": 2}],
+        )
+        # whole words only, plurals included
+        self.assertEqual(index.candidates("expense, officer, stapled"), [])
+        self.assertEqual(index.hits("staplers, pens"), {0: 1, 1: 1, 2: 1})
+
+    def test_default_rules_match_plurals(self):
+        for text, name in [
+            ("2 RESTAURANTS MEALS", "Meals & Entertainment"),
+            ("AIRCON REPAIRS", "Repairs & Maintenance"),
+            ("REAL PROPERTY TAXES", "Taxes & Licenses"),
+            ("BUSINESS LICENSES", "Taxes & Licenses"),
+            ("UTILITIES", "Utilities"),
+            ("SERVICES RENDERED", "Repairs & Maintenance"),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(category_candidates(text)[0]["name"], name)
+        # still whole words
+        self.assertEqual(category_candidates("EXPENSES, PENNY, VEGAS"), [])
+
+    def test_db_keywords_first(self):
+        (card,) = self._categories(Fuel_Card="petron")
+        # more default-rule hits, but a DB keyword matches
+        found = categorize("PETRON diesel gas toll parking")
+        self.assertEqual(found["suggested_category"], {"id": card.pk, "name": "Fuel Card"})
+        self.assertEqual(
+            [c["name"] for c in found["category_candidates"]], ["Fuel Card", "Transportation & Travel"]
+        )
+
+    def test_default_rules_in_order(self):
+        (meals,) = self._categories(**{"Meals & Entertainment": ""})
+        # "Office Supplies" comes before "Meals & Entertainment" in DEFAULT_RULES
+        found = categorize("coffee coffee snack food paper")
+        self.assertEqual(found["suggested_category"], {"id": None, "name": "Office Supplies"})
+        self.assertEqual(
+            found["category_candidates"][1], {"id": meals.pk, "name": "Meals & Entertainment", "hits": 4}
+        )
+        self.assertEqual(categorize("nothing to see")["suggested_category"], categorizer.UNCATEGORIZED)
+
+    def test_classifier_wins_when_confident(self):
+        (card,) = self._categories(Fuel_Card="petron")
+        prediction = [{"id": card.pk, "name": "old name", "probability": 0.9}]
+        with mock.patch.object(categorizer, "predict_category", return_value=prediction):
+            found = categorize("coffee")
+        self.assertEqual(found["suggested_category"], {"id": card.pk, "name": "Fuel Card"})
+        self.assertEqual(found["category_candidates"][0]["name"], "Meals & Entertainment")
+
+        prediction[0]["probability"] = 0.2
+        with mock.patch.object(categorizer, "predict_category", return_value=prediction):
+            found = categorize("coffee")
+        self.assertEqual(found["suggested_category"]["name"], "Meals & Entertainment")
+
+    def test_invalidated_by_signals(self):
+        index = get_index()
+        self.assertIs(get_index(), index)
+        (card,) = self._categories(Fuel_Card="petron")
+        self.assertIsNot(get_index(), index)
+        self.assertEqual(categorize("petron")["suggested_category"]["id"], card.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.keywords = "shell"
+            card.save()
+        self.assertEqual(categorize("petron")["suggested_category"]["id"], None)
+        with self.captureOnCommitCallbacks(execute=True):
+            card.delete()
+        self.assertEqual(categorize("shell")["suggested_category"]["id"], None)
+
+    @override_settings(OCR_CATEGORY_INDEX_CHECK_SECONDS=0)
+    def test_other_process_invalidated(self):
+        index = get_index()
+        # another process bumps the shared version; the index here is kept
+        with mock.patch.dict(categorizer._state):
+            invalidate_index()
+        self.assertIs(categorizer._state["index"], index)
+        self.assertIsNot(get_index(), index)
+
+
+class CategoryClassifierTests(TestCase):
+    WORDS = {
+        "Meals": ["jollibee", "chicken", "burger", "fries", "rice", "coke", "spaghetti", "sundae"],
+        "Fuel": ["petron", "diesel", "unleaded", "liters", "pump", "octane", "xcs", "blaze"],
+        "Office": ["bond", "paper", "ballpen", "folder", "stapler", "envelope", "toner", "clip"],
+    }
+
+    def setUp(self):
+        self.dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(OCR_CLASSIFIER_DIR=self.dir, OCR_CLASSIFIER_FEATURES=4096))
+        self.enterContext(mock.patch.dict(classifier._state, model=None, mtime=None, checked_at=None))
+        self.enterContext(mock.patch.object(classifier, "RELOAD_CHECK_SECONDS", 0))
+        self.categories = {
+            name: ExpenseCategory.objects.create(name=name) for name in self.WORDS
+        }
+        self.rng = random.Random(4)
+
+    def _receipts(self, count, names=None):
+        names = names or list(self.WORDS)
+        payloads = synthetic_payloads(count, seed=self.rng.randrange(1000))
+        for n, payload in enumerate(payloads):
+            name = names[n % len(names)]
+            words = self.rng.choices(self.WORDS[name], k=6)
+            payload["raw_ocr_text"] = f"OFFICIAL RECEIPT {' '.join(words)} TOTAL 100.00"
+            payload["category_id"] = self.categories[name].pk
+            payload["serial_number"] = f"{name}-{Receipt.objects.count() + n}"
+        bulk_create_receipts(payloads)
+
+    def _train(self, *args):
+        call_command("train_category_model", *args, stdout=io.StringIO())
+
+    def test_train_save_load_predict(self):
+        self.assertIsNone(classifier.get_model())
+        self.assertEqual(classifier.predict_category("diesel"), [])
+
+        self._receipts(30)
+        self._train()
+        model = classifier.CategoryModel.load(self.dir)
+        self.assertEqual(sum(model.meta["doc_counts"]), 30)
+        self.assertEqual(model.meta["last_receipt_id"], Receipt.objects.latest("id").pk)
+        for name in self.WORDS:
+            with self.subTest(name=name):
+                (top, *rest) = classifier.predict_category(" ".join(self.WORDS[name][:3]))
+                self.assertEqual(top["id"], self.categories[name].pk)
+                self.assertGreater(top["probability"], 0.9)
+                self.assertEqual(len(rest), 2)
+        # digits carry no features
+        self.assertEqual(model.predict("100.00 12/31"), [])
+
+    def test_incremental_training(self):
+        self._receipts(12)
+        self._train()
+        first = classifier.CategoryModel.load(self.dir).meta
+
+        self._receipts(6)
+        self._train()
+        meta = classifier.CategoryModel.load(self.dir).meta
+        self.assertEqual(sum(meta["doc_counts"]), 18)
+        self.assertGreater(meta["generation"], first["generation"])
+        # the previous generation's arrays are removed
+        self.assertEqual(
+            sorted(p.name for p in Path(self.dir).glob("*.npy")),
+            sorted([meta["counts"], meta["log_prob"]]),
+        )
+
+        out = io.StringIO()
+        call_command("train_category_model", stdout=out)
+        self.assertIn("No new categorised receipts", out.getvalue())
+
+        self._train("--full")
+        self.assertEqual(sum(classifier.CategoryModel.load(self.dir).meta["doc_counts"]), 18)
+
+    def test_get_model_reloads(self):
+        self._receipts(10, names=["Meals", "Fuel"])
+        self._train()
+        model = classifier.get_model()
+        self.assertEqual(len(model.classes), 2)
+        self.assertIs(classifier.get_model(), model)
+
+        self._receipts(5, names=["Office"])
+        self._train()
+        reloaded = classifier.get_model()
+        self.assertIsNot(reloaded, model)
+        self.assertEqual(
+            [c["name"] for c in reloaded.classes], ["Meals", "Fuel", "Office"]
+        )
+        self.assertEqual(
+            classifier.predict_category("toner stapler", k=1)[0]["id"], self.categories["Office"].pk
+        )
+
+    def test_evaluate(self):
+        self._receipts(30)
+        out = io.StringIO()
+        call_command("train_category_model", "--evaluate", stdout=out)
+        self.assertIn("classifier top-1       100.0%", out.getvalue())
+        self.assertFalse(list(Path(self.dir).iterdir()))
+
+
+def _png(seed=0):
+    rng = np.random.default_rng(seed)
+    ok, data = cv2.imencode(".png", rng.integers(0, 255, (40, 60, 3), dtype=np.uint8))
+    return data.tobytes()
+
+
+def _fake_ocr(fh):
+    lines = ["ACME TRADING", "TOTAL AMOUNT DUE 10.00"]
+    return {
+        **parse_receipt(lines, " ".join(lines)),
+        "suggested_category": categorizer.UNCATEGORIZED,
+        "confidence": 0.9,
+    }
+
+
+@override_settings(OCR_JOB_QUEUE_MAX=3, OCR_JOB_STALE_SECONDS=60, OCR_JOB_MAX_ATTEMPTS=2)
+class OcrJobQueueTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(jobs, "process_receipt", side_effect=_fake_ocr))
+
+    def _submit(self, owner=None):
+        return jobs.submit_job(ContentFile(_png(), name="r.png"), owner=owner)
+
+    def _age(self, job, seconds):
+        OcrJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_submit_claim_finish(self):
+        first, second = self._submit(), self._submit()
+        self.assertEqual(jobs.pending_count(), 2)
+
+        claimed = jobs.claim_next_job()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, OcrJob.RUNNING, 1))
+        self.assertIsNotNone(claimed.claim_token)
+        self.assertEqual(jobs.claim_next_job().pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job())
+
+        jobs.run_job(claimed)
+        done = OcrJob.objects.get(pk=first.pk)
+        self.assertEqual(done.status, OcrJob.DONE)
+        self.assertEqual(done.result["receipt"]["total_amount_due"], "10.00")
+        self.assertFalse(done.image)
+        self.assertEqual(jobs.pending_count(), 1)
+
+    def test_queue_full(self):
+        for _ in range(3):
+            self._submit()
+        with self.assertRaises(jobs.QueueFull):
+            self._submit()
+
+    def test_failure(self):
+        job = self._submit()
+        with mock.patch.object(jobs, "process_receipt", side_effect=RuntimeError("bad image")):
+            jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (OcrJob.FAILED, "bad image"))
+
+    def test_model_server_down_is_retried(self):
+        job = self._submit()
+        down = mock.patch.object(jobs, "process_receipt", side_effect=OcrServerError("restarting"))
+        with down:
+            jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.claim_token), (OcrJob.QUEUED, 1, None))
+        self.assertIn("restarting", job.error)
+        self.assertTrue(job.image)
+        # not before OCR_JOB_RETRY_DELAY
+        self.assertIsNone(jobs.claim_next_job())
+
+        self._age(job, 60)
+        with down:
+            jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        # out of attempts (OCR_JOB_MAX_ATTEMPTS=2)
+        self.assertEqual((job.status, job.attempts), (OcrJob.FAILED, 2))
+        self._age(job, 60)
+        self.assertIsNone(jobs.claim_next_job())
+
+        retried = self._submit()
+        with down:
+            jobs.run_job(jobs.claim_next_job())
+        self._age(retried, 60)
+        jobs.run_job(jobs.claim_next_job())
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.error, retried.attempts), (OcrJob.DONE, "", 2))
+
+    def test_reclaim_stale_job(self):
+        job = self._submit()
+        slow = jobs.claim_next_job()
+        # running, but not yet stale
+        self.assertIsNone(jobs.claim_next_job())
+
+        self._age(job, 120)
+        again = jobs.claim_next_job()
+        self.assertEqual((again.pk, again.attempts), (job.pk, 2))
+        self.assertNotEqual(again.claim_token, slow.claim_token)
+
+        # the presumed-dead worker finishes first: its outcome is discarded
+        jobs.run_job(slow)
+        job.refresh_from_db()
+        self.assertEqual(job.status, OcrJob.RUNNING)
+        self.assertTrue(job.image)
+
+        jobs.run_job(again)
+        job.refresh_from_db()
+        self.assertEqual(job.status, OcrJob.DONE)
+
+    def test_give_up_after_max_attempts(self):
+        job = self._submit()
+        jobs.claim_next_job()
+        self._age(job, 120)
+        last = jobs.claim_next_job()
+        self._age(job, 120)
+        self.assertIsNone(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, OcrJob.FAILED)
+
+        # the last worker turns up after all
+        jobs.run_job(last)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (OcrJob.FAILED, None))
+
+    def test_job_only_visible_to_its_owner(self):
+        alice = get_user_model().objects.create_user("alice", password="x")
+        bob = get_user_model().objects.create_user("bob", password="x")
+        client = APIClient()
+        client.force_authenticate(alice)
+        upload = SimpleUploadedFile("r.png", _png(), content_type="image/png")
+        response = client.post("/api/ocr/jobs/", {"image": upload}, format="multipart")
+        self.assertEqual(response.status_code, 202)
+        url = f"/api/ocr/jobs/{response.data['id']}/"
+        self.assertEqual(OcrJob.objects.get().owner, alice)
+
+        self.assertEqual(client.get(url).status_code, 200)
+        client.force_authenticate(bob)
+        self.assertEqual(client.get(url).status_code, 404)
+        client.force_authenticate(None)
+        self.assertEqual(client.get(url).status_code, 404)
+
+        client.force_authenticate(None)
+        upload = SimpleUploadedFile("r.png", _png(), content_type="image/png")
+        response = client.post("/api/ocr/jobs/", {"image": upload}, format="multipart")
+        url, secret = f"/api/ocr/jobs/{response.data['id']}/", response.data["secret"]
+        self.assertEqual(len(secret), 43)
+        self.assertEqual(client.get(url, HTTP_X_OCR_JOB_SECRET=secret).status_code, 200)
+        self.assertNotIn("secret", client.get(url, HTTP_X_OCR_JOB_SECRET=secret).data)
+        # another anonymous caller knowing only the id
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.get(url, HTTP_X_OCR_JOB_SECRET=secret[:-1]).status_code, 404)
+        client.force_authenticate(alice)
+        self.assertEqual(client.get(url, HTTP_X_OCR_JOB_SECRET=secret).status_code, 404)
+        # submitted before jobs had secrets
+        legacy = OcrJob.objects.create(image=ContentFile(_png(), name="r.png"))
+        client.force_authenticate(None)
+        self.assertEqual(client.get(f"/api/ocr/jobs/{legacy.pk}/", HTTP_X_OCR_JOB_SECRET="").status_code, 404)
+
+
+class _CraftGeometryReader:
+    """
+    Stands in for EasyOCR with CRAFT's geometry: every image of a batch
+    is scaled as ``easyocr.detection.test_net`` scales it, dark blobs of
+    the scaled image are the text boxes, mapped back by the batch ratio.
+    """
+
+    def __init__(self):
+        self.passes = []
+
+    def detect(self, img, reformat=False, **kwargs):
+        from easyocr.imgproc import resize_aspect_ratio
+
+        batch = img if img.ndim == 4 else img[None]
+        self.passes.append(len(batch))
+        horizontal = []
+        for rgb in batch:
+            resized, ratio, _ = resize_aspect_ratio(
+                rgb, _DETECT_CANVAS_SIZE, interpolation=cv2.INTER_LINEAR
+            )
+            # without the black canvas test_net pads to multiples of 32
+            h, w = int(rgb.shape[0] * ratio), int(rgb.shape[1] * ratio)
+            dark = (resized[:h, :w].mean(axis=2) < 128).astype(np.uint8)
+            _, _, stats, _ = cv2.connectedComponentsWithStats(dark)
+            horizontal.append([
+                [int(x / ratio), int((x + w) / ratio), int(y / ratio), int((y + h) / ratio)]
+                for x, y, w, h, _ in stats[1:]
+            ])
+        return horizontal, [[] for _ in batch]
+
+    def recognize(self, grey, horizontal_list, free_list, reformat=False, **kwargs):
+        return [
+            ([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], "text", 0.9)
+            for x0, x1, y0, y1 in horizontal_list
+        ]
+
+
+class BatchedDetectionTests(SimpleTestCase):
+    @staticmethod
+    def _image(height, width, seed):
+        rng = np.random.default_rng(seed)
+        rgb = np.full((height, width, 3), 255, np.uint8)
+        for _ in range(12):
+            x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 10))
+            # thin strokes vanish when an image is shrunk more than on its own
+            rgb[y : y + 2, x : x + int(rng.integers(5, 40))] = 0
+        return rgb, cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    def test_batched_equals_single(self):
+        images = [
+            self._image(1200, 800, 0),
+            self._image(3200, 2000, 1),  # over CRAFT's canvas: scaled down
+            self._image(900, 1400, 2),
+            self._image(2000, 3200, 3),  # the same long side as the second
+        ]
+        reader = _CraftGeometryReader()
+        single = [_readtext_batched(reader, [image])[0] for image in images]
+        reader.passes.clear()
+        self.assertEqual(_readtext_batched(reader, images), single)
+        # one pass for the small images, one for the two large ones
+        self.assertEqual(sorted(reader.passes), [2, 2])
+        self.assertTrue(all(single))
+
+
+class BatchOcrViewTests(TestCase):
+    def test_ocr_server_down_is_503(self):
+        images = [SimpleUploadedFile(f"{n}.png", _png(n), content_type="image/png") for n in range(2)]
+        with mock.patch.object(services, "_get_reader"), mock.patch.object(
+            services, "_run_reader", side_effect=OcrServerError("connection refused")
+        ):
+            response = APIClient().post("/api/ocr/extract/batch/", {"images": images}, format="multipart")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("connection refused", response.data["detail"])
+
+
+class OcrReadyViewTests(SimpleTestCase):
+    url = "/api/ocr/ready/"
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(services._status, loaded=False, warm=False, error=""))
+
+    @override_settings(OCR_WARM_START=False)
+    def test_lazy_reader_is_ready(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["warm_start"], response.data["warm"]), (False, False))
+
+    @override_settings(OCR_WARM_START=True)
+    def test_warm_start(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 503)
+        services._status.update(loaded=True, warm=True)
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["ready"])
+
+
+class ImageBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.data = _png(7)
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+
+    def _path(self, data):
+        path = Path(self.tmp) / "r.png"
+        path.write_bytes(data)
+        return path
+
+    def _temporary_upload(self, data):
+        upload = TemporaryUploadedFile("r.png", "image/png", len(data), None)
+        upload.write(data)
+        upload.seek(0)
+        self.addCleanup(upload.close)
+        return upload
+
+    def _in_memory_upload(self, data):
+        return InMemoryUploadedFile(io.BytesIO(data), "image", "r.png", "image/png", len(data), None)
+
+    def _sources(self, data):
+        return {
+            "path": self._path(data),
+            "str path": str(self._path(data)),
+            "BytesIO": io.BytesIO(data),
+            "in-memory upload": self._in_memory_upload(data),
+            "temporary upload": self._temporary_upload(data),
+            "stored file": ContentFile(data, name="r.png"),
+        }
+
+    def test_sources(self):
+        expected = _decode_image(bytearray(self.data))
+        for name, source in self._sources(self.data).items():
+            with self.subTest(source=name):
+                with _image_buffer(source) as buf:
+                    self.assertEqual(bytes(buf), self.data)
+                    rgb, grey = _decode_image(buf)
+                np.testing.assert_array_equal(rgb, expected[0])
+                np.testing.assert_array_equal(grey, expected[1])
+
+    def test_empty(self):
+        for name, source in self._sources(b"").items():
+            with self.subTest(source=name):
+                with self.assertRaisesMessage(ValueError, "not a readable image"):
+                    with _image_buffer(source) as buf:
+                        self.assertEqual(len(buf), 0)
+                        _decode_image(buf)
+
+    def test_decode_error_is_not_a_buffer_error(self):
+        def imdecode(encoded, flags):
+            # as OpenCV's C code: no frame keeps the array alive
+            del encoded
+            raise RuntimeError("decoder crashed")
+
+        sources = self._sources(self.data)
+        with mock.patch.object(services.cv2, "imdecode", imdecode):
+            for name in ("path", "BytesIO", "temporary upload"):
+                with self.subTest(source=name):
+                    with self.assertRaisesMessage(RuntimeError, "decoder crashed"):
+                        with _image_buffer(sources[name]) as buf:
+                            _decode_image(buf)
+
+
+_RAW = [[[[0, 0], [80, 0], [80, 12], [0, 12]], "ACME TRADING", 0.9]]
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "ocr": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "ocr-tests"},
+    },
+    OCR_CACHE_ALIAS="ocr",
+    OCR_CACHE_TTL=3600,
+)
+class OcrResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(OCR_CACHE_DIR=str(self.dir)))
+        self.cache = OcrResultCache()
+        self.addCleanup(lambda: self.cache.backend.clear())
+        self.enterContext(mock.patch.object(services, "result_cache", self.cache))
+        self.reader = self.enterContext(mock.patch.object(services, "_run_reader", return_value=[_RAW]))
+        self.enterContext(mock.patch.object(services, "_get_reader"))
+
+    def _extract(self, data):
+        return services.extract_text(SimpleUploadedFile("r.png", data, "image/png"))
+
+    def test_tiers_and_stats(self):
+        data = _png(3)
+        digest = hashlib.sha256(data).hexdigest()
+
+        first = self._extract(data)
+        self.assertEqual((first["cache_hit"], first["image_sha256"]), (False, digest))
+        self.assertTrue((self.dir / CACHE_VERSION / digest[:2] / f"{digest}.json").exists())
+
+        second = self._extract(data)
+        self.assertTrue(second["cache_hit"])
+        self.assertEqual(second["lines"], first["lines"])
+        self.assertEqual(self.reader.call_count, 1)
+
+        # the disk tier survives the backend losing the entry, and refills it
+        self.cache.backend.clear()
+        self.assertTrue(self._extract(data)["cache_hit"])
+        self.assertTrue(self._extract(data)["cache_hit"])
+        self.assertEqual(self.reader.call_count, 1)
+
+        self.assertEqual(
+            self.cache.stats()["process"], {"memory_hits": 2, "disk_hits": 1, "misses": 1, "writes": 1}
+        )
+        # the shared counters live in the backend, so only those since clear()
+        self.assertEqual(
+            self.cache.stats()["shared"], {"memory_hits": 1, "disk_hits": 1, "misses": 0, "writes": 0}
+        )
+
+    def test_key_per_image_and_config(self):
+        self._extract(_png(3))
+        self._extract(_png(4))
+        self.assertEqual(self.reader.call_count, 2)
+        with override_settings(OCR_PREPROCESS={"enabled": True}):
+            self.assertFalse(self._extract(_png(3))["cache_hit"])
+            self.assertTrue(self._extract(_png(3))["cache_hit"])
+        self.assertTrue(self._extract(_png(3))["cache_hit"])
+        self.assertEqual(self.reader.call_count, 3)
+        with override_settings(OCR_CACHE_ENABLED=False):
+            self.assertFalse(self._extract(_png(3))["cache_hit"])
+
+    def test_digest_taken_while_streaming(self):
+        data = _png(5)
+        digest = hashlib.sha256(data).hexdigest()
+
+        def upload():
+            request = RequestFactory().post(
+                "/api/ocr/extract/", {"image": SimpleUploadedFile("r.png", data, "image/png")}
+            )
+            return request.FILES["image"]
+
+        # kept in memory, and spooled to a temp file past the memory limit
+        in_memory = upload()
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=len(data) // 2):
+            on_disk = upload()
+        self.assertIsInstance(in_memory, InMemoryUploadedFile)
+        self.assertIsInstance(on_disk, TemporaryUploadedFile)
+        self.assertEqual((in_memory.sha256, on_disk.sha256), (digest, digest))
+
+        # the streamed digest is used as is, and a hit never opens the bytes
+        with mock.patch.object(services.hashlib, "sha256") as sha256:
+            self.assertEqual(services.extract_text(in_memory)["image_sha256"], digest)
+            with mock.patch.object(services, "_image_buffer") as image_buffer:
+                self.assertTrue(services.extract_text(on_disk)["cache_hit"])
+        sha256.assert_not_called()
+        image_buffer.assert_not_called()
+        self.assertEqual(self.reader.call_count, 1)
+
+    def test_file_path(self):
+        data = _png(6)
+        path = self.dir / "receipt.png"
+        path.write_bytes(data)
+        first = services.extract_text(str(path))
+        self.assertEqual(first["image_sha256"], hashlib.sha256(data).hexdigest())
+        self.assertTrue(services.extract_text(path)["cache_hit"])
+        # an upload of the same bytes shares the entry
+        self.assertTrue(self._extract(data)["cache_hit"])
+        self.assertEqual(self.reader.call_count, 1)
+
+    def test_disk_expiry_and_eviction(self):
+        entry = {"lines": [], "line_confidences": [], "raw_result": []}
+        digests = [f"{n:02d}" + "0" * 62 for n in range(5)]
+        now = time.time()
+        for n, digest in enumerate(digests):
+            self.cache.set(digest, entry)
+            # written n × 10 minutes ago; the last one two hours ago
+            age = 7200 if n == 4 else n * 600
+            os.utime(self.cache._disk_path(digest), (now - age,) * 2)
+        size = self.cache._disk_path(digests[0]).stat().st_size
+        self.cache.backend.clear()
+
+        # older than OCR_CACHE_TTL: dropped from the disk tier
+        self.assertIsNone(self.cache.get(digests[4]))
+        self.assertFalse(self.cache._disk_path(digests[4]).exists())
+
+        # reading the oldest makes it the most recently used
+        self.assertEqual(self.cache.get(digests[3]), entry)
+        with override_settings(OCR_CACHE_DISK_MAX_BYTES=int(size * 2.5)):
+            self.cache.prune()
+        kept = sorted(path.stem[:2] for path in self.dir.rglob("*.json"))
+        self.assertEqual(kept, ["00", "03"])
+
+
+class _StubReader:
+    """The EasyOCR methods the model server calls, answering at once (or,
+    for ``detect``, once *release* is set)."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def detect(self, img, reformat=False):
+        self.release.wait()
+        return [np.array([[0, 10, 0, 5]], dtype=np.int32)], [[]]
+
+    def recognize(self, grey, horizontal_list, free_list, reformat=False):
+        if not horizontal_list:
+            raise ValueError("nothing to recognise")
+        return [([[0, 0], [10, 0], [10, 5], [0, 5]], "TOTAL", np.float32(0.5))]
+
+    def readtext(self, data):
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], str(len(data)), 1.0)]
+
+
+class _TrackingServer(OcrModelServer):
+    """Remembers its client connections, so a test can drop them as a
+    restart would."""
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        self.connections.append(conn)
+        return conn, addr
+
+
+class ModelServerTests(SimpleTestCase):
+    def setUp(self):
+        self.path = str(Path(self.enterContext(tempfile.TemporaryDirectory())) / "ocr.sock")
+        self.reader = _StubReader()
+        self.addCleanup(self.reader.release.set)
+
+    def _serve(self):
+        server = _TrackingServer(self.path, self.reader, concurrency=2)
+        server.connections = []
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            for conn in server.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # already closed by its handler
+                conn.close()
+
+        self.addCleanup(stop)
+        return stop
+
+    def test_round_trip(self):
+        arrays = [
+            np.arange(24, dtype=np.uint8).reshape(2, 3, 4),
+            np.linspace(0, 1, 6, dtype=np.float32).reshape(3, 2),
+            np.array([-(2 ** 40), 7], dtype=np.int64),
+            np.array([True, False]),
+            np.zeros((0, 4), dtype=np.float64),
+            np.asfortranarray(np.arange(6, dtype=">i2").reshape(2, 3)),
+        ]
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        sender = threading.Thread(target=send_message, args=(a, {"op": "x", "n": [1, 2]}, arrays))
+        sender.start()
+        header, received = recv_message(b)
+        sender.join()
+        self.assertEqual(header, {"op": "x", "n": [1, 2]})
+        self.assertEqual(len(received), len(arrays))
+        for sent, got in zip(arrays, received):
+            with self.subTest(dtype=sent.dtype.str, shape=sent.shape):
+                self.assertEqual((got.dtype, got.shape), (sent.dtype, sent.shape))
+                np.testing.assert_array_equal(got, sent)
+
+    def test_dispatch(self):
+        server = OcrModelServer(self.path, self.reader, concurrency=1)
+        self.addCleanup(server.server_close)
+        grey = np.zeros((5, 10), np.uint8)
+        self.assertEqual(server.dispatch({"op": "ping"}, []), "pong")
+        self.assertEqual(server.dispatch({"op": "detect"}, [grey]), [[[[0, 10, 0, 5]]], [[]]])
+        raw = server.dispatch(
+            {"op": "recognize", "horizontal_list": [[0, 10, 0, 5]], "free_list": []}, [grey]
+        )
+        self.assertEqual(raw, [[[[0, 0], [10, 0], [10, 5], [0, 5]], "TOTAL", 0.5]])
+        # plain values only: the reply is JSON
+        self.assertIs(type(raw[0][2]), float)
+        self.assertEqual(
+            server.dispatch({"op": "readtext"}, [np.frombuffer(b"PNG", np.uint8)])[0][1:], ["3", 1.0]
+        )
+        with self.assertRaisesMessage(ValueError, "Unknown OCR server op: 'train'"):
+            server.dispatch({"op": "train"}, [])
+
+    def test_reconnects_after_a_restart(self):
+        stop = self._serve()
+        client = RemoteReader(self.path, timeout=5)
+        self.assertTrue(client.ping())
+        first = client._local.sock
+        stop()
+        stop = self._serve()
+        # the old connection is dead; one reconnect, transparently
+        self.assertTrue(client.ping())
+        self.assertIsNot(client._local.sock, first)
+        horizontal, free = client.detect(np.zeros((5, 10, 3), np.uint8))
+        self.assertEqual(horizontal, [[[0, 10, 0, 5]]])
+
+        # down for good: the reconnect fails too
+        stop()
+        with self.assertRaisesMessage(OcrServerError, "unavailable"):
+            client.ping()
+
+    def test_errors(self):
+        self._serve()
+        client = RemoteReader(self.path, timeout=0.2)
+        grey = np.zeros((5, 10), np.uint8)
+        # the server answers ok=false
+        with self.assertRaisesMessage(OcrServerError, "nothing to recognise"):
+            client.recognize(grey, [], [])
+        with self.assertRaisesMessage(OcrServerError, "Unknown OCR server op"):
+            client._call({"op": "train"})
+        self.assertTrue(client.ping())
+
+        self.reader.release.clear()
+        with self.assertRaisesMessage(OcrServerError, "timed out"):
+            client.detect(grey)
+        self.reader.release.set()
+        # a new connection afterwards
+        self.assertTrue(client.ping())
+
+        with self.assertRaisesMessage(OcrServerError, "unavailable"):
+            RemoteReader(self.path + ".missing").ping()
+
+
+def _receipt_photo(angle):
+    """A 2000×3000 grey photo: a text-covered receipt on a darker table,
+    turned by *angle* degrees, and the corners of the solid marker block
+    printed on it, in photo coordinates."""
+    h, w = 3000, 2000
+    grey = np.full((h, w), 90, np.uint8)
+    grey[600:2500, 500:1500] = 235
+    for n in range(16):
+        cv2.putText(
+            grey, f"ITEM {n:02d} SOMETHING  {n * 7}.50", (540, 680 + n * 70),
+            cv2.FONT_HERSHEY_SIMPLEX, 1.3, 0, 3,
+        )
+    grey[1900:1980, 900:1200] = 0
+    marker = np.array([[900, 1900], [1200, 1900], [1200, 1980], [900, 1980]], np.float64)
+    rot = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    grey = cv2.warpAffine(grey, rot, (w, h), flags=cv2.INTER_LINEAR, borderValue=90)
+    return grey, marker @ rot[:, :2].T + rot[:, 2]
+
+
+class PreprocessTests(SimpleTestCase):
+    def test_boxes_map_back_to_the_photo(self):
+        grey, marker = _receipt_photo(4.0)
+        rgb = cv2.cvtColor(grey, cv2.COLOR_GRAY2RGB)
+        detector, processed, transform = preprocess(
+            rgb, grey, preprocess_config({"enabled": True, "max_long_edge": 1000})
+        )
+        # cropped to the receipt and halved
+        self.assertEqual(max(processed.shape), 1000)
+        self.assertLess(processed.shape[1], 700)
+        self.assertEqual(detector.shape, (*processed.shape, 3))
+
+        # the marker is the largest dark blob; deskewed, it is level
+        n, labels, stats, _ = cv2.connectedComponentsWithStats((processed < 60).astype(np.uint8))
+        blob = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        ys, xs = np.nonzero(labels == blob)
+        rect = cv2.minAreaRect(np.column_stack([xs, ys]).astype(np.float32))
+        self.assertLess(min(abs(rect[2]), abs(90 - abs(rect[2]))), 1.0)
+
+        (bbox, text, conf), = transform.map_raw([(cv2.boxPoints(rect).tolist(), "TOTAL", 0.9)])
+        self.assertEqual((text, conf), ("TOTAL", 0.9))
+        # every mapped corner lands on a corner of the printed block
+        errors = np.linalg.norm(np.array(bbox)[:, None] - marker[None], axis=2).min(axis=1)
+        self.assertLess(errors.max(), 6.0)
+
+    def test_identity(self):
+        grey, _ = _receipt_photo(0.0)
+        off = preprocess_config({"crop": False, "deskew": False, "max_long_edge": None})
+        _, processed, transform = preprocess(cv2.cvtColor(grey, cv2.COLOR_GRAY2RGB), grey, off)
+        self.assertTrue(transform.is_identity)
+        self.assertEqual(processed.shape, grey.shape)
+        raw = [([[1, 2], [3, 2], [3, 4], [1, 4]], "A", 0.5)]
+        self.assertIs(Transform().map_raw(raw), raw)
+
+    def test_receipt_bounds(self):
+        grey, _ = _receipt_photo(0.0)
+        x0, y0, x1, y1 = _receipt_bounds(grey)
+        for got, drawn in zip((x0, y0, x1, y1), (500, 600, 1500, 2500)):
+            self.assertAlmostEqual(got, drawn, delta=20)
+
+        photo = np.full((1000, 800), 90, np.uint8)
+        for name, (top, left, bottom, right) in {
+            # more than 90% of the photo: nothing to crop
+            "whole photo": (0, 0, 1000, 800),
+            "nearly all": (20, 20, 985, 785),
+            # under 15%: not a receipt
+            "speck": (100, 100, 400, 300),
+        }.items():
+            with self.subTest(name):
+                grey = photo.copy()
+                grey[top:bottom, left:right] = 235
+                self.assertIsNone(_receipt_bounds(grey))
+        grey = photo.copy()
+        grey[100:700, 100:500] = 235  # 30%
+        self.assertIsNotNone(_receipt_bounds(grey))
+
+
+class _CountingReader:
+    """Records how many detector calls overlap."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = self.peak = 0
+
+    def detect(self, img, reformat=False):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+        return [[]], [[]]
+
+    def recognize(self, grey, horizontal_list, free_list, reformat=False):
+        return []
+
+
+class CpuBudgetTests(SimpleTestCase):
+    def test_concurrent_inferences_capped(self):
+        image = (np.zeros((20, 30, 3), np.uint8), np.zeros((20, 30), np.uint8))
+        for limit in (1, 2):
+            with self.subTest(OCR_MAX_CONCURRENT=limit):
+                reader = _CountingReader()
+                with override_settings(OCR_MAX_CONCURRENT=limit), mock.patch.object(services, "_slots", None):
+                    threads = [
+                        threading.Thread(target=_readtext_batched, args=(reader, [image]))
+                        for _ in range(6)
+                    ]
+                    for t in threads:
+                        t.start()
+                    for t in threads:
+                        t.join()
+                self.assertEqual(reader.peak, limit)
+
+    def test_thread_budget(self):
+        with mock.patch.object(torch, "set_num_threads") as set_threads, \
+                mock.patch.object(torch, "get_num_interop_threads", return_value=8), \
+                mock.patch.object(torch, "set_num_interop_threads", side_effect=RuntimeError) as set_interop:
+            services.apply_thread_budget(threads=2, interop_threads=1)
+            set_threads.assert_called_once_with(2)
+            set_interop.assert_called_once_with(1)
+            # 0: torch's defaults
+            set_threads.reset_mock()
+            services.apply_thread_budget(threads=0, interop_threads=0)
+            set_threads.assert_not_called()
+
+    @override_settings(OCR_TORCH_THREADS=2)
+    def test_pin_to_cpus(self):
+        with mock.patch.object(services.os, "sched_getaffinity", create=True, return_value={0, 1, 2, 3, 4}), \
+                mock.patch.object(services.os, "sched_setaffinity", create=True) as setaffinity:
+            self.assertEqual(services.pin_to_cpus(0), {0, 1})
+            self.assertEqual(services.pin_to_cpus(2), {4, 0})
+            setaffinity.assert_called_with(0, {4, 0})
+            with override_settings(OCR_TORCH_THREADS=0):
+                self.assertIsNone(services.pin_to_cpus(1))
+        # no sched_setaffinity (macOS, Windows): nothing to do
+        with mock.patch.object(services, "os", mock.Mock(spec=["getpid"])):
+            self.assertIsNone(services.pin_to_cpus(1))
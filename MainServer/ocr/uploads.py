@@ -0,0 +1,45 @@
+"""
+Upload handlers that hash the file while Django streams it in.
+
+They are Django's default memory / temporary-file handlers with a
+SHA-256 fed from ``receive_data_chunk``; the finished upload carries the
+hex digest as ``upload.sha256``, so ``ocr.services.extract_text`` can
+look the result cache up without reading the bytes a second time.
+Installed through ``FILE_UPLOAD_HANDLERS``.
+"""
+
+import hashlib
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class _HashingMixin:
+    def new_file(self, *args, **kwargs):
+        # set first: the memory handler raises StopFutureHandlers from new_file
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        # a handler that returns the chunk did not keep it (the memory
+        # handler for a large upload); only the one that stores it hashes
+        if passed_on is None:
+            self.sha256.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        if upload is not None:
+            upload.sha256 = self.sha256.hexdigest()
+        return upload
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+    """``MemoryFileUploadHandler`` that sets ``upload.sha256``."""
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    """``TemporaryFileUploadHandler`` that sets ``upload.sha256``."""
@@ -1,6 +1,18 @@
 from django.urls import path
-from .views import ReceiptOCRView
+from .views import (
+    ReceiptOCRView,
+    BatchReceiptOCRView,
+    OcrJobSubmitView,
+    OcrJobDetailView,
+    OcrCacheStatsView,
+    OcrReadyView,
+)
 
 urlpatterns = [
     path("extract/", ReceiptOCRView.as_view(), name="ocr-extract"),
-]
\ No newline at end of file
+    path("extract/batch/", BatchReceiptOCRView.as_view(), name="ocr-extract-batch"),
+    path("jobs/", OcrJobSubmitView.as_view(), name="ocr-job-submit"),
+    path("jobs/<uuid:pk>/", OcrJobDetailView.as_view(), name="ocr-job-detail"),
+    path("cache/stats/", OcrCacheStatsView.as_view(), name="ocr-cache-stats"),
+    path("ready/", OcrReadyView.as_view(), name="ocr-ready"),
+]
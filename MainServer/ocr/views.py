@@ -1,39 +1,158 @@
-from django.shortcuts import render
+import secrets
+import time
+
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .serializers import ReceiptUploadSerializer, OCRResultSerializer
-from .services import extract_text
-from .parser import parse_receipt
-from .categorizer import suggest_category
+from AdminServer import metrics
+
+from .models import OcrJob
+from .serializers import (
+    ReceiptUploadSerializer,
+    BatchReceiptUploadSerializer,
+    OCRResultSerializer,
+    OCRBatchResultSerializer,
+    OcrJobSerializer,
+)
+from .pipeline import process_receipt, process_receipt_batch
+from .jobs import submit_job, QueueFull
+from .cache import result_cache
+from .model_server import OcrServerError
+from .services import reader_status
 
 
 class ReceiptOCRView(APIView):
     """
-    POST an image → get back structured parsed receipt data.
+    POST an image → get back structured parsed receipt data.  The
+    response's ``Server-Timing`` header breaks the time down by stage.
     """
 
     def post(self, request):
-        ser = ReceiptUploadSerializer(data=request.data)
-        ser.is_valid(raise_exception=True)
+        # parsing the multipart body (and spooling large files to disk)
+        with metrics.stage("upload"):
+            ser = ReceiptUploadSerializer(data=request.data)
+            ser.is_valid(raise_exception=True)
 
         image = ser.validated_data["image"]
+        try:
+            payload = process_receipt(image)
+        except OcrServerError as exc:
+            return Response(
+                {"detail": f"OCR service unavailable: {exc}"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
 
-        # 1. OCR
-        ocr = extract_text(image)
+        with metrics.stage("serialize"):
+            data = OCRResultSerializer(payload).data
+        return Response(data, status=status.HTTP_200_OK)
 
-        # 2. Parse
-        parsed = parse_receipt(ocr["lines"], ocr["paragraph"])
 
-        # 3. Auto-categorise
-        cat = suggest_category(ocr["paragraph"])
+class BatchReceiptOCRView(APIView):
+    """
+    POST several ``images`` → one parsed result per image, in input
+    order, with per-image timings.  Images go through the reader in
+    batches; a bad image only fails its own entry.
+    """
+
+    def post(self, request):
+        ser = BatchReceiptUploadSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
 
+        t0 = time.perf_counter()
+        try:
+            results = process_receipt_batch(ser.validated_data["images"])
+        except OcrServerError as exc:
+            return Response(
+                {"detail": f"OCR service unavailable: {exc}"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
         payload = {
-            **parsed,
-            "suggested_category": cat,
-            "confidence": ocr["avg_confidence"],
+            "results": results,
+            "timing_ms": {
+                "total": round((time.perf_counter() - t0) * 1000, 2),
+            },
         }
 
-        out = OCRResultSerializer(payload)
-        return Response(out.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        out = OCRBatchResultSerializer(payload)
+        return Response(out.data, status=status.HTTP_200_OK)
+
+
+def _owner(request):
+    """The job owner for *request*: its user, or ``None`` if anonymous."""
+    return request.user if request.user.is_authenticated else None
+
+
+class OcrJobSubmitView(APIView):
+    """
+    POST an image → get back a job id immediately.  The OCR itself runs
+    on ``manage.py ocr_worker``; poll :class:`OcrJobDetailView`.  An
+    anonymous submitter also gets the job's ``secret``, needed to poll.
+    """
+
+    def post(self, request):
+        ser = ReceiptUploadSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        try:
+            job = submit_job(ser.validated_data["image"], owner=_owner(request))
+        except QueueFull:
+            return Response(
+                {"detail": "OCR queue is full, please retry shortly."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={
+                    "Retry-After": str(
+                        getattr(settings, "OCR_JOB_RETRY_AFTER", 5)
+                    )
+                },
+            )
+
+        data = OcrJobSerializer(job).data
+        if job.poll_secret:
+            data["secret"] = job.poll_secret
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class OcrJobDetailView(APIView):
+    """
+    GET a job's status; ``result`` holds the ``OCRResultSerializer``
+    payload once the status is DONE.  An anonymous job needs its secret
+    in the ``X-OCR-Job-Secret`` header.  Another user's job, or a wrong
+    secret, is a 404.
+    """
+
+    def get(self, request, pk):
+        job = get_object_or_404(OcrJob, pk=pk, kind=OcrJob.OCR, owner=_owner(request))
+        if job.owner_id is None and not (
+            # jobs from before secrets existed have none: nobody may poll them
+            job.poll_secret
+            and secrets.compare_digest(job.poll_secret, request.headers.get("X-OCR-Job-Secret", ""))
+        ):
+            raise Http404
+        return Response(OcrJobSerializer(job).data)
+
+
+class OcrCacheStatsView(APIView):
+    """
+    GET hit / miss counters of the OCR result cache, for this process
+    and (best-effort) across all workers sharing the cache backend.
+    """
+
+    def get(self, request):
+        return Response(result_cache.stats())
+
+
+class OcrReadyView(APIView):
+    """
+    GET readiness of the OCR reader.  With ``OCR_WARM_START``: 200 once
+    the model is loaded and has run its warm-up inference, 503 before.
+    Without it the reader loads on the first request, so always 200.
+    """
+
+    def get(self, request):
+        state = reader_status()
+        code = status.HTTP_200_OK if state["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response(state, status=code)
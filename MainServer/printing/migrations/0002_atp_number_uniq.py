@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('printing', '0001_initial'),
+        # duplicates are merged first
+        ('billing', '0003_merge_duplicate_parties'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='printeraccreditation',
+            constraint=models.UniqueConstraint(fields=('authority_to_print_number',), name='atp_number_uniq'),
+        ),
+    ]
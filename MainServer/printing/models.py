@@ -17,6 +17,13 @@ class PrinterAccreditation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["authority_to_print_number"], name="atp_number_uniq"
+            ),
+        ]
+
     @property
     def valid_until_date(self):
         return self.atp_issue_date.replace(